@@ -23,13 +23,26 @@ def _auto_migrate(app, db):
         ("products", "lookup_count", "INTEGER DEFAULT 0"),
         ("products", "cached_score", "INTEGER"),
         ("products", "score_cached_at", "TIMESTAMP"),
+        ("products", "next_refresh_at", "TIMESTAMP"),
+        ("products", "ai_image_url", "TEXT"),
+        ("products", "ai_video_url", "TEXT"),
+        ("products", "ai_video_task_id", "VARCHAR(100)"),
+        ("products", "ai_video_status", "VARCHAR(50)"),
         ("brand_products", "sales_7d", "INTEGER DEFAULT 0"),
+        ("scan_jobs", "attempts", "INTEGER DEFAULT 0"),
+        ("api_keys", "webhook_url", "VARCHAR(500)"),
+        ("api_keys", "webhook_secret", "VARCHAR(64)"),
+        ("scan_jobs", "worker_id", "VARCHAR(100)"),
+        ("scan_jobs", "started_at", "TIMESTAMP"),
+        ("scan_jobs", "next_attempt_at", "TIMESTAMP"),
         # Brand Hunter v2 — new columns on brand_scan_jobs
         ("brand_scan_jobs", "brand_id_str", "VARCHAR(100)"),
         ("brand_scan_jobs", "brand_name", "VARCHAR(300)"),
         ("brand_scan_jobs", "brand_logo_url", "VARCHAR(500)"),
+        ("brand_scan_tasks", "heartbeat_at", "TIMESTAMP"),
         # Pre-launch feature sprint
         ("users", "onboarded_at", "TIMESTAMP"),
+        ("users", "entitlement_changed_at", "TIMESTAMP"),
         ("subscriptions", "paused_until", "TIMESTAMP"),
         ("subscriptions", "save_offer_used_at", "TIMESTAMP"),
     ]
@@ -43,6 +56,33 @@ def _auto_migrate(app, db):
         except Exception:
             db.session.rollback()
 
+    # Index for refresh jobs selecting by next_refresh_at <= now
+    try:
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_products_next_refresh_at ON products (next_refresh_at)"
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+    # Index for the Discord bot's entitlement change polling
+    try:
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_users_entitlement_changed_at ON users (entitlement_changed_at)"
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+    # Index for scan workers' per-API-key fairness
+    try:
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_scan_jobs_api_key_id ON scan_jobs (api_key_id)"
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
     # Fix brands table if it was created without id column
     try:
         db.session.execute(db.text("SELECT id FROM brands LIMIT 1"))
@@ -152,7 +192,7 @@ def _auto_migrate(app, db):
                 print(f"[MIGRATE] {tbl} creation failed: {e}")
 
     # Fix Brand Hunter v2 tables if missing
-    for tbl in ['scanned_brands', 'brand_products']:
+    for tbl in ['scanned_brands', 'brand_products', 'brand_scan_tasks', 'brand_scan_pages']:
         try:
             db.session.execute(db.text(f"SELECT id FROM {tbl} LIMIT 1"))
             db.session.rollback()
@@ -188,6 +228,21 @@ def _auto_migrate(app, db):
     except Exception:
         db.session.rollback()
 
+    # Job queue, service lease, webhook delivery, share-link cache, AI asset and progress relay tables
+    for tbl, col in [('queue_jobs', 'id'), ('service_leases', 'name'), ('webhook_deliveries', 'id'),
+                     ('share_links', 'url'), ('ai_assets', 'key'), ('progress_events', 'id')]:
+        try:
+            db.session.execute(db.text(f"SELECT {col} FROM {tbl} LIMIT 1"))
+            db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            try:
+                db.create_all()
+                print(f"[MIGRATE] Created {tbl} table")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATE] {tbl} creation failed: {e}")
+
     # Fix favorited_creators table if missing
     try:
         db.session.execute(db.text("SELECT id FROM favorited_creators LIMIT 1"))
@@ -342,21 +397,25 @@ def create_app():
     @flask_app.context_processor
     def inject_campaign_banner():
         try:
-            from app.models import CampaignBanner
+            from app.models import CampaignBanner as Banner
             from datetime import datetime as dt, timedelta as td
             now_est = dt.utcnow() - td(hours=5)
             # Get highest-priority active campaign that's either live or upcoming (EST)
-            campaign = CampaignBanner.query.filter(
-                CampaignBanner.is_active == True,
+            campaign = Banner.query.filter(
+                Banner.is_active == True,
                 db.or_(
-                    CampaignBanner.ends_at.is_(None),
-                    CampaignBanner.ends_at > now_est
+                    Banner.ends_at.is_(None),
+                    Banner.ends_at > now_est
                 )
-            ).order_by(CampaignBanner.priority.desc()).first()
+            ).order_by(Banner.priority.desc()).first()
             return {'active_campaign': campaign}
         except Exception:
             return {'active_campaign': None}
 
+    # --- Forward progress events to the web process (start_web_services relays them) ---
+    from app.services.progress import start_forwarder
+    start_forwarder(flask_app)
+
     # --- Start background scheduler ---
     from app.services.scheduler import init_scheduler
     init_scheduler(flask_app)
@@ -364,6 +423,33 @@ def create_app():
     return flask_app
 
 
+def start_web_services(flask_app):
+    """
+    Background work owned by the web process: the embedded job worker,
+    scan-job pool and Kling poller (all three skipped when
+    JOB_WORKER_EMBEDDED=0 because worker.py runs them), and resuming
+    Brand Hunter scans orphaned by a restart — those run on the web
+    process's in-memory scan queue, where its progress SSE can see them —
+    and prefetching warmed images into the image proxy cache.
+    It also relays progress events other processes publish into this
+    process's bus, which the progress SSE endpoints read.
+    Called from main.py only — other importers of ``app``
+    (discord_bot.py, scripts) must not claim queue jobs or scans.
+    """
+    from app.services.progress import start_relay
+    start_relay(flask_app)
+    from app.services.job_queue import start_embedded_worker
+    start_embedded_worker(flask_app)
+    from app.services.scan_jobs import start_embedded_pool
+    start_embedded_pool(flask_app)
+    from app.services.ai_media import start_embedded_poller
+    start_embedded_poller(flask_app)
+    from app.services.brand_scan_queue import start_resume_watch
+    start_resume_watch(flask_app)
+    from app.services.image_warmup import start_prefetch_watch
+    start_prefetch_watch(flask_app)
+
+
 # ---------------------------------------------------------------------------
 # Create the module-level app instance.
 # This enables backward-compatible imports:
@@ -29,6 +29,8 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
     onboarded_at = db.Column(db.DateTime, nullable=True)
+    # Bumped whenever subscription / credit state changes — Discord bot entitlement caches poll it
+    entitlement_changed_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def to_dict(self):
         return {
@@ -155,6 +157,7 @@ class Product(db.Model):
     rating = db.Column(db.Float)  # Normalized 0-5 rating (distinct from product_rating for future use)
     price_trend = db.Column(db.String(20))  # 'rising', 'falling', 'stable'
     last_echotik_sync = db.Column(db.DateTime)
+    next_refresh_at = db.Column(db.DateTime, index=True)  # Adaptive refresh schedule (services/refresh_policy)
 
     # Lookup popularity (used to prioritize refresh tiers)
     lookup_count = db.Column(db.Integer, default=0)
@@ -167,6 +170,15 @@ class Product(db.Model):
     cached_score = db.Column(db.Integer, nullable=True)
     score_cached_at = db.Column(db.DateTime, nullable=True)
 
+    # Latest AI image / Kling video (kept in sync by services/ai_media).
+    # ai_image_url is an /api/ai/assets/<key> path (older rows may hold a
+    # data: URL until ai_media.stored_image moves it); deferred since only
+    # the AI endpoints read it.
+    ai_image_url = db.deferred(db.Column(db.Text, nullable=True))
+    ai_video_url = db.Column(db.Text, nullable=True)
+    ai_video_task_id = db.Column(db.String(100), nullable=True)
+    ai_video_status = db.Column(db.String(50), nullable=True)
+
     # Composite indexes for common query patterns
     __table_args__ = (
         db.Index('idx_influencer_sales', 'influencer_count', 'sales_7d'),
@@ -335,6 +347,8 @@ class ApiKey(db.Model):
     credits = db.Column(db.Integer, default=0)  # 1 credit = 1 scan
     total_usage = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    webhook_url = db.Column(db.String(500))     # Completed ScanJobs are POSTed here (services/webhooks)
+    webhook_secret = db.Column(db.String(64))   # HMAC-SHA256 signing secret for those POSTs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
@@ -342,11 +356,15 @@ class ScanJob(db.Model):
     """Async Job Queue for SaaS Scans"""
     __tablename__ = 'scan_jobs'
     id = db.Column(db.String(36), primary_key=True)  # UUID
-    status = db.Column(db.String(20), default='queued', index=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, complete, error
     input_query = db.Column(db.String(500))
     result_json = db.Column(db.Text)
-    api_key_id = db.Column(db.Integer, db.ForeignKey('api_keys.id'))
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_keys.id'), index=True)
+    attempts = db.Column(db.Integer, default=0)
+    worker_id = db.Column(db.String(100))                  # Claiming worker (services/scan_jobs)
+    next_attempt_at = db.Column(db.DateTime)               # Retry backoff — not claimed before this
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
 
 
@@ -753,3 +771,180 @@ class BrandScanJob(db.Model):
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class BrandScanTask(db.Model):
+    """Per-brand progress within a BrandScanJob — one row per brand in the batch"""
+    __tablename__ = 'brand_scan_tasks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('brand_scan_jobs.id'), nullable=False, index=True)
+    shop_id = db.Column(db.String(100), nullable=False, index=True)
+    brand_name = db.Column(db.String(300))
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, complete, error, stopped
+    current_page = db.Column(db.Integer, default=0)
+    products_found = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.String(500))
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)                  # Last page checkpoint — stale = orphaned worker
+    completed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'shop_id': self.shop_id,
+            'brand_name': self.brand_name,
+            'status': self.status,
+            'current_page': self.current_page or 0,
+            'products_found': self.products_found or 0,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class BrandScanPage(db.Model):
+    """Checkpoint staging — one fetched product page of a BrandScanTask, kept until the brand is saved"""
+    __tablename__ = 'brand_scan_pages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('brand_scan_tasks.id'), nullable=False, index=True)
+    page = db.Column(db.Integer, nullable=False)
+    product_count = db.Column(db.Integer, default=0)
+    products_json = db.Column(db.Text)                     # Normalized EchoTik product dicts for the page
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'page', name='uq_brand_scan_page'),
+    )
+
+
+class QueueJob(db.Model):
+    """Durable background job — claimed by a worker under a renewable lease (see services/job_queue)"""
+    __tablename__ = 'queue_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)        # Registered handler name, e.g. 'daily_sync'
+    payload_json = db.Column(db.Text)
+    status = db.Column(db.String(20), default='queued')    # queued, running, complete, failed
+    priority = db.Column(db.Integer, default=0)            # Higher runs first
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    dedupe_key = db.Column(db.String(100), index=True)     # At most one queued/running job per key
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    result_json = db.Column(db.Text)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_queue_jobs_claim', 'status', 'priority', 'run_after'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'priority': self.priority or 0,
+            'attempts': self.attempts or 0,
+            'max_attempts': self.max_attempts,
+            'lease_owner': self.lease_owner,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class ServiceLease(db.Model):
+    """Named cross-process lock with an expiry — scheduler leadership fallback, admin scan lock"""
+    __tablename__ = 'service_leases'
+
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100))
+    info_json = db.Column(db.Text)
+    acquired_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+
+class WebhookDelivery(db.Model):
+    """One webhook POST of a finished ScanJob to its API key's callback URL — the delivery log"""
+    __tablename__ = 'webhook_deliveries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_keys.id'), index=True)
+    scan_job_id = db.Column(db.String(36), index=True)
+    url = db.Column(db.String(500))
+    payload_json = db.Column(db.Text)
+    status = db.Column(db.String(20), default='pending')   # pending, delivered, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    response_status = db.Column(db.Integer)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_webhook_deliveries_due', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.scan_job_id,
+            'url': self.url,
+            'status': self.status,
+            'attempts': self.attempts or 0,
+            'response_status': self.response_status,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at and self.status == 'pending' else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+        }
+
+
+class ShareLink(db.Model):
+    """Resolved TikTok short share link — product_id NULL caches 'no product here' until expires_at"""
+    __tablename__ = 'share_links'
+
+    url = db.Column(db.String(300), primary_key=True)
+    product_id = db.Column(db.String(50))
+    region = db.Column(db.String(10), default='US')
+    resolved_url = db.Column(db.String(1000))
+    source = db.Column(db.String(20))        # redirect, html, echotik
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime)      # NULL = never (positive results)
+
+
+class AiAsset(db.Model):
+    """Generated AI image / Kling video for a product, keyed by its inputs so retries reuse it (see services/ai_media)"""
+    __tablename__ = 'ai_assets'
+
+    key = db.Column(db.String(64), primary_key=True)     # sha256 of kind + product + source + settings
+    product_id = db.Column(db.String(50), index=True)
+    kind = db.Column(db.String(20), nullable=False)      # lifestyle_image, one_click_image, stored_image, video
+    mime_type = db.Column(db.String(50))
+    data = db.Column(db.Text)                            # base64 image bytes (images)
+    task_id = db.Column(db.String(100), index=True)      # Kling task (videos)
+    status = db.Column(db.String(20), default='ready')   # ready | pending, processing, completed, failed (videos)
+    url = db.Column(db.Text)                             # video URL once Kling finishes
+    error = db.Column(db.String(500))
+    meta_json = db.Column(db.Text)                       # category, prompt, duration …
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProgressEvent(db.Model):
+    """Progress event published outside the web process, relayed into its in-memory bus (see services/progress)"""
+    __tablename__ = 'progress_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(100), nullable=False)
+    payload_json = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
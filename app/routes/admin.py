@@ -402,20 +402,36 @@ def _categorize_action(action):
 @login_required
 @admin_required
 def admin_scheduler_run_now():
-    """Admin: trigger the daily EchoTik sync immediately (in a background
-    thread). Useful to confirm scheduler logs are wired up correctly
+    """Admin: queue the daily EchoTik sync to run immediately on a job
+    worker. Useful to confirm scheduler logs are wired up correctly
     without waiting for 8 PM EST."""
-    from app import executor
-    from flask import current_app
     try:
-        from app.services.scheduler import daily_sync
-        app = current_app._get_current_object()
-        executor.submit(daily_sync, app)
-        return jsonify({'success': True, 'message': 'Daily sync started in background. Refresh logs in a few seconds.'})
+        from app.services.job_queue import enqueue
+        job_id, created = enqueue('daily_sync', priority=10, max_attempts=2, dedupe_key='daily_sync')
+        if not created:
+            return jsonify({'success': True, 'job_id': job_id,
+                            'message': f'Daily sync already queued or running (job #{job_id}).'})
+        return jsonify({'success': True, 'job_id': job_id,
+                        'message': 'Daily sync queued. Refresh logs in a few seconds.'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@admin_bp.route('/api/admin/jobs')
+@login_required
+@admin_required
+def admin_jobs():
+    """Recent durable queue jobs and which process holds scheduler leadership."""
+    from app.services.job_queue import recent_jobs
+    from app.services.scheduler import init_scheduler
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    leader = getattr(init_scheduler, 'leader', None)
+    return jsonify({
+        'jobs': recent_jobs(limit),
+        'scheduler_leader_here': bool(leader and leader.is_leader),
+    })
+
+
 @admin_bp.route('/api/admin/scheduler/status')
 @login_required
 @admin_required
@@ -1540,11 +1556,13 @@ def hot_products_test():
         """)
         raw_results = db.session.execute(raw_sql, {'cutoff': cutoff_date}).fetchall()
 
-        # Also test: call actual get_hot_products from discord_bot
+        # Also test: what the bot would post next, from the precomputed pool
+        # (peek — doesn't mark anything shown)
+        pool_built_at = None
         try:
-            from discord_bot import get_hot_products
-            bot_results = get_hot_products()
-            bot_count = len(bot_results) if bot_results else 0
+            from app.services.hot_products import peek
+            pool_built_at, bot_results = peek(15)
+            bot_count = len(bot_results)
         except Exception as e:
             bot_results = []
             bot_count = f"ERROR: {str(e)}"
@@ -1572,6 +1590,7 @@ def hot_products_test():
                 'commission': r[5],
                 'last_shown': str(r[6])
             } for r in raw_results[:5]],
+            'pool_built_at': pool_built_at.isoformat() if pool_built_at else None,
             'bot_function_count': bot_count,
             'bot_function_results': bot_results[:3] if isinstance(bot_results, list) else []
         })
@@ -2222,22 +2241,55 @@ def trigger_echotik_scraper():
     pages = request.get_json(silent=True) or {}
     num_pages = pages.get('pages', 5)
 
-    try:
-        from app.services.echotik_scraper import run_scraper_sync
-    except ImportError:
-        return jsonify({'error': 'echotik_scraper module not available'}), 500
+    from app.services.job_queue import enqueue
+    job_id, created = enqueue('echotik_scraper', {'pages': num_pages}, priority=10,
+                              max_attempts=1, dedupe_key='echotik_scraper')
+    if not created:
+        return jsonify({'success': True, 'job_id': job_id,
+                        'message': f'Scraper already queued or running (job #{job_id})'})
+    log_activity(session.get('user_id'), 'echotik_scraper_manual',
+                 {'pages': num_pages, 'job_id': job_id})
+    return jsonify({'success': True, 'job_id': job_id,
+                    'message': f'Scraper queued ({num_pages} pages) — running in background'})
 
-    def _run():
-        try:
-            result = run_scraper_sync(current_app._get_current_object(), pages=num_pages)
-            log.info("[ADMIN] Manual scraper run complete: %s", result)
-        except Exception as exc:
-            log.error("[ADMIN] Manual scraper run failed: %s", exc)
 
-    executor.submit(_run)
-    log_activity(session.get('user_id'), 'echotik_scraper_manual',
-                 {'pages': num_pages})
-    return jsonify({'success': True, 'message': f'Scraper started ({num_pages} pages) — running in background'})
+# Progress channels admins may watch live (see services/progress)
+_ADMIN_PROGRESS_CHANNELS = ('daily_sync', 'scraper', 'trickle')
+
+
+@admin_bp.route('/api/admin/progress/<channel>', methods=['GET'])
+@login_required
+@admin_required
+def admin_progress_latest(channel):
+    """Latest progress event for the daily sync, scraper or trickle refresh."""
+    if channel not in _ADMIN_PROGRESS_CHANNELS:
+        return jsonify({'error': 'Unknown channel'}), 404
+    from app.services.progress import progress_bus
+    return jsonify({'channel': channel, 'event': progress_bus.latest(channel)})
+
+
+@admin_bp.route('/api/admin/progress/<channel>/events', methods=['GET'])
+@login_required
+@admin_required
+def admin_progress_events(channel):
+    """Server-Sent Events stream of the daily sync, scraper or trickle progress channel."""
+    if channel not in _ADMIN_PROGRESS_CHANNELS:
+        return jsonify({'error': 'Unknown channel'}), 404
+    from flask import Response, stream_with_context
+    from app.services.progress import stream_channel, try_open_stream, close_stream
+
+    if not try_open_stream():
+        return jsonify({'error': 'Too many live streams'}), 503
+    try:
+        after = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        after = 0
+
+    resp = Response(stream_with_context(stream_channel(channel, after)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(close_stream)
+    return resp
 
 
 @admin_bp.route('/api/admin/echotik-scraper/debug', methods=['POST'])
@@ -4,17 +4,24 @@ Extracted from monolithic app.py
 """
 
 import os
+import re
 import time
 import json
-import base64
 import random
 import requests
 import traceback
+import uuid
 
-from flask import Blueprint, jsonify, request, session, send_from_directory
+from flask import Blueprint, Response, jsonify, request, session, send_from_directory
 from app import db
 from app.models import Product, User, ApiKey, ScanJob
-from app.routes.auth import login_required, admin_required, get_current_user, log_activity
+from app.routes.auth import login_required, admin_required, get_current_user
+from app.services import ai_context
+from app.services import ai_chat as ai_chat_service
+from app.services.ai_cache import response_cache, context_key
+from app.services.progress import sse_event, try_open_stream, close_stream
+from app.services import ai_media
+from app.services.job_queue import enqueue
 
 ai_bp = Blueprint('ai_bp', __name__)
 
@@ -59,8 +66,13 @@ def ai_chat():
         message = data.get('message', '')
         if not message:
             return jsonify({"success": False, "error": "No message provided"}), 400
+        no_cache = bool(data.get('no_cache')) or 'no-cache' in (request.headers.get('Cache-Control') or '')
+        if '--fresh' in message.lower():
+            no_cache = True
+            message = re.sub(r'--fresh', '', message, flags=re.IGNORECASE).strip() or message
 
-        product_context = _build_product_context(message)
+        # Precomputed per data version — no queries per message (services/ai_context)
+        product_context = ai_context.render('web', message)
 
         system_prompt = f"""You are 'Vantage AI', the intelligent assistant for the Vantage platform — a premium TikTok Shop product research tool for affiliate sellers.
 
@@ -71,7 +83,7 @@ YOUR CAPABILITIES:
 - Provide market insights and product recommendations based on real data
 
 CURRENT DATABASE SNAPSHOT:
-{json.dumps(product_context, default=str)}
+{product_context}
 
 RESPONSE RULES:
 1. Be concise, professional, and data-driven. Always reference specific numbers.
@@ -83,183 +95,86 @@ RESPONSE RULES:
 7. Refer to the platform as 'Vantage'. You are Vantage AI.
 8. Keep responses concise — 2-3 sentences for simple questions, bullet points for product lists."""
 
-        ai_response = None
-
-        # PRIMARY — Claude Sonnet via Anthropic API
-        if anthropic_key:
-            try:
-                ai_res = requests.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers={
-                        "x-api-key": anthropic_key,
-                        "anthropic-version": "2023-06-01",
-                        "content-type": "application/json",
-                    },
-                    json={
-                        "model": "claude-sonnet-4-5-20250514",
-                        "max_tokens": 1500,
-                        "temperature": 0.4,
-                        "system": system_prompt,
-                        "messages": [{"role": "user", "content": message}],
-                    },
-                    timeout=60,
-                )
-                if ai_res.status_code == 200:
-                    ai_data = ai_res.json()
-                    ai_response = ai_data['content'][0]['text']
-                else:
-                    print(f"[AI] Anthropic error {ai_res.status_code}, falling back to Grok")
-            except Exception as e:
-                print(f"[AI] Anthropic exception: {e}, falling back to Grok")
-
-        # FALLBACK — Grok via xAI (if Anthropic failed or key missing)
-        if ai_response is None and xai_key:
-            ai_res = requests.post(
-                "https://api.x.ai/v1/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {xai_key}",
-                },
-                json={
-                    "model": "grok-4-1-fast-reasoning",
-                    "max_tokens": 1500,
-                    "temperature": 0.4,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": message},
-                    ],
-                },
-                timeout=60,
-            )
-            if ai_res.status_code != 200:
-                return jsonify({"success": False, "error": f"AI Error ({ai_res.status_code}): {ai_res.text[:200]}"}), 500
-            ai_data = ai_res.json()
-            ai_response = ai_data['choices'][0]['message']['content']
-
-        if ai_response is None:
-            return jsonify({"success": False, "error": "All AI providers failed"}), 500
-
-        return jsonify({"success": True, "response": ai_response})
+        # Near-identical questions against the same snapshot reuse the
+        # answer (services/ai_cache); "no_cache", Cache-Control: no-cache or --fresh skips it
+        scope = context_key(product_context)
+        cached = None
+        if no_cache:
+            response_cache.bypass()
+        else:
+            cached = response_cache.get(scope, message)
+        streaming = data.get('stream') or 'text/event-stream' in (request.headers.get('Accept') or '')
+
+        if cached:
+            ai_response, meta = cached
+            if streaming:
+                return Response(_cached_events(ai_response, meta), mimetype='text/event-stream',
+                                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            return jsonify({"success": True, "response": ai_response,
+                            "provider": meta.get('provider'), "cached": True})
+
+        # SSE mode: forward tokens as they arrive (event stream of
+        # start / message deltas / done | error — see services/ai_chat)
+        if streaming:
+            # Each live stream holds a worker thread — shared cap with the progress SSE (services/progress)
+            if not try_open_stream():
+                return jsonify({"success": False, "error": "Too many AI chats in progress. Try again in a moment."}), \
+                    429, {'Retry-After': '5'}
+            db.session.close()  # release the connection before the long-lived stream
+            resp = Response(_chat_events(system_prompt, message, anthropic_key, xai_key, scope),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            resp.call_on_close(close_stream)
+            return resp
+
+        try:
+            ai_response, meta = ai_chat_service.complete(system_prompt, message, anthropic_key, xai_key)
+        except ai_chat_service.ProviderError as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+        response_cache.put(scope, message, ai_response, {'provider': meta.get('provider')})
+
+        return jsonify({"success": True, "response": ai_response, "provider": meta.get('provider')})
 
     except Exception as e:
         print(f"[AI] Exception: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-def _build_product_context(user_message):
-    """Build diverse product context segments so the AI can answer any question."""
-    from sqlalchemy import func, desc
-
-    msg_lower = user_message.lower()
-
-    def _product_summary(p):
-        efficiency = round(p.ad_spend / max(p.video_count or 1, 1), 1) if p.ad_spend else 0
-        pid = p.product_id or ''
-        return {
-            "name": p.product_name[:80] if p.product_name else "Unknown",
-            "seller": p.seller_name or "Unknown",
-            "tiktok_link": p.product_url or (f"https://shop.tiktok.com/view/product/{pid}?region=US&locale=en-US" if pid else ""),
-            "price": round(p.price or 0, 2),
-            "ad_spend_7d": round(p.ad_spend or 0, 2),
-            "videos_alltime": p.video_count_alltime or p.video_count or 0,
-            "videos_7d": p.video_7d or 0,
-            "sales_7d": p.sales_7d or 0,
-            "sales_30d": p.sales_30d or 0,
-            "gmv_30d": round(p.gmv_30d or 0, 2),
-            "commission": round((p.commission_rate or 0) * 100, 1),
-            "influencers": p.influencer_count or 0,
-            "efficiency": efficiency,
-            "rating": p.product_rating or 0,
-        }
-
-    context = {}
-
-    # Minimum video count filter to exclude placeholder/broken products
-    # (matches the filter used on the website — products with <5 videos are junk)
-    MIN_VIDEOS = 5
-    video_count_field = db.func.coalesce(Product.video_count_alltime, Product.video_count)
-
-    # Always include: summary stats
-    total = Product.query.filter(
-        Product.product_status == 'active',
-        video_count_field >= MIN_VIDEOS,
-    ).count()
-    gems = Product.query.filter(
-        Product.sales_7d > 50,
-        video_count_field >= MIN_VIDEOS,
-        video_count_field < 50,
-        Product.product_status == 'active',
-    ).count()
-
-    context["database_summary"] = {
-        "total_active_products": total,
-        "gem_opportunities": gems,
-    }
+def _chat_events(system_prompt, message, anthropic_key, xai_key, scope):
+    """SSE messages for one streamed chat reply; a complete reply is cached."""
+    parts = []
+    try:
+        for kind, value in ai_chat_service.stream(system_prompt, message, anthropic_key, xai_key):
+            if kind == 'start':
+                yield sse_event({"provider": value}, event='start')
+            elif kind == 'text':
+                parts.append(value)
+                yield sse_event({"delta": value})
+            else:
+                response_cache.put(scope, message, ''.join(parts), {'provider': value['provider']})
+                yield sse_event({"success": True, **value}, event='done')
+    except ai_chat_service.ProviderError as e:
+        yield sse_event({"success": False, "error": str(e)}, event='error')
+    except Exception as e:
+        print(f"[AI] Stream exception: {e}")
+        yield sse_event({"success": False, "error": "AI stream failed"}, event='error')
 
-    # Segment 1: Top products by GMV (always useful)
-    top_gmv = Product.query.filter(
-        Product.gmv > 0,
-        video_count_field >= MIN_VIDEOS,
-        Product.product_status == 'active',
-    ).order_by(desc(Product.gmv)).limit(15).all()
-    context["top_by_gmv"] = [_product_summary(p) for p in top_gmv]
-
-    # Segment 2: Gems — strong sales, low video/creator saturation (but not zero/near-zero)
-    gem_products = Product.query.filter(
-        Product.sales_7d > 50,
-        video_count_field >= MIN_VIDEOS,  # Must have real data, not placeholder
-        video_count_field < 50,            # But not oversaturated
-        Product.product_status == 'active',
-    ).order_by(desc(Product.sales_7d)).limit(15).all()
-    context["gems_high_sales_low_videos"] = [_product_summary(p) for p in gem_products]
-
-    # Segment 3: Top sellers by 7D sales volume
-    top_sales = Product.query.filter(
-        Product.sales_7d > 0,
-        video_count_field >= MIN_VIDEOS,
-        Product.product_status == 'active',
-    ).order_by(desc(Product.sales_7d)).limit(10).all()
-    context["top_by_sales_volume"] = [_product_summary(p) for p in top_sales]
-
-    # Segment 4: Best commission rates
-    if any(w in msg_lower for w in ['commission', 'affiliate', 'earn', 'money', 'profit', 'margin']):
-        high_comm = Product.query.filter(
-            Product.commission_rate > 0.10,
-            Product.sales_7d > 10,
-            video_count_field >= MIN_VIDEOS,
-            Product.product_status == 'active',
-        ).order_by(desc(Product.commission_rate)).limit(10).all()
-        context["best_commission_rates"] = [_product_summary(p) for p in high_comm]
-
-    # Segment 5: Newest / trending products
-    if any(w in msg_lower for w in ['new', 'recent', 'latest', 'discover', 'fresh', 'trending']):
-        newest = Product.query.filter(
-            Product.product_status == 'active',
-            video_count_field >= MIN_VIDEOS,
-        ).order_by(desc(Product.first_seen)).limit(10).all()
-        context["recently_discovered"] = [_product_summary(p) for p in newest]
-
-    # Segment 6: Niche opportunities (high GMV, low creators)
-    if any(w in msg_lower for w in ['niche', 'untapped', 'opportunity', 'hidden']):
-        niche = Product.query.filter(
-            Product.gmv > 10000,
-            Product.influencer_count <= 30,
-            video_count_field >= MIN_VIDEOS,
-            Product.product_status == 'active',
-        ).order_by(desc(Product.gmv)).limit(10).all()
-        context["niche_opportunities"] = [_product_summary(p) for p in niche]
-
-    # Segment 7: Budget-friendly products
-    if any(w in msg_lower for w in ['cheap', 'budget', 'affordable', 'low price', 'under']):
-        cheap = Product.query.filter(
-            Product.price > 0,
-            Product.sales_7d > 5,
-            video_count_field >= MIN_VIDEOS,
-            Product.product_status == 'active',
-        ).order_by(Product.price.asc()).limit(10).all()
-        context["budget_friendly"] = [_product_summary(p) for p in cheap]
-
-    return context
+
+def _cached_events(ai_response, meta):
+    """A cached reply in the same SSE shape as a live one."""
+    yield sse_event({"provider": meta.get('provider'), "cached": True}, event='start')
+    yield sse_event({"delta": ai_response})
+    yield sse_event({"success": True, "provider": meta.get('provider'), "cached": True,
+                     "match": meta.get('match'), "ttft_ms": 0, "total_ms": 0}, event='done')
+
+
+@ai_bp.route('/api/ai/latency', methods=['GET'])
+@login_required
+@admin_required
+def ai_latency():
+    """Time-to-first-token and total latency per AI provider, plus response cache hit rates (this process)."""
+    return jsonify({"success": True, "providers": ai_chat_service.latency_stats(),
+                    "cache": response_cache.stats()})
 
 
 # =============================================================================
@@ -431,6 +346,11 @@ def generate_ai_image(product_id):
     - Place it in a natural lifestyle setting
     - Camera a few feet back with open background
     - Add complementary items for realism
+
+    Generation runs as an 'ai_image' job (services/ai_media): responds 202
+    with a job_id to poll at /api/ai/jobs/<job_id>. The scene prompt is
+    random, so every request gets a new image; only the job's own retries
+    reuse what it already generated.
     """
     if not GEMINI_API_KEY:
         return jsonify({
@@ -438,230 +358,62 @@ def generate_ai_image(product_id):
             'error': 'Gemini API key not configured. Please add GEMINI_API_KEY to environment variables.'
         }), 500
 
-    try:
-        # Get product info
-        product = Product.query.get(product_id)
-        if not product:
-            return jsonify({'success': False, 'error': 'Product not found'}), 404
-
-        # Check if a cropped image was provided in the request
-        request_data = request.get_json() or {}
-        cropped_image_data = request_data.get('cropped_image')
-
-        if cropped_image_data:
-            # Use the cropped image provided by the frontend
-            # Remove data URL prefix if present (e.g., "data:image/png;base64,")
-            if ',' in cropped_image_data:
-                header, image_data = cropped_image_data.split(',', 1)
-                if 'png' in header:
-                    mime_type = 'image/png'
-                elif 'webp' in header:
-                    mime_type = 'image/webp'
-                else:
-                    mime_type = 'image/jpeg'
-            else:
-                image_data = cropped_image_data
-                mime_type = 'image/jpeg'
-        else:
-            # Fall back to fetching the original product image
-            image_url = product.cached_image_url or product.image_url
-            if not image_url:
-                return jsonify({'success': False, 'error': 'No product image available'}), 400
-
-            # Download the product image and convert to base64
-            try:
-                # If it's a proxy URL, fetch through our proxy
-                if image_url.startswith('/api/image-proxy'):
-                    # Extract the actual URL from the proxy
-                    from urllib.parse import parse_qs, urlparse
-                    parsed = urlparse(image_url)
-                    actual_url = parse_qs(parsed.query).get('url', [None])[0]
-                    if actual_url:
-                        image_url = actual_url
-
-                img_response = requests.get(image_url, timeout=30, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                if img_response.status_code != 200:
-                    return jsonify({'success': False, 'error': f'Failed to download product image: {img_response.status_code}'}), 400
-
-                image_data = base64.b64encode(img_response.content).decode('utf-8')
-
-                # Determine image mime type
-                content_type = img_response.headers.get('Content-Type', 'image/jpeg')
-                if 'png' in content_type:
-                    mime_type = 'image/png'
-                elif 'webp' in content_type:
-                    mime_type = 'image/webp'
-                else:
-                    mime_type = 'image/jpeg'
-
-            except Exception as e:
-                return jsonify({'success': False, 'error': f'Failed to fetch product image: {str(e)}'}), 400
-
-        # Determine product category and generate prompt
-        category = get_product_category(product.product_name or '')
-        prompt = get_scene_prompt(product.product_name or 'product', category)
-
-        # Use the REAL Nano Banana Pro models:
-        # - gemini-3-pro-image-preview = Nano Banana Pro (BEST quality, 2K/4K, sharp text) - PRIMARY
-        # - gemini-2.5-flash-image = Nano Banana (fast fallback)
-        models_to_try = [
-            "gemini-3-pro-image-preview",   # Nano Banana Pro - BEST QUALITY, try first!
-            "gemini-2.5-flash-image",       # Nano Banana - fallback if Pro fails
-        ]
+    product = Product.query.get(product_id)
+    if not product:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+
+    # Optional cropped image from the frontend (data URL or raw base64)
+    request_data = request.get_json(silent=True) or {}
+    cropped_image_data = request_data.get('cropped_image')
+    if not cropped_image_data and not (product.cached_image_url or product.image_url):
+        return jsonify({'success': False, 'error': 'No product image available'}), 400
+
+    # The same request while one is queued or running returns that job
+    key = ai_media.lifestyle_key(product, cropped_image_data)
+    user = get_current_user()
+    job_id, _ = enqueue('ai_image', {
+        'product_id': product_id,
+        'cropped_image': cropped_image_data,
+        'user_id': user.id if user else None,
+        'variant': uuid.uuid4().hex,
+    }, priority=5, max_attempts=2, dedupe_key=f'ai_image:{key[:40]}')
+    return jsonify({
+        'success': True,
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': f'/api/ai/jobs/{job_id}',
+        'message': 'Image generation queued. Poll status_url for the result.',
+    }), 202
+
+
+@ai_bp.route('/api/ai/jobs/<int:job_id>', methods=['GET'])
+def ai_job_status(job_id):
+    """Status of a queued AI image / one-click video job, with the image and video once ready."""
+    user = get_current_user()
+    if request.args.get('passkey') != DEV_PASSKEY:
+        if not user:
+            return jsonify({'error': 'Unauthorized'}), 401
+        owner = ai_media.job_owner(job_id)
+        if not user.is_admin and owner != user.id:
+            return jsonify({'error': 'Job not found'}), 404
 
-        # Basic payload without resolution config (for fallback model)
-        payload = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [
-                        {
-                            "inlineData": {
-                                "mimeType": mime_type,
-                                "data": image_data
-                            }
-                        },
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "responseModalities": ["TEXT", "IMAGE"]
-            }
-        }
-
-        # Payload with aspect ratio AND 2K resolution for Nano Banana Pro
-        # Supports: "1K", "2K", "4K" - using 2K for sharp text while keeping reasonable speed
-        payload_with_config = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [
-                        {
-                            "inlineData": {
-                                "mimeType": mime_type,
-                                "data": image_data
-                            }
-                        },
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "responseModalities": ["TEXT", "IMAGE"],
-                "imageConfig": {
-                    "aspectRatio": "9:16",
-                    "imageSize": "2K"
-                }
-            }
-        }
-
-        response = None
-        last_error = None
-
-        for model_name in models_to_try:
-            gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
-            # Use full config (aspect ratio + 2K resolution) for Nano Banana Pro
-            # Use basic payload for fallback model
-            current_payload = payload_with_config if "3-pro" in model_name else payload
-
-            try:
-                response = requests.post(
-                    gemini_url,
-                    json=current_payload,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=120  # Longer timeout for high-quality generation
-                )
-
-                if response.status_code == 200:
-                    result_check = response.json()
-                    # Verify we got an image back
-                    if 'candidates' in result_check and len(result_check['candidates']) > 0:
-                        candidate = result_check['candidates'][0]
-                        if 'content' in candidate and 'parts' in candidate['content']:
-                            has_image = any('inlineData' in part for part in candidate['content']['parts'])
-                            if has_image:
-                                print(f"AI Image: Success with model {model_name}")
-                                break
-                    last_error = f"{model_name}: No image in response"
-                    print(f"AI Image: {model_name} returned no image, trying next...")
-                else:
-                    last_error = f"{model_name}: {response.status_code} - {response.text[:300]}"
-                    print(f"AI Image: Failed with {model_name}, trying next...")
-            except Exception as e:
-                last_error = f"{model_name}: {str(e)}"
-                print(f"AI Image: Exception with {model_name}: {e}")
-                continue
-
-        if not response or response.status_code != 200:
-            error_detail = last_error or 'All models failed'
-            return jsonify({
-                'success': False,
-                'error': f'Gemini API error',
-                'detail': error_detail
-            }), 500
-
-        result = response.json()
-
-        # Extract the generated image from response
-        generated_image = None
-        generated_mime = 'image/png'  # Default
-        if 'candidates' in result and len(result['candidates']) > 0:
-            candidate = result['candidates'][0]
-            if 'content' in candidate and 'parts' in candidate['content']:
-                for part in candidate['content']['parts']:
-                    if 'inlineData' in part:
-                        generated_image = part['inlineData']['data']
-                        generated_mime = part['inlineData'].get('mimeType', 'image/png')
-                        break
-
-        if not generated_image:
-            # Try alternative response structure
-            if 'candidates' in result:
-                return jsonify({
-                    'success': False,
-                    'error': 'No image generated - model may not support image output',
-                    'debug': str(result)[:500]
-                }), 500
-            return jsonify({
-                'success': False,
-                'error': 'Failed to generate image - unexpected response format',
-                'debug': str(result)[:500]
-            }), 500
-
-        # Log the generation
-        user = get_current_user()
-        if user:
-            log_activity(user.id, 'ai_image_generated', {
-                'product_id': product_id,
-                'product_name': product.product_name[:50] if product.product_name else '',
-                'category': category
-            })
+    status = ai_media.job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, **status})
 
-        return jsonify({
-            'success': True,
-            'image': f"data:{generated_mime};base64,{generated_image}",
-            'product_name': product.product_name,
-            'category': category,
-            'prompt_used': prompt[:200] + '...'
-        })
 
-    except requests.Timeout:
-        return jsonify({'success': False, 'error': 'Gemini API timeout - please try again'}), 504
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+@ai_bp.route('/api/ai/assets/<key>', methods=['GET'])
+def ai_asset(key):
+    """A generated image's bytes — the URL job status and ``product.ai_image_url`` point at."""
+    if request.args.get('passkey') != DEV_PASSKEY and not get_current_user():
+        return jsonify({'error': 'Unauthorized'}), 401
+    image = ai_media.asset_image(key)
+    if image is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    data, mime_type = image
+    # Keys hash the asset's inputs, so the bytes behind one never change
+    return Response(data, mimetype=mime_type, headers={'Cache-Control': 'private, max-age=86400'})
 
 
 # =============================================================================
@@ -811,7 +563,12 @@ def api_generate_video():
     if not product:
         return jsonify({'error': 'Product not found'}), 404
 
-    image_url = data.get('image_url') or product.ai_image_url or product.cached_image_url or product.image_url
+    stored = None if data.get('image_url') else ai_media.stored_image(product)
+    if stored:
+        # Raw base64 of the product's AI image (Kling can't fetch our asset URL)
+        image_url = stored[1]
+    else:
+        image_url = data.get('image_url') or product.cached_image_url or product.image_url
 
     if not image_url:
         return jsonify({'error': 'No image available for this product'}), 400
@@ -845,24 +602,30 @@ def api_generate_video():
 
 @ai_bp.route('/api/video-status/<task_id>', methods=['GET'])
 def api_video_status(task_id):
-    """Check status of Kling AI video generation task"""
-    result = get_kling_video_result(task_id)
-
-    if result.get('status') == 'completed' and result.get('video_url'):
-        product = Product.query.filter_by(ai_video_task_id=task_id).first()
+    """
+    Status of a Kling video task. Tracked tasks are answered from what the
+    Kling poller (services/ai_media) last wrote; only untracked ones are
+    fetched from Kling directly.
+    """
+    from app.models import AiAsset
+
+    asset = AiAsset.query.filter_by(kind='video', task_id=task_id).first()
+    product = Product.query.filter_by(ai_video_task_id=task_id).first()
+    status = (asset.status if asset else None) or (product.ai_video_status if product else None)
+    if status:
+        result = {'status': status, 'task_id': task_id}
+        video_url = (asset.url if asset else None) or (product.ai_video_url if product else None)
+        if status == 'completed' and video_url:
+            result['video_url'] = video_url
+        if status == 'failed' and asset and asset.error:
+            result['error'] = asset.error
         if product:
-            product.ai_video_url = result['video_url']
-            product.ai_video_status = 'completed'
-            db.session.commit()
             result['product_id'] = product.product_id
+        if status in ai_media.PENDING_VIDEO:
+            ai_media.notify_poller()
+        return jsonify(result)
 
-    elif result.get('status') == 'failed':
-        product = Product.query.filter_by(ai_video_task_id=task_id).first()
-        if product:
-            product.ai_video_status = 'failed'
-            db.session.commit()
-
-    return jsonify(result)
+    return jsonify(get_kling_video_result(task_id))
 
 
 @ai_bp.route('/api/one-click-video', methods=['POST'])
@@ -875,6 +638,9 @@ def api_one_click_video():
         "product_id": "xxx",
         "category": "beauty"  # Optional: beauty, home, fitness, tech, fashion, default
     }
+
+    Queued as an 'ai_video' job (services/ai_media) — responds 202 with a
+    job_id; /api/ai/jobs/<job_id> reports the image and the video's progress.
     """
     passkey = request.args.get('passkey')
     data = request.get_json() or {}
@@ -889,7 +655,8 @@ def api_one_click_video():
 
     product_id = data.get('product_id')
     category = data.get('category', 'default')
-    skip_image = data.get('skip_image', False)
+    skip_image = bool(data.get('skip_image', False))
+    duration = str(data.get('duration', '5'))
 
     if not product_id:
         return jsonify({'error': 'product_id required'}), 400
@@ -898,104 +665,26 @@ def api_one_click_video():
     if not product:
         return jsonify({'error': 'Product not found'}), 404
 
-    image_base64 = None
-
-    # Step 1: Generate AI Image (unless we're skipping or already have one)
-    if not skip_image or not product.ai_image_url:
-        if not GEMINI_API_KEY:
-            return jsonify({'error': 'Gemini API not configured for image generation'}), 500
-
-        category_prompts = {
-            "beauty": f"Professional product photography of {product.product_name[:100]}, elegant beauty product shot, soft lighting, luxury aesthetic, clean background, 9:16 vertical format",
-            "home": f"Lifestyle home product photo of {product.product_name[:100]}, cozy modern home setting, warm natural lighting, 9:16 vertical format",
-            "fitness": f"Dynamic fitness product shot of {product.product_name[:100]}, gym or outdoor setting, energetic lighting, 9:16 vertical format",
-            "tech": f"Sleek technology product photo of {product.product_name[:100]}, modern minimalist setup, cool lighting, 9:16 vertical format",
-            "fashion": f"Fashion product photography of {product.product_name[:100]}, stylish lifestyle shot, natural lighting, 9:16 vertical format",
-            "default": f"Professional product lifestyle photography of {product.product_name[:100]}, clean modern aesthetic, soft studio lighting, 9:16 vertical TikTok format"
-        }
-
-        prompt = category_prompts.get(category, category_prompts["default"])
-
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-preview-image-generation:generateContent?key={GEMINI_API_KEY}"
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "responseModalities": ["image", "text"],
-                "imageDimension": "PORTRAIT_9_16"
-            }
-        }
-
-        try:
-            response = requests.post(url, json=payload, timeout=90)
-            response.raise_for_status()
-            gemini_data = response.json()
-
-            candidates = gemini_data.get("candidates", [])
-            if candidates:
-                parts = candidates[0].get("content", {}).get("parts", [])
-                for part in parts:
-                    if "inlineData" in part:
-                        mime_type = part["inlineData"].get("mimeType", "image/png")
-                        image_base64 = part["inlineData"].get("data", "")
-
-                        # Save to product with data: prefix for display
-                        product.ai_image_url = f"data:{mime_type};base64,{image_base64}"
-                        db.session.commit()
-                        break
-
-            if not image_base64:
-                return jsonify({'error': 'Failed to generate AI image'}), 500
-
-        except Exception as e:
-            return jsonify({'error': f'Image generation failed: {str(e)}'}), 500
-    else:
-        # Use existing AI image
-        if product.ai_image_url and product.ai_image_url.startswith('data:'):
-            if ',' in product.ai_image_url:
-                image_base64 = product.ai_image_url.split(',')[1]
-
-    # Step 2: Generate Video with Kling AI
-    if not KLING_ACCESS_KEY or not KLING_SECRET_KEY:
-        return jsonify({
-            'success': True,
-            'image_generated': True,
-            'image_url': product.ai_image_url,
-            'video_started': False,
-            'message': 'Image generated but Kling AI not configured for video'
-        })
-
-    if not image_base64:
-        # Fallback to cached image URL if no base64 available
-        fallback_url = product.cached_image_url or product.image_url
-        if not fallback_url:
-            return jsonify({'error': 'No image available for video generation'}), 400
-        video_result = create_kling_video_task(fallback_url)
-    else:
-        # Use raw base64 (Kling accepts this per API docs)
-        video_result = create_kling_video_task(image_base64)
-
-    if video_result.get('success'):
-        product.ai_video_task_id = video_result['task_id']
-        product.ai_video_status = 'processing'
-        db.session.commit()
-
-        return jsonify({
-            'success': True,
-            'image_generated': True,
-            'image_url': product.ai_image_url,
-            'video_started': True,
-            'video_task_id': video_result['task_id'],
-            'video_status': 'processing',
-            'message': 'Image generated, video processing. Poll /api/video-status for updates.',
-            'product_id': product_id
-        })
-    else:
-        return jsonify({
-            'success': True,
-            'image_generated': True,
-            'image_url': product.ai_image_url,
-            'video_started': False,
-            'video_error': video_result.get('error', 'Unknown error'),
-            'message': 'Image generated but video generation failed'
-        })
+    has_stored_image = (product.ai_image_url or '').startswith((ai_media.ASSET_URL_PREFIX, 'data:'))
+    if not (skip_image and has_stored_image) and not GEMINI_API_KEY:
+        return jsonify({'error': 'Gemini API not configured for image generation'}), 500
+
+    # Image → Kling runs as an 'ai_video' job (services/ai_media); the same
+    # request while one is queued or running returns that job
+    user = get_current_user()
+    job_id, created = enqueue('ai_video', {
+        'product_id': product_id,
+        'category': category,
+        'skip_image': skip_image,
+        'duration': duration,
+        'user_id': user.id if user else None,
+    }, priority=5, max_attempts=3, dedupe_key=f'ai_video:{product_id}:{category}:{duration}'[:100])
+
+    return jsonify({
+        'success': True,
+        'status': 'queued' if created else 'already_queued',
+        'job_id': job_id,
+        'product_id': product_id,
+        'status_url': f'/api/ai/jobs/{job_id}',
+        'message': 'Image + video generation queued. Poll status_url for progress.',
+    }), 202
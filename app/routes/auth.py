@@ -528,8 +528,8 @@ def get_me():
 @login_required
 def api_scan_status():
     """Get current scan lock status"""
-    # Import at call time to avoid circular imports — SCAN_LOCK lives in the
-    # monolith (app.py) or will be moved to a scan service module later.
+    # Import at call time to avoid circular imports — the scan lock is a DB
+    # lease managed by the scan blueprint.
     from app import app as _legacy_app
     try:
         from app.routes.scan import get_scan_status
@@ -5,21 +5,28 @@ Extracted from monolithic app.py
 
 import os
 import json
+import math
 import secrets
 import uuid
+from functools import wraps
 
 try:
     import stripe
 except ImportError:
     stripe = None
 
-from flask import Blueprint, jsonify, request, session, send_from_directory, url_for
+from flask import Blueprint, g, jsonify, request, session, send_from_directory, url_for
 from app import db
-from app.models import Product, User, ApiKey, ScanJob
+from app.models import Product, User, ApiKey, ScanJob, WebhookDelivery
 from app.routes.auth import login_required, admin_required, get_current_user, log_activity
+from app.services import api_keys, scan_jobs, webhooks
+from app.services.entitlements import mark_changed as mark_entitlement_changed
 
 extern_bp = Blueprint('extern_bp', __name__)
 
+# Queries accepted by one /api/extern/scan/batch call
+SCAN_BATCH_MAX = int(os.environ.get('SCAN_BATCH_MAX', '100'))
+
 # =============================================================================
 # STRIPE CONFIGURATION
 # =============================================================================
@@ -35,58 +42,112 @@ else:
 # SAAS API ROUTES
 # =============================================================================
 
-@extern_bp.route('/api/extern/scan', methods=['POST'])
-def extern_scan_start():
-    """Start a scan via API Key (Async)"""
-    api_key_val = request.headers.get('X-API-KEY')
-    if not api_key_val:
-        return jsonify({'error': 'Missing X-API-KEY header'}), 401
+def api_key_required(f):
+    """X-API-KEY auth (cached validation) plus the per-key rate limit. Sets ``g.api_key``."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        api_key_val = request.headers.get('X-API-KEY')
+        if not api_key_val:
+            return jsonify({'error': 'Missing X-API-KEY header'}), 401
+
+        key = api_keys.authenticate(api_key_val)
+        if not key:
+            return jsonify({'error': 'Invalid API Key'}), 401
+
+        wait = api_keys.rate_limit(key.id)
+        if wait:
+            resp = jsonify({'error': 'Rate limit exceeded', 'retry_after': round(wait, 2)})
+            resp.headers['Retry-After'] = str(math.ceil(wait))
+            return resp, 429
+
+        g.api_key = key
+        return f(*args, **kwargs)
+    return decorated
+
 
-    key = ApiKey.query.filter_by(key=api_key_val, is_active=True).first()
-    if not key:
-        return jsonify({'error': 'Invalid API Key'}), 401
+def _queue_scans(key, queries):
+    """Charge one credit per query and queue the jobs. Returns (jobs, remaining) or None if short."""
+    remaining = api_keys.spend_credits(key.id, len(queries))
+    if remaining is None:
+        return None
 
-    if key.credits < 1:
-         return jsonify({'error': 'Insufficient Credits'}), 402
+    jobs = []
+    try:
+        for query in queries:
+            job_id = str(uuid.uuid4())
+            db.session.add(ScanJob(id=job_id, status='queued', input_query=query[:500], api_key_id=key.id))
+            jobs.append({'job_id': job_id, 'query': query})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        api_keys.refund_credits(key.id, len(queries))
+        raise
+    # Picked up by the scan worker pool (services/scan_jobs)
+    scan_jobs.notify()
+    return jobs, remaining
 
+
+@extern_bp.route('/api/extern/scan', methods=['POST'])
+@api_key_required
+def extern_scan_start():
+    """Start a scan via API Key (Async)"""
     data = request.get_json() or {}
     query = data.get('query') or data.get('url')
     if not query:
         return jsonify({'error': 'Missing query/url'}), 400
 
-    # Deduct Credit
-    key.credits -= 1
-    key.total_usage += 1
+    queued = _queue_scans(g.api_key, [str(query).strip()])
+    if queued is None:
+        return jsonify({'error': 'Insufficient Credits'}), 402
+    jobs, remaining = queued
 
-    # Create Job
-    job_id = str(uuid.uuid4())
-    job = ScanJob(id=job_id, status='queued', input_query=query, api_key_id=key.id)
-    db.session.add(job)
-    db.session.commit()
+    return jsonify({
+        'success': True,
+        'job_id': jobs[0]['job_id'],
+        'status': 'queued',
+        'credits_remaining': remaining
+    })
+
+@extern_bp.route('/api/extern/scan/batch', methods=['POST'])
+@api_key_required
+def extern_scan_batch():
+    """Queue many scans in one call — body {"queries": [...]} — 1 credit each"""
+    data = request.get_json() or {}
+    queries = data.get('queries') or data.get('urls') or []
+    if not isinstance(queries, list):
+        return jsonify({'error': 'queries must be a list'}), 400
+    queries = [str(q).strip() for q in queries if q and str(q).strip()]
+    if not queries:
+        return jsonify({'error': 'Missing queries'}), 400
+    if len(queries) > SCAN_BATCH_MAX:
+        return jsonify({'error': f'Batch limited to {SCAN_BATCH_MAX} queries per request'}), 400
+
+    queued = _queue_scans(g.api_key, queries)
+    if queued is None:
+        return jsonify({'error': 'Insufficient Credits', 'credits_required': len(queries),
+                        'credits_remaining': api_keys.credit_balance(g.api_key.id)}), 402
+    jobs, remaining = queued
 
     return jsonify({
         'success': True,
-        'job_id': job_id,
+        'jobs': jobs,
         'status': 'queued',
-        'credits_remaining': key.credits
+        'credits_remaining': remaining
     })
 
 @extern_bp.route('/api/extern/jobs/<job_id>', methods=['GET'])
+@api_key_required
 def extern_job_status(job_id):
     """Check job status"""
-    api_key_val = request.headers.get('X-API-KEY')
-    if not api_key_val:
-        return jsonify({'error': 'Missing X-API-KEY header'}), 401
-
-    # We could validate key config here but for speed we just check job existence
-    job = ScanJob.query.get(job_id)
-    if not job:
+    job = db.session.get(ScanJob, job_id)
+    if not job or job.api_key_id != g.api_key.id:
         return jsonify({'error': 'Job not found'}), 404
 
     resp = {
         'id': job.id,
         'status': job.status,
         'created_at': job.created_at.isoformat(),
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
         'result': None
     }
 
@@ -98,6 +159,59 @@ def extern_job_status(job_id):
 
     return jsonify(resp)
 
+@extern_bp.route('/api/extern/webhook', methods=['GET'])
+@api_key_required
+def extern_webhook_get():
+    """Show the key's registered callback URL"""
+    key = db.session.get(ApiKey, g.api_key.id)
+    return jsonify({'url': key.webhook_url, 'active': bool(key.webhook_url)})
+
+@extern_bp.route('/api/extern/webhook', methods=['PUT', 'POST'])
+@api_key_required
+def extern_webhook_set():
+    """Register a callback URL for finished scans — body {"url": ...}. Returns a new signing secret."""
+    data = request.get_json() or {}
+    url = (data.get('url') or '').strip()
+    error = webhooks.validate_url(url)
+    if error:
+        return jsonify({'error': error}), 400
+    if len(url) > 500:
+        return jsonify({'error': 'Webhook URL too long'}), 400
+
+    key = db.session.get(ApiKey, g.api_key.id)
+    key.webhook_url = url
+    key.webhook_secret = secrets.token_hex(32)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'url': url,
+        'secret': key.webhook_secret,
+        'message': 'Save the secret now — it is only shown once. Verify X-Prism-Signature '
+                   '(t=<ts>,v1=HMAC-SHA256(secret, "<ts>.<body>")) on every delivery.'
+    })
+
+@extern_bp.route('/api/extern/webhook', methods=['DELETE'])
+@api_key_required
+def extern_webhook_delete():
+    """Stop webhook deliveries for this key (already queued ones are still sent)"""
+    key = db.session.get(ApiKey, g.api_key.id)
+    key.webhook_url = None
+    db.session.commit()
+    return jsonify({'success': True})
+
+@extern_bp.route('/api/extern/webhook/deliveries', methods=['GET'])
+@api_key_required
+def extern_webhook_deliveries():
+    """Delivery log — newest first; optional ?status=pending|delivered|failed&limit="""
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    q = WebhookDelivery.query.filter_by(api_key_id=g.api_key.id)
+    status = request.args.get('status')
+    if status:
+        q = q.filter_by(status=status)
+    rows = q.order_by(WebhookDelivery.id.desc()).limit(limit).all()
+    return jsonify({'deliveries': [r.to_dict() for r in rows]})
+
 
 # =============================================================================
 # USER DEVELOPER ROUTES
@@ -129,6 +243,7 @@ def api_dev_keygen():
 
         for k in old_keys:
             k.is_active = False
+        api_keys.revoke(*[k.key for k in old_keys])
 
         # Bonus for new users (if no credits existed)
         if existing_credits == 0 and not old_keys:
@@ -285,6 +400,7 @@ def fulfill_credits(user_id, amount):
             key = ApiKey.query.filter_by(user_id=user_id, is_active=True).first()
             if key:
                 key.credits += amount
+                mark_entitlement_changed(user_id)
                 db.session.commit()
                 print(">> STRIPE: Credits added successfully!")
             else:
@@ -298,6 +414,7 @@ def fulfill_credits(user_id, amount):
                     is_active=True
                 )
                 db.session.add(new_key)
+                mark_entitlement_changed(user_id)
                 db.session.commit()
                 print(">> STRIPE: Created new key with credits!")
         except Exception as e:
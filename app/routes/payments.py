@@ -21,6 +21,7 @@ from flask import Blueprint, jsonify, request, session, redirect
 from app import db
 from app.models import User, Subscription, SystemConfig
 from app.routes.auth import login_required, get_current_user, log_activity
+from app.services.entitlements import mark_changed as mark_entitlement_changed
 
 log = logging.getLogger(__name__)
 
@@ -281,6 +282,7 @@ def create_subscription():
     sub.coupon_code = coupon_code if coupon_code in COUPON_CODES else None
     sub.referral_code = referral_code or (COUPON_CODES.get(coupon_code, {}).get('referral_source'))
     sub.created_at = datetime.utcnow()
+    mark_entitlement_changed(user.id)
     db.session.commit()
 
     log_activity(user.id, 'subscription_created', {
@@ -330,6 +332,7 @@ def subscription_return():
             except (ValueError, TypeError):
                 pass
 
+        mark_entitlement_changed(sub.user_id)
         db.session.commit()
         log_activity(sub.user_id, 'subscription_activated', {'paypal_status': pp_status})
 
@@ -379,6 +382,7 @@ def subscription_webhook():
                 pass
 
     try:
+        mark_entitlement_changed(sub.user_id)
         db.session.commit()
     except Exception:
         log.exception('[PAYMENTS] Webhook DB commit failed')
@@ -485,6 +489,7 @@ def cancel_subscription():
 
     sub.status = 'cancelled'
     sub.cancelled_at = datetime.utcnow()
+    mark_entitlement_changed(user.id)
     db.session.commit()
 
     # Remove Discord role (unless admin)
@@ -17,7 +17,7 @@ from functools import wraps
 
 from flask import (
     Blueprint, jsonify, request, send_from_directory, redirect,
-    session, url_for, Response, current_app
+    session, url_for, Response, current_app, stream_with_context
 )
 from sqlalchemy import func, or_, text
 
@@ -25,6 +25,7 @@ from app import db
 from app.models import Product, WatchedBrand, BlacklistedBrand
 
 from app.routes.auth import login_required, admin_required, subscription_required, get_current_user, log_activity
+from app.services.share_links import resolve as resolve_share_link
 
 
 # ---------------------------------------------------------------------------
@@ -523,92 +524,6 @@ def fetch_copilot_trending(**kwargs):
     return None
 
 
-# ---------------------------------------------------------------------------
-# Product lookup helpers
-# ---------------------------------------------------------------------------
-
-def extract_product_id(input_str):
-    """
-    Extract product ID from various TikTok URL formats or raw ID.
-    Handles redirects for short links (e.g. tiktok.com/t/...)
-
-    Supported formats:
-    - https://www.tiktok.com/shop/pdp/1729436251038
-    - https://www.tiktok.com/shop/product/1729436251038
-    - https://shop.tiktok.com/view/product/1729436251038
-    - https://affiliate.tiktok.com/product/1729436251038
-    - https://www.tiktok.com/t/ZTHwgwbUL5uL7-oXGV7/ (Short link)
-    - 1729436251038 (raw ID)
-    """
-    if not input_str:
-        return None
-
-    input_str = input_str.strip()
-
-    # If it's just digits, return as-is
-    if input_str.isdigit():
-        return input_str
-
-    # Handle Short Links (tiktok.com/t/ or vm.tiktok.com)
-    if '/t/' in input_str or 'vm.tiktok.com' in input_str:
-        try:
-             # Browser-like headers to avoid 403 blocks
-             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-
-             # Use GET with stream=True (stop downloading body) instead of HEAD (often blocked)
-             response = requests.get(input_str, allow_redirects=True, timeout=15, headers=headers, stream=True)
-
-             resolved_url = response.url
-             response.close() # Close connection immediately
-
-             print(f"DEBUG: Resolved short link {input_str} -> {resolved_url}")
-             input_str = resolved_url
-
-        except Exception as e:
-             print(f"Error resolving short link {input_str}: {e}")
-             # Continue to try regex on original string just in case
-
-    # Try to extract from URL patterns
-    patterns = [
-        r'tiktok\.com/shop/pdp/(\d+)',
-        r'tiktok\.com/view/product/(\d+)',
-        r'tiktok\.com/shop/product/(\d+)',
-        r'tiktok\.com/product/(\d+)',
-        r'product/(\d+)',
-        r'/(\d{10,25})',  # Fallback: any 10-25 digit number in URL
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, input_str)
-        if match:
-            return match.group(1)
-
-    return None
-
-
-def resolve_tiktok_share_link(share_url):
-    """
-    Resolve TikTok share links (like /t/XXXXXX) by following redirects.
-    Returns the final URL after redirects.
-    """
-    try:
-        # Follow redirects to get final URL
-        response = requests.head(share_url, allow_redirects=True, timeout=10)
-        return response.url
-    except:
-        try:
-            # Fallback: try GET request
-            response = requests.get(share_url, allow_redirects=True, timeout=10)
-            return response.url
-        except:
-            return None
-
-
-def is_tiktok_share_link(url):
-    """Check if URL is a TikTok shortened share link"""
-    return bool(re.search(r'tiktok\.com/t/[A-Za-z0-9]+', url))
-
-
 # =============================================================================
 # PAGE ROUTES
 # =============================================================================
@@ -1108,25 +1023,11 @@ def api_product_video_status(product_id):
             'task_id': product.ai_video_task_id
         })
 
-    # Import Kling helper at runtime to avoid circular dependency
-    import sys
-    main_mod = sys.modules.get('__main__')
-    get_kling_video_result = getattr(main_mod, 'get_kling_video_result', None)
-
-    if not get_kling_video_result:
-        return jsonify({'status': product.ai_video_status or 'unknown', 'task_id': product.ai_video_task_id})
-
-    result = get_kling_video_result(product.ai_video_task_id)
-
-    if result.get('status') == 'completed' and result.get('video_url'):
-        product.ai_video_url = result['video_url']
-        product.ai_video_status = 'completed'
-        db.session.commit()
-    elif result.get('status') == 'failed':
-        product.ai_video_status = 'failed'
-        db.session.commit()
-
-    return jsonify(result)
+    # Pending tasks are kept current by the Kling poller (services/ai_media)
+    from app.services.ai_media import PENDING_VIDEO, notify_poller
+    if product.ai_video_status in PENDING_VIDEO:
+        notify_poller()
+    return jsonify({'status': product.ai_video_status or 'unknown', 'task_id': product.ai_video_task_id})
 
 
 # =============================================================================
@@ -1254,15 +1155,8 @@ def lookup_product():
     if not input_url:
         return jsonify({'success': False, 'error': 'Please provide a TikTok product URL or ID'}), 400
 
-    # Resolve share links
-    resolved_url = input_url
-    if is_tiktok_share_link(input_url):
-        resolved_url = resolve_tiktok_share_link(input_url)
-        if not resolved_url:
-            return jsonify({'success': False, 'error': 'Could not resolve share link'}), 400
-
-    # Extract product ID
-    product_id = extract_product_id(resolved_url)
+    # Resolve share links / extract product ID (services/share_links)
+    product_id, _ = resolve_share_link(input_url)
     if not product_id:
         return jsonify({'success': False, 'error': 'Could not extract product ID'}), 400
 
@@ -1323,58 +1217,50 @@ def lookup_batch():
     """
     Batch lookup multiple TikTok products by URL or ID.
     Returns stats preview WITHOUT saving to database.
+
+    ``urls`` is a newline-separated string or a list. With
+    ``Accept: application/x-ndjson`` (or ``"stream": true``) results are
+    streamed one JSON object per line as they finish, followed by a
+    ``{"done": true, ...}`` line; otherwise one JSON response at the end.
     """
-    data = request.get_json() or {}
+    from app.services.lookup import lookup_many, LOOKUP_BATCH_MAX
+
+    data = request.get_json(silent=True) or {}
     urls_raw = data.get('urls', '')
 
     if not urls_raw:
         return jsonify({'success': False, 'error': 'Please provide URLs'}), 400
 
-    urls = [u.strip() for u in urls_raw.strip().split('\n') if u.strip()]
+    if isinstance(urls_raw, str):
+        urls_raw = urls_raw.split('\n')
+    urls = list(dict.fromkeys(str(u).strip() for u in urls_raw if str(u).strip()))
     if not urls:
         return jsonify({'success': False, 'error': 'No valid URLs found'}), 400
-    if len(urls) > 20: # Limit batch size for performance
-         return jsonify({'success': False, 'error': 'Batch limited to 20 items per request'}), 400
+    if len(urls) > LOOKUP_BATCH_MAX:
+        return jsonify({'success': False,
+                        'error': f'Batch limited to {LOOKUP_BATCH_MAX} items per request'}), 400
+
+    stream = data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', '')
+    if stream:
+        def generate():
+            count = errors = 0
+            for r in lookup_many(urls):
+                count += r['success']
+                errors += not r['success']
+                yield json.dumps(r) + '\n'
+            yield json.dumps({'done': True, 'success': True, 'count': count, 'errors': errors}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
 
     results = []
     errors = []
-
-    for i, url in enumerate(urls):
-        try:
-            # Resolve share links
-            resolved_url = url
-            if is_tiktok_share_link(url):
-                resolved_url = resolve_tiktok_share_link(url)
-
-            # Extract product ID
-            product_id = extract_product_id(resolved_url)
-            if not product_id:
-                errors.append({'url': url, 'error': 'Invalid ID'})
-                continue
-
-            # TIERED ENRICHMENT
-            p, source = fetch_product_details_echotik(product_id)
-            if not p:
-                errors.append({'url': url, 'error': 'Not found'})
-                continue
-
-            res = extract_metadata_from_echotik(p)
-
-            results.append({
-                'product_id': product_id,
-                'product_name': res['product_name'] or 'Unknown',
-                'image_url': res['image_url'],
-                'seller_name': res['seller_name'] or 'Unknown',
-                'price': res['price'],
-                'sales_7d': res['sales_7d'],
-                'video_count': res['video_count'],
-                'influencer_count': res['influencer_count'],
-                'commission_rate': res['commission_rate'],
-                'url': url
-            })
-
-        except Exception as e:
-            errors.append({'url': url, 'error': str(e)})
+    order = {u: i for i, u in enumerate(urls)}
+    for r in sorted(lookup_many(urls), key=lambda r: order[r['url']]):
+        if r['success']:
+            results.append(r['product'])
+        else:
+            errors.append({'url': r['url'], 'error': r['error']})
 
     return jsonify({
         'success': True,
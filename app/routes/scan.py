@@ -5,6 +5,7 @@ EchoTik product sync, single-product refresh, deep refresh, and OOS detection.
 
 import os
 import time
+import uuid
 import traceback
 import requests
 import logging
@@ -24,15 +25,23 @@ log = logging.getLogger(__name__)
 scan_bp = Blueprint('scan', __name__)
 
 # --- GLOBAL SCAN LOCK ---
-SCAN_LOCK = {
-    'locked': False,
-    'locked_by': None,
-    'scan_type': None,
-    'start_time': None,
-}
+# A DB lease (services/leases), so it holds across gunicorn workers and
+# processes; it expires on its own if the holder dies mid-scan.
+SCAN_LEASE = 'scan'
+SCAN_LEASE_TTL = 1800
+
 
 def get_scan_status():
-    return SCAN_LOCK
+    from app.services.leases import holder
+    held = holder(SCAN_LEASE)
+    if not held:
+        return {'locked': False, 'locked_by': None, 'scan_type': None, 'start_time': None}
+    return {
+        'locked': True,
+        'locked_by': held['info'].get('locked_by'),
+        'scan_type': held['info'].get('scan_type'),
+        'start_time': held['acquired_at'].isoformat() if held['acquired_at'] else None,
+    }
 
 # =============================================================================
 # CONFIG
@@ -65,16 +74,18 @@ def echotik_sync_trigger():
         pages     — number of pages to fetch (default 10, max 25)
         page_size — products per page (default 50, max 50)
     """
-    if SCAN_LOCK['locked']:
+    from app.services.leases import PROCESS_OWNER, acquire, release
+
+    owner = f"{PROCESS_OWNER}:{uuid.uuid4().hex[:8]}"
+    if not acquire(SCAN_LEASE, owner, SCAN_LEASE_TTL,
+                   info={'locked_by': 'admin', 'scan_type': 'echotik_sync'}):
+        status = get_scan_status()
         return jsonify({
             'success': False,
-            'error': f"Scan already running: {SCAN_LOCK['scan_type']}",
+            'error': f"Scan already running: {status['scan_type']}",
         }), 409
 
     try:
-        SCAN_LOCK.update(locked=True, locked_by='admin', scan_type='echotik_sync',
-                         start_time=datetime.utcnow().isoformat())
-
         data = request.get_json(silent=True) or {}
         max_pages = min(int(data.get('pages', 25)), 25)
         page_size = min(int(data.get('page_size', 10)), 10)  # EchoTik API max is 10
@@ -90,7 +101,7 @@ def echotik_sync_trigger():
         return jsonify({'success': False, 'error': str(e)}), 500
 
     finally:
-        SCAN_LOCK.update(locked=False, locked_by=None, scan_type=None, start_time=None)
+        release(SCAN_LEASE, owner)
 
 
 def run_echotik_sync(max_pages: int = 10, page_size: int = 10) -> dict:
@@ -4,13 +4,16 @@ Serves Jinja2 templates for all frontend pages.
 Existing API routes remain unchanged in their respective blueprints.
 """
 
+import os
+import logging
+import threading
 from functools import wraps
 from datetime import datetime
 from datetime import timedelta
 from flask import Blueprint, render_template, redirect, session, request, jsonify, flash
 from sqlalchemy import desc, or_
 from app import db
-from app.models import Product, BlacklistedBrand, Subscription, User, Brand, ProductVideo, TapProduct, TapList, ProductView, CampaignBanner, CouponCode, CouponRedemption, ScannedBrand, BrandProduct, BrandScanJob, FavoritedCreator
+from app.models import Product, BlacklistedBrand, Subscription, User, Brand, ProductVideo, TapProduct, TapList, ProductView, CampaignBanner, CouponCode, CouponRedemption, ScannedBrand, BrandProduct, BrandScanJob, BrandScanTask, FavoritedCreator
 from app.routes.auth import get_current_user
 
 
@@ -60,6 +63,7 @@ def api_admin_required(f):
     return decorated
 
 views_bp = Blueprint('views', __name__)
+log = logging.getLogger(__name__)
 
 # Products with status='active' or NULL (new products may not have status set)
 _active_filter = or_(Product.product_status == 'active', Product.product_status.is_(None))
@@ -548,9 +552,38 @@ def products_list():
         flash(f'Error loading products: {str(e)[:200]}', 'error')
         return render_template('products.html', **ctx)
 
+# Products listing page — shared with the image warmup stage so it can
+# pre-sign exactly the rows the first pages will render.
+LISTING_PER_PAGE = 30
+LISTING_SORTS = ('trending', 'commission', 'new', 'gmv', 'videos_low')  # 'sales' == 'trending'
+
+
+def _listing_base_query():
+    return Product.query.filter(
+        _active_filter,
+        Product.video_count >= 5,
+        Product.sales_7d > 0
+    )
+
+
+def _listing_order(sort):
+    if sort == 'commission':
+        return desc(Product.commission_rate)
+    elif sort == 'new':
+        return desc(Product.first_seen)
+    elif sort == 'gmv':
+        return desc(Product.gmv)
+    elif sort == 'sales':
+        return desc(Product.sales_7d)
+    elif sort == 'videos_low':
+        return Product.video_count.asc()
+    else:  # trending (default)
+        return desc(Product.sales_7d)
+
+
 def _products_list_inner(ctx):
     page = request.args.get('page', 1, type=int)
-    per_page = 30
+    per_page = LISTING_PER_PAGE
     sort = request.args.get('sort', 'trending')
     search = request.args.get('search', '').strip()
     category = request.args.get('category', '').strip()
@@ -560,11 +593,7 @@ def _products_list_inner(ctx):
     tap_only = request.args.get('tap_only', '') == '1'
     on_sale = request.args.get('on_sale', '') == '1'
 
-    query = Product.query.filter(
-        _active_filter,
-        Product.video_count >= 5,
-        Product.sales_7d > 0
-    )
+    query = _listing_base_query()
 
     # TAP boosted filter — only show products with active TAP links
     if tap_only:
@@ -597,18 +626,7 @@ def _products_list_inner(ctx):
             Product.price > 0,
         )
 
-    if sort == 'commission':
-        query = query.order_by(desc(Product.commission_rate))
-    elif sort == 'new':
-        query = query.order_by(desc(Product.first_seen))
-    elif sort == 'gmv':
-        query = query.order_by(desc(Product.gmv))
-    elif sort == 'sales':
-        query = query.order_by(desc(Product.sales_7d))
-    elif sort == 'videos_low':
-        query = query.order_by(Product.video_count.asc())
-    else:  # trending (default)
-        query = query.order_by(desc(Product.sales_7d))
+    query = query.order_by(_listing_order(sort))
 
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     products = pagination.items
@@ -1954,6 +1972,8 @@ def redeem_coupon():
                 redemption = CouponRedemption(coupon_id=coupon.id, user_id=user.id)
                 coupon.times_used += 1
                 db.session.add(redemption)
+                from app.services.entitlements import mark_changed
+                mark_changed(user.id)
                 db.session.commit()
 
                 flash(f"Coupon applied! You have Pro access until {new_end.strftime('%B %d, %Y')}.", 'success')
@@ -2186,41 +2206,49 @@ def brand_hunter_scan():
     if page_end < page_start:
         page_end = page_start
 
-    # Check for existing running job
-    existing = BrandScanJob.query.filter(
-        BrandScanJob.status.in_(['queued', 'running'])
-    ).first()
-    if existing:
-        return jsonify({'error': 'A scan is already running', 'job_id': existing.id}), 409
+    # Skip brands another job is already scanning — two workers rewriting
+    # the same brand's products would race on the delete + insert.
+    busy = {t.shop_id for t in BrandScanTask.query.filter(
+        BrandScanTask.status.in_(['queued', 'running'])
+    ).all()}
+    skipped = [b for b in brands_to_scan if str(b.get('shop_id', '')) in busy]
+    brands_to_scan = [b for b in brands_to_scan
+                      if b.get('shop_id') and str(b.get('shop_id')) not in busy]
+    if not brands_to_scan:
+        existing = BrandScanTask.query.filter(
+            BrandScanTask.status.in_(['queued', 'running'])
+        ).first()
+        return jsonify({'error': 'Those brands are already being scanned',
+                        'job_id': existing.job_id if existing else None}), 409
 
-    # Store brand list as comma-separated in brand_name for progress display
     brand_names = [b.get('name', '?') for b in brands_to_scan]
     job = BrandScanJob(
-        brand_id_str=','.join(b.get('shop_id', '') for b in brands_to_scan),
+        brand_id_str=','.join(str(b.get('shop_id', '')) for b in brands_to_scan),
         brand_name=brand_names[0] if len(brand_names) == 1 else f"{len(brand_names)} brands",
         page_start=page_start,
         page_end=page_end,
         status='queued',
     )
     db.session.add(job)
+    db.session.flush()
+    tasks = [
+        BrandScanTask(job_id=job.id, shop_id=str(b.get('shop_id')),
+                      brand_name=(b.get('name') or 'Unknown')[:300], status='queued')
+        for b in brands_to_scan
+    ]
+    db.session.add_all(tasks)
     db.session.commit()
 
-    from app import executor
+    from app.services.brand_scan_queue import brand_scan_queue
     from flask import current_app
     app = current_app._get_current_object()
-    executor.submit(_run_batch_brand_scan, app, job.id, brands_to_scan)
+    brand_scan_queue.submit(app, job.id, [t.id for t in tasks])
 
-    return jsonify({'job_id': job.id})
+    return jsonify({'job_id': job.id, 'skipped': [b.get('name') for b in skipped]})
 
 
-@views_bp.route('/app/brand-hunter/scan/<int:job_id>/status')
-@login_required
-def brand_hunter_scan_status(job_id):
-    """Poll scan progress."""
-    job = BrandScanJob.query.get(job_id)
-    if not job:
-        return jsonify({'error': 'Job not found'}), 404
-    return jsonify({
+def _scan_job_dict(job):
+    return {
         'status': job.status,
         'current_page': job.current_page,
         'page_start': job.page_start,
@@ -2228,7 +2256,106 @@ def brand_hunter_scan_status(job_id):
         'brand_name': job.brand_name or '',
         'products_found': job.products_found,
         'error_message': job.error_message,
-    })
+    }
+
+
+def _scan_status_payload(job, tasks):
+    """
+    Progress payload shared by the status poll and the SSE stream.
+    ``job`` is a ``_scan_job_dict``; ``tasks`` are ``BrandScanTask.to_dict()``
+    dicts (the stream keeps them current from bus events).
+    """
+    if not tasks:
+        # Jobs created before per-brand tasks existed
+        return {**job, 'brands': []}
+
+    page_start = job['page_start'] or 1
+    span = max(1, (job['page_end'] or 1) - page_start + 1)
+    running = [t for t in tasks if t['status'] == 'running']
+    done = sum(1 for t in tasks if t['status'] in ('complete', 'error', 'stopped'))
+    partial = sum(
+        min(1.0, max(0, (t['current_page'] or page_start) - page_start + 1) / span)
+        for t in running
+    )
+    return {
+        **job,
+        'current_page': max((t['current_page'] or 0) for t in running) if running else job['current_page'],
+        'brand_name': ', '.join(t['brand_name'] or '?' for t in running) or job['brand_name'],
+        'products_found': sum(t['products_found'] or 0 for t in tasks),
+        'brands_total': len(tasks),
+        'brands_done': done,
+        'progress_pct': min(100, round((done + partial) / len(tasks) * 100)),
+        'brands': tasks,
+    }
+
+
+@views_bp.route('/app/brand-hunter/scan/<int:job_id>/status')
+@login_required
+def brand_hunter_scan_status(job_id):
+    """Poll scan progress — job totals plus per-brand progress."""
+    job = BrandScanJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    tasks = BrandScanTask.query.filter_by(job_id=job.id).order_by(BrandScanTask.id).all()
+    return jsonify(_scan_status_payload(_scan_job_dict(job), [t.to_dict() for t in tasks]))
+
+
+@views_bp.route('/app/brand-hunter/scan/<int:job_id>/events')
+@login_required
+def brand_hunter_scan_events(job_id):
+    """
+    Server-Sent Events stream of scan progress. Sends the current state
+    from the DB once, then applies bus events in memory — no DB reads
+    while streaming. 503 when all stream slots are taken (client polls).
+    """
+    from flask import Response, stream_with_context
+    from app.services.progress import (progress_bus, sse_event, try_open_stream, close_stream,
+                                       PROGRESS_SSE_MAX_SECONDS)
+
+    job = BrandScanJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    job_state = _scan_job_dict(job)
+    tasks = {t.id: t.to_dict() for t in
+             BrandScanTask.query.filter_by(job_id=job.id).order_by(BrandScanTask.id).all()}
+    db.session.close()  # release the connection before the long-lived stream
+
+    if not try_open_stream():
+        return jsonify({'error': 'Too many live streams'}), 503
+
+    channel = f'brand_scan:{job_id}'
+    try:
+        after = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        after = 0
+    terminal = ('complete', 'error', 'stopped')
+
+    def _gen():
+        import time as _time
+        yield sse_event(_scan_status_payload(job_state, list(tasks.values())), retry=2000)
+        if job_state['status'] in terminal:
+            return
+        cursor = after
+        deadline = _time.monotonic() + PROGRESS_SSE_MAX_SECONDS
+        while _time.monotonic() < deadline:
+            events = progress_bus.wait(channel, cursor, timeout=15.0)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for seq, ev in events:
+                cursor = seq
+                if ev.get('task_id') in tasks:
+                    tasks[ev['task_id']].update(ev.get('task') or {})
+                job_state.update(ev.get('job') or {})
+            yield sse_event(_scan_status_payload(job_state, list(tasks.values())), event_id=cursor)
+            if job_state['status'] in terminal:
+                return
+
+    resp = Response(stream_with_context(_gen()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(close_stream)
+    return resp
 
 
 @views_bp.route('/app/brand-hunter/scan/<int:job_id>/stop', methods=['POST'])
@@ -2239,21 +2366,121 @@ def brand_hunter_scan_stop(job_id):
     if not job:
         return jsonify({'error': 'Job not found'}), 404
     if job.status in ('queued', 'running'):
+        now = datetime.utcnow()
         job.status = 'stopped'
-        job.completed_at = datetime.utcnow()
-        # Mark the brand as complete with whatever products we have so far
-        if job.brand_id_str:
-            brand = ScannedBrand.query.filter_by(brand_id=job.brand_id_str).first()
-            if brand:
-                brand.scan_status = 'complete'
+        job.completed_at = now
+        # Running brands see this on their next progress flush and keep
+        # whatever products they have so far.
+        BrandScanTask.query.filter(
+            BrandScanTask.job_id == job.id,
+            BrandScanTask.status.in_(['queued', 'running']),
+        ).update({'status': 'stopped', 'completed_at': now}, synchronize_session=False)
         db.session.commit()
+        from app.services.progress import publish
+        publish(f'brand_scan:{job.id}', job={'status': 'stopped'})
+        from app.services.brand_scan_queue import brand_scan_queue
+        brand_scan_queue.cancel(job.id)
     return jsonify({'success': True})
 
 
+@views_bp.route('/app/brand-hunter/scan/<int:job_id>/resume', methods=['POST'])
+@login_required
+def brand_hunter_scan_resume(job_id):
+    """Resume a stopped, failed or orphaned scan from each brand's last completed page."""
+    job = BrandScanJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    from app.services.brand_scan_queue import brand_scan_queue, resume_job
+    if brand_scan_queue.has_job(job.id):
+        return jsonify({'error': 'Scan is already running', 'job_id': job.id}), 409
+
+    from flask import current_app
+    resumed = resume_job(current_app._get_current_object(), job.id)
+    if not resumed:
+        return jsonify({'error': 'Nothing to resume'}), 400
+    return jsonify({'job_id': job.id, 'resumed': resumed})
+
+
+# Brand scan tuning — pages in flight per brand (the EchoTik rate limiter
+# still paces the actual calls) and how often progress is written to the job.
+BRAND_SCAN_PAGE_WINDOW = int(os.environ.get('BRAND_SCAN_PAGE_WINDOW', '4'))
+BRAND_SCAN_PROGRESS_SECONDS = float(os.environ.get('BRAND_SCAN_PROGRESS_SECONDS', '3'))
+BRAND_SCAN_EMPTY_STREAK = 5
+
+
+def _iter_brand_pages(shop_id, page_start, page_end, window=None, should_stop=None,
+                      empty_streak=0):
+    """
+    Fetch brand product pages concurrently, yielding ``(page, products)``
+    in page order.
+
+    Keeps up to ``window`` pages in flight. Results are consumed strictly
+    in order so the empty-streak cutoff behaves exactly like a sequential
+    scan: after ``BRAND_SCAN_EMPTY_STREAK`` consecutive empty pages no
+    further pages are submitted and anything still in flight is dropped.
+    ``empty_streak`` carries the count over from checkpointed pages when
+    resuming. ``should_stop()`` is polled between pages for user-initiated
+    stops.
+    """
+    if empty_streak >= BRAND_SCAN_EMPTY_STREAK:
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services.echotik import fetch_brand_products
+
+    window = max(1, window or BRAND_SCAN_PAGE_WINDOW)
+
+    def _fetch(page):
+        try:
+            return fetch_brand_products(str(shop_id), page=page, page_size=10) or []
+        except Exception:
+            return []
+
+    pool = ThreadPoolExecutor(max_workers=window)
+    pending = {}
+    next_submit = page_start
+    try:
+        while next_submit <= page_end and len(pending) < window:
+            pending[next_submit] = pool.submit(_fetch, next_submit)
+            next_submit += 1
+
+        page = page_start
+        while page in pending:
+            products = pending.pop(page).result()
+            empty_streak = 0 if products else empty_streak + 1
+            yield page, products
+
+            if empty_streak >= BRAND_SCAN_EMPTY_STREAK:
+                break
+            if should_stop and should_stop():
+                break
+            if next_submit <= page_end:
+                pending[next_submit] = pool.submit(_fetch, next_submit)
+                next_submit += 1
+            page += 1
+    finally:
+        for fut in pending.values():
+            fut.cancel()
+        pool.shutdown(wait=False)
+
+
 def _scan_single_brand(shop_id, brand_name, page_start, page_end, job):
-    """Scan product pages for a single brand. Called within app context."""
+    """
+    Scan product pages for a single brand. Called within app context.
+
+    ``job`` is the brand's ``BrandScanTask`` — progress and the stop flag
+    are tracked per brand. Every fetched page is checkpointed; pages
+    already staged for this task (an interrupted run) are reused and the
+    scan continues after the last one.
+
+    Live progress goes to the progress bus on every page; the task row
+    itself is only written every ``BRAND_SCAN_PROGRESS_SECONDS``.
+    """
     import time as _time
-    from app.services.echotik import fetch_brand_products
+    from app.services.brand_hunter import (
+        brand_product_row, stage_page, load_checkpoint, clear_checkpoint,
+    )
+    from app.services.progress import publish
 
     brand = ScannedBrand.query.filter_by(brand_id=str(shop_id)).first()
     if not brand:
@@ -2266,167 +2493,129 @@ def _scan_single_brand(shop_id, brand_name, page_start, page_end, job):
     db.session.commit()
 
     all_products = []
-    empty_streak = 0
-
-    for page in range(page_start, page_end + 1):
-        # Check if scan was stopped
-        db.session.refresh(job)
-        if job.status in ('stopped', 'error'):
-            break
+    stopped = False
+    last_flush = _time.monotonic()
 
-        job.current_page = page
-        job.brand_name = brand_name  # Update display name for current brand
-        db.session.commit()
+    staged = load_checkpoint(job.id, page_start, page_end)
+    empty_streak = 0
+    for page, products in staged:
+        all_products.extend(brand_product_row(brand.id, p, page) for p in products)
+        empty_streak = 0 if products else empty_streak + 1
+    resume_from = page_start + len(staged)
+    if staged:
+        print(f"[BrandScan] {brand_name}: resuming at page {resume_from} "
+              f"({len(all_products)} products checkpointed)", flush=True)
+
+    def _checkpoint(page, products):
+        """Stage the page — committed per page so a restart loses at most one."""
+        try:
+            stage_page(job.id, page, products)
+            db.session.commit()
+        except Exception as e:
+            log.warning(f"[BrandScan] checkpoint of page {page} failed for {brand_name}: {e}")
+            try: db.session.rollback()
+            except Exception: pass
 
+    def _flush_progress(page):
+        """Batched progress write; also picks up a user-initiated stop."""
+        nonlocal stopped, last_flush
+        last_flush = _time.monotonic()
         try:
-            products = fetch_brand_products(str(shop_id), page=page, page_size=10)
+            db.session.refresh(job)
+            if job.status in ('stopped', 'error'):
+                stopped = True
+                return
+            job.current_page = page
+            job.products_found = found_before + len(all_products)
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
         except Exception:
-            products = []
+            try: db.session.rollback()
+            except Exception: pass
+
+    found_before = job.products_found or 0
+    channel = f'brand_scan:{job.job_id}'
+    last_page = resume_from - 1 if staged else page_start
+    for page, products in _iter_brand_pages(shop_id, resume_from, page_end,
+                                             should_stop=lambda: stopped,
+                                             empty_streak=empty_streak):
+        last_page = page
+        all_products.extend(brand_product_row(brand.id, p, page) for p in products)
+        _checkpoint(page, products)
+        publish(channel, task_id=job.id, task={
+            'status': 'running', 'current_page': page,
+            'products_found': found_before + len(all_products),
+        })
 
-        if not products:
-            empty_streak += 1
-            if empty_streak >= 5:
+        if _time.monotonic() - last_flush >= BRAND_SCAN_PROGRESS_SECONDS:
+            _flush_progress(page)
+            if stopped:
                 break
-            _time.sleep(0.2)
-            continue
-        empty_streak = 0
-
-        for p in products:
-            bp = BrandProduct(
-                brand_id=brand.id,
-                product_id=p.get('product_id', ''),
-                title=(p.get('product_name', '') or '')[:500],
-                image_url=p.get('image_url', ''),
-                price=p.get('price', 0) or 0,
-                commission_rate=p.get('commission_rate', 0) or 0,
-                sales_7d=p.get('sales_7d', 0) or 0,
-                sales_30d=p.get('sales_30d', 0) or p.get('sales', 0) or 0,
-                revenue_30d=p.get('gmv_30d', 0) or p.get('gmv', 0) or 0,
-                total_videos=p.get('video_count_alltime', 0) or p.get('video_count', 0) or 0,
-                total_sales=p.get('sales', 0) or 0,
-                influencer_count=p.get('influencer_count', 0) or 0,
-                category=p.get('category', ''),
-                page_found=page,
-                is_hidden_gem=(page > 99),
-            )
-            all_products.append(bp)
+    if not stopped:
+        _flush_progress(last_page)
 
-        job.products_found = (job.products_found or 0) + len(products)
-        db.session.commit()
-        _time.sleep(0.3)
+    found = _persist_brand_scan(brand, shop_id, brand_name, all_products)
+
+    # A stopped scan keeps its checkpoint so a later resume picks it up
+    if not stopped:
+        try:
+            clear_checkpoint(job.id)
+            db.session.commit()
+        except Exception:
+            try: db.session.rollback()
+            except Exception: pass
+    return found
 
-    # Clear old products, save new
-    try:
-        BrandProduct.query.filter_by(brand_id=brand.id).delete()
-        for bp in all_products:
-            bp.brand_id = brand.id
-            db.session.add(bp)
-    except Exception as e:
-        log.warning(f"[BrandScan] clear/insert BrandProducts failed for {brand_name}: {e}")
-        try: db.session.rollback()
-        except Exception: pass
 
-    # Update brand stats (guard every step — we don't want a session
-    # error here to bubble out and kill the whole batch).
+def _persist_brand_scan(brand, shop_id, brand_name, rows):
+    """
+    Replace a brand's products with ``rows`` (``brand_products`` row dicts),
+    recompute its aggregates in SQL, and bulk-upsert the products into the
+    main Product table so "View" is instant. Returns the product count.
+    """
+    from app.services.brand_hunter import replace_brand_products, recompute_brand_aggregates
+
+    # Clear old products, save new, update brand stats — one transaction
+    # (guard every step — we don't want a session error here to bubble out
+    # and kill the whole batch).
     try:
-        brand.total_products = len(all_products)
-        brand.sales_30d = sum(bp.sales_30d or 0 for bp in all_products)
-        brand.revenue_30d = sum(bp.revenue_30d or 0 for bp in all_products)
-        brand.units_sold_30d = sum(bp.total_sales or 0 for bp in all_products)
-        if all_products:
-            comms = [bp.commission_rate for bp in all_products if bp.commission_rate and bp.commission_rate > 0]
-            brand.avg_commission = sum(comms) / len(comms) if comms else 0
-            top = max(all_products, key=lambda bp: bp.total_sales or 0)
-            brand.top_product_name = top.title
-        else:
-            brand.avg_commission = 0
-            brand.top_product_name = None
-        brand.is_hidden_gem = any(bp.is_hidden_gem for bp in all_products)
+        replace_brand_products(brand.id, rows)
+        recompute_brand_aggregates([brand.id])
         brand.scan_status = 'saving'
         brand.last_scanned = datetime.utcnow()
-        job.brand_name = f"{brand_name} (saving {len(all_products)} products...)"
         db.session.commit()
     except Exception as e:
-        log.warning(f"[BrandScan] brand stats commit failed for {brand_name}: {e}")
+        log.warning(f"[BrandScan] saving BrandProducts failed for {brand_name}: {e}")
         try: db.session.rollback()
         except Exception: pass
 
-    # If we found nothing, skip the sync + image-sign passes entirely.
-    # An empty in_([]) SELECT can leave the session wedged on some
-    # configurations, and there's nothing to sync anyway.
-    if all_products:
-        # Sync to main Product table so "View" is instant
+    # If we found nothing, skip the Product table sync entirely.
+    if rows:
         try:
-            from app.services.echotik import sync_to_db as echotik_sync
-            raw_for_sync = []
-            for bp in all_products:
-                raw_for_sync.append({
-                    'product_id': bp.product_id,
-                    'product_name': bp.title,
-                    'image_url': bp.image_url,
-                    'price': bp.price,
-                    'commission_rate': bp.commission_rate,
-                    'sales': bp.total_sales,
-                    'sales_7d': bp.sales_7d or (bp.sales_30d // 4 if bp.sales_30d else 0),
-                    'sales_30d': bp.sales_30d,
-                    'video_count_alltime': bp.total_videos,
-                    'video_count': bp.total_videos,
-                    'influencer_count': bp.influencer_count,
-                    'category': bp.category,
-                    'seller_name': brand_name,
-                    'seller_id': str(shop_id),
-                })
-            for i in range(0, len(raw_for_sync), 50):
-                try:
-                    echotik_sync(raw_for_sync[i:i+50])
-                except Exception:
-                    try: db.session.rollback()
-                    except Exception: pass
+            from app.services.echotik import bulk_upsert_products
+            bulk_upsert_products([{
+                'product_id': r['product_id'],
+                'product_name': r['title'],
+                'image_url': r['image_url'],
+                'price': r['price'],
+                'commission_rate': r['commission_rate'],
+                'sales': r['total_sales'],
+                'sales_7d': r['sales_7d'] or (r['sales_30d'] // 4 if r['sales_30d'] else 0),
+                'sales_30d': r['sales_30d'],
+                'video_count_alltime': r['total_videos'],
+                'video_count': r['total_videos'],
+                'influencer_count': r['influencer_count'],
+                'category': r['category'],
+                'seller_name': brand_name,
+                'seller_id': str(shop_id),
+            } for r in rows])
         except Exception as e:
             log.warning(f"[BrandScan] Product table sync failed: {e}")
             try: db.session.rollback()
             except Exception: pass
 
-        # Sign images on the MAIN Product table entries (not BrandProduct)
-        try:
-            from app.services.echotik import fetch_batch_images
-            from sqlalchemy import or_
-            pids = [bp.product_id for bp in all_products]
-            shop_pids = [f'shop_{pid}' for pid in pids]
-            all_pids = pids + shop_pids
-            unsigned_products = Product.query.filter(
-                Product.product_id.in_(all_pids),
-                Product.image_url.isnot(None),
-                Product.image_url != '',
-                or_(Product.cached_image_url.is_(None), Product.cached_image_url == '')
-            ).limit(200).all()
-
-            try:
-                job.brand_name = f"{brand_name} (signing {len(unsigned_products)} images...)"
-                db.session.commit()
-            except Exception:
-                try: db.session.rollback()
-                except Exception: pass
-
-            for i in range(0, len(unsigned_products), 10):
-                batch = unsigned_products[i:i+10]
-                urls = [p.image_url for p in batch if p.image_url and p.image_url.startswith('http')]
-                if not urls:
-                    continue
-                try:
-                    signed = fetch_batch_images(urls)
-                    for p in batch:
-                        if p.image_url in signed:
-                            p.cached_image_url = signed[p.image_url][:500]
-                    db.session.commit()
-                except Exception:
-                    try: db.session.rollback()
-                    except Exception: pass
-                _time.sleep(0.2)
-        except Exception as e:
-            log.warning(f"[BrandScan] image signing block failed: {e}")
-            try: db.session.rollback()
-            except Exception: pass
+    # Image signing + prefetch happens in the warmup stage that runs after
+    # the batch completes (services/image_warmup) — not inline here.
 
     # Final status — bulletproofed; failure here MUST NOT kill the batch.
     try:
@@ -2436,106 +2625,112 @@ def _scan_single_brand(shop_id, brand_name, page_start, page_end, job):
         try: db.session.rollback()
         except Exception: pass
 
-    return len(all_products)
+    return len(rows)
 
 
-def _run_batch_brand_scan(app, job_id, brands_list):
-    """Background: scan product pages for one or more brands."""
+def _run_brand_scan_task(app, task_id):
+    """Background (brand scan queue worker): scan one brand of a batch job."""
+    from app.services.progress import publish
+
     with app.app_context():
-        job = BrandScanJob.query.get(job_id)
-        if not job:
+        task = BrandScanTask.query.get(task_id)
+        if not task or task.status != 'queued':
+            return
+        job = BrandScanJob.query.get(task.job_id)
+        if not job or job.status == 'stopped':
+            task.status = 'stopped'
+            db.session.commit()
             return
-        job.status = 'running'
-        job.started_at = datetime.utcnow()
-        job.products_found = 0
-        db.session.commit()
-
-        total_brands = len(brands_list or [])
-        processed = 0
-        for idx, brand_info in enumerate(brands_list or []):
-            shop_id = (brand_info or {}).get('shop_id', '')
-            name = (brand_info or {}).get('name', 'Unknown')
-            print(f"[BrandScan] ===== brand {idx+1}/{total_brands}: {name} "
-                  f"(shop_id={shop_id}) =====", flush=True)
-
-            # Defensive: always rollback any dirty session state from prior brand
-            try: db.session.rollback()
-            except Exception: pass
 
-            # Re-fetch job fresh from DB (survives cross-brand session issues).
-            # We explicitly DO NOT break on 'error' status — the user never set
-            # that, it's only ever set by a crash that shouldn't stop other
-            # brands. Only 'stopped' (user-initiated) halts the batch.
-            try:
-                job = BrandScanJob.query.get(job_id)
-            except Exception as e:
-                print(f"[BrandScan] job refetch failed at brand {idx+1}: {e}", flush=True)
-                try: db.session.rollback()
-                except Exception: pass
-                job = None
-            if not job:
-                print(f"[BrandScan] job gone, stopping batch", flush=True)
-                break
-            if job.status == 'stopped':
-                print(f"[BrandScan] user stopped batch at brand {idx+1}", flush=True)
-                break
-            # Heal a bad 'error' status set by a previous crash — keep going
-            if job.status == 'error':
-                job.status = 'running'
-                job.error_message = None
-                try: db.session.commit()
-                except Exception:
-                    try: db.session.rollback()
-                    except Exception: pass
+        now = datetime.utcnow()
+        task.status = 'running'
+        task.started_at = task.started_at or now
+        task.heartbeat_at = now
+        if job.status == 'queued':
+            job.status = 'running'
+            job.started_at = now
+        db.session.commit()
+        channel = f'brand_scan:{job.id}'
+        publish(channel, task_id=task.id, task=task.to_dict(), job={'status': job.status})
+        page_start, page_end = job.page_start, job.page_end
+        shop_id, name = task.shop_id, task.brand_name or 'Unknown'
+        print(f"[BrandScan] job {job.id}: {name} (shop_id={shop_id})", flush=True)
 
-            if not shop_id:
-                print(f"[BrandScan] skipping {name}: missing shop_id", flush=True)
-                continue
+        try:
+            found = _scan_single_brand(shop_id, name, page_start, page_end, task)
+            print(f"[BrandScan] {name} found {found} products", flush=True)
 
-            # Wrap each brand scan in a broad try/except so it can NEVER
-            # propagate an exception out to the outer try.
-            try:
-                found = _scan_single_brand(shop_id, name, job.page_start, job.page_end, job)
-                print(f"[BrandScan] {name} found {found} products", flush=True)
-
-                # Fallback: if nothing found AND we weren't starting at page 1,
-                # try pages 1-10 (catches small brands requested with high ranges)
-                if found == 0 and job.page_start > 1:
-                    try: db.session.rollback()
-                    except Exception: pass
-                    try:
-                        job = BrandScanJob.query.get(job_id)
-                    except Exception:
-                        job = None
-                    if job and job.status != 'stopped':
-                        print(f"[BrandScan] {name} found 0, fallback scan pages 1-10", flush=True)
-                        try:
-                            _scan_single_brand(shop_id, name, 1, 10, job)
-                        except Exception as e:
-                            print(f"[BrandScan] fallback failed for {name}: {e}", flush=True)
-                            try: db.session.rollback()
-                            except Exception: pass
-                processed += 1
-            except Exception as e:
-                print(f"[BrandScan] brand scan CRASHED for {name}: {e}", flush=True)
+            # Fallback: if nothing found AND we weren't starting at page 1,
+            # try pages 1-10 (catches small brands requested with high ranges)
+            if found == 0 and page_start > 1:
                 try: db.session.rollback()
                 except Exception: pass
-                continue  # Critical: move to next brand, never kill the batch
+                db.session.refresh(task)
+                if task.status == 'running':
+                    print(f"[BrandScan] {name} found 0, fallback scan pages 1-10", flush=True)
+                    _scan_single_brand(shop_id, name, 1, 10, task)
+            status, error = 'complete', None
+        except Exception as e:
+            print(f"[BrandScan] brand scan CRASHED for {name}: {e}", flush=True)
+            status, error = 'error', str(e)[:500]
 
-        # Final status update — re-fetch job fresh
-        print(f"[BrandScan] batch finished — processed {processed}/{total_brands}", flush=True)
         try: db.session.rollback()
         except Exception: pass
+        try:
+            task = BrandScanTask.query.get(task_id)
+            if task and task.status == 'running':
+                task.status = status
+                task.error_message = error
+            if task:
+                task.completed_at = task.completed_at or datetime.utcnow()
+            db.session.commit()
+            if task:
+                publish(channel, task_id=task.id, task=task.to_dict())
+        except Exception as e:
+            print(f"[BrandScan] task status commit failed: {e}", flush=True)
+            try: db.session.rollback()
+            except Exception: pass
+
+
+def _finish_brand_scan_job(app, job_id):
+    """Background: close out a job once all its brands have run."""
+    with app.app_context():
         try:
             job = BrandScanJob.query.get(job_id)
-            if job and job.status in ('running', 'error'):
+            if not job:
+                return
+            tasks = BrandScanTask.query.filter_by(job_id=job_id).all()
+            job.products_found = sum(t.products_found or 0 for t in tasks)
+            if job.status in ('queued', 'running', 'error'):
                 job.status = 'complete'
                 job.completed_at = datetime.utcnow()
-                db.session.commit()
+            db.session.commit()
+            from app.services.progress import publish
+            publish(f'brand_scan:{job_id}', job=_scan_job_dict(job))
+            print(f"[BrandScan] job {job_id} finished — "
+                  f"{sum(1 for t in tasks if t.status == 'complete')}/{len(tasks)} brands", flush=True)
         except Exception as e:
             print(f"[BrandScan] final status commit failed: {e}", flush=True)
             try: db.session.rollback()
             except Exception: pass
+            return
+
+        # Warm thumbnails for the scanned brands' detail pages now that the
+        # job is marked complete, so the UI isn't held on image signing.
+        try:
+            shop_ids = [t.shop_id for t in tasks if t.shop_id]
+            brand_ids = []
+            if shop_ids:
+                brand_ids = [b.id for b in ScannedBrand.query.filter(
+                    ScannedBrand.brand_id.in_(shop_ids)
+                ).all()]
+            if brand_ids:
+                from app.services.image_warmup import warm_listing_images
+                warm_listing_images(app, pages=0, brand_ids=brand_ids)
+        except Exception as e:
+            print(f"[BrandScan] image warmup failed: {e}", flush=True)
+            try: db.session.rollback()
+            except Exception: pass
 
 
 @views_bp.route('/app/brand-hunter/<int:brand_id>')
@@ -2786,6 +2981,10 @@ _IMAGE_PROXY_ALLOWED_HOSTS = (
 
 _IMAGE_PROXY_CACHE = {}  # url -> (bytes, content_type, expires_at)
 _IMAGE_PROXY_CACHE_TTL = 3600  # 1 hour
+# Sized to hold the warmed first listing pages (see services/image_warmup)
+# plus on-demand traffic — thumbnails are ~20-60KB each.
+_IMAGE_PROXY_CACHE_MAX = 600
+_IMAGE_PROXY_LOCK = threading.Lock()
 
 # Tiny transparent PNG used as a graceful 200-response fallback when an
 # upstream CDN refuses our fetch. iOS Safari is inconsistent about firing
@@ -2812,6 +3011,74 @@ def _proxy_fallback_png():
     return resp
 
 
+def _image_cache_get(cache_key):
+    """Return (bytes, content_type) from the proxy cache, or None."""
+    cached = _IMAGE_PROXY_CACHE.get(cache_key)
+    if cached and cached[2] > datetime.utcnow().timestamp():
+        return cached[0], cached[1]
+    return None
+
+
+def _image_cache_put(cache_key, body, ctype, ttl=_IMAGE_PROXY_CACHE_TTL):
+    """Store image bytes, evicting the soonest-to-expire entries when full."""
+    now = datetime.utcnow().timestamp()
+    with _IMAGE_PROXY_LOCK:
+        if len(_IMAGE_PROXY_CACHE) > _IMAGE_PROXY_CACHE_MAX:
+            # Drop the 50 entries closest to expiry
+            keys = sorted(_IMAGE_PROXY_CACHE.items(), key=lambda kv: kv[1][2])[:50]
+            for k, _ in keys:
+                _IMAGE_PROXY_CACHE.pop(k, None)
+        _IMAGE_PROXY_CACHE[cache_key] = (body, ctype, now + ttl)
+
+
+def _fetch_image_upstream(url):
+    """
+    Download an image from the CDN. Returns (bytes, content_type) or None.
+
+    Volcengine's TOS buckets return 403 AccessDenied unless the request
+    includes the Referer the bucket is configured to allow. EchoTik's
+    bucket allows echotik.live referers.
+    """
+    referers_to_try = [
+        'https://echotik.live/',
+        'https://open.echotik.live/',
+        'https://www.echotik.live/',
+    ]
+    last_failure = None
+    body = b''
+    ctype = ''
+    status_code = 0
+
+    try:
+        import requests as _requests
+        for ref in referers_to_try:
+            r = _requests.get(url, timeout=15, headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                              'AppleWebKit/537.36 (KHTML, like Gecko) '
+                              'Chrome/124.0.0.0 Safari/537.36',
+                'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Referer': ref,
+                'Origin': ref.rstrip('/'),
+            })
+            status_code = r.status_code
+            ctype = r.headers.get('Content-Type', '').split(';')[0].strip()
+            body = r.content or b''
+            if status_code == 200 and ctype.startswith('image/') and len(body) >= 200:
+                return body, ctype
+            last_failure = (status_code, ctype, len(body), body[:120])
+
+        print(f"[ImageProxy] FAIL url={url[:140]} "
+              f"tried_referers={len(referers_to_try)} "
+              f"last_status={last_failure[0] if last_failure else '?'} "
+              f"last_ctype={last_failure[1] if last_failure else '?'!r} "
+              f"last_bytes={last_failure[2] if last_failure else '?'} "
+              f"last_head={last_failure[3] if last_failure else ''!r}", flush=True)
+    except Exception as e:
+        print(f"[ImageProxy] NETWORK_ERR url={url[:140]} err={e}", flush=True)
+    return None
+
+
 @views_bp.route('/api/image-proxy')
 @login_required
 def api_image_proxy():
@@ -2835,9 +3102,8 @@ def api_image_proxy():
     # Cache by base URL (no query params) so signed URLs that expire
     # and get re-signed still hit the same cache bucket.
     cache_key = url.split('?', 1)[0]
-    now = datetime.utcnow().timestamp()
-    cached = _IMAGE_PROXY_CACHE.get(cache_key)
-    if cached and cached[2] > now:
+    cached = _image_cache_get(cache_key)
+    if cached:
         resp = Response(cached[0], content_type=cached[1])
         resp.headers['Cache-Control'] = 'public, max-age=86400'
         return resp
@@ -2865,58 +3131,12 @@ def api_image_proxy():
 
     # (Primary cache check done above using cache_key.)
 
-    # Cache miss — fetch. Volcengine's TOS buckets return 403 AccessDenied
-    # unless the request includes the Referer the bucket is configured to
-    # allow. EchoTik's bucket allows echotik.live referers.
-    referers_to_try = [
-        'https://echotik.live/',
-        'https://open.echotik.live/',
-        'https://www.echotik.live/',
-    ]
-    last_failure = None
-    body = b''
-    ctype = ''
-    status_code = 0
-
-    try:
-        import requests as _requests
-        for ref in referers_to_try:
-            r = _requests.get(url, timeout=15, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                              'AppleWebKit/537.36 (KHTML, like Gecko) '
-                              'Chrome/124.0.0.0 Safari/537.36',
-                'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Referer': ref,
-                'Origin': ref.rstrip('/'),
-            })
-            status_code = r.status_code
-            ctype = r.headers.get('Content-Type', '').split(';')[0].strip()
-            body = r.content or b''
-            if status_code == 200 and ctype.startswith('image/') and len(body) >= 200:
-                break  # success
-            last_failure = (status_code, ctype, len(body), body[:120])
-
-        if not (status_code == 200 and ctype.startswith('image/') and len(body) >= 200):
-            print(f"[ImageProxy] FAIL url={url[:140]} "
-                  f"tried_referers={len(referers_to_try)} "
-                  f"last_status={last_failure[0] if last_failure else '?'} "
-                  f"last_ctype={last_failure[1] if last_failure else '?'!r} "
-                  f"last_bytes={last_failure[2] if last_failure else '?'} "
-                  f"last_head={last_failure[3] if last_failure else ''!r}", flush=True)
-            return _proxy_fallback_png()
-    except Exception as e:
-        print(f"[ImageProxy] NETWORK_ERR url={url[:140]} err={e}", flush=True)
+    fetched = _fetch_image_upstream(url)
+    if not fetched:
         return _proxy_fallback_png()
+    body, ctype = fetched
 
-    # Cap cache at ~200 entries to avoid memory bloat
-    if len(_IMAGE_PROXY_CACHE) > 200:
-        # Drop 50 oldest
-        keys = sorted(_IMAGE_PROXY_CACHE.items(), key=lambda kv: kv[1][2])[:50]
-        for k, _ in keys:
-            _IMAGE_PROXY_CACHE.pop(k, None)
-
-    _IMAGE_PROXY_CACHE[cache_key] = (body, ctype, now + _IMAGE_PROXY_CACHE_TTL)
+    _image_cache_put(cache_key, body, ctype)
     resp = Response(body, content_type=ctype)
     resp.headers['Cache-Control'] = 'public, max-age=86400'
     return resp
@@ -2926,28 +3146,6 @@ def api_image_proxy():
 # Product lookup — paste-a-TikTok-URL or paste-a-product-ID
 # ---------------------------------------------------------------------------
 
-_TIKTOK_URL_RE = None  # lazy-compiled
-_PRODUCT_ID_RE = None
-
-
-def _tiktok_url_re():
-    import re as _re
-    global _TIKTOK_URL_RE
-    if _TIKTOK_URL_RE is None:
-        _TIKTOK_URL_RE = _re.compile(
-            r'^https?://(?:www\.|vm\.|m\.)?tiktok\.com', _re.IGNORECASE
-        )
-    return _TIKTOK_URL_RE
-
-
-def _product_id_re():
-    import re as _re
-    global _PRODUCT_ID_RE
-    if _PRODUCT_ID_RE is None:
-        _PRODUCT_ID_RE = _re.compile(r'^\d{15,}$')
-    return _PRODUCT_ID_RE
-
-
 @views_bp.route('/api/products/lookup', methods=['POST'])
 @api_auth
 def api_products_lookup():
@@ -2958,96 +3156,35 @@ def api_products_lookup():
       - A TikTok share URL (https://www.tiktok.com/t/..., vm.tiktok.com/..., etc.)
       - A raw numeric product_id (15+ digits)
 
-    Behaviour:
+    Behaviour (services/lookup):
       1. If the product already exists in our DB → return its URL, source='database'
       2. Otherwise call EchoTik realtime → upsert → return new URL
     """
+    from app.services.lookup import lookup_product, LookupFailed
+
     body = request.get_json(silent=True) or {}
     query = (body.get('query') or '').strip()
     if not query:
         return jsonify({'error': 'Missing query'}), 400
 
-    product_id = None
-    region = 'US'
-    source = None
-
-    # Flow A — TikTok share URL
-    if _tiktok_url_re().match(query):
-        try:
-            from app.services.echotik import extract_product_id_from_share_url
-            result = extract_product_id_from_share_url(query)
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).warning(
-                f"[ProductLookup] extract_product_id {query!r} err: {e}")
-            result = None
-        if not result or not result.get('product_id'):
-            return jsonify({
-                'error': 'Could not extract a product from that TikTok link. '
-                         'Make sure it is a TikTok Shop product link, not a regular video.'
-            }), 404
-        product_id = result['product_id']
-        region = result.get('region') or 'US'
-        source = 'share_url'
-
-    # Flow B — raw product ID
-    elif _product_id_re().match(query):
-        product_id = query
-        region = 'US'
-        source = 'product_id'
-
-    else:
-        return jsonify({'error': 'Not a TikTok URL or product ID'}), 400
-
-    # Canonical primary key is "shop_<raw_id>"
-    raw_id = str(product_id).replace('shop_', '')
-    db_key = f"shop_{raw_id}"
-
-    # Fast path — already in DB
-    existing = Product.query.get(db_key)
-    if existing:
-        return jsonify({
-            'source': 'database',
-            'product_id': db_key,
-            'product_url': f'/app/products/{db_key}',
-        })
-
-    # Fetch from EchoTik realtime → normalize → upsert via existing sync_to_db
     try:
-        from app.services.echotik import fetch_product_detail_realtime, sync_to_db
-        product_data = fetch_product_detail_realtime(raw_id, region=region)
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).warning(
-            f"[ProductLookup] realtime fetch {raw_id} err: {e}")
-        product_data = None
-
-    if not product_data:
-        return jsonify({
-            'error': 'Product not found on TikTok Shop. It may be region-restricted '
-                     'or delisted.'
-        }), 404
-
-    # Make sure product_id matches what we looked up (sync_to_db prefixes it)
-    product_data['product_id'] = raw_id
-    try:
-        sync_to_db([product_data])
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).warning(
-            f"[ProductLookup] sync_to_db {raw_id} err: {e}")
-        # Don't block the user — fallthrough; product detail page has its own lookup
+        result = lookup_product(query)
+    except LookupFailed as e:
+        return jsonify({'error': str(e)}), e.status
 
-    try:
-        from app.routes.auth import log_activity
-        _user = get_current_user()
-        if _user:
-            log_activity(_user.id, 'product_lookup', {
-                'source': source, 'product_id': db_key,
-                'query': (query[:120] if source == 'share_url' else '')
-            })
-    except Exception:
-        pass
+    db_key = result['product_id']
+    source = result['source']
+    if source != 'database':
+        try:
+            from app.routes.auth import log_activity
+            _user = get_current_user()
+            if _user:
+                log_activity(_user.id, 'product_lookup', {
+                    'source': source, 'product_id': db_key,
+                    'query': (query[:120] if source == 'share_url' else '')
+                })
+        except Exception:
+            pass
 
     return jsonify({
         'source': source,
@@ -0,0 +1,162 @@
+"""
+PRISM — AI Response Cache
+Reuses PRISM AI answers for near-identical questions ("best gems today" /
+"best gems for today?") instead of another LLM round trip with the
+multi-kilobyte system prompt. Used by /api/ai/chat and the Discord bot
+(each process keeps its own cache).
+
+Entries are keyed by the context the answer was given against — the AI
+context snapshot's data version plus the keyword segments the question
+pulled in (``context_key``) — and the normalized question. A new snapshot
+therefore never serves an answer about old data.
+
+Lookup: exact normalized match first, then a fuzzy scan of the same
+context's entries. Two questions match when fuzzywuzzy's token-set,
+token-sort and plain ratios all reach AI_CACHE_SIMILARITY — token-set
+alone scores "cheap products" vs "cheap products for dogs" as 100, and
+both token ratios ignore word order, so "low competition and high sales"
+would answer "high competition and low sales" — and they carry the same
+numbers ("under $10" never answers "under $20"). Without fuzzywuzzy only
+exact matches hit.
+
+Entries expire after AI_CACHE_TTL_SECONDS; past AI_CACHE_MAX_ENTRIES the
+least recently used go first. Callers skip the cache when the user asks
+for a fresh answer (``no_cache`` / ``Cache-Control: no-cache`` on the
+web, ``--fresh`` in the message on either).
+
+Environment variables:
+    AI_CACHE_TTL_SECONDS  — answer lifetime (default 1800)
+    AI_CACHE_MAX_ENTRIES  — LRU capacity per process (default 500)
+    AI_CACHE_SIMILARITY   — fuzzy match threshold, 0-100 (default 90)
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    from fuzzywuzzy import fuzz
+    FUZZY_AVAILABLE = True
+except ImportError:
+    FUZZY_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+AI_CACHE_TTL_SECONDS = float(os.environ.get('AI_CACHE_TTL_SECONDS', '1800'))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', '500'))
+AI_CACHE_SIMILARITY = int(os.environ.get('AI_CACHE_SIMILARITY', '90'))
+
+# Fuzzy candidates compared per lookup (most recently used first)
+_FUZZY_SCAN = 200
+
+_NON_WORD_RE = re.compile(r'[^a-z0-9$%.\s]+')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+# Words that don't change what's being asked
+_FILLER = frozenset((
+    'a an the for of to in on me my i you can could please what whats which are is '
+    'show give list tell find any some us'
+).split())
+
+
+def normalize(question):
+    """Lowercased question without punctuation and filler words."""
+    text = _NON_WORD_RE.sub(' ', (question or '').lower())
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    words = text.split()
+    return ' '.join(w for w in words if w not in _FILLER) or ' '.join(words)
+
+
+def context_key(product_context):
+    """Cache scope for a rendered AI context (data version + selected segments)."""
+    return hashlib.sha1(product_context.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU map of (context, normalized question) -> answer, with hit metrics."""
+
+    def __init__(self, ttl=AI_CACHE_TTL_SECONDS, max_entries=AI_CACHE_MAX_ENTRIES,
+                 similarity=AI_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (scope, question) -> (expires, answer, meta)
+        self._stats = {'exact_hits': 0, 'fuzzy_hits': 0, 'misses': 0,
+                       'bypasses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    def _similar(self, a, b):
+        if _NUMBER_RE.findall(a) != _NUMBER_RE.findall(b):
+            return False
+        return min(fuzz.token_set_ratio(a, b), fuzz.token_sort_ratio(a, b),
+                   fuzz.ratio(a, b)) >= self.similarity
+
+    def get(self, scope, question):
+        """``(answer, meta)`` for a matching live entry, or None (counted as a miss)."""
+        q = normalize(question)
+        now = time.monotonic()
+        with self._lock:
+            key = (scope, q)
+            hit = self._entries.get(key)
+            if hit and hit[0] <= now:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                hit = None
+            if hit:
+                self._entries.move_to_end(key)
+                self._stats['exact_hits'] += 1
+                return hit[1], {**hit[2], 'match': 'exact'}
+
+            if FUZZY_AVAILABLE and q:
+                scanned = 0
+                for other in reversed(self._entries):
+                    if other[0] != scope:
+                        continue
+                    scanned += 1
+                    if scanned > _FUZZY_SCAN:
+                        break
+                    entry = self._entries[other]
+                    if entry[0] > now and self._similar(q, other[1]):
+                        self._entries.move_to_end(other)
+                        self._stats['fuzzy_hits'] += 1
+                        return entry[1], {**entry[2], 'match': 'fuzzy'}
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, scope, question, answer, meta=None):
+        if not answer:
+            return
+        q = normalize(question)
+        with self._lock:
+            self._entries[(scope, q)] = (time.monotonic() + self.ttl, answer, dict(meta or {}))
+            self._entries.move_to_end((scope, q))
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def bypass(self):
+        """Count a request that skipped the cache on purpose."""
+        with self._lock:
+            self._stats['bypasses'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            size = len(self._entries)
+        hits = s['exact_hits'] + s['fuzzy_hits']
+        lookups = hits + s['misses']
+        return {**s, 'hits': hits, 'lookups': lookups, 'entries': size,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+                'fuzzy': FUZZY_AVAILABLE}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,241 @@
+"""
+PRISM — AI Chat Providers
+The model calls behind /api/ai/chat: Claude (Anthropic) first, Grok (xAI)
+as the fallback. Both are always called in streaming mode — ``stream``
+yields text as it arrives (the SSE mode of /api/ai/chat forwards it to
+the browser), ``complete`` joins it for the plain JSON mode.
+
+Falling back to Grok is only possible before the first token: once text
+has gone out, a provider failing mid-reply ends the stream with an error.
+
+Transport: provider responses are read incrementally with ``requests``
+(``iter_lines``). The web process runs gunicorn's gthread worker, so a
+streamed reply holds a worker thread for the whole generation; streamed
+replies share the long-lived stream cap of services/progress
+(``try_open_stream``), and past it the SSE mode answers 429.
+
+Per provider, the process keeps the last AI_LATENCY_SAMPLES time-to-first-
+token and total-latency samples plus call/error counts
+(``latency_stats``, GET /api/ai/latency).
+
+Environment variables:
+    AI_CHAT_TIMEOUT    — connect / between-chunks read timeout in seconds (default 60)
+    AI_LATENCY_SAMPLES — latency samples kept per provider (default 200)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import requests
+
+log = logging.getLogger(__name__)
+
+AI_CHAT_TIMEOUT = float(os.environ.get('AI_CHAT_TIMEOUT', '60'))
+AI_LATENCY_SAMPLES = int(os.environ.get('AI_LATENCY_SAMPLES', '200'))
+
+ANTHROPIC_MODEL = "claude-sonnet-4-5-20250514"
+GROK_MODEL = "grok-4-1-fast-reasoning"
+MAX_TOKENS = 1500
+TEMPERATURE = 0.4
+
+
+class ProviderError(Exception):
+    """A provider call failed (HTTP error, stream error, timeout)."""
+
+
+
+# ---------------------------------------------------------------------------
+# Latency stats
+# ---------------------------------------------------------------------------
+
+_stats = {}           # provider -> {'calls', 'errors', 'ttft': deque, 'total': deque}
+_stats_lock = threading.Lock()
+
+
+def _provider_stats(provider):
+    s = _stats.get(provider)
+    if s is None:
+        s = _stats[provider] = {
+            'calls': 0, 'errors': 0,
+            'ttft': deque(maxlen=AI_LATENCY_SAMPLES),
+            'total': deque(maxlen=AI_LATENCY_SAMPLES),
+        }
+    return s
+
+
+def _record(provider, ttft_ms=None, total_ms=None, error=False):
+    with _stats_lock:
+        s = _provider_stats(provider)
+        s['calls'] += 1
+        if error:
+            s['errors'] += 1
+        if ttft_ms is not None:
+            s['ttft'].append(ttft_ms)
+        if total_ms is not None:
+            s['total'].append(total_ms)
+
+
+def _summary(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'max': ordered[-1], 'last': samples[-1]}
+
+
+def latency_stats():
+    """``{provider: {calls, errors, ttft_ms, total_ms}}`` (ms percentiles over recent calls)."""
+    with _stats_lock:
+        return {
+            provider: {
+                'calls': s['calls'],
+                'errors': s['errors'],
+                'samples': len(s['total']),
+                'ttft_ms': _summary(list(s['ttft'])),
+                'total_ms': _summary(list(s['total'])),
+            }
+            for provider, s in _stats.items()
+        }
+
+
+# ---------------------------------------------------------------------------
+# Providers — generators of text deltas
+# ---------------------------------------------------------------------------
+
+def _sse_data(resp):
+    """``data:`` payloads of a streamed SSE response, parsed as JSON (``[DONE]`` ends it)."""
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+def _anthropic(key, system_prompt, message):
+    resp = requests.post(
+        "https://api.anthropic.com/v1/messages",
+        headers={
+            "x-api-key": key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json",
+        },
+        json={
+            "model": ANTHROPIC_MODEL,
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURE,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": message}],
+            "stream": True,
+        },
+        timeout=AI_CHAT_TIMEOUT,
+        stream=True,
+    )
+    with resp:
+        if resp.status_code != 200:
+            raise ProviderError(f"Anthropic error ({resp.status_code}): {resp.text[:200]}")
+        for event in _sse_data(resp):
+            kind = event.get('type')
+            if kind == 'content_block_delta' and event.get('delta', {}).get('type') == 'text_delta':
+                yield event['delta'].get('text') or ''
+            elif kind == 'error':
+                raise ProviderError(f"Anthropic stream error: {event.get('error', {}).get('message', '')[:200]}")
+            elif kind == 'message_stop':
+                return
+
+
+def _grok(key, system_prompt, message):
+    resp = requests.post(
+        "https://api.x.ai/v1/chat/completions",
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {key}",
+        },
+        json={
+            "model": GROK_MODEL,
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURE,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message},
+            ],
+            "stream": True,
+        },
+        timeout=AI_CHAT_TIMEOUT,
+        stream=True,
+    )
+    with resp:
+        if resp.status_code != 200:
+            raise ProviderError(f"AI Error ({resp.status_code}): {resp.text[:200]}")
+        for event in _sse_data(resp):
+            for choice in event.get('choices') or []:
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    yield text
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def stream(system_prompt, message, anthropic_key=None, xai_key=None):
+    """
+    Generator of ``(kind, value)``: ``('start', provider)``, then
+    ``('text', delta)`` per chunk, then ``('end', {provider, ttft_ms,
+    total_ms})``. Raises ``ProviderError`` when no provider produced a
+    reply, or when the provider fails mid-reply.
+    """
+    providers = [(name, fn, key) for name, fn, key in
+                 (('anthropic', _anthropic, anthropic_key), ('grok', _grok, xai_key)) if key]
+    if not providers:
+        raise ProviderError("No AI API key configured. Set ANTHROPIC_API_KEY or XAI_API_KEY.")
+
+    last_error = None
+    for name, fn, key in providers:
+        started = time.perf_counter()
+        ttft_ms = None
+        try:
+            for text in fn(key, system_prompt, message):
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000)
+                    yield 'start', name
+                yield 'text', text
+        except (ProviderError, requests.RequestException) as e:
+            _record(name, ttft_ms, error=True)
+            last_error = e if isinstance(e, ProviderError) else ProviderError(f"{name} request failed: {e}")
+            if ttft_ms is not None:
+                raise last_error
+            log.warning("[AI] %s failed before first token (%s), trying next provider", name, e)
+            continue
+        total_ms = round((time.perf_counter() - started) * 1000)
+        if ttft_ms is None:
+            # Completed without any text — treat like a failure so the next provider gets a go
+            _record(name, error=True, total_ms=total_ms)
+            last_error = ProviderError(f"{name} returned an empty reply")
+            continue
+        _record(name, ttft_ms, total_ms)
+        log.info("[AI] %s reply: ttft=%dms total=%dms", name, ttft_ms, total_ms)
+        yield 'end', {'provider': name, 'ttft_ms': ttft_ms, 'total_ms': total_ms}
+        return
+    raise last_error or ProviderError("All AI providers failed")
+
+
+def complete(system_prompt, message, anthropic_key=None, xai_key=None):
+    """The whole reply as ``(text, meta)`` — ``meta`` as in ``stream``'s 'end' event."""
+    parts, meta = [], {}
+    for kind, value in stream(system_prompt, message, anthropic_key, xai_key):
+        if kind == 'text':
+            parts.append(value)
+        elif kind == 'end':
+            meta = value
+    return ''.join(parts), meta
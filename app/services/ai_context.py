@@ -0,0 +1,253 @@
+"""
+PRISM — AI Context Snapshot
+The "CURRENT DATABASE SNAPSHOT" block that /api/ai/chat and the Discord
+bot's PRISM AI put in their system prompts, precomputed.
+
+The product data behind it only changes at sync time, so every segment
+(summary counts, always-on top lists, keyword-triggered lists) for both
+prompt profiles is queried and serialized once per data version and kept
+in memory. Answering a message is then a segment selection plus a string
+join — no DB access.
+
+The snapshot is built by the daily sync (the ``ai_context`` stage) and
+stored in ``system_config``, so the web workers and the bot share one
+copy. Each process holds the snapshot in memory and, at most every
+AI_CONTEXT_CHECK_SECONDS, reads the small version key to see if a newer
+one was stored. A missing snapshot, or one older than
+AI_CONTEXT_MAX_AGE_MINUTES (continuous mode refreshes products between
+syncs), is rebuilt on the spot by whichever process asks first.
+
+Environment variables:
+    AI_CONTEXT_CHECK_SECONDS    — how often a process checks for a newer snapshot (default 60)
+    AI_CONTEXT_MAX_AGE_MINUTES  — rebuild a snapshot older than this (default 360)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+AI_CONTEXT_CHECK_SECONDS = float(os.environ.get('AI_CONTEXT_CHECK_SECONDS', '60'))
+AI_CONTEXT_MAX_AGE_MINUTES = float(os.environ.get('AI_CONTEXT_MAX_AGE_MINUTES', '360'))
+
+SNAPSHOT_CONFIG_KEY = 'ai_context_snapshot'
+VERSION_CONFIG_KEY = 'ai_context_version'
+
+# Products with fewer videos are placeholders/broken rows (same cut as the website)
+MIN_VIDEOS = 5
+
+# {'version', 'built_at', 'profiles': {profile: {segment: json}},
+#  'triggers': {profile: {segment: [keywords]}}}
+_snapshot = None
+_checked_at = 0.0         # monotonic time of the last version check
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Segments
+# ---------------------------------------------------------------------------
+
+def _web_summary(p):
+    efficiency = round(p.ad_spend / max(p.video_count or 1, 1), 1) if p.ad_spend else 0
+    pid = p.product_id or ''
+    return {
+        "name": p.product_name[:80] if p.product_name else "Unknown",
+        "seller": p.seller_name or "Unknown",
+        "tiktok_link": p.product_url or (f"https://shop.tiktok.com/view/product/{pid}?region=US&locale=en-US" if pid else ""),
+        "price": round(p.price or 0, 2),
+        "ad_spend_7d": round(p.ad_spend or 0, 2),
+        "videos_alltime": p.video_count_alltime or p.video_count or 0,
+        "videos_7d": p.video_7d or 0,
+        "sales_7d": p.sales_7d or 0,
+        "sales_30d": p.sales_30d or 0,
+        "gmv_30d": round(p.gmv_30d or 0, 2),
+        "commission": round((p.commission_rate or 0) * 100, 1),
+        "influencers": p.influencer_count or 0,
+        "efficiency": efficiency,
+        "rating": p.product_rating or 0,
+    }
+
+
+def _bot_summary(p):
+    efficiency = round(p.ad_spend / max(p.video_count or 1, 1), 1) if p.ad_spend else 0
+    pid = p.product_id or ''
+    return {
+        "name": (p.product_name or "Unknown")[:80],
+        "seller": p.seller_name or "Unknown",
+        "tiktok_link": (p.product_url or f"https://shop.tiktok.com/view/product/{pid}?region=US&locale=en-US") if pid else "",
+        "price": round(p.price or 0, 2),
+        "ad_spend_7d": round(p.ad_spend or 0, 2),
+        "videos": p.video_count_alltime or p.video_count or 0,
+        "sales_7d": p.sales_7d or 0,
+        "gmv_30d": round(p.gmv_30d or 0, 2),
+        "commission_pct": round((p.commission_rate or 0) * 100, 1),
+        "influencers": p.influencer_count or 0,
+        "efficiency": efficiency,
+    }
+
+
+def _profiles():
+    """
+    ``{profile: (summary_fn, segments)}``; a segment is
+    ``(name, keywords | None, limit, filters, order_by)`` — keywords None
+    means always included. Every segment also gets the active /
+    MIN_VIDEOS filters.
+    """
+    from app import db
+    from app.models import Product
+
+    vc = db.func.coalesce(Product.video_count_alltime, Product.video_count)
+    web = [
+        ('top_by_gmv', None, 15, [Product.gmv > 0], Product.gmv.desc()),
+        ('gems_high_sales_low_videos', None, 15, [Product.sales_7d > 50, vc < 50], Product.sales_7d.desc()),
+        ('top_by_sales_volume', None, 10, [Product.sales_7d > 0], Product.sales_7d.desc()),
+        ('best_commission_rates', ('commission', 'affiliate', 'earn', 'money', 'profit', 'margin'), 10,
+         [Product.commission_rate > 0.10, Product.sales_7d > 10], Product.commission_rate.desc()),
+        ('recently_discovered', ('new', 'recent', 'latest', 'discover', 'fresh', 'trending'), 10,
+         [], Product.first_seen.desc()),
+        ('niche_opportunities', ('niche', 'untapped', 'opportunity', 'hidden'), 10,
+         [Product.gmv > 10000, Product.influencer_count <= 30], Product.gmv.desc()),
+        ('budget_friendly', ('cheap', 'budget', 'affordable', 'low price', 'under'), 10,
+         [Product.price > 0, Product.sales_7d > 5], Product.price.asc()),
+    ]
+    bot = [
+        ('top_by_ad_spend', None, 12, [Product.ad_spend > 0], Product.ad_spend.desc()),
+        ('gems', None, 12, [Product.sales_7d > 50, vc < 50], Product.sales_7d.desc()),
+        ('top_sellers', None, 8, [Product.sales_7d > 0], Product.sales_7d.desc()),
+        ('best_commissions', ('commission', 'affiliate', 'earn', 'profit', 'margin'), 8,
+         [Product.commission_rate > 0.10, Product.sales_7d > 10], Product.commission_rate.desc()),
+        ('newest', ('new', 'recent', 'latest', 'trending', 'fresh'), 8,
+         [], Product.first_seen.desc()),
+        ('niche_opportunities', ('pick', 'niche', 'opportunity', 'untapped', 'hidden'), 8,
+         [Product.gmv_30d >= 50000, Product.gmv_30d <= 200000, Product.influencer_count <= 50],
+         Product.gmv_30d.desc()),
+        ('budget_friendly', ('cheap', 'budget', 'affordable', 'low price', 'under'), 8,
+         [Product.price > 0, Product.sales_7d > 5], Product.price.asc()),
+    ]
+    return {'web': (_web_summary, web), 'bot': (_bot_summary, bot)}
+
+
+# ---------------------------------------------------------------------------
+# Build / load — call inside an app context
+# ---------------------------------------------------------------------------
+
+def build_snapshot():
+    """Query and serialize every segment, store the snapshot and make it current. Commits."""
+    global _snapshot, _checked_at
+    from app import db
+    from app.models import Product
+    from app.routes.auth import set_config_value
+
+    vc = db.func.coalesce(Product.video_count_alltime, Product.video_count)
+    base = [Product.product_status == 'active', vc >= MIN_VIDEOS]
+    total = Product.query.filter(*base).count()
+    gems = Product.query.filter(*base, Product.sales_7d > 50, vc < 50).count()
+
+    profiles, triggers = {}, {}
+    for profile, (summary, segments) in _profiles().items():
+        built, kws = {}, {}
+        for name, keywords, limit, filters, order in segments:
+            rows = Product.query.filter(*base, *filters).order_by(order).limit(limit).all()
+            built[name] = json.dumps([summary(p) for p in rows], default=str)
+            if keywords:
+                kws[name] = list(keywords)
+        profiles[profile], triggers[profile] = built, kws
+    profiles['web']['database_summary'] = json.dumps(
+        {"total_active_products": total, "gem_opportunities": gems})
+    profiles['bot']['database_summary'] = json.dumps({"total_active_products": total})
+
+    payload = json.dumps(profiles, sort_keys=True)
+    snapshot = {
+        'version': hashlib.sha1(payload.encode()).hexdigest()[:16],
+        'built_at': datetime.utcnow().isoformat(),
+        'profiles': profiles,
+        'triggers': triggers,
+    }
+    set_config_value(SNAPSHOT_CONFIG_KEY, json.dumps(snapshot))
+    set_config_value(VERSION_CONFIG_KEY, f"{snapshot['version']}@{snapshot['built_at']}")
+    with _lock:
+        _snapshot = snapshot
+        _checked_at = time.monotonic()
+    log.info("[AIContext] snapshot %s built (%d products)", snapshot['version'], total)
+    return snapshot
+
+
+def _stored_version():
+    from app.models import SystemConfig
+
+    row = SystemConfig.query.get(VERSION_CONFIG_KEY)
+    return row.value if row else None
+
+
+def _load_stored():
+    from app.models import SystemConfig
+
+    row = SystemConfig.query.get(SNAPSHOT_CONFIG_KEY)
+    if not row or not row.value:
+        return None
+    try:
+        snapshot = json.loads(row.value)
+    except ValueError:
+        return None
+    if not all(p in snapshot.get('profiles', {}) for p in ('web', 'bot')) or 'triggers' not in snapshot:
+        return None
+    return snapshot
+
+
+def _is_stale(snapshot):
+    built_at = datetime.fromisoformat(snapshot['built_at'])
+    return datetime.utcnow() - built_at > timedelta(minutes=AI_CONTEXT_MAX_AGE_MINUTES)
+
+
+def current():
+    """
+    The current snapshot — from memory, refreshed from ``system_config``
+    when its version moved, rebuilt when missing or stale.
+    """
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and now - _checked_at < AI_CONTEXT_CHECK_SECONDS:
+            return snapshot
+        _checked_at = now
+
+    stored = _stored_version()
+    if snapshot is None or stored != f"{snapshot['version']}@{snapshot['built_at']}":
+        snapshot = _load_stored() if stored else None
+    if snapshot is None or _is_stale(snapshot):
+        return build_snapshot()
+    with _lock:
+        _snapshot = snapshot
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# Per-message assembly
+# ---------------------------------------------------------------------------
+
+def render(profile, user_message):
+    """
+    The context JSON for one message: the summary, the always-on segments
+    and the keyword-triggered ones the message asks for. ``profile`` is
+    'web' (/api/ai/chat) or 'bot' (Discord). Call inside an app context.
+    """
+    snapshot = current()
+    segments = snapshot['profiles'][profile]
+    triggered = snapshot['triggers'][profile]
+    msg_lower = (user_message or '').lower()
+
+    parts = [f'"database_summary": {segments["database_summary"]}']
+    for name, body in segments.items():
+        if name == 'database_summary':
+            continue
+        kw = triggered.get(name)
+        if kw and not any(w in msg_lower for w in kw):
+            continue
+        parts.append(f'{json.dumps(name)}: {body}')
+    return '{' + ', '.join(parts) + '}'
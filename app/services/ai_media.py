@@ -0,0 +1,607 @@
+"""
+PRISM — AI Media Jobs
+Gemini product images and Kling image-to-video, run as durable queue jobs
+(services/job_queue) instead of inside the request.
+
+    POST /api/generate-image/<id>  → 'ai_image' job: lifestyle image (Gemini)
+    POST /api/one-click-video      → 'ai_video' job: image (Gemini) → Kling task
+    GET  /api/ai/jobs/<job_id>     → job status, the image URL, the video's progress
+    GET  /api/ai/assets/<key>      → a generated image's bytes
+
+Assets: every generated image and every Kling task is an ``ai_assets`` row
+keyed by a hash of its inputs (product, source image / crop, category,
+image bytes, duration). A retried job finds the row and reuses it, so a
+retry doesn't generate the image twice or submit the video to Kling
+twice. Lifestyle images use a random scene prompt, so each request gets
+its own ``variant`` and only that request's retries reuse the image;
+one-click images are reused across requests. Assets are reused for
+AI_ASSET_TTL_DAYS; failed videos are resubmitted. Products and job status
+point at images by URL (``asset_url``) — the base64 bytes only ever live
+on the asset row. A legacy ``data:`` URL in ``product.ai_image_url`` is
+moved onto an asset row the first time it's read.
+
+Kling polling: one ``KlingPoller`` thread per process, but only the
+holder of the ``kling_poller`` lease polls. Each tick it lists recent
+Kling tasks in one call (KLING_POLL_PAGE_SIZE per page), writes the
+outcome of every pending task it tracks — on ``ai_assets`` and on the
+product — and fetches individually only the few that fell off the list.
+/api/video-status and /api/product/<id>/video-status read what it wrote.
+
+Environment variables:
+    AI_ASSET_TTL_DAYS     — how long a generated image or video is reused (default 30)
+    KLING_POLL_SECONDS    — poller tick while videos are pending (default 10)
+    KLING_POLL_PAGE_SIZE  — tasks fetched per list call (default 100)
+"""
+
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+
+from app.services.leases import PROCESS_OWNER
+
+log = logging.getLogger(__name__)
+
+AI_ASSET_TTL_DAYS = float(os.environ.get('AI_ASSET_TTL_DAYS', '30'))
+KLING_POLL_SECONDS = float(os.environ.get('KLING_POLL_SECONDS', '10'))
+KLING_POLL_PAGE_SIZE = int(os.environ.get('KLING_POLL_PAGE_SIZE', '100'))
+
+JOB_KINDS = ('ai_image', 'ai_video')
+PENDING_VIDEO = ('pending', 'processing')
+
+# Tasks that fell off the list call, fetched one by one per tick
+_SINGLE_FETCH_LIMIT = 10
+_LEASE_NAME = 'kling_poller'
+
+ASSET_URL_PREFIX = '/api/ai/assets/'
+
+_KLING_STATUS = {
+    "submitted": "pending",
+    "processing": "processing",
+    "succeed": "completed",
+    "failed": "failed",
+}
+
+_ONE_CLICK_PROMPTS = {
+    "beauty": "Professional product photography of {name}, elegant beauty product shot, soft lighting, luxury aesthetic, clean background, 9:16 vertical format",
+    "home": "Lifestyle home product photo of {name}, cozy modern home setting, warm natural lighting, 9:16 vertical format",
+    "fitness": "Dynamic fitness product shot of {name}, gym or outdoor setting, energetic lighting, 9:16 vertical format",
+    "tech": "Sleek technology product photo of {name}, modern minimalist setup, cool lighting, 9:16 vertical format",
+    "fashion": "Fashion product photography of {name}, stylish lifestyle shot, natural lighting, 9:16 vertical format",
+    "default": "Professional product lifestyle photography of {name}, clean modern aesthetic, soft studio lighting, 9:16 vertical TikTok format",
+}
+
+
+class MediaJobError(Exception):
+    """A job that can't succeed on retry (no product image, model returned no image)."""
+
+
+def _digest(*parts):
+    return hashlib.sha256('|'.join(str(p or '') for p in parts).encode()).hexdigest()
+
+
+def _mime_from(hint):
+    hint = hint or ''
+    if 'png' in hint:
+        return 'image/png'
+    if 'webp' in hint:
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+# ---------------------------------------------------------------------------
+# Assets — call inside an app context
+# ---------------------------------------------------------------------------
+
+def lifestyle_key(product, cropped_image=None, variant=None):
+    """Asset key of a product's lifestyle image for this crop / source image and request variant."""
+    source = _digest(cropped_image) if cropped_image else (product.cached_image_url or product.image_url)
+    return _digest('lifestyle_image', product.product_id, source, variant)
+
+
+def one_click_key(product_id, category):
+    return _digest('one_click_image', product_id, category)
+
+
+def video_key(product_id, image_base64, duration):
+    """Asset key of a Kling video — on the image's bytes, so a regenerated image gets a new video."""
+    return _digest('video', product_id, _digest(image_base64), duration)
+
+
+def get_asset(key):
+    """The usable asset for ``key``: younger than AI_ASSET_TTL_DAYS, and an image with bytes or a video not failed."""
+    from app import db
+    from app.models import AiAsset
+
+    asset = db.session.get(AiAsset, key)
+    if asset is None:
+        return None
+    if asset.created_at and asset.created_at < datetime.utcnow() - timedelta(days=AI_ASSET_TTL_DAYS):
+        return None
+    if asset.kind == 'video':
+        return asset if asset.status != 'failed' else None
+    return asset if asset.data else None
+
+
+def asset_url(key):
+    """Path serving an image asset's bytes — what ``product.ai_image_url`` stores."""
+    return f"{ASSET_URL_PREFIX}{key}"
+
+
+def asset_image(key):
+    """``(bytes, mime)`` of an image asset, or None."""
+    from app import db
+    from app.models import AiAsset
+
+    asset = db.session.get(AiAsset, key)
+    if asset is None or not asset.data:
+        return None
+    return base64.b64decode(asset.data), asset.mime_type or 'image/png'
+
+
+def stored_image(product):
+    """
+    ``(asset_key, base64)`` of the image ``product.ai_image_url`` points at,
+    or None. A legacy ``data:`` URL is saved as an asset and the product
+    repointed at it (commits).
+    """
+    from app import db
+    from app.models import AiAsset
+
+    url = product.ai_image_url or ''
+    if url.startswith('data:') and ',' in url:
+        header, data = url.split(',', 1)
+        if not data:
+            return None
+        key = _digest('stored_image', product.product_id, data)
+        _save_asset(key, product.product_id, 'stored_image', {'migrated_from': 'data_url'},
+                    mime_type=_mime_from(header), data=data)
+        product.ai_image_url = asset_url(key)
+        db.session.commit()
+        return key, data
+    if not url.startswith(ASSET_URL_PREFIX):
+        return None
+    key = url[len(ASSET_URL_PREFIX):]
+    asset = db.session.get(AiAsset, key)
+    return (key, asset.data) if asset is not None and asset.data else None
+
+
+def _save_asset(key, product_id, kind, meta=None, **fields):
+    """Insert or replace an asset row. Commits."""
+    from app import db
+    from app.models import AiAsset
+
+    now = datetime.utcnow()
+    asset = db.session.merge(AiAsset(
+        key=key, product_id=product_id, kind=kind,
+        meta_json=json.dumps(meta or {}, default=str),
+        created_at=now, updated_at=now, **fields,
+    ))
+    db.session.commit()
+    return asset
+
+
+# ---------------------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------------------
+
+def _source_image(product, cropped_image=None):
+    """``(base64, mime)`` of the crop sent by the browser, else the product's own image."""
+    if cropped_image:
+        # Remove data URL prefix if present (e.g., "data:image/png;base64,")
+        if ',' in cropped_image:
+            header, image_data = cropped_image.split(',', 1)
+            return image_data, _mime_from(header)
+        return cropped_image, 'image/jpeg'
+
+    image_url = product.cached_image_url or product.image_url
+    if not image_url:
+        raise MediaJobError('No product image available')
+    if image_url.startswith('/api/image-proxy'):
+        # Fetch the upstream URL behind our proxy
+        from urllib.parse import parse_qs, urlparse
+        actual_url = parse_qs(urlparse(image_url).query).get('url', [None])[0]
+        if actual_url:
+            image_url = actual_url
+    resp = requests.get(image_url, timeout=30, headers={
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    })
+    if resp.status_code == 404:
+        raise MediaJobError('Failed to download product image: 404')
+    if resp.status_code != 200:
+        raise RuntimeError(f'Failed to download product image: {resp.status_code}')
+    return base64.b64encode(resp.content).decode('utf-8'), _mime_from(resp.headers.get('Content-Type'))
+
+
+def _inline_image(result):
+    """``(base64, mime)`` of the first image part of a Gemini response, or None."""
+    for candidate in (result.get('candidates') or [])[:1]:
+        for part in (candidate.get('content') or {}).get('parts') or []:
+            if 'inlineData' in part:
+                return part['inlineData'].get('data'), part['inlineData'].get('mimeType', 'image/png')
+    return None
+
+
+def _generate_lifestyle(gemini_key, image_data, mime_type, prompt):
+    """
+    Lifestyle image from the product image and scene prompt. Nano Banana
+    Pro (gemini-3-pro-image-preview, 9:16 at 2K) first, Nano Banana
+    (gemini-2.5-flash-image) as the fallback. Returns ``(base64, mime)``.
+    """
+    models_to_try = ["gemini-3-pro-image-preview", "gemini-2.5-flash-image"]
+    contents = [{
+        "role": "user",
+        "parts": [
+            {"inlineData": {"mimeType": mime_type, "data": image_data}},
+            {"text": prompt},
+        ],
+    }]
+    last_error = None
+    for model_name in models_to_try:
+        config = {"responseModalities": ["TEXT", "IMAGE"]}
+        if "3-pro" in model_name:
+            config["imageConfig"] = {"aspectRatio": "9:16", "imageSize": "2K"}
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={gemini_key}"
+        try:
+            resp = requests.post(url, json={"contents": contents, "generationConfig": config},
+                                 headers={'Content-Type': 'application/json'}, timeout=120)
+        except requests.RequestException as e:
+            last_error = f"{model_name}: {e}"
+            log.info("[AIMedia] %s request failed: %s", model_name, e)
+            continue
+        if resp.status_code != 200:
+            last_error = f"{model_name}: {resp.status_code} - {resp.text[:300]}"
+            log.info("[AIMedia] %s returned %s, trying next", model_name, resp.status_code)
+            continue
+        image = _inline_image(resp.json())
+        if image and image[0]:
+            log.info("[AIMedia] lifestyle image from %s", model_name)
+            return image
+        last_error = f"{model_name}: No image in response"
+    raise RuntimeError(f"Gemini API error: {last_error or 'All models failed'}")
+
+
+def _generate_one_click(gemini_key, product_name, category):
+    """Text-to-image product shot for one-click video. Returns ``(base64, mime)``."""
+    template = _ONE_CLICK_PROMPTS.get(category, _ONE_CLICK_PROMPTS["default"])
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-preview-image-generation:generateContent?key={gemini_key}"
+    resp = requests.post(url, json={
+        "contents": [{"parts": [{"text": template.format(name=(product_name or '')[:100])}]}],
+        "generationConfig": {
+            "responseModalities": ["image", "text"],
+            "imageDimension": "PORTRAIT_9_16",
+        },
+    }, timeout=90)
+    resp.raise_for_status()
+    image = _inline_image(resp.json())
+    if not image or not image[0]:
+        raise MediaJobError('Failed to generate AI image')
+    return image
+
+
+# ---------------------------------------------------------------------------
+# Job handlers — called by the job worker as fn(app, **payload)
+# ---------------------------------------------------------------------------
+
+def run_image_job(app, product_id, cropped_image=None, user_id=None, variant=None):
+    """'ai_image': lifestyle image for a product, reused from the asset cache when this job was retried."""
+    from app.models import Product
+    from app.routes.ai import GEMINI_API_KEY, get_product_category, get_scene_prompt
+    from app.routes.auth import log_activity
+
+    product = Product.query.get(product_id)
+    if not product:
+        return {'success': False, 'error': 'Product not found'}
+    key = lifestyle_key(product, cropped_image, variant)
+    asset = get_asset(key)
+    if asset:
+        return {'success': True, 'cached': True, 'asset_key': key, 'product_id': product_id,
+                **json.loads(asset.meta_json or '{}')}
+    if not GEMINI_API_KEY:
+        return {'success': False, 'error': 'Gemini API key not configured'}
+
+    try:
+        image_data, mime_type = _source_image(product, cropped_image)
+        category = get_product_category(product.product_name or '')
+        prompt = get_scene_prompt(product.product_name or 'product', category)
+        generated, generated_mime = _generate_lifestyle(GEMINI_API_KEY, image_data, mime_type, prompt)
+    except MediaJobError as e:
+        return {'success': False, 'error': str(e)}
+
+    meta = {'category': category, 'prompt_used': prompt[:200] + '...'}
+    _save_asset(key, product_id, 'lifestyle_image', meta, mime_type=generated_mime, data=generated)
+    if user_id:
+        log_activity(user_id, 'ai_image_generated', {
+            'product_id': product_id,
+            'product_name': product.product_name[:50] if product.product_name else '',
+            'category': category,
+        })
+    return {'success': True, 'cached': False, 'asset_key': key, 'product_id': product_id, **meta}
+
+
+def run_video_job(app, product_id, category='default', skip_image=False, duration='5', user_id=None):
+    """
+    'ai_video': one-click Gemini image → Kling task. Both steps go through
+    the asset cache, so a retry after the image step doesn't regenerate it
+    and a task already submitted for this image isn't submitted again.
+    """
+    from app import db
+    from app.models import Product
+    from app.routes.ai import (GEMINI_API_KEY, KLING_ACCESS_KEY, KLING_SECRET_KEY,
+                               create_kling_video_task)
+
+    product = Product.query.get(product_id)
+    if not product:
+        return {'success': False, 'error': 'Product not found'}
+
+    # Step 1: image — the product's stored AI image when asked to skip, else cached / generated
+    stored = stored_image(product) if skip_image else None
+    if stored:
+        image_key, image_base64 = stored
+    else:
+        image_key = one_click_key(product_id, category)
+        asset = get_asset(image_key)
+        if asset is None:
+            if not GEMINI_API_KEY:
+                return {'success': False, 'error': 'Gemini API not configured for image generation'}
+            try:
+                data, mime = _generate_one_click(GEMINI_API_KEY, product.product_name, category)
+            except MediaJobError as e:
+                return {'success': False, 'error': str(e)}
+            asset = _save_asset(image_key, product_id, 'one_click_image', {'category': category},
+                                mime_type=mime, data=data)
+        image_base64 = asset.data
+        product.ai_image_url = asset_url(image_key)
+        db.session.commit()
+
+    result = {'success': True, 'image_generated': True, 'image_asset_key': image_key,
+              'product_id': product_id}
+
+    # Step 2: Kling
+    if not KLING_ACCESS_KEY or not KLING_SECRET_KEY:
+        return {**result, 'video_started': False,
+                'message': 'Image generated but Kling AI not configured for video'}
+
+    vkey = video_key(product_id, image_base64, duration)
+    video = get_asset(vkey)
+    if video is None:
+        # Raw base64 (Kling accepts this per API docs), else the product's image URL
+        source = image_base64 or product.cached_image_url or product.image_url
+        if not source:
+            return {**result, 'video_started': False, 'video_error': 'No image available for video generation'}
+        created = create_kling_video_task(source, duration=duration)
+        if not created.get('success'):
+            return {**result, 'video_started': False, 'video_error': created.get('error', 'Unknown error'),
+                    'message': 'Image generated but video generation failed'}
+        video = _save_asset(vkey, product_id, 'video', {'duration': duration},
+                            task_id=created['task_id'], status='processing')
+        notify_poller()
+
+    product.ai_video_task_id = video.task_id
+    product.ai_video_status = 'completed' if video.url else video.status
+    if video.url:
+        product.ai_video_url = video.url
+    db.session.commit()
+    return {**result, 'video_started': True, 'video_asset_key': vkey,
+            'video_task_id': video.task_id, 'video_status': product.ai_video_status}
+
+
+def job_status(job_id):
+    """Status of an AI media job plus its image and video, or None if it isn't one."""
+    from app import db
+    from app.models import QueueJob, AiAsset
+
+    job = db.session.get(QueueJob, job_id)
+    if job is None or job.kind not in JOB_KINDS:
+        return None
+    try:
+        result = json.loads(job.result_json) if job.result_json else None
+    except ValueError:
+        result = None
+    out = {'job_id': job.id, 'kind': job.kind, 'status': job.status,
+           'attempts': job.attempts or 0, 'error': job.last_error, 'result': result}
+    if result:
+        image_key = result.get('asset_key') or result.get('image_asset_key')
+        if image_key:
+            out['image'] = asset_url(image_key)
+        video = db.session.get(AiAsset, result.get('video_asset_key') or '')
+        if video is not None:
+            out['video'] = {'status': video.status, 'task_id': video.task_id,
+                            'video_url': video.url, 'error': video.error}
+    return out
+
+
+def job_owner(job_id):
+    """``user_id`` the job was queued for (None for passkey / admin jobs)."""
+    from app import db
+    from app.models import QueueJob
+
+    payload = db.session.execute(db.select(QueueJob.payload_json).where(QueueJob.id == job_id)).scalar()
+    try:
+        return json.loads(payload or '{}').get('user_id')
+    except ValueError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Kling poller
+# ---------------------------------------------------------------------------
+
+def _parse_task(task_data):
+    """Kling task JSON → ``{status, raw_status, video_url?, duration?, error?}``."""
+    status = task_data.get("task_status", "unknown")
+    result = {"status": _KLING_STATUS.get(status, status), "raw_status": status}
+    if status == "succeed":
+        videos = (task_data.get("task_result") or {}).get("videos") or []
+        if videos:
+            result["video_url"] = videos[0].get("url")
+            result["duration"] = videos[0].get("duration")
+    elif status == "failed":
+        result["error"] = task_data.get("task_status_msg", "Video generation failed")
+    return result
+
+
+def list_kling_tasks(page_size=None):
+    """Most recent image-to-video tasks in one call: ``{task_id: parsed}``."""
+    from app.routes.ai import KLING_API_BASE_URL, generate_kling_jwt_token
+
+    token = generate_kling_jwt_token()
+    if not token:
+        return {}
+    resp = requests.get(
+        f"{KLING_API_BASE_URL}/v1/videos/image2video",
+        params={"pageNum": 1, "pageSize": page_size or KLING_POLL_PAGE_SIZE},
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        timeout=30,
+    )
+    data = resp.json()
+    if data.get("code") != 0:
+        raise RuntimeError(data.get("message", f"Kling list error: {data}"))
+    return {t.get("task_id"): _parse_task(t) for t in data.get("data") or [] if t.get("task_id")}
+
+
+def pending_task_ids():
+    """Kling tasks still running — on video assets or products (/api/generate-video)."""
+    from app import db
+    from app.models import AiAsset, Product
+
+    ids = set(db.session.execute(
+        db.select(AiAsset.task_id).where(AiAsset.kind == 'video', AiAsset.status.in_(PENDING_VIDEO),
+                                         AiAsset.task_id.isnot(None))
+    ).scalars())
+    ids |= set(db.session.execute(
+        db.select(Product.ai_video_task_id).where(Product.ai_video_status.in_(PENDING_VIDEO),
+                                                  Product.ai_video_task_id.isnot(None))
+    ).scalars())
+    db.session.commit()
+    return ids
+
+
+def _apply(task_id, parsed):
+    """Write a finished task's outcome to its asset and product(s). Joins the caller's transaction."""
+    from app import db
+    from app.models import AiAsset, Product
+
+    now = datetime.utcnow()
+    if parsed['status'] == 'completed' and parsed.get('video_url'):
+        asset_values = {'status': 'completed', 'url': parsed['video_url'], 'updated_at': now}
+        product_values = {'ai_video_status': 'completed', 'ai_video_url': parsed['video_url']}
+    elif parsed['status'] == 'failed':
+        asset_values = {'status': 'failed', 'error': (parsed.get('error') or '')[:500], 'updated_at': now}
+        product_values = {'ai_video_status': 'failed'}
+    else:
+        asset_values = {'status': parsed['status'], 'updated_at': now}
+        product_values = {'ai_video_status': parsed['status']}
+    db.session.execute(
+        db.update(AiAsset).where(AiAsset.task_id == task_id).values(**asset_values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.update(Product).where(Product.ai_video_task_id == task_id).values(**product_values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def poll_kling_once(task_ids=None):
+    """
+    Check every pending task: one list call, then single fetches for the
+    few not on the first page. Returns how many tasks reached a final
+    state. Commits.
+    """
+    from app import db
+    from app.routes.ai import get_kling_video_result
+
+    ids = set(task_ids) if task_ids is not None else pending_task_ids()
+    if not ids:
+        return 0
+    listed = list_kling_tasks() if len(ids) > 1 else {}
+    missing = [t for t in ids if t not in listed][:_SINGLE_FETCH_LIMIT]
+    for task_id in missing:
+        single = get_kling_video_result(task_id)
+        if 'status' in single:
+            listed[task_id] = single
+
+    finished = 0
+    for task_id in ids:
+        parsed = listed.get(task_id)
+        if not parsed:
+            continue
+        _apply(task_id, parsed)
+        if parsed['status'] in ('completed', 'failed'):
+            finished += 1
+    db.session.commit()
+    if finished:
+        log.info("[AIMedia] %d Kling task(s) finished (%d pending checked)", finished, len(ids))
+    return finished
+
+
+class KlingPoller:
+    """Background thread polling Kling while videos are pending; the ``kling_poller`` lease keeps it to one process."""
+
+    def __init__(self, app):
+        self.app = app
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='kling-poller')
+            self._thread.start()
+        return self
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.notify()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        from app.services import leases
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    ids = pending_task_ids()
+                    if ids and leases.acquire(_LEASE_NAME, PROCESS_OWNER, ttl=KLING_POLL_SECONDS * 3):
+                        poll_kling_once(ids)
+                except Exception:
+                    log.exception("[AIMedia] Kling poll failed")
+                    from app import db
+                    try: db.session.rollback()
+                    except Exception: pass
+            with self._cond:
+                self._cond.wait(KLING_POLL_SECONDS)
+
+
+_poller = None
+
+
+def notify_poller():
+    """Wake this process's poller, if it runs one — called after a task is submitted."""
+    if _poller is not None:
+        _poller.notify()
+
+
+def start_poller(app):
+    """Start this process's Kling poller (once)."""
+    global _poller
+    if _poller is None:
+        _poller = KlingPoller(app).start()
+    return _poller
+
+
+def start_embedded_poller(app):
+    """Boot hook: poll from the web process unless a worker.py process does."""
+    from app.services.job_queue import JOB_WORKER_EMBEDDED
+    if os.environ.get('SKIP_SCHEDULER') or not JOB_WORKER_EMBEDDED:
+        return None
+    return start_poller(app)
@@ -0,0 +1,268 @@
+"""
+PRISM — External API Keys
+Key validation, per-key rate limiting and credit accounting for the
+developer API (routes/extern).
+
+Validation:
+    ``authenticate(key)`` answers from an in-process TTL cache, so a
+    client polling /api/extern/jobs doesn't cost an ``api_keys`` query per
+    call. Unknown keys are cached too (briefly), so a client hammering with
+    a bad key can't turn into a DB load. Deactivating keys goes through
+    ``revoke``, which also bumps the ``api_keys_version`` config row in the
+    same transaction; every process re-reads that row at most every
+    API_KEY_VERSION_SECONDS while serving API calls and drops its cache
+    when it changes — a revoked key stops working everywhere within that.
+
+Rate limiting:
+    A token bucket per key — API_KEY_RPS sustained, API_KEY_BURST burst.
+    In memory by default (per process; buckets idle long enough to be
+    full again are pruned every minute). With RATE_LIMIT_REDIS_URL set and
+    the optional ``redis`` package installed, buckets live in Redis and
+    are shared by every process.
+
+Credits:
+    ``spend_credits`` is one conditional UPDATE
+    (``credits = credits - n WHERE credits >= n``) — concurrent requests
+    can't double-spend, and it costs a single round trip.
+
+Environment variables:
+    API_KEY_CACHE_SECONDS   — validation cache TTL (default 60)
+    API_KEY_VERSION_SECONDS — how often the revocation version is checked (default 2)
+    API_KEY_RPS             — sustained requests/second per key (default 5)
+    API_KEY_BURST           — bucket size per key (default 20)
+    RATE_LIMIT_REDIS_URL    — shared bucket backend (optional)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = logging.getLogger(__name__)
+
+API_KEY_CACHE_SECONDS = float(os.environ.get('API_KEY_CACHE_SECONDS', '60'))
+API_KEY_VERSION_SECONDS = float(os.environ.get('API_KEY_VERSION_SECONDS', '2'))
+API_KEY_RPS = float(os.environ.get('API_KEY_RPS', '5'))
+API_KEY_BURST = int(os.environ.get('API_KEY_BURST', '20'))
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+
+# Unknown keys are remembered for less time than valid ones
+_NEGATIVE_TTL = 10
+_CACHE_MAX = 10000
+_VERSION_KEY = 'api_keys_version'
+_PRUNE_SECONDS = 60
+
+# What the cache keeps per key — never the credit balance, which must come from the DB
+KeyInfo = namedtuple('KeyInfo', 'id user_id')
+
+
+# ---------------------------------------------------------------------------
+# Validation cache
+# ---------------------------------------------------------------------------
+
+_cache = {}               # key string -> (expires_monotonic, KeyInfo | None)
+_cache_lock = threading.Lock()
+_version = {'value': None, 'checked': None}
+
+
+def _check_version(now):
+    """Drop the cache if any process revoked keys since the last check (throttled)."""
+    with _cache_lock:
+        if _version['checked'] is not None and now - _version['checked'] < API_KEY_VERSION_SECONDS:
+            return
+        _version['checked'] = now
+
+    from app import db
+    from app.models import SystemConfig
+
+    value = db.session.execute(
+        db.select(SystemConfig.value).where(SystemConfig.key == _VERSION_KEY)
+    ).scalar()
+    with _cache_lock:
+        if value != _version['value']:
+            _version['value'] = value
+            _cache.clear()
+
+
+def authenticate(key):
+    """``KeyInfo`` for an active key, or None. Call inside an app context."""
+    if not key:
+        return None
+    now = time.monotonic()
+    _check_version(now)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    from app import db
+    from app.models import ApiKey
+
+    row = db.session.execute(
+        db.select(ApiKey.id, ApiKey.user_id)
+        .where(ApiKey.key == key, ApiKey.is_active == True)  # noqa: E712
+    ).first()
+    info = KeyInfo(row.id, row.user_id) if row else None
+    with _cache_lock:
+        if len(_cache) >= _CACHE_MAX:
+            _cache.clear()
+        _cache[key] = (now + (API_KEY_CACHE_SECONDS if info else _NEGATIVE_TTL), info)
+    return info
+
+
+def invalidate(*keys):
+    """Drop keys from this process's validation cache (all keys if none given)."""
+    with _cache_lock:
+        if not keys:
+            _cache.clear()
+        for k in keys:
+            _cache.pop(k, None)
+
+
+def revoke(*keys):
+    """
+    Call when deactivating keys: drops them here and bumps the version so
+    other processes drop theirs. Joins the caller's transaction (no commit).
+    """
+    from app import db
+    from app.models import SystemConfig
+
+    invalidate(*keys)
+    db.session.merge(SystemConfig(key=_VERSION_KEY, value=str(time.time_ns())))
+
+
+# ---------------------------------------------------------------------------
+# Credits — call inside an app context
+# ---------------------------------------------------------------------------
+
+def spend_credits(key_id, n=1):
+    """
+    Atomically take ``n`` credits from key ``key_id``. Returns the remaining
+    balance, or None if the key has fewer than ``n`` (nothing is taken).
+    Commits.
+    """
+    from app import db
+    from app.models import ApiKey
+
+    remaining = db.session.execute(
+        db.update(ApiKey)
+        .where(ApiKey.id == key_id, ApiKey.is_active == True, ApiKey.credits >= n)  # noqa: E712
+        .values(credits=ApiKey.credits - n,
+                total_usage=db.func.coalesce(ApiKey.total_usage, 0) + n)
+        .returning(ApiKey.credits)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.session.commit()
+    return remaining
+
+
+def refund_credits(key_id, n=1):
+    """Give back ``n`` credits taken by ``spend_credits``. Commits."""
+    from app import db
+    from app.models import ApiKey
+
+    db.session.execute(
+        db.update(ApiKey)
+        .where(ApiKey.id == key_id)
+        .values(credits=ApiKey.credits + n,
+                total_usage=db.func.coalesce(ApiKey.total_usage, 0) - n)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def credit_balance(key_id):
+    from app import db
+    from app.models import ApiKey
+
+    return db.session.execute(db.select(ApiKey.credits).where(ApiKey.id == key_id)).scalar() or 0
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+class MemoryBuckets:
+    """Per-key token buckets in this process."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}    # key -> [tokens, last_monotonic]
+        self._lock = threading.Lock()
+        self._next_prune = time.monotonic() + _PRUNE_SECONDS
+
+    def take(self, key, cost=1):
+        """Take ``cost`` tokens. Returns 0 on success, else seconds until enough refill."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune(now)
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= cost:
+                self._buckets[key] = [tokens - cost, now]
+                return 0.0
+            self._buckets[key] = [tokens, now]
+            return (cost - tokens) / self.rate
+
+    def _prune(self, now):
+        """Forget buckets that have refilled completely — same as a fresh one. Caller holds the lock."""
+        self._next_prune = now + _PRUNE_SECONDS
+        refill = self.burst / self.rate
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < refill}
+
+
+_REDIS_TAKE = """
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every process through one Lua script per take."""
+
+    def __init__(self, url, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+
+    def take(self, key, cost=1):
+        return float(self._take(keys=[f'prism:ratelimit:{key}'],
+                                args=[self.rate, self.burst, time.time(), cost]))
+
+
+def _make_buckets():
+    if RATE_LIMIT_REDIS_URL:
+        if redis is None:
+            log.warning("[API] RATE_LIMIT_REDIS_URL set but redis isn't installed — per-process limits")
+        else:
+            return RedisBuckets(RATE_LIMIT_REDIS_URL, API_KEY_RPS, API_KEY_BURST)
+    return MemoryBuckets(API_KEY_RPS, API_KEY_BURST)
+
+
+buckets = _make_buckets()
+
+
+def rate_limit(key_id, cost=1):
+    """Seconds the caller must wait (0 = allowed). Fails open if the backend errors."""
+    try:
+        return buckets.take(key_id, cost)
+    except Exception:
+        log.warning("[API] rate limit backend error — allowing request", exc_info=True)
+        return 0.0
@@ -0,0 +1,353 @@
+"""
+PRISM — Brand Hunter Persistence
+Set-based writes for Brand Hunter scan results: bulk replace of a brand's
+``BrandProduct`` rows and brand aggregates computed in SQL instead of by
+loading every product row back into Python.
+
+The daily refresh (``refresh_brand_products``) re-fetches the first pages
+of every scanned brand concurrently, writes only rows whose numbers moved
+in bulk, and recomputes aggregates once for the brands that changed.
+
+Also owns the per-page scan checkpoints (``brand_scan_pages``): every
+fetched page is staged as it arrives so a scan interrupted by a restart
+resumes after its last completed page instead of starting over.
+"""
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+# Brands whose best product sits on ranking page 100+ are "hidden gems"
+HIDDEN_GEM_PAGE = 100
+
+# Daily refresh — pages per brand, parallel fetches (the EchoTik rate
+# limiter still paces the calls) and rows per UPDATE statement.
+BRAND_REFRESH_PAGES = int(os.environ.get('BRAND_REFRESH_PAGES', '2'))
+BRAND_REFRESH_WORKERS = int(os.environ.get('BRAND_REFRESH_WORKERS', '4'))
+BRAND_REFRESH_BATCH = 500
+
+# BrandProduct columns the refresh may change
+_REFRESH_COLUMNS = ('sales_7d', 'sales_30d', 'revenue_30d', 'total_videos',
+                    'influencer_count', 'price', 'commission_rate')
+
+
+def brand_product_row(brand_id: int, p: dict, page: int) -> dict:
+    """Map a normalized EchoTik product dict to a ``brand_products`` row."""
+    return {
+        'brand_id': brand_id,
+        'product_id': p.get('product_id', ''),
+        'title': (p.get('product_name', '') or '')[:500],
+        'image_url': (p.get('image_url', '') or '')[:500],
+        'price': p.get('price', 0) or 0,
+        'commission_rate': p.get('commission_rate', 0) or 0,
+        'sales_7d': p.get('sales_7d', 0) or 0,
+        'sales_30d': p.get('sales_30d', 0) or p.get('sales', 0) or 0,
+        'revenue_30d': p.get('gmv_30d', 0) or p.get('gmv', 0) or 0,
+        'total_videos': p.get('video_count_alltime', 0) or p.get('video_count', 0) or 0,
+        'total_sales': p.get('sales', 0) or 0,
+        'influencer_count': p.get('influencer_count', 0) or 0,
+        'category': (p.get('category', '') or '')[:100],
+        'page_found': page,
+        'is_hidden_gem': page >= HIDDEN_GEM_PAGE,
+        'last_synced': datetime.utcnow(),
+    }
+
+
+def replace_brand_products(brand_id: int, rows: list[dict]) -> int:
+    """
+    Delete a brand's products and bulk-insert ``rows`` in one executemany.
+    Does not commit.
+    """
+    from app import db
+    from app.models import BrandProduct
+
+    db.session.execute(
+        db.delete(BrandProduct).where(BrandProduct.brand_id == brand_id)
+    )
+    if rows:
+        db.session.execute(db.insert(BrandProduct), rows)
+    return len(rows)
+
+
+def recompute_brand_aggregates(brand_ids=None) -> None:
+    """
+    Recompute ``ScannedBrand`` totals from ``brand_products`` with one
+    grouped ``UPDATE ... FROM`` — sales_30d, revenue_30d, units, product
+    count, avg commission (non-zero only), top product by total sales and
+    the hidden-gem flag. ``brand_ids=None`` recomputes every brand.
+    Brands left with no products are zeroed. Does not commit.
+    """
+    from app import db
+    from app.models import BrandProduct, ScannedBrand
+    from sqlalchemy import case, func, select, update, exists
+
+    bp = BrandProduct
+    agg = select(
+        bp.brand_id.label('brand_id'),
+        func.count(bp.id).label('n'),
+        func.coalesce(func.sum(bp.sales_30d), 0).label('sales_30d'),
+        func.coalesce(func.sum(bp.revenue_30d), 0).label('revenue_30d'),
+        func.coalesce(func.sum(bp.total_sales), 0).label('units'),
+        func.coalesce(
+            func.avg(case((bp.commission_rate > 0, bp.commission_rate))), 0
+        ).label('avg_commission'),
+        func.max(case((bp.is_hidden_gem, 1), else_=0)).label('gem'),
+    ).group_by(bp.brand_id)
+    if brand_ids is not None:
+        agg = agg.where(bp.brand_id.in_(list(brand_ids)))
+    agg = agg.subquery()
+
+    top_name = (
+        select(bp.title)
+        .where(bp.brand_id == ScannedBrand.id)
+        .order_by(bp.total_sales.desc(), bp.id.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    db.session.execute(
+        update(ScannedBrand)
+        .where(ScannedBrand.id == agg.c.brand_id)
+        .values(
+            total_products=agg.c.n,
+            sales_30d=agg.c.sales_30d,
+            revenue_30d=agg.c.revenue_30d,
+            units_sold_30d=agg.c.units,
+            avg_commission=agg.c.avg_commission,
+            top_product_name=top_name,
+            is_hidden_gem=agg.c.gem > 0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    empty = update(ScannedBrand).where(
+        ~exists().where(bp.brand_id == ScannedBrand.id)
+    )
+    if brand_ids is not None:
+        empty = empty.where(ScannedBrand.id.in_(list(brand_ids)))
+    db.session.execute(
+        empty.values(
+            total_products=0, sales_30d=0, revenue_30d=0, units_sold_30d=0,
+            avg_commission=0, top_product_name=None, is_hidden_gem=False,
+        ).execution_options(synchronize_session=False)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Daily refresh
+# ---------------------------------------------------------------------------
+
+def _refreshed_values(bp: tuple, fresh: dict) -> dict:
+    """
+    New refresh-column values for an existing row ``bp`` (tuple in
+    ``_REFRESH_COLUMNS`` order). Zero/missing fresh values keep the
+    stored number.
+    """
+    old = dict(zip(_REFRESH_COLUMNS, bp))
+    return {
+        'sales_7d': fresh.get('sales_7d', 0) or old['sales_7d'] or 0,
+        'sales_30d': fresh.get('sales_30d', 0) or fresh.get('sales', 0) or old['sales_30d'],
+        'revenue_30d': fresh.get('gmv_30d', 0) or fresh.get('gmv', 0) or old['revenue_30d'],
+        'total_videos': (fresh.get('video_count_alltime', 0) or fresh.get('video_count', 0)
+                         or old['total_videos']),
+        'influencer_count': fresh.get('influencer_count', 0) or old['influencer_count'],
+        'price': fresh.get('price', 0) or old['price'],
+        'commission_rate': fresh.get('commission_rate', 0) or old['commission_rate'],
+    }
+
+
+def _bulk_update_brand_products(updates: list[dict]) -> None:
+    """
+    Write ``updates`` (``{'id', <refresh columns>, 'last_synced'}``) in
+    ``BRAND_REFRESH_BATCH``-row statements: ``UPDATE ... FROM (VALUES ...)``
+    on Postgres, executemany by primary key elsewhere. Does not commit.
+    """
+    from app import db
+    from app.models import BrandProduct
+    from sqlalchemy import Integer, Float, DateTime, column, update, values
+
+    if db.engine.dialect.name != 'postgresql':
+        for i in range(0, len(updates), BRAND_REFRESH_BATCH):
+            db.session.execute(update(BrandProduct), updates[i:i + BRAND_REFRESH_BATCH])
+        return
+
+    cols = [column('id', Integer)] + [
+        column(c, Float if c in ('price', 'commission_rate', 'revenue_30d') else Integer)
+        for c in _REFRESH_COLUMNS
+    ] + [column('last_synced', DateTime)]
+    names = [c.name for c in cols]
+    for i in range(0, len(updates), BRAND_REFRESH_BATCH):
+        chunk = updates[i:i + BRAND_REFRESH_BATCH]
+        v = values(*cols, name='v').data([tuple(u[n] for n in names) for u in chunk])
+        db.session.execute(
+            update(BrandProduct)
+            .where(BrandProduct.id == v.c.id)
+            .values({n: v.c[n] for n in names[1:]})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def refresh_brand_products(brands, pages=None, workers=None) -> dict:
+    """
+    Refresh ``BrandProduct`` stats for ``brands`` (``ScannedBrand`` rows)
+    from the first ``pages`` EchoTik pages of each brand.
+
+    All pages are fetched concurrently across brands; existing rows are
+    loaded in one query and diffed in Python, so only rows whose numbers
+    changed are written, and brands with no changes are skipped. Changed
+    brands get one grouped aggregate recompute at the end. Must be called
+    inside an app context. Commits.
+
+    Returns ``{'brands', 'fetched', 'rows_updated', 'brands_changed'}``.
+    """
+    from app import db
+    from app.models import BrandProduct, ScannedBrand
+    from app.services.echotik import fetch_brand_products
+
+    pages = pages or BRAND_REFRESH_PAGES
+    workers = max(1, workers or BRAND_REFRESH_WORKERS)
+    by_shop = {str(b.brand_id): b.id for b in brands if b.brand_id}
+    stats = {'brands': len(by_shop), 'fetched': 0, 'rows_updated': 0, 'brands_changed': 0}
+    if not by_shop:
+        return stats
+
+    def _fetch(job):
+        shop_id, page = job
+        try:
+            return shop_id, fetch_brand_products(shop_id, page=page, page_size=10) or []
+        except Exception as e:
+            log.debug("[BrandRefresh] %s page %d failed: %s", shop_id, page, e)
+            return shop_id, []
+
+    # 1. Fetch — (brand, page) pairs in parallel; later pages don't
+    # overwrite a product already seen on an earlier one.
+    fresh = {}   # brand row id -> {raw product id: product dict}
+    jobs = [(shop_id, page) for page in range(1, pages + 1) for shop_id in by_shop]
+    from app.services.pipeline import carry_meter
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for shop_id, products in pool.map(carry_meter(_fetch), jobs):
+            for p in products:
+                pid = str(p.get('product_id') or '').replace('shop_', '')
+                if pid:
+                    fresh.setdefault(by_shop[shop_id], {}).setdefault(pid, p)
+                    stats['fetched'] += 1
+    if not fresh:
+        return stats
+
+    # 2. Diff — one query for every candidate row across all brands
+    raw_ids = {pid for m in fresh.values() for pid in m}
+    candidates = list(raw_ids) + [f'shop_{pid}' for pid in raw_ids]
+    now = datetime.utcnow()
+    updates = []
+    changed = set()
+    cols = [getattr(BrandProduct, c) for c in _REFRESH_COLUMNS]
+    for i in range(0, len(candidates), BRAND_REFRESH_BATCH):
+        rows = db.session.execute(
+            db.select(BrandProduct.id, BrandProduct.brand_id, BrandProduct.product_id, *cols)
+            .where(BrandProduct.brand_id.in_(list(fresh)),
+                   BrandProduct.product_id.in_(candidates[i:i + BRAND_REFRESH_BATCH]))
+        ).all()
+        for row in rows:
+            p = fresh[row.brand_id].get((row.product_id or '').replace('shop_', ''))
+            if not p:
+                continue
+            current = tuple(row[3:])
+            new = _refreshed_values(current, p)
+            if tuple(new[c] for c in _REFRESH_COLUMNS) == current:
+                continue
+            updates.append({'id': row.id, **new, 'last_synced': now})
+            changed.add(row.brand_id)
+
+    # 3. Write — bulk row updates, then one aggregate pass for changed brands
+    if updates:
+        _bulk_update_brand_products(updates)
+        recompute_brand_aggregates(changed)
+        db.session.execute(
+            db.update(ScannedBrand)
+            .where(ScannedBrand.id.in_(list(changed)))
+            .values(last_scanned=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    stats['rows_updated'] = len(updates)
+    stats['brands_changed'] = len(changed)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Scan checkpoints
+# ---------------------------------------------------------------------------
+
+def stage_page(task_id: int, page: int, products: list[dict]) -> None:
+    """Stage one fetched page (empty pages too — they count toward the cutoff). Does not commit."""
+    from app import db
+    from app.models import BrandScanPage
+
+    db.session.add(BrandScanPage(
+        task_id=task_id,
+        page=page,
+        product_count=len(products),
+        products_json=json.dumps(products, default=str),
+    ))
+
+
+def load_checkpoint(task_id: int, page_start: int, page_end: int) -> list[tuple[int, list[dict]]]:
+    """
+    Staged ``(page, products)`` pairs for a task, in page order, trimmed to
+    the contiguous run starting at ``page_start`` — the pages a resumed scan
+    can skip.
+    """
+    from app.models import BrandScanPage
+
+    staged = (
+        BrandScanPage.query
+        .filter(BrandScanPage.task_id == task_id,
+                BrandScanPage.page >= page_start,
+                BrandScanPage.page <= page_end)
+        .order_by(BrandScanPage.page)
+        .all()
+    )
+    pages = []
+    expected = page_start
+    for row in staged:
+        if row.page != expected:
+            break
+        try:
+            products = json.loads(row.products_json or '[]')
+        except ValueError:
+            break
+        pages.append((row.page, products))
+        expected += 1
+    return pages
+
+
+def clear_checkpoint(task_id: int) -> None:
+    """Drop a task's staged pages once its products are saved. Does not commit."""
+    from app import db
+    from app.models import BrandScanPage
+
+    db.session.execute(
+        db.delete(BrandScanPage).where(BrandScanPage.task_id == task_id)
+    )
+
+
+def purge_checkpoints(older_than_days: int = 7) -> int:
+    """Delete staged pages of finished tasks older than ``older_than_days``. Commits."""
+    from app import db
+    from app.models import BrandScanPage, BrandScanTask
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    finished = db.select(BrandScanTask.id).where(
+        BrandScanTask.status.in_(['complete', 'error', 'stopped']),
+        BrandScanTask.created_at < cutoff,
+    )
+    result = db.session.execute(
+        db.delete(BrandScanPage).where(BrandScanPage.task_id.in_(finished))
+    )
+    db.session.commit()
+    return result.rowcount or 0
@@ -0,0 +1,268 @@
+"""
+PRISM — Brand Hunter Scan Queue
+Shared work queue that runs Brand Hunter brand scans with brand-level
+concurrency, independent of the durable job queue (services/job_queue).
+
+Each brand in a batch is a ``BrandScanTask`` row. Workers pull tasks
+fairly across jobs: the job with the fewest brands in flight goes next,
+ties broken by whichever job was served least recently. A 50-brand batch
+therefore can't starve a single-brand scan started by another admin.
+
+Every task runs inside its own app context, so each brand gets an
+isolated SQLAlchemy session — a failure in one brand can't poison the
+session another worker is using.
+
+Scans survive restarts: each fetched page is checkpointed (see
+``services/brand_hunter``) and tasks heartbeat as they go. On web boot
+(main.py → ``start_web_services``; never in the bot or worker.py, whose
+progress the web SSE can't see), ``start_resume_watch`` requeues tasks
+whose worker went away — running
+tasks with a stale heartbeat, queued tasks nobody picked up — and they
+continue from their last completed page.
+
+Environment variables:
+    BRAND_SCAN_CONCURRENCY   — brands scanned at once (default 3)
+    BRAND_SCAN_STALL_SECONDS — heartbeat age that marks a task orphaned (default 180)
+    BRAND_SCAN_AUTO_RESUME   — set to 0 to disable resume-on-boot
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+BRAND_SCAN_CONCURRENCY = int(os.environ.get('BRAND_SCAN_CONCURRENCY', '3'))
+BRAND_SCAN_STALL_SECONDS = int(os.environ.get('BRAND_SCAN_STALL_SECONDS', '180'))
+BRAND_SCAN_AUTO_RESUME = os.environ.get('BRAND_SCAN_AUTO_RESUME', '1') != '0'
+
+
+class BrandScanQueue:
+    """In-process fair queue of brand scan tasks, grouped by job."""
+
+    def __init__(self, concurrency=BRAND_SCAN_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()   # job_id -> deque[task_id], LRU order
+        self._in_flight = {}            # job_id -> running task count
+        self._apps = {}                 # job_id -> Flask app
+        self._workers = []
+
+    # -- public ------------------------------------------------------------
+
+    def submit(self, app, job_id, task_ids):
+        """Queue ``task_ids`` (BrandScanTask ids) belonging to ``job_id``."""
+        with self._cond:
+            self._apps[job_id] = app
+            self._pending.setdefault(job_id, deque()).extend(task_ids)
+            self._in_flight.setdefault(job_id, 0)
+            self._ensure_workers()
+            self._cond.notify_all()
+
+    def cancel(self, job_id):
+        """Drop a job's not-yet-started tasks. Running tasks see the DB stop flag."""
+        with self._cond:
+            dropped = self._pending.pop(job_id, None)
+            if dropped is not None and not self._in_flight.get(job_id):
+                self._in_flight.pop(job_id, None)
+                app = self._apps.pop(job_id, None)
+            else:
+                app = None
+        if app is not None:
+            self._finish(app, job_id)
+
+    def has_job(self, job_id):
+        """True while any of ``job_id``'s tasks are queued or running in this process."""
+        with self._cond:
+            return job_id in self._pending or self._in_flight.get(job_id, 0) > 0
+
+    def snapshot(self):
+        """Queue depth per job — for admin/debug display."""
+        with self._cond:
+            return {
+                jid: {'pending': len(q), 'running': self._in_flight.get(jid, 0)}
+                for jid, q in self._pending.items()
+            }
+
+    # -- internals ---------------------------------------------------------
+
+    def _ensure_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.concurrency:
+            w = threading.Thread(target=self._worker_loop, daemon=True,
+                                 name=f'brand-scan-{len(self._workers) + 1}')
+            w.start()
+            self._workers.append(w)
+
+    def _next_task(self):
+        """Pick the next (job_id, task_id) fairly. Caller holds the lock."""
+        best = None
+        for job_id, queue in self._pending.items():
+            if not queue:
+                continue
+            if best is None or self._in_flight[job_id] < self._in_flight[best]:
+                best = job_id
+        if best is None:
+            return None
+        task_id = self._pending[best].popleft()
+        self._in_flight[best] += 1
+        # Move to the back so ties rotate between jobs
+        self._pending.move_to_end(best)
+        return best, task_id
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                picked = self._next_task()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._next_task()
+                job_id, task_id = picked
+                app = self._apps[job_id]
+
+            try:
+                from app.routes.views import _run_brand_scan_task
+                _run_brand_scan_task(app, task_id)
+            except Exception:
+                log.exception("[BrandScanQueue] task %s crashed", task_id)
+
+            with self._cond:
+                self._in_flight[job_id] -= 1
+                done = (self._in_flight[job_id] == 0
+                        and not self._pending.get(job_id))
+                if done:
+                    self._pending.pop(job_id, None)
+                    self._in_flight.pop(job_id, None)
+                    self._apps.pop(job_id, None)
+            if done:
+                self._finish(app, job_id)
+
+    def _finish(self, app, job_id):
+        try:
+            from app.routes.views import _finish_brand_scan_job
+            _finish_brand_scan_job(app, job_id)
+        except Exception:
+            log.exception("[BrandScanQueue] finishing job %s failed", job_id)
+
+
+brand_scan_queue = BrandScanQueue()
+
+
+# ---------------------------------------------------------------------------
+# Resume
+# ---------------------------------------------------------------------------
+
+def resume_job(app, job_id, statuses=('queued', 'running', 'stopped', 'error'), stale_before=None):
+    """
+    Requeue ``job_id``'s tasks in ``statuses`` and submit them. Call inside
+    an app context. With ``stale_before`` only tasks whose last heartbeat
+    (or creation, if never started) is older are taken — the claim is a
+    conditional UPDATE, so two processes can't resume the same task.
+
+    Returns the number of tasks requeued.
+    """
+    from app import db
+    from app.models import BrandScanJob, BrandScanTask
+
+    candidates = BrandScanTask.query.filter(
+        BrandScanTask.job_id == job_id,
+        BrandScanTask.status.in_(list(statuses)),
+    ).all()
+    claimed = []
+    for task in candidates:
+        claim = db.update(BrandScanTask).where(
+            BrandScanTask.id == task.id,
+            BrandScanTask.status == task.status,
+        )
+        if stale_before is not None:
+            claim = claim.where(db.func.coalesce(
+                BrandScanTask.heartbeat_at, BrandScanTask.started_at, BrandScanTask.created_at,
+            ) < stale_before)
+        # products_found restarts at 0 — the resumed scan recounts staged pages
+        result = db.session.execute(claim.values(
+            status='queued', products_found=0, error_message=None,
+            completed_at=None, heartbeat_at=datetime.utcnow(),
+        ).execution_options(synchronize_session=False))
+        if result.rowcount:
+            claimed.append(task.id)
+
+    if claimed:
+        job = db.session.get(BrandScanJob, job_id)
+        if job:
+            job.status = 'running'
+            job.completed_at = None
+            job.error_message = None
+    db.session.commit()
+
+    if claimed:
+        from app.services.progress import publish
+        publish(f'brand_scan:{job_id}', job={'status': 'running', 'error_message': None})
+        brand_scan_queue.submit(app, job_id, claimed)
+    return len(claimed)
+
+
+def resume_stalled_scans(app):
+    """
+    Requeue every orphaned task of an unfinished job. Jobs this process is
+    already running are skipped. Returns ``{'jobs', 'tasks'}``.
+    """
+    from app import db
+    from app.models import BrandScanJob, BrandScanTask
+
+    stats = {'jobs': 0, 'tasks': 0}
+    with app.app_context():
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=BRAND_SCAN_STALL_SECONDS)
+            jobs = BrandScanJob.query.filter(
+                BrandScanJob.status.in_(['queued', 'running'])
+            ).all()
+            for job in jobs:
+                if brand_scan_queue.has_job(job.id):
+                    continue
+                if not BrandScanTask.query.filter_by(job_id=job.id).first():
+                    # Pre-task jobs have no per-brand state to resume from
+                    if (job.started_at or job.created_at or cutoff) < cutoff:
+                        job.status = 'error'
+                        job.error_message = 'Interrupted by restart'
+                        job.completed_at = datetime.utcnow()
+                        db.session.commit()
+                    continue
+                n = resume_job(app, job.id, statuses=('queued', 'running'), stale_before=cutoff)
+                if n:
+                    stats['jobs'] += 1
+                    stats['tasks'] += n
+                    print(f"[BrandScan] resumed job {job.id}: {n} stalled brand(s)", flush=True)
+        except Exception:
+            log.exception("[BrandScanQueue] resume of stalled scans failed")
+            try: db.session.rollback()
+            except Exception: pass
+    return stats
+
+
+def start_resume_watch(app):
+    """
+    Boot hook: resume orphaned scans now, then once more after the stall
+    window — a task still heartbeating from the previous process during a
+    rolling deploy only counts as orphaned once that window passes.
+    """
+    if getattr(start_resume_watch, '_started', False):
+        return
+    start_resume_watch._started = True
+    if os.environ.get('SKIP_SCHEDULER') or not BRAND_SCAN_AUTO_RESUME:
+        return
+
+    def _watch():
+        resume_stalled_scans(app)
+        time.sleep(BRAND_SCAN_STALL_SECONDS + 5)
+        resume_stalled_scans(app)
+        try:
+            from app.services.brand_hunter import purge_checkpoints
+            with app.app_context():
+                purge_checkpoints()
+        except Exception:
+            log.exception("[BrandScanQueue] checkpoint purge failed")
+
+    threading.Thread(target=_watch, daemon=True, name='brand-scan-resume').start()
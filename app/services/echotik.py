@@ -9,11 +9,14 @@ Environment variables:
     ECHOTIK_USERNAME       — HTTP Basic Auth username for open.echotik.live
     ECHOTIK_PASSWORD       — HTTP Basic Auth password for open.echotik.live
     ECHOTIK_PROXY_STRING   — Optional proxy in format host:port:username:password
+    ECHOTIK_MAX_RPS        — Process-wide request rate budget (default 5/s)
+    ECHOTIK_BURST          — Token-bucket burst size (default 10)
 """
 
 import os
 import time
 import logging
+import threading
 from datetime import datetime
 from typing import Optional
 
@@ -64,6 +67,44 @@ MAX_RETRIES = 3
 INITIAL_BACKOFF = 1.0  # seconds
 AUTH_RETRY_LIMIT = 1   # re-auth once, then give up
 
+# Global rate budget — every EchoTik call goes through the same bucket so
+# parallel workers (image warmup, Brand Hunter, scheduler) can't burst past
+# the API's limits no matter how many threads are in flight.
+ECHOTIK_MAX_RPS = float(os.environ.get('ECHOTIK_MAX_RPS', '5'))
+ECHOTIK_BURST = int(os.environ.get('ECHOTIK_BURST', '10'))
+
+
+class _RateLimiter:
+    """Thread-safe token bucket. ``acquire()`` blocks until a token is free."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.1)
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+        # Per-stage API call accounting for scheduler pipelines
+        from app.services.pipeline import current_meter
+        meter = current_meter.get()
+        if meter is not None:
+            meter.add(api_calls=tokens)
+
+
+rate_limiter = _RateLimiter(ECHOTIK_MAX_RPS, ECHOTIK_BURST)
+
 
 # ---------------------------------------------------------------------------
 # HTTP plumbing
@@ -99,6 +140,7 @@ def _request(method: str, url: str, *, params=None, json_body=None,
     last_exc = None
 
     for attempt in range(1, MAX_RETRIES + 1):
+        rate_limiter.acquire()
         try:
             resp = requests.request(
                 method, url,
@@ -317,6 +359,42 @@ def fetch_product_detail(product_id: str) -> Optional[dict]:
     return _normalize_product(payload)
 
 
+DETAIL_BATCH_SIZE = 10
+
+
+def fetch_product_details(product_ids: list[str]) -> dict[str, dict]:
+    """
+    Fetch enriched detail for many products, ``DETAIL_BATCH_SIZE`` per call
+    (``product_ids`` takes a comma-separated list).
+
+    Args:
+        product_ids: Raw product IDs (with or without ``shop_`` prefix).
+
+    Returns:
+        ``{raw_id: normalized dict}`` for the products EchoTik returned.
+        Raises ``EchoTikError`` if a call fails.
+    """
+    raw_ids = list(dict.fromkeys(str(p).replace('shop_', '') for p in product_ids if p))
+    found = {}
+    for i in range(0, len(raw_ids), DETAIL_BATCH_SIZE):
+        chunk = raw_ids[i:i + DETAIL_BATCH_SIZE]
+        data = _request('GET', f"{ECHOTIK_V3_BASE}/product/detail",
+                        params={'product_ids': ','.join(chunk)})
+        payload = data.get('data') or []
+        if isinstance(payload, dict):
+            payload = [payload]
+        for item in payload:
+            if not isinstance(item, dict):
+                continue
+            p = _normalize_product(item)
+            pid = str(p.get('product_id') or '').replace('shop_', '')
+            if pid in chunk:
+                found[pid] = p
+            elif len(chunk) == 1:
+                found[chunk[0]] = p
+    return found
+
+
 # ---------------------------------------------------------------------------
 # Public API — realtime product lookup (share URL / raw product_id)
 # ---------------------------------------------------------------------------
@@ -756,29 +834,40 @@ def _extract_creator_avatar(c: dict) -> Optional[str]:
     )
 
 
-def _sign_urls_bulk(urls: list[str]) -> dict[str, str]:
+def _sign_urls_bulk(urls: list[str], max_workers: int = 1) -> dict[str, str]:
     """
     Bulk-sign EchoTik CDN URLs so the browser can actually load them.
 
     Volcengine TOS returns 403 AccessDenied to anonymous requests. The
     `/batch/cover/download` endpoint exchanges raw CDN URLs for signed
     versions that the CDN accepts. Chunks into groups of 10 (the API
-    limit) and merges the results.
+    limit) and merges the results. With ``max_workers > 1`` the chunks
+    are signed concurrently; the global rate limiter still paces calls.
     """
     if not urls:
         return {}
     clean = list({u for u in urls if u and isinstance(u, str) and u.startswith('http')})
-    out = {}
     # Process in batches of 10 (API limit)
-    for i in range(0, len(clean), 10):
-        batch = clean[i:i + 10]
+    chunks = [clean[i:i + 10] for i in range(0, len(clean), 10)]
+
+    def _sign_chunk(batch):
         try:
-            signed = fetch_batch_images(batch)
-            if signed:
-                out.update(signed)
+            return fetch_batch_images(batch) or {}
         except Exception as exc:
             print(f"[EchoTik] _sign_urls_bulk chunk failed: {exc}", flush=True)
-            continue
+            return {}
+
+    out = {}
+    if max_workers <= 1 or len(chunks) <= 1:
+        for batch in chunks:
+            out.update(_sign_chunk(batch))
+        return out
+
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services.pipeline import carry_meter
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        for signed in pool.map(carry_meter(_sign_chunk), chunks):
+            out.update(signed)
     return out
 
 
@@ -948,6 +1037,7 @@ def _try_raw(url, params):
     the full payload when an endpoint exists but returns an error code.
     Returns (status, body_dict) or (None, dict) on network failure.
     """
+    rate_limiter.acquire()
     try:
         auth = _get_auth()
         resp = requests.get(url, params=params, auth=auth, timeout=30)
@@ -1401,7 +1491,7 @@ def fetch_product_trend(product_id: str, days: int = 30) -> list[dict]:
 # Public API — sync_to_db
 # ---------------------------------------------------------------------------
 
-def sync_to_db(products_list: list[dict]) -> dict:
+def sync_to_db(products_list: list[dict], post_sync: bool = True) -> dict:
     """
     Upsert a list of normalized product dicts into the Product model.
 
@@ -1411,6 +1501,9 @@ def sync_to_db(products_list: list[dict]) -> dict:
     Args:
         products_list: Output from ``fetch_trending_products`` or a list of
                        ``fetch_product_detail`` results.
+        post_sync:     Run the image signing / category enrichment passes
+                       (``run_post_sync``). Callers syncing in many small
+                       batches pass False and run them once at the end.
 
     Returns:
         ``{'created': int, 'updated': int, 'errors': int}``
@@ -1423,6 +1516,7 @@ def sync_to_db(products_list: list[dict]) -> dict:
     updated = 0
     errors = 0
     now = datetime.utcnow()
+    touched = []
 
     for p in products_list:
         if not p:
@@ -1434,6 +1528,7 @@ def sync_to_db(products_list: list[dict]) -> dict:
                 continue
 
             product_id = f"shop_{raw_id}"
+            touched.append(product_id)
 
             sales_7d = p.get('sales_7d', 0) or 0
             video_7d = p.get('video_count_7d', 0) or 0
@@ -1477,6 +1572,19 @@ def sync_to_db(products_list: list[dict]) -> dict:
         db.session.rollback()
         raise
 
+    _reschedule_synced(db, touched)
+
+    if post_sync:
+        run_post_sync()
+
+    log.info("sync_to_db: created=%d updated=%d errors=%d", created, updated, errors)
+    return {'created': created, 'updated': updated, 'errors': errors}
+
+
+def run_post_sync():
+    """Image signing and category enrichment after a sync (both non-fatal)."""
+    from app import db
+
     # --- Post-sync: sign images in batches of 10 ---
     try:
         _sign_product_images(db)
@@ -1489,8 +1597,145 @@ def sync_to_db(products_list: list[dict]) -> dict:
     except Exception:
         log.exception("Post-sync category enrichment failed (non-fatal)")
 
-    log.info("sync_to_db: created=%d updated=%d errors=%d", created, updated, errors)
-    return {'created': created, 'updated': updated, 'errors': errors}
+
+def bulk_upsert_products(products_list: list[dict]) -> dict:
+    """
+    Set-based alternative to ``sync_to_db`` for large batches.
+
+    Issues a single multi-row ``INSERT ... ON CONFLICT (product_id) DO
+    UPDATE`` (Postgres and SQLite) instead of a savepoint + SELECT per row.
+    The update clause mirrors ``_update_existing``: metrics only overwrite
+    when the new value is non-zero or the stored one is empty, all-time
+    video counts never go down, and names/sellers only replace unknowns.
+
+    Skips the post-sync image signing and category enrichment passes —
+    callers schedule those separately. Falls back to ``sync_to_db`` on
+    other dialects.
+
+    Returns ``{'upserted': int, 'errors': int}``.
+    """
+    from app import db
+    from app.models import Product
+    from sqlalchemy import and_, case, func, or_
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as _insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as _insert
+    else:
+        result = sync_to_db(products_list)
+        return {'upserted': result['created'] + result['updated'], 'errors': result['errors']}
+
+    now = datetime.utcnow()
+    rows = {}
+    errors = 0
+    for p in products_list:
+        raw_id = str((p or {}).get('product_id', '')).replace('shop_', '')
+        if not raw_id:
+            errors += 1
+            continue
+        name = (p.get('product_name') or 'Unknown Product')[:500]
+        sname = (p.get('seller_name') or '').strip()[:255]
+        if sname.lower() in ('', 'unknown', 'none', 'null'):
+            sname = 'Unknown'
+        s7d = p.get('sales_7d', 0) or 0
+        v_alltime = p.get('video_count_alltime', 0) or 0
+        # Later duplicates win — same as sequential sync_to_db calls
+        rows[f"shop_{raw_id}"] = {
+            'product_id': f"shop_{raw_id}",
+            'product_name': name,
+            'image_url': (p.get('image_url') or '')[:500] or None,
+            'product_url': (p.get('product_url') or
+                            f"https://shop.tiktok.com/view/product/{raw_id}?region=US&locale=en-US")[:500],
+            'price': p.get('price', 0) or 0,
+            'sales': p.get('sales', 0) or 0,
+            'sales_7d': s7d,
+            'sales_30d': p.get('sales_30d', 0) or 0,
+            'commission_rate': p.get('commission_rate', 0) or 0,
+            'influencer_count': p.get('influencer_count', 0) or 0,
+            'video_count': v_alltime,
+            'video_count_alltime': v_alltime,
+            'category': (p.get('category') or '')[:100] or None,
+            'seller_name': sname,
+            'seller_id': (str(p['seller_id'])[:50] if p.get('seller_id') else None),
+            'sales_velocity': round(s7d / max(p.get('video_count_7d', 0) or 0, 1), 2),
+            'scan_type': 'echotik_trending',
+            'product_status': 'active',
+            'first_seen': now,
+            'last_updated': now,
+            'last_echotik_sync': now,
+        }
+    if not rows:
+        return {'upserted': 0, 'errors': errors}
+
+    stmt = _insert(Product)
+    ex = stmt.excluded
+    t = Product.__table__.c
+
+    def _better(col):
+        return case((or_(ex[col] > 0, func.coalesce(t[col], 0) == 0), ex[col]), else_=t[col])
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.product_id],
+        set_={
+            'price': _better('price'),
+            'sales': _better('sales'),
+            'sales_7d': _better('sales_7d'),
+            'sales_30d': _better('sales_30d'),
+            'commission_rate': _better('commission_rate'),
+            'influencer_count': case(
+                (((ex.influencer_count > 0) & (func.coalesce(t.influencer_count, 0) == 0)),
+                 ex.influencer_count), else_=t.influencer_count),
+            'video_count_alltime': case(
+                (ex.video_count_alltime > func.coalesce(t.video_count_alltime, 0),
+                 ex.video_count_alltime), else_=t.video_count_alltime),
+            'video_count': case(
+                (ex.video_count_alltime > func.coalesce(t.video_count_alltime, 0),
+                 ex.video_count_alltime), else_=t.video_count),
+            'product_name': case(
+                (and_(*[func.lower(func.trim(ex.product_name)) != bad for bad in
+                        ('', 'unknown', 'none', 'null', 'unknown product')]), ex.product_name),
+                else_=t.product_name),
+            'image_url': func.coalesce(ex.image_url, t.image_url),
+            'product_url': ex.product_url,
+            'seller_name': case(
+                ((ex.seller_name != 'Unknown')
+                 & or_(t.seller_name.is_(None), t.seller_name == 'Unknown'), ex.seller_name),
+                else_=t.seller_name),
+            'seller_id': case(
+                (or_(t.seller_id.is_(None), t.seller_id == ''), ex.seller_id), else_=t.seller_id),
+            'category': func.coalesce(ex.category, t.category),
+            'prev_sales_7d': t.sales_7d,
+            'prev_sales_30d': t.sales_30d,
+            'sales_velocity': ex.sales_velocity,
+            'last_echotik_sync': ex.last_echotik_sync,
+            'last_updated': ex.last_updated,
+        },
+    )
+    try:
+        db.session.execute(stmt, list(rows.values()))
+        db.session.commit()
+    except Exception:
+        log.exception("bulk_upsert_products failed")
+        db.session.rollback()
+        raise
+
+    _reschedule_synced(db, list(rows))
+
+    log.info("bulk_upsert_products: upserted=%d errors=%d", len(rows), errors)
+    return {'upserted': len(rows), 'errors': errors}
+
+
+def _reschedule_synced(db, product_ids):
+    """Set ``next_refresh_at`` for freshly synced rows (non-fatal)."""
+    try:
+        from app.services.refresh_policy import reschedule
+        reschedule(product_ids)
+        db.session.commit()
+    except Exception:
+        log.exception("Post-sync refresh scheduling failed (non-fatal)")
+        db.session.rollback()
 
 
 def _enrich_missing_categories(db):
@@ -1772,6 +2017,10 @@ def _update_existing(product, p: dict, velocity: float, now: datetime):
     comm = p.get('commission_rate', 0) or 0
     v_alltime = p.get('video_count_alltime', 0) or 0
 
+    # Keep the previous observation — refresh_policy schedules on the delta
+    product.prev_sales_7d = product.sales_7d or 0
+    product.prev_sales_30d = product.sales_30d or 0
+
     # Only overwrite if the new value is better or the existing is empty
     if price > 0 or not product.price:
         product.price = price
@@ -5,30 +5,59 @@ Headless Chromium scraper that logs into EchoTik with saved session cookies,
 intercepts XHR/Fetch network requests on product listing pages, captures the
 JSON responses, and syncs them through the existing normalization pipeline.
 
-Includes a 6-hour cache layer: products whose last_echotik_sync is < 6 h old
-are skipped automatically.
+Includes a cache layer: products whose adaptive ``next_refresh_at`` (see
+services/refresh_policy) is still in the future are skipped automatically.
+
+Run progress (pages loaded, products captured, sync result) is published
+on the ``scraper`` progress channel (see services/progress).
+
+Browser pool: Chromium is launched once per process and kept between runs
+(``BrowserPool``), with warm contexts that already carry the cookies and
+abort image / media / font / stylesheet requests — only the JSON XHRs
+matter. Each listing page waits for its product XHR instead of network
+idle. ``bench_echotik_scraper.py`` measures pages/min against a local
+stub site.
+
+Parallel scraping: after page 1, the remaining listing pages are shared
+out to ECHOTIK_SCRAPER_CONTEXTS contexts (same cookies) through a queue,
+each loading its pages by URL. Intercepted batches stream through an
+asyncio queue into a sync consumer that normalizes and upserts them in a
+worker thread while scraping continues, deduplicated by product_id.
 
 Cookie workflow:
     1. Admin exports cookies from browser (DevTools > Application > Cookies)
     2. Admin uploads via POST /api/admin/echotik-cookies
     3. Cookies are saved to data/echotik_cookies.json
-    4. Scraper loads them into a fresh Playwright context each run
+    4. Scraper loads them into pooled Playwright contexts (new contexts
+       once the file changes)
 
 Environment:
-    ECHOTIK_SCRAPER_HEADED  — set to "1" for visible browser (debug)
-    ECHOTIK_SCRAPER_PAGES   — number of pages to scrape (default 5)
+    ECHOTIK_SCRAPER_HEADED          — set to "1" for visible browser (debug)
+    ECHOTIK_SCRAPER_PAGES           — number of pages to scrape (default 5)
+    ECHOTIK_SCRAPER_BLOCK_RESOURCES — set to "0" to load images/fonts/CSS/media too (default 1)
+    ECHOTIK_SCRAPER_XHR_TIMEOUT     — seconds to wait for a page's product XHR (default 20)
+    ECHOTIK_SCRAPER_PAGE_DELAY      — max random pause between pages, seconds (default 0.5)
+    ECHOTIK_BROWSER_IDLE_SECONDS    — close the pooled browser after this long unused (default 900)
+    ECHOTIK_CONTEXT_MAX_USES        — runs per browser context before it's replaced (default 20)
+    ECHOTIK_SCRAPER_CONTEXTS        — concurrent browser contexts per scrape; 1 walks the
+                                      Next button sequentially (default 3)
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import os
 import random
+import threading
 import time
-from datetime import datetime, timedelta
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from app.services.progress import publish
+
 log = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -42,9 +71,25 @@ COOKIE_PATH = os.path.join(
 
 ECHOTIK_DOMAIN = 'echotik.live'
 ECHOTIK_PRODUCTS_URL = 'https://echotik.live/products/trending'
-CACHE_HOURS = 6
 DEFAULT_PAGES = 5
 
+BLOCK_RESOURCES = os.environ.get('ECHOTIK_SCRAPER_BLOCK_RESOURCES', '1') != '0'
+XHR_TIMEOUT = float(os.environ.get('ECHOTIK_SCRAPER_XHR_TIMEOUT', '20'))
+PAGE_DELAY = float(os.environ.get('ECHOTIK_SCRAPER_PAGE_DELAY', '0.5'))
+BROWSER_IDLE_SECONDS = float(os.environ.get('ECHOTIK_BROWSER_IDLE_SECONDS', '900'))
+CONTEXT_MAX_USES = int(os.environ.get('ECHOTIK_CONTEXT_MAX_USES', '20'))
+SCRAPER_CONTEXTS = max(1, int(os.environ.get('ECHOTIK_SCRAPER_CONTEXTS', '3')))
+
+# Playwright resource types the scraper never needs
+BLOCKED_RESOURCE_TYPES = frozenset(('image', 'media', 'font', 'stylesheet'))
+
+_LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+]
+
 # User agents for rotation
 _USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
@@ -186,16 +231,15 @@ def get_cookie_status() -> dict:
 
 def _get_recently_synced_ids(app) -> set:
     """
-    Return set of product_ids that were synced within the last CACHE_HOURS.
+    Return set of product_ids whose next refresh is not due yet.
     Must be called inside an app context.
     """
     from app import db
     from app.models import Product
 
-    cutoff = datetime.utcnow() - timedelta(hours=CACHE_HOURS)
     rows = (
         db.session.query(Product.product_id)
-        .filter(Product.last_echotik_sync >= cutoff)
+        .filter(Product.next_refresh_at > datetime.utcnow())
         .all()
     )
     return {r[0] for r in rows}
@@ -264,151 +308,466 @@ def _looks_like_product(d: dict) -> bool:
 
 
 # ---------------------------------------------------------------------------
-# Core scraper (async)
+# Browser pool
 # ---------------------------------------------------------------------------
 
-async def scrape_products(
-    pages: int = DEFAULT_PAGES,
-    headed: bool = False,
-    debug: bool = False,
-) -> dict:
-    """
-    Launch headless Chromium, load EchoTik cookies, navigate product pages,
-    intercept XHR responses, and return collected product data.
+async def _block_heavy_resources(route):
+    """Context route handler: abort asset requests, the scraper only needs the XHRs."""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-    Args:
-        pages:  Number of listing pages to scrape.
-        headed: If True, run in visible browser mode (for debugging).
-        debug:  If True, return raw XHR data instead of syncing to DB.
 
-    Returns:
-        Dict with keys: products (list), xhr_urls (list), stats (dict)
-    """
-    from playwright.async_api import async_playwright, TimeoutError as PwTimeout
+def _cookie_signature(cookies: list[dict]) -> str:
+    return hashlib.sha1(json.dumps(cookies, sort_keys=True).encode()).hexdigest()
 
-    cookies = load_cookies()
-    collected_products = []
-    collected_xhr_urls = []
-    collected_responses = []
 
-    async def on_response(response):
-        """Intercept all responses and filter for product data."""
-        url = response.url
-        if not _matches_product_xhr(url):
+class BrowserPool:
+    """
+    One Chromium per process, kept alive between scraper runs, and warm
+    contexts (cookies loaded, heavy resources blocked) handed out per run.
+
+    Playwright objects belong to the event loop that created them, so the
+    pool runs its own loop on a daemon thread and every scrape executes
+    there (``run`` from sync code, ``call`` from another loop). The
+    browser is closed after ECHOTIK_BROWSER_IDLE_SECONDS without a run;
+    a context is retired after ECHOTIK_CONTEXT_MAX_USES runs, when the
+    cookies change, or when a run using it failed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._playwright = None
+        self._browser = None
+        self._headed = None
+        self._idle = []            # [(context, cookie_signature, uses)]
+        self._uses = {}            # context in use -> (cookie_signature, uses)
+        self._idle_timer = None
+        self.launches = 0
+
+    # -- loop plumbing ------------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name='echotik-browser-pool', daemon=True).start()
+            return self._loop
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run ``coro`` on the pool's loop and block until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result(timeout)
+
+    async def call(self, coro):
+        """Await ``coro`` on the pool's loop from any other loop."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()))
+
+    def shutdown(self):
+        """Close the browser and stop the pool's loop (worker shutdown)."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
             return
         try:
-            if 'application/json' not in (response.headers.get('content-type', '')):
-                return
-            body = await response.json()
-            collected_xhr_urls.append(url)
+            asyncio.run_coroutine_threadsafe(self._close_browser(), loop).result(30)
+        except Exception as exc:
+            log.warning("[SCRAPER] Browser pool shutdown failed: %s", exc)
+        loop.call_soon_threadsafe(loop.stop)
 
-            if debug:
-                collected_responses.append({'url': url, 'body': body})
+    # -- browser / contexts (pool loop only) --------------------------------
 
-            products = _extract_products_from_response(body)
-            if products:
-                collected_products.extend(products)
-                log.info("[SCRAPER] Intercepted %d products from %s", len(products), url[:120])
-        except Exception as exc:
-            log.debug("[SCRAPER] Failed to parse response from %s: %s", url[:80], exc)
-
-    ua = random.choice(_USER_AGENTS)
-    launch_args = [
-        '--disable-blink-features=AutomationControlled',
-        '--no-sandbox',
-        '--disable-dev-shm-usage',
-        '--disable-gpu',
-    ]
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
+    async def _ensure_browser(self, headed: bool):
+        from playwright.async_api import async_playwright
+
+        if self._browser is not None and self._browser.is_connected():
+            if self._headed == headed or self._uses:
+                return self._browser
+        await self._close_browser(force=True)
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(
             headless=not headed,
-            args=launch_args,
+            args=_LAUNCH_ARGS,
         )
+        self._headed = headed
+        self.launches += 1
+        log.info("[SCRAPER] Launched pooled Chromium (headed=%s)", headed)
+        return self._browser
+
+    async def _close_browser(self, force: bool = False):
+        if self._uses and not force:
+            return  # a run is still using it; the next idle timeout retries
+        idle, self._idle = self._idle, []
+        for context, _, _ in idle:
+            await _close_quietly(context)
+        browser, self._browser = self._browser, None
+        pw, self._playwright = self._playwright, None
+        if browser is not None:
+            await _close_quietly(browser)
+            log.info("[SCRAPER] Closed pooled Chromium")
+        if pw is not None:
+            try:
+                await pw.stop()
+            except Exception:
+                pass
+
+    async def _new_context(self, browser, cookies: list[dict]):
+        context = await browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            user_agent=random.choice(_USER_AGENTS),
+            locale='en-US',
+            timezone_id='America/New_York',
+            java_script_enabled=True,
+        )
+        await context.add_cookies(cookies)
+        if BLOCK_RESOURCES:
+            await context.route('**/*', _block_heavy_resources)
+        return context
+
+    async def acquire(self, cookies: list[dict], headed: bool = False):
+        """A context with ``cookies`` loaded — warm from the pool when possible."""
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        browser = await self._ensure_browser(headed)
+        sig = _cookie_signature(cookies)
+        while self._idle:
+            context, ctx_sig, uses = self._idle.pop()
+            if ctx_sig == sig and context.browser is browser:
+                self._uses[context] = (sig, uses)
+                return context
+            await _close_quietly(context)
+        context = await self._new_context(browser, cookies)
+        self._uses[context] = (sig, 0)
+        return context
+
+    async def release(self, context, reusable: bool = True):
+        sig, uses = self._uses.pop(context, (None, 0))
+        uses += 1
+        if reusable and uses < CONTEXT_MAX_USES and self._browser is not None \
+                and self._browser.is_connected():
+            self._idle.append((context, sig, uses))
+        else:
+            await _close_quietly(context)
+        if not self._uses:
+            self._idle_timer = asyncio.get_running_loop().call_later(
+                BROWSER_IDLE_SECONDS, lambda: asyncio.ensure_future(self._close_browser()))
+
+    @asynccontextmanager
+    async def context(self, cookies: list[dict], headed: bool = False):
+        """``async with pool.context(cookies) as ctx`` — acquire + release, retiring it on error."""
+        context = await self.acquire(cookies, headed)
+        ok = False
         try:
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent=ua,
-                locale='en-US',
-                timezone_id='America/New_York',
-                java_script_enabled=True,
-            )
-            await context.add_cookies(cookies)
+            yield context
+            ok = True
+        finally:
+            await self.release(context, reusable=ok)
+
+
+async def _close_quietly(closable):
+    try:
+        await closable.close()
+    except Exception:
+        pass
+
+
+_pool = BrowserPool()
+
+
+def browser_pool() -> BrowserPool:
+    return _pool
+
+
+def shutdown_browser_pool():
+    _pool.shutdown()
 
-            page = await context.new_page()
-            page.set_default_timeout(30_000)
-            page.on('response', on_response)
 
-            # Navigate to product listing
-            log.info("[SCRAPER] Navigating to %s", ECHOTIK_PRODUCTS_URL)
+# ---------------------------------------------------------------------------
+# Core scraper (async)
+# ---------------------------------------------------------------------------
+
+def _is_login_url(url: str) -> bool:
+    url = url.lower()
+    return 'login' in url or 'signin' in url or 'auth' in url
+
+
+async def _page_pause():
+    """Short random pause between listing pages (ECHOTIK_SCRAPER_PAGE_DELAY)."""
+    if PAGE_DELAY > 0:
+        await asyncio.sleep(random.uniform(0, PAGE_DELAY))
+
+
+class _Capture:
+    """
+    Product XHRs intercepted across one run's pages (all contexts). Each
+    batch goes to ``on_batch`` when given — the streamed sync — otherwise
+    it's kept in ``products``.
+    """
+
+    def __init__(self, debug: bool = False, on_batch=None):
+        self.debug = debug
+        self.on_batch = on_batch
+        self.products = []
+        self.xhr_urls = []
+        self.responses = []
+        self.captured = 0
+
+    def attach(self, page):
+        """Intercept ``page``'s responses. Returns ``load(action, timeout)`` for that page."""
+        from playwright.async_api import TimeoutError as PwTimeout
+
+        arrived = {'event': None}   # set when the awaited product XHR lands
+
+        async def on_response(response):
+            """Intercept all responses and filter for product data."""
+            url = response.url
+            if not _matches_product_xhr(url):
+                return
             try:
-                await page.goto(ECHOTIK_PRODUCTS_URL, wait_until='networkidle', timeout=45_000)
-            except PwTimeout:
-                raise ScraperTimeoutError(f"Timed out loading {ECHOTIK_PRODUCTS_URL}")
-
-            # Check for login redirect (cookie expiry detection)
-            current_url = page.url.lower()
-            if 'login' in current_url or 'signin' in current_url or 'auth' in current_url:
-                raise ScraperCookieError(
-                    f"Redirected to login page ({page.url}). "
-                    "Session cookies are expired — re-upload via admin panel."
-                )
-
-            # Wait for initial content to render
-            await asyncio.sleep(random.uniform(2.0, 4.0))
-
-            # Paginate through listing pages
-            for page_num in range(2, pages + 1):
-                try:
-                    # Look for pagination controls — try common selectors
-                    next_btn = await page.query_selector(
-                        'button.next, a.next, [aria-label="Next"], '
-                        '.pagination .next, .ant-pagination-next, '
-                        'button:has-text("Next"), li.next > a'
-                    )
-                    if next_btn:
-                        is_disabled = await next_btn.get_attribute('disabled')
-                        aria_disabled = await next_btn.get_attribute('aria-disabled')
-                        if is_disabled is not None or aria_disabled == 'true':
-                            log.info("[SCRAPER] Next button disabled on page %d, stopping", page_num - 1)
-                            break
-
-                        await next_btn.click()
-                        # Wait for network requests triggered by pagination
-                        await page.wait_for_load_state('networkidle', timeout=15_000)
-                        await asyncio.sleep(random.uniform(2.0, 5.0))
-                        log.info("[SCRAPER] Navigated to page %d", page_num)
+                if 'application/json' not in (response.headers.get('content-type', '')):
+                    return
+                body = await response.json()
+                self.xhr_urls.append(url)
+
+                if self.debug:
+                    self.responses.append({'url': url, 'body': body})
+
+                products = _extract_products_from_response(body)
+                if products:
+                    self.captured += len(products)
+                    if self.on_batch is not None:
+                        self.on_batch(products)
                     else:
-                        # Try URL-based pagination
-                        sep = '&' if '?' in ECHOTIK_PRODUCTS_URL else '?'
-                        page_url = f"{ECHOTIK_PRODUCTS_URL}{sep}page={page_num}"
-                        await page.goto(page_url, wait_until='networkidle', timeout=30_000)
-                        await asyncio.sleep(random.uniform(2.0, 4.0))
-                        log.info("[SCRAPER] Loaded page %d via URL", page_num)
-
-                except PwTimeout:
-                    log.warning("[SCRAPER] Timeout on page %d, continuing with what we have", page_num)
-                    break
-                except Exception as exc:
-                    log.warning("[SCRAPER] Pagination error on page %d: %s", page_num, exc)
+                        self.products.extend(products)
+                    log.info("[SCRAPER] Intercepted %d products from %s", len(products), url[:120])
+                    publish('scraper', status='capturing', captured=self.captured)
+                # Debug runs inspect response shapes the extractor may not know
+                # yet, so any matching JSON XHR counts as the page having loaded
+                if (products or self.debug) and arrived['event'] is not None:
+                    arrived['event'].set()
+            except Exception as exc:
+                log.debug("[SCRAPER] Failed to parse response from %s: %s", url[:80], exc)
+
+        async def load(action, timeout=XHR_TIMEOUT):
+            """
+            Run a navigation ``action`` and wait for the product XHR it
+            triggers. In debug runs a settled page (network idle) also ends
+            the wait, returning whatever was captured.
+            """
+            event = arrived['event'] = asyncio.Event()
+            await action()
+            waits = [asyncio.ensure_future(event.wait())]
+            if self.debug:
+                waits.append(asyncio.ensure_future(page.wait_for_load_state('networkidle')))
+            done, pending = await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for w in pending:
+                w.cancel()
+            for w in done:
+                w.exception()   # a load-state timeout just ends the wait
+            if event.is_set():
+                return
+            if self.debug and done and not _is_login_url(page.url):
+                log.info("[SCRAPER] Debug: page settled without a product XHR on %s", page.url[:120])
+                return
+            raise PwTimeout(f"No product XHR within {timeout:.0f}s")
+
+        page.set_default_timeout(30_000)
+        page.on('response', on_response)
+        return load
+
+
+def _page_url(products_url: str, page_num: int) -> str:
+    sep = '&' if '?' in products_url else '?'
+    return f"{products_url}{sep}page={page_num}"
+
+
+async def _open_listing(page, load, products_url: str):
+    """Load the first listing page; a login redirect or no product data is fatal."""
+    from playwright.async_api import TimeoutError as PwTimeout
+
+    log.info("[SCRAPER] Navigating to %s", products_url)
+    try:
+        await load(lambda: page.goto(products_url, wait_until='domcontentloaded', timeout=45_000),
+                   timeout=max(XHR_TIMEOUT, 45))
+    except PwTimeout:
+        if _is_login_url(page.url):
+            raise ScraperCookieError(
+                f"Redirected to login page ({page.url}). "
+                "Session cookies are expired — re-upload via admin panel."
+            )
+        raise ScraperTimeoutError(f"Timed out waiting for product data on {products_url}")
+
+    # Check for login redirect (cookie expiry detection)
+    if _is_login_url(page.url):
+        raise ScraperCookieError(
+            f"Redirected to login page ({page.url}). "
+            "Session cookies are expired — re-upload via admin panel."
+        )
+
+
+async def _walk_next_button(page, load, capture, pages: int, products_url: str) -> int:
+    """Single-context pagination: Next button, URL fallback. Returns pages loaded after the first."""
+    from playwright.async_api import TimeoutError as PwTimeout
+
+    loaded = 0
+    for page_num in range(2, pages + 1):
+        await _page_pause()
+        try:
+            # Look for pagination controls — try common selectors
+            next_btn = await page.query_selector(
+                'button.next, a.next, [aria-label="Next"], '
+                '.pagination .next, .ant-pagination-next, '
+                'button:has-text("Next"), li.next > a'
+            )
+            if next_btn:
+                is_disabled = await next_btn.get_attribute('disabled')
+                aria_disabled = await next_btn.get_attribute('aria-disabled')
+                if is_disabled is not None or aria_disabled == 'true':
+                    log.info("[SCRAPER] Next button disabled on page %d, stopping", page_num - 1)
                     break
 
+                await load(next_btn.click)
+                log.info("[SCRAPER] Navigated to page %d", page_num)
+            else:
+                # Try URL-based pagination
+                page_url = _page_url(products_url, page_num)
+                await load(lambda: page.goto(page_url, wait_until='domcontentloaded', timeout=30_000))
+                log.info("[SCRAPER] Loaded page %d via URL", page_num)
+            loaded += 1
+            publish('scraper', status='capturing', page=page_num, pages=pages,
+                    captured=capture.captured)
+
+        except PwTimeout:
+            log.warning("[SCRAPER] Timeout on page %d, continuing with what we have", page_num)
+            break
+        except Exception as exc:
+            log.warning("[SCRAPER] Pagination error on page %d: %s", page_num, exc)
+            break
+    return loaded
+
+
+async def _walk_page_queue(worker: int, page, load, capture, page_numbers: asyncio.Queue,
+                           pages: int, products_url: str) -> int:
+    """
+    One context's share of a parallel scrape: take page numbers off the
+    shared queue and load each by URL until the queue is empty. A timeout
+    or error stops this context only. Returns pages loaded.
+    """
+    from playwright.async_api import TimeoutError as PwTimeout
+
+    loaded = 0
+    while True:
+        try:
+            page_num = page_numbers.get_nowait()
+        except asyncio.QueueEmpty:
+            return loaded
+        await _page_pause()
+        page_url = _page_url(products_url, page_num)
+        try:
+            await load(lambda: page.goto(page_url, wait_until='domcontentloaded', timeout=30_000))
+        except PwTimeout:
+            log.warning("[SCRAPER] Context %d: timeout on page %d, stopping this context", worker, page_num)
+            return loaded
+        except Exception as exc:
+            log.warning("[SCRAPER] Context %d: error on page %d: %s", worker, page_num, exc)
+            return loaded
+        loaded += 1
+        log.info("[SCRAPER] Context %d loaded page %d", worker, page_num)
+        publish('scraper', status='capturing', page=page_num, pages=pages, captured=capture.captured)
+
+
+async def scrape_products(
+    pages: int = DEFAULT_PAGES,
+    headed: bool = False,
+    debug: bool = False,
+    products_url: str = ECHOTIK_PRODUCTS_URL,
+    cookies: Optional[list[dict]] = None,
+    contexts: Optional[int] = None,
+) -> dict:
+    """
+    Scrape EchoTik listing pages in pooled browser contexts: load the
+    cookies, navigate the product pages, intercept XHR responses, and
+    return the collected product data. Runs on the browser pool's loop
+    whichever loop awaits it.
+
+    Args:
+        pages:        Number of listing pages to scrape.
+        headed:       If True, run in visible browser mode (for debugging).
+        debug:        If True, return raw XHR data instead of syncing to DB.
+        products_url: Listing URL (overridden by the benchmark's stub site).
+        cookies:      Playwright cookies; default ``load_cookies()``.
+        contexts:     Concurrent browser contexts; default ECHOTIK_SCRAPER_CONTEXTS.
+
+    Returns:
+        Dict with keys: products (list), xhr_urls (list), stats (dict)
+    """
+    return await _pool.call(_scrape(pages, headed, debug, products_url, cookies, contexts))
+
+
+async def _scrape(pages, headed, debug, products_url, cookies, contexts=None, on_batch=None) -> dict:
+    """
+    The scrape itself (pool loop only). Page 1 loads first in one context
+    — a login redirect fails the run before fanning out — then pages
+    2..N are shared out to ``contexts`` contexts through a queue, each
+    loading its pages by URL. With one context the Next button is walked
+    instead. Products go to ``on_batch`` as they're intercepted when
+    given (then ``products`` comes back empty).
+    """
+    if cookies is None:
+        cookies = load_cookies()
+    workers = max(1, min(contexts or SCRAPER_CONTEXTS, pages - 1))
+    capture = _Capture(debug, on_batch)
+
+    start = time.monotonic()
+    launches_before = _pool.launches
+    pages_loaded = 0
+
+    async with AsyncExitStack() as stack:
+        ctxs = [await stack.enter_async_context(_pool.context(cookies, headed)) for _ in range(workers)]
+        open_pages = [await ctx.new_page() for ctx in ctxs]
+        try:
+            loads = [capture.attach(page) for page in open_pages]
+            await _open_listing(open_pages[0], loads[0], products_url)
+            pages_loaded = 1
+
+            if workers == 1:
+                pages_loaded += await _walk_next_button(open_pages[0], loads[0], capture, pages, products_url)
+            elif pages > 1:
+                page_numbers = asyncio.Queue()
+                for page_num in range(2, pages + 1):
+                    page_numbers.put_nowait(page_num)
+                log.info("[SCRAPER] Scraping pages 2-%d across %d contexts", pages, workers)
+                counts = await asyncio.gather(*(
+                    _walk_page_queue(i, page, load, capture, page_numbers, pages, products_url)
+                    for i, (page, load) in enumerate(zip(open_pages, loads))
+                ))
+                pages_loaded += sum(counts)
         finally:
-            await browser.close()
+            for page in open_pages:
+                await _close_quietly(page)
 
+    elapsed = time.monotonic() - start
     stats = {
-        'xhr_urls_captured': len(collected_xhr_urls),
-        'raw_products_captured': len(collected_products),
+        'xhr_urls_captured': len(capture.xhr_urls),
+        'raw_products_captured': capture.captured,
         'pages_attempted': pages,
+        'pages_loaded': pages_loaded,
+        'contexts': workers,
+        'browser_launched': _pool.launches > launches_before,
+        'scrape_s': round(elapsed, 2),
+        'pages_per_min': round(pages_loaded * 60 / elapsed, 1) if elapsed > 0 else None,
     }
 
-    log.info("[SCRAPER] Capture complete: %d XHR calls, %d products",
-             len(collected_xhr_urls), len(collected_products))
+    log.info("[SCRAPER] Capture complete: %d XHR calls, %d products, %d pages in %.1fs (%d contexts)",
+             len(capture.xhr_urls), capture.captured, pages_loaded, elapsed, workers)
 
     return {
-        'products': collected_products,
-        'xhr_urls': collected_xhr_urls,
-        'debug_responses': collected_responses if debug else [],
+        'products': capture.products,
+        'xhr_urls': capture.xhr_urls,
+        'debug_responses': capture.responses if debug else [],
         'stats': stats,
     }
 
@@ -417,6 +776,102 @@ async def scrape_products(
 # Sync pipeline — normalizes captured data and writes to DB
 # ---------------------------------------------------------------------------
 
+def _stored_id(product_id) -> str:
+    """``products.product_id`` for a normalized EchoTik id (``shop_`` prefixed)."""
+    return f"shop_{str(product_id).replace('shop_', '')}"
+
+
+class _StreamingSync:
+    """
+    Normalizes and upserts captured products batch by batch, deduplicated
+    by product_id across pages and contexts, skipping products whose
+    refresh isn't due. ``push`` runs in a worker thread; ``finish`` runs
+    the post-sync image / category passes once and returns the totals.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = set()
+        self.recently_synced = None
+        self.result = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': 0,
+                       'normalize_errors': 0, 'duplicates': 0}
+
+    def push(self, raw_products: list[dict]) -> int:
+        """Normalize + sync one batch. Returns how many products were written."""
+        from app.services.echotik import _normalize_product, sync_to_db
+
+        with self.app.app_context():
+            if self.recently_synced is None:
+                # Get IDs synced within cache window
+                self.recently_synced = _get_recently_synced_ids(self.app)
+                log.info("[SCRAPER] Cache: %d products not due for refresh (will skip)",
+                         len(self.recently_synced))
+
+            normalized = []
+            for raw in raw_products:
+                try:
+                    product = _normalize_product(raw)
+                except Exception as exc:
+                    log.debug("[SCRAPER] Normalize error: %s", exc)
+                    self.result['normalize_errors'] += 1
+                    continue
+                pid = product.get('product_id')
+                if not pid:
+                    self.result['normalize_errors'] += 1
+                    continue
+                key = _stored_id(pid)
+                if key in self.seen:
+                    self.result['duplicates'] += 1
+                    continue
+                self.seen.add(key)
+                if key in self.recently_synced:
+                    self.result['skipped'] += 1  # cached
+                    continue
+                normalized.append(product)
+
+            if normalized:
+                synced = sync_to_db(normalized, post_sync=False)
+                for k in ('created', 'updated', 'errors'):
+                    self.result[k] += synced.get(k, 0)
+        return len(normalized)
+
+    def finish(self) -> dict:
+        from app.services.echotik import run_post_sync
+
+        if self.result['created'] or self.result['updated']:
+            with self.app.app_context():
+                run_post_sync()
+        log.info("[SCRAPER] Synced: %d new, %d updated, %d cached, %d duplicates, %d errors",
+                 self.result['created'], self.result['updated'], self.result['skipped'],
+                 self.result['duplicates'], self.result['errors'] + self.result['normalize_errors'])
+        return dict(self.result)
+
+
+async def _sync_batches(batches: asyncio.Queue, sync: _StreamingSync):
+    """
+    Consumer side of a streamed scrape: drain intercepted batches (``None``
+    ends it) and sync them in a worker thread, so the browser keeps
+    scraping while the DB work runs.
+    """
+    done = False
+    while not done:
+        items = [await batches.get()]
+        while not batches.empty():
+            items.append(batches.get_nowait())
+        done = None in items
+        raw = [p for batch in items if batch for p in batch]
+        if not raw:
+            continue
+        try:
+            written = await asyncio.to_thread(sync.push, raw)
+        except Exception as exc:
+            log.error("[SCRAPER] Batch sync failed (%d products): %s", len(raw), exc)
+            sync.result['errors'] += len(raw)
+            continue
+        publish('scraper', status='capturing', synced=sync.result['created'] + sync.result['updated'],
+                written=written)
+
+
 def sync_scraped_products(app, raw_products: list[dict]) -> dict:
     """
     Normalize and sync scraped products to DB, skipping recently-synced ones.
@@ -426,48 +881,26 @@ def sync_scraped_products(app, raw_products: list[dict]) -> dict:
         raw_products: List of raw product dicts from XHR interception.
 
     Returns:
-        Dict with created/updated/skipped/error counts.
+        Dict with created/updated/skipped/duplicates/error counts.
     """
-    from app.services.echotik import _normalize_product, sync_to_db
-
-    with app.app_context():
-        # Get IDs synced within cache window
-        recently_synced = _get_recently_synced_ids(app)
-        log.info("[SCRAPER] Cache: %d products synced in last %dh (will skip)",
-                 len(recently_synced), CACHE_HOURS)
-
-        # Normalize all products
-        normalized = []
-        normalize_errors = 0
-        for raw in raw_products:
-            try:
-                product = _normalize_product(raw)
-                pid = product.get('product_id')
-                if not pid:
-                    normalize_errors += 1
-                    continue
-                if pid in recently_synced:
-                    continue  # Skip — cached
-                normalized.append(product)
-            except Exception as exc:
-                log.debug("[SCRAPER] Normalize error: %s", exc)
-                normalize_errors += 1
-
-        skipped = len(raw_products) - len(normalized) - normalize_errors
-        log.info("[SCRAPER] After cache filter: %d to sync, %d skipped, %d errors",
-                 len(normalized), skipped, normalize_errors)
+    sync = _StreamingSync(app)
+    sync.push(raw_products)
+    return sync.finish()
 
-        if not normalized:
-            return {
-                'created': 0, 'updated': 0,
-                'skipped': skipped, 'errors': normalize_errors,
-            }
 
-        # Use existing sync pipeline
-        result = sync_to_db(normalized)
-        result['skipped'] = skipped
-        result['normalize_errors'] = normalize_errors
-        return result
+async def _scrape_and_sync(app, pages: int, headed: bool) -> tuple[dict, dict]:
+    """Scrape with every intercepted batch streamed into the sync consumer (pool loop)."""
+    batches = asyncio.Queue()
+    sync = _StreamingSync(app)
+    consumer = asyncio.ensure_future(_sync_batches(batches, sync))
+    try:
+        scrape_result = await _scrape(pages, headed, False, ECHOTIK_PRODUCTS_URL, None,
+                                      on_batch=batches.put_nowait)
+    finally:
+        # Whatever was captured still gets synced, even if the scrape failed
+        batches.put_nowait(None)
+        await consumer
+    return scrape_result, await asyncio.to_thread(sync.finish)
 
 
 # ---------------------------------------------------------------------------
@@ -476,7 +909,8 @@ def sync_scraped_products(app, raw_products: list[dict]) -> dict:
 
 def run_scraper_sync(app, pages: int = DEFAULT_PAGES) -> dict:
     """
-    Full scrape → normalize → sync pipeline. Synchronous wrapper for async scraper.
+    Full scrape → normalize → sync pipeline. Synchronous wrapper for async
+    scraper; products are synced while the scrape is still running.
 
     Args:
         app:   Flask app instance.
@@ -494,38 +928,32 @@ def run_scraper_sync(app, pages: int = DEFAULT_PAGES) -> dict:
             pass
 
     log.info("[SCRAPER] Starting full scrape: %d pages, headed=%s", pages, headed)
+    publish('scraper', status='running', page=0, pages=pages)
     start = time.time()
 
-    # Run async scraper in a fresh event loop (safe for threaded scheduler)
-    loop = asyncio.new_event_loop()
+    # Run on the browser pool's loop (safe for threaded scheduler / job worker)
     try:
-        scrape_result = loop.run_until_complete(
-            scrape_products(pages=pages, headed=headed)
-        )
-    finally:
-        loop.close()
+        scrape_result, sync_result = _pool.run(_scrape_and_sync(app, pages, headed))
+    except Exception as exc:
+        publish('scraper', status='failed', error=str(exc)[:200])
+        raise
 
-    raw_products = scrape_result['products']
-    if not raw_products:
+    raw_captured = scrape_result['stats']['raw_products_captured']
+    if not raw_captured:
         log.warning("[SCRAPER] No products captured from XHR interception")
-        return {
-            'created': 0, 'updated': 0, 'skipped': 0, 'errors': 0,
-            'xhr_urls': len(scrape_result['xhr_urls']),
-            'duration_s': round(time.time() - start, 1),
-        }
-
-    # Sync to database
-    sync_result = sync_scraped_products(app, raw_products)
     sync_result['xhr_urls'] = len(scrape_result['xhr_urls'])
-    sync_result['raw_captured'] = len(raw_products)
+    sync_result['raw_captured'] = raw_captured
+    sync_result['pages_per_min'] = scrape_result['stats']['pages_per_min']
+    sync_result['contexts'] = scrape_result['stats']['contexts']
     sync_result['duration_s'] = round(time.time() - start, 1)
 
     log.info(
         "[SCRAPER] Complete in %.1fs: %d captured → %d new, %d updated, %d skipped, %d errors",
-        sync_result['duration_s'], len(raw_products),
+        sync_result['duration_s'], raw_captured,
         sync_result.get('created', 0), sync_result.get('updated', 0),
         sync_result.get('skipped', 0), sync_result.get('errors', 0),
     )
+    publish('scraper', status='complete', **sync_result)
     return sync_result
 
 
@@ -537,13 +965,7 @@ def run_debug_scrape(app, pages: int = 1) -> dict:
     """
     log.info("[SCRAPER] Debug scrape: %d page(s)", pages)
 
-    loop = asyncio.new_event_loop()
-    try:
-        result = loop.run_until_complete(
-            scrape_products(pages=pages, headed=False, debug=True)
-        )
-    finally:
-        loop.close()
+    result = _pool.run(_scrape(pages, False, True, ECHOTIK_PRODUCTS_URL, None))
 
     # Build debug summary — truncate large payloads
     sample_products = result['products'][:3]  # First 3 products
@@ -0,0 +1,157 @@
+"""
+PRISM — Discord Entitlements
+Who gets Vantage Pro access in Discord, cached per process so the bot's
+subscriber gate doesn't run a User + Subscription query on every message
+in a gated channel.
+
+A Discord user is entitled if their PRISM account is an admin or has an
+active subscription. ``lookup(discord_id)`` answers from a TTL cache
+(unknown users included). Writers that change that state — the PayPal
+webhook, checkout return, cancel, credit fulfilment — call
+``mark_changed(user_id)`` in their transaction: it drops the local entry
+and bumps ``users.entitlement_changed_at``. Other processes (the bot)
+run ``poll_changes()`` every few seconds and drop the entries of users
+bumped since their last poll; ENTITLEMENT_CACHE_SECONDS bounds anything
+that slips past.
+
+Environment variables:
+    ENTITLEMENT_CACHE_SECONDS — cache TTL (default 300)
+    ENTITLEMENT_POLL_SECONDS  — how often the bot polls for changes (default 15)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+ENTITLEMENT_CACHE_SECONDS = float(os.environ.get('ENTITLEMENT_CACHE_SECONDS', '300'))
+ENTITLEMENT_POLL_SECONDS = float(os.environ.get('ENTITLEMENT_POLL_SECONDS', '15'))
+
+_CACHE_MAX = 20000
+
+# user_id is None when no PRISM account is linked to the Discord ID
+Entitlement = namedtuple('Entitlement', 'has_access user_id is_admin')
+
+_cache = {}               # discord_id -> (expires_monotonic, Entitlement)
+_cache_lock = threading.Lock()
+_cursor = None            # (entitlement_changed_at, user id) of the newest change poll_changes saw
+
+
+def _load(discord_id):
+    from app import db
+    from app.models import User, Subscription
+
+    row = db.session.execute(
+        db.select(User.id, User.is_admin).where(User.discord_id == discord_id)
+    ).first()
+    if not row:
+        return Entitlement(False, None, False)
+    if row.is_admin:
+        return Entitlement(True, row.id, True)
+    active = db.session.execute(
+        db.select(Subscription.id)
+        .where(Subscription.user_id == row.id, Subscription.status == 'active')
+        .limit(1)
+    ).first()
+    return Entitlement(active is not None, row.id, False)
+
+
+def lookup(discord_id):
+    """``Entitlement`` for a Discord user. Call inside an app context."""
+    discord_id = str(discord_id)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(discord_id)
+        if hit and hit[0] > now:
+            return hit[1]
+    ent = _load(discord_id)
+    with _cache_lock:
+        if len(_cache) >= _CACHE_MAX:
+            _cache.clear()
+        _cache[discord_id] = (now + ENTITLEMENT_CACHE_SECONDS, ent)
+    return ent
+
+
+def invalidate(*discord_ids):
+    """Drop Discord IDs from this process's cache (everything if none given)."""
+    with _cache_lock:
+        if not discord_ids:
+            _cache.clear()
+        for d in discord_ids:
+            _cache.pop(str(d), None)
+
+
+def mark_changed(user_id):
+    """
+    Record that ``user_id``'s entitlement may have changed. Joins the
+    caller's transaction (no commit).
+    """
+    from app import db
+    from app.models import User
+
+    if user_id is None:
+        return
+    discord_id = db.session.execute(
+        db.update(User).where(User.id == user_id)
+        .values(entitlement_changed_at=datetime.utcnow())
+        .returning(User.discord_id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if discord_id:
+        invalidate(discord_id)
+
+
+def poll_changes():
+    """
+    Invalidate users whose entitlement changed since the last poll.
+    Returns how many were dropped. Call inside an app context.
+    """
+    global _cursor
+    from app import db
+    from app.models import User
+
+    newest_first = (User.entitlement_changed_at.desc(), User.id.desc())
+    if _cursor is None:
+        # First poll: nothing is cached from before, just find the high-water mark
+        top = db.session.execute(
+            db.select(User.entitlement_changed_at, User.id)
+            .where(User.entitlement_changed_at.isnot(None))
+            .order_by(*newest_first).limit(1)
+        ).first()
+        _cursor = tuple(top) if top else (datetime.utcnow(), 0)
+        db.session.commit()
+        return 0
+    # Strictly after the cursor — (changed_at, id) breaks ties between users
+    # bumped in the same instant without re-matching the last one seen
+    changed_at, user_id = _cursor
+    rows = db.session.execute(
+        db.select(User.discord_id, User.entitlement_changed_at, User.id)
+        .where(db.or_(User.entitlement_changed_at > changed_at,
+                      db.and_(User.entitlement_changed_at == changed_at, User.id > user_id)))
+        .order_by(*newest_first)
+    ).all()
+    db.session.commit()
+    ids = [r.discord_id for r in rows if r.discord_id]
+    if rows:
+        _cursor = (rows[0].entitlement_changed_at, rows[0].id)
+    if ids:
+        invalidate(*ids)
+    return len(ids)
+
+
+def entitled_discord_ids():
+    """Discord IDs of every admin or actively subscribed user. Call inside an app context."""
+    from app import db
+    from app.models import User, Subscription
+
+    active = db.select(Subscription.user_id).where(Subscription.status == 'active')
+    rows = db.session.execute(
+        db.select(User.discord_id)
+        .where(User.discord_id.isnot(None),
+               db.or_(User.is_admin == True, User.id.in_(active)))  # noqa: E712
+    ).scalars().all()
+    return {str(d) for d in rows if d}
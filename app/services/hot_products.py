@@ -0,0 +1,201 @@
+"""
+PRISM — Hot Products Pool
+The ranked candidate list behind the Discord bot's daily hot-products
+post. The daily sync builds it once (the ``hot_pool`` stage, after the
+score cache) and stores it in ``system_config``; the bot's daily post and
+``!hotproducts`` just take the top entries.
+
+Building: the opportunity-zone query (40-120 all-time videos, 100+ 7D
+sales, commission, not shown in the last HOT_REPEAT_DAYS), scored,
+sorted and deduplicated by name prefix — the top HOT_POOL_SIZE kept.
+
+Taking: pool entries shown since the repeat cutoff (an earlier post or a
+forced ``!hotproducts``) are skipped, the first ``n`` are returned and
+their ``last_shown_hot`` is set in one UPDATE. A missing, old or used-up
+pool is rebuilt on the spot.
+
+Environment variables:
+    HOT_POOL_SIZE          — candidates kept after ranking (default 45)
+    HOT_POOL_MAX_AGE_HOURS — rebuild a pool older than this (default 36)
+    HOT_REPEAT_DAYS        — days before a product can be posted again (default 3)
+"""
+
+import os
+import json
+import math
+import logging
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+HOT_POOL_SIZE = int(os.environ.get('HOT_POOL_SIZE', '45'))
+HOT_POOL_MAX_AGE_HOURS = float(os.environ.get('HOT_POOL_MAX_AGE_HOURS', '36'))
+HOT_REPEAT_DAYS = float(os.environ.get('HOT_REPEAT_DAYS', '3'))
+
+POOL_CONFIG_KEY = 'hot_products_pool'
+_CANDIDATES = 200
+
+
+def opportunity_score(p):
+    """Opportunity Score (0-99) the Discord hot list has always ranked by."""
+    s7 = p.sales_7d or 0
+    s30 = p.sales_30d or 0
+    comm = p.commission_rate or 0
+    creators = p.influencer_count or 0
+    price = p.price or 0
+
+    # Demand (0-25)
+    demand = min(25, round(math.log10(max(s7, 1) + 1) * 8))
+    # Momentum (0-20)
+    if s30 > 0 and s7 > 0:
+        ratio = s7 / (s30 / 4.3)
+        momentum = min(20, round(ratio * 10))
+    else:
+        momentum = 5
+    # Commission (0-20)
+    c = comm * 100 if comm < 1 else comm
+    commission_score = min(20, round(c * 0.65))
+    # Saturation gap (0-20)
+    if s7 > 0 and creators > 0:
+        sat = s7 / creators
+        saturation = min(20, round(math.log10(max(sat, 1) + 1) * 8))
+    else:
+        saturation = 10
+    # Price fit (0-14)
+    if 10 <= price <= 60:
+        price_fit = 14
+    elif 5 <= price < 10 or 60 < price <= 100:
+        price_fit = 8
+    else:
+        price_fit = 3
+
+    return min(99, demand + momentum + commission_score + saturation + price_fit)
+
+
+def _product_dict(p, score):
+    return {
+        'product_id': p.product_id,
+        'product_name': p.product_name,
+        'seller_name': p.seller_name,
+        'sales': p.sales,
+        'sales_7d': p.sales_7d,
+        'sales_30d': p.sales_30d,
+        'influencer_count': p.influencer_count,
+        'video_count': p.video_count_alltime or p.video_count or 0,
+        'commission_rate': p.commission_rate,
+        'shop_ads_commission': p.shop_ads_commission,
+        'price': p.price,
+        'ad_spend': p.ad_spend,
+        'image_url': p.cached_image_url or p.image_url,
+        'cached_image_url': p.cached_image_url,
+        'has_free_shipping': p.has_free_shipping,
+        'product_url': p.product_url,
+        'live_count': p.live_count,
+        'stock': p.live_count,
+        'opportunity_score': score,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Pool — call inside an app context
+# ---------------------------------------------------------------------------
+
+def build_pool(size=None):
+    """Rank and store the candidate pool. Returns the pool's product dicts. Commits."""
+    from app import db
+    from app.models import Product
+    from app.routes.auth import set_config_value
+
+    cutoff = datetime.utcnow() - timedelta(days=HOT_REPEAT_DAYS)
+    video_count_field = db.func.coalesce(Product.video_count_alltime, Product.video_count)
+    candidates = Product.query.filter(
+        video_count_field >= 40,           # Min 40 all-time videos
+        video_count_field <= 120,          # Max 120 (opportunity zone)
+        Product.sales_7d >= 100,           # 100+ 7D sales
+        Product.commission_rate > 0,       # Must have commission
+        db.or_(Product.product_status == 'active', Product.product_status.is_(None)),
+        db.or_(Product.last_shown_hot.is_(None), Product.last_shown_hot < cutoff),
+    ).order_by(Product.sales_7d.desc().nullslast()).limit(_CANDIDATES).all()
+
+    scored = sorted(((opportunity_score(p), p) for p in candidates),
+                    key=lambda t: t[0], reverse=True)
+    seen_names = set()
+    pool = []
+    for score, p in scored:
+        name_key = (p.product_name or '').lower().strip()[:50]
+        if name_key and name_key not in seen_names:
+            seen_names.add(name_key)
+            pool.append(_product_dict(p, score))
+            if len(pool) >= (size or HOT_POOL_SIZE):
+                break
+
+    set_config_value(POOL_CONFIG_KEY, json.dumps({
+        'built_at': datetime.utcnow().isoformat(),
+        'products': pool,
+    }, default=str))
+    log.info("[HotProducts] pool built: %d of %d candidates", len(pool), len(candidates))
+    return pool
+
+
+def load_pool():
+    """``(built_at, products)`` of the stored pool, or ``(None, [])``."""
+    from app.models import SystemConfig
+
+    row = SystemConfig.query.get(POOL_CONFIG_KEY)
+    if not row or not row.value:
+        return None, []
+    try:
+        data = json.loads(row.value)
+        return datetime.fromisoformat(data['built_at']), data.get('products') or []
+    except (ValueError, KeyError, TypeError):
+        return None, []
+
+
+def _recently_shown(product_ids, cutoff):
+    from app import db
+    from app.models import Product
+
+    if not product_ids:
+        return set()
+    return set(db.session.execute(
+        db.select(Product.product_id)
+        .where(Product.product_id.in_(product_ids), Product.last_shown_hot >= cutoff)
+    ).scalars())
+
+
+def peek(n):
+    """The next ``n`` products ``take`` would return, without marking them shown."""
+    built_at, pool = load_pool()
+    cutoff = datetime.utcnow() - timedelta(days=HOT_REPEAT_DAYS)
+    shown = _recently_shown([p['product_id'] for p in pool], cutoff)
+    return built_at, [p for p in pool if p['product_id'] not in shown][:n]
+
+
+def take(n):
+    """
+    Top ``n`` pool products not shown since the repeat cutoff; marks them
+    shown (one bulk UPDATE). Rebuilds a missing, stale or exhausted pool
+    first. Commits.
+    """
+    from app import db
+    from app.models import Product
+
+    built_at, picked = peek(n)
+    stale = built_at is None or datetime.utcnow() - built_at > timedelta(hours=HOT_POOL_MAX_AGE_HOURS)
+    if stale or len(picked) < n:
+        build_pool()
+        built_at, picked = peek(n)
+
+    if picked:
+        try:
+            db.session.execute(
+                db.update(Product)
+                .where(Product.product_id.in_([p['product_id'] for p in picked]))
+                .values(last_shown_hot=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            log.warning("[HotProducts] last_shown_hot update failed: %s", e)
+            db.session.rollback()
+    return picked
@@ -0,0 +1,259 @@
+"""
+PRISM — Image Warmup
+Pre-signs and prefetches thumbnails for the products most likely to be
+rendered first after a sync, so those page loads are served from the
+/api/image-proxy cache instead of a cold EchoTik CDN round trip.
+
+Candidates:
+    * First ``IMAGE_WARMUP_PAGES`` pages of /app/products for every sort
+    * First page of /app/brand-hunter/<id> for freshly scanned brands
+
+The proxy cache lives in the web process's memory, but the daily sync can
+run in worker.py. Signing (a DB write) happens wherever the warmup runs;
+the byte prefetch only happens in the web process. Elsewhere the warmup
+stores a prefetch request in ``system_config`` and the web process's
+``start_prefetch_watch`` thread picks it up within
+IMAGE_WARMUP_CHECK_SECONDS (and once at boot, so a fresh deploy starts
+warm).
+
+Environment variables:
+    IMAGE_WARMUP_PAGES         — listing pages per sort to warm (default 2)
+    IMAGE_WARMUP_WORKERS       — parallel sign / download workers (default 4)
+    IMAGE_WARMUP_TTL           — seconds warmed bytes stay cached (default 6h)
+    IMAGE_WARMUP_CHECK_SECONDS — how often the web process checks for prefetch requests (default 60)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+IMAGE_WARMUP_PAGES = int(os.environ.get('IMAGE_WARMUP_PAGES', '2'))
+IMAGE_WARMUP_WORKERS = int(os.environ.get('IMAGE_WARMUP_WORKERS', '4'))
+IMAGE_WARMUP_TTL = int(os.environ.get('IMAGE_WARMUP_TTL', str(6 * 3600)))
+IMAGE_WARMUP_CHECK_SECONDS = float(os.environ.get('IMAGE_WARMUP_CHECK_SECONDS', '60'))
+
+PREFETCH_CONFIG_KEY = 'image_warmup_request'
+
+# True in the web process (set by start_prefetch_watch) — the only one whose
+# proxy cache is ever read
+_serves_proxy = False
+
+# Brand Hunter detail renders the top 100 rows by total_videos by default
+BRAND_DETAIL_LIMIT = 100
+
+
+def _listing_candidates(pages):
+    """Products on the first ``pages`` pages of each /app/products sort."""
+    from app.routes.views import (
+        LISTING_PER_PAGE, LISTING_SORTS, _listing_base_query, _listing_order,
+    )
+
+    seen = {}
+    limit = LISTING_PER_PAGE * pages
+    for sort in LISTING_SORTS:
+        rows = _listing_base_query().order_by(_listing_order(sort)).limit(limit).all()
+        for p in rows:
+            seen.setdefault(p.product_id, p)
+    return list(seen.values())
+
+
+def _brand_candidates(brand_ids):
+    """Main-table products backing the first Brand Hunter detail page of each brand."""
+    from app.models import Product, BrandProduct
+
+    pids = set()
+    for bid in brand_ids:
+        rows = (
+            BrandProduct.query
+            .with_entities(BrandProduct.product_id)
+            .filter_by(brand_id=bid)
+            .order_by(BrandProduct.total_videos.desc().nullslast())
+            .limit(BRAND_DETAIL_LIMIT)
+            .all()
+        )
+        for (pid,) in rows:
+            raw = (pid or '').replace('shop_', '')
+            if raw:
+                pids.update((raw, f'shop_{raw}'))
+    if not pids:
+        return []
+    return Product.query.filter(Product.product_id.in_(list(pids))).all()
+
+
+def _prefetch(url):
+    from app.routes.views import _fetch_image_upstream
+    try:
+        return _fetch_image_upstream(url)
+    except Exception as exc:
+        log.debug("[WARMUP] prefetch failed %s: %s", url[:80], exc)
+        return None
+
+
+def _with_images(products):
+    return [p for p in products if p.image_url and p.image_url.startswith('http')]
+
+
+def warm_images(products, workers=None):
+    """
+    Sign every product's image in parallel 10-URL batches, persist the new
+    ``cached_image_url`` values, then download the bytes into the image
+    proxy cache. Must be called inside an app context.
+
+    Returns ``{'candidates', 'signed', 'prefetched', 'failed'}``.
+    """
+    stats = sign_images(products, workers)
+    stats.update(prefetch_images(products, workers))
+    return stats
+
+
+def sign_images(products, workers=None):
+    """Re-sign and persist ``cached_image_url`` for ``products``. Returns ``{'candidates', 'signed'}``."""
+    from app import db
+    from app.services.echotik import _sign_urls_bulk
+
+    workers = workers or IMAGE_WARMUP_WORKERS
+    products = _with_images(products)
+    stats = {'candidates': len(products), 'signed': 0}
+    if not products:
+        return stats
+
+    # 1. Sign — signatures expire after ~3 days, so re-sign everything
+    signed = _sign_urls_bulk([p.image_url for p in products], max_workers=workers)
+    now = datetime.utcnow()
+    for p in products:
+        fresh = signed.get(p.image_url)
+        if fresh and fresh.startswith('http'):
+            p.cached_image_url = fresh[:500]
+            p.image_cached_at = now
+            stats['signed'] += 1
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        log.exception("[WARMUP] signed URL commit failed")
+    return stats
+
+
+def prefetch_images(products, workers=None):
+    """
+    Download ``products``' images into this process's proxy cache.
+    Returns ``{'prefetched', 'failed'}``.
+    """
+    from app.routes.views import _image_cache_get, _image_cache_put
+
+    workers = workers or IMAGE_WARMUP_WORKERS
+    stats = {'prefetched': 0, 'failed': 0}
+
+    # 2. Prefetch — key by the base of the URL the templates will request,
+    # exactly as /api/image-proxy does, skipping anything already warm.
+    jobs = {}
+    for p in _with_images(products):
+        src = p.cached_image_url or p.image_url
+        key = src.split('?', 1)[0]
+        if key not in jobs and not _image_cache_get(key):
+            jobs[key] = src
+    if not jobs:
+        return stats
+
+    keys = list(jobs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, fetched in zip(keys, pool.map(_prefetch, [jobs[k] for k in keys])):
+            if fetched:
+                _image_cache_put(key, fetched[0], fetched[1], ttl=IMAGE_WARMUP_TTL)
+                stats['prefetched'] += 1
+            else:
+                stats['failed'] += 1
+    return stats
+
+
+def _candidates(pages, brand_ids):
+    candidates = {}
+    if pages > 0:
+        for p in _listing_candidates(pages):
+            candidates[p.product_id] = p
+    if brand_ids:
+        for p in _brand_candidates(brand_ids):
+            candidates[p.product_id] = p
+    return list(candidates.values())
+
+
+def warm_listing_images(app, pages=None, brand_ids=None):
+    """
+    Pipeline stage: warm the first listing pages (and, optionally, the
+    Brand Hunter detail pages of ``brand_ids``). Safe to run in a
+    background thread. Outside the web process the prefetch is handed
+    to the web process instead of filling a cache nobody reads.
+    """
+    pages = IMAGE_WARMUP_PAGES if pages is None else pages
+    with app.app_context():
+        candidates = _candidates(pages, brand_ids)
+        stats = sign_images(candidates)
+        if _serves_proxy:
+            stats.update(prefetch_images(candidates))
+        else:
+            request_prefetch(pages, brand_ids)
+            stats.update({'prefetched': 0, 'failed': 0, 'prefetch': 'requested'})
+        log.info(
+            "[WARMUP] %d candidates: %d signed, %d prefetched, %d failed",
+            stats['candidates'], stats['signed'], stats['prefetched'], stats['failed'],
+        )
+        return stats
+
+
+def request_prefetch(pages, brand_ids=None):
+    """Ask the web process to prefetch these candidates. Commits."""
+    from app.routes.auth import set_config_value
+
+    set_config_value(PREFETCH_CONFIG_KEY, json.dumps({
+        'at': datetime.utcnow().isoformat(),
+        'pages': pages,
+        'brand_ids': list(brand_ids or []),
+    }))
+
+
+def _pending_request():
+    from app import db
+    from app.models import SystemConfig
+
+    row = SystemConfig.query.get(PREFETCH_CONFIG_KEY)
+    value = row.value if row else None
+    db.session.rollback()
+    return value
+
+
+def start_prefetch_watch(app):
+    """
+    Web-process boot hook: prefetch whenever a new request is stored (and
+    once at boot for the latest one). Safe to call twice.
+    """
+    global _serves_proxy
+    if _serves_proxy:
+        return
+    _serves_proxy = True
+    if os.environ.get('SKIP_SCHEDULER'):
+        return
+
+    def _watch():
+        seen = None
+        while True:
+            try:
+                with app.app_context():
+                    value = _pending_request()
+                    if value and value != seen:
+                        seen = value
+                        req = json.loads(value)
+                        candidates = _candidates(req.get('pages', IMAGE_WARMUP_PAGES), req.get('brand_ids'))
+                        stats = prefetch_images(candidates)
+                        log.info("[WARMUP] Prefetched %d images for request %s (%d failed)",
+                                 stats['prefetched'], req.get('at'), stats['failed'])
+            except Exception:
+                log.exception("[WARMUP] prefetch watch failed")
+            time.sleep(IMAGE_WARMUP_CHECK_SECONDS)
+
+    threading.Thread(target=_watch, daemon=True, name='image-prefetch-watch').start()
@@ -0,0 +1,389 @@
+"""
+PRISM — Durable Job Queue
+Database-backed background jobs that survive deploys, replacing the
+in-process ``app.executor`` for admin "run now" work and scheduled runs.
+
+Jobs are ``queue_jobs`` rows. A worker claims the highest-priority
+runnable job under a lease (``SELECT ... FOR UPDATE SKIP LOCKED`` on
+Postgres, then a conditional UPDATE — the UPDATE alone is what makes the
+claim safe on SQLite) and renews the lease while the handler runs. If the
+worker dies, the lease expires and the job is claimed again; a failed
+attempt is retried with exponential backoff until ``max_attempts``.
+
+Handlers are looked up by ``kind`` in ``HANDLERS`` and called as
+``fn(app, **payload)`` inside an app context; their return value is
+stored as ``result_json``.
+
+The APScheduler scheduler only enqueues (see services/scheduler), and
+only the process holding scheduler leadership (services/leases) fires.
+Jobs run wherever a ``JobWorker`` runs: embedded in the web process by
+default (started from main.py via ``start_web_services`` — never from
+``create_app``, so the Discord bot and scripts importing ``app`` don't
+claim jobs), or in the dedicated ``worker.py`` process with
+JOB_WORKER_EMBEDDED=0 on the web service (the Procfile sets it).
+
+Environment variables:
+    JOB_WORKER_CONCURRENCY — jobs one worker runs at once (default 2)
+    JOB_WORKER_EMBEDDED    — run a worker inside the web process (default 1;
+                             set 0 when a worker.py process is deployed)
+    JOB_LEASE_SECONDS      — lease length; renewed every quarter (default 120)
+    JOB_POLL_SECONDS       — idle poll interval (default 2)
+"""
+
+import os
+import json
+import signal
+import logging
+import importlib
+import threading
+from datetime import datetime, timedelta
+
+from app.services.leases import PROCESS_OWNER
+
+log = logging.getLogger(__name__)
+
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '2'))
+JOB_WORKER_EMBEDDED = os.environ.get('JOB_WORKER_EMBEDDED', '1') != '0'
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '120'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+
+# First retry after a minute, doubling per attempt
+_RETRY_BASE_SECONDS = 60
+# Finished jobs are kept this long for the admin job list
+_KEEP_FINISHED_DAYS = 14
+
+# kind -> 'module:function', resolved lazily so workers import only what they run
+HANDLERS = {
+    'daily_sync': 'app.services.scheduler:daily_sync',
+    'trickle_refresh': 'app.services.trickle:trickle_refresh',
+    'echotik_scraper': 'app.services.echotik_scraper:run_scraper_sync',
+    'ai_image': 'app.services.ai_media:run_image_job',
+    'ai_video': 'app.services.ai_media:run_video_job',
+}
+
+
+def _resolve(kind):
+    target = HANDLERS.get(kind)
+    if target is None:
+        raise KeyError(f"No job handler registered for '{kind}'")
+    if callable(target):
+        return target
+    module, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module), attr)
+
+
+# ---------------------------------------------------------------------------
+# Queue operations — call inside an app context
+# ---------------------------------------------------------------------------
+
+def enqueue(kind, payload=None, priority=0, max_attempts=3, run_after=None, dedupe_key=None):
+    """
+    Add a job. With ``dedupe_key``, an already queued or running job with
+    the same key is returned instead of adding another.
+
+    Returns ``(job_id, created)``. Commits.
+    """
+    from app import db
+    from app.models import QueueJob
+
+    if kind not in HANDLERS:
+        raise KeyError(f"No job handler registered for '{kind}'")
+    if dedupe_key:
+        existing = db.session.execute(
+            db.select(QueueJob.id).where(
+                QueueJob.dedupe_key == dedupe_key,
+                QueueJob.status.in_(['queued', 'running']),
+            ).limit(1)
+        ).scalar()
+        if existing:
+            return existing, False
+
+    job = QueueJob(
+        kind=kind,
+        payload_json=json.dumps(payload or {}, default=str),
+        priority=priority,
+        max_attempts=max(1, max_attempts),
+        run_after=run_after or datetime.utcnow(),
+        dedupe_key=dedupe_key,
+        status='queued',
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id, True
+
+
+def claim(owner, limit=1):
+    """
+    Lease up to ``limit`` runnable jobs to ``owner``: queued jobs that are
+    due, and running jobs whose lease expired. Running jobs out of attempts
+    are marked failed instead. Returns ``[(id, kind, payload)]``. Commits.
+    """
+    from app import db
+    from app.models import QueueJob
+
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        db.select(QueueJob.id, QueueJob.kind, QueueJob.payload_json, QueueJob.status,
+                  QueueJob.attempts, QueueJob.max_attempts, QueueJob.lease_owner)
+        .where(db.or_(
+            db.and_(QueueJob.status == 'queued', QueueJob.run_after <= now),
+            db.and_(QueueJob.status == 'running', QueueJob.lease_expires_at < now),
+        ))
+        .order_by(QueueJob.priority.desc(), QueueJob.id)
+        .limit(limit * 4)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    claimed = []
+    for c in candidates:
+        if len(claimed) >= limit:
+            break
+        # Same status + lease owner as we read → nobody claimed it in between
+        unchanged = db.and_(
+            QueueJob.id == c.id,
+            QueueJob.status == c.status,
+            QueueJob.lease_owner.is_(None) if c.lease_owner is None
+            else QueueJob.lease_owner == c.lease_owner,
+        )
+        if c.status == 'running' and (c.attempts or 0) >= (c.max_attempts or 1):
+            db.session.execute(
+                db.update(QueueJob).where(unchanged).values(
+                    status='failed', lease_owner=None, lease_expires_at=None,
+                    completed_at=now, last_error='Lease expired — worker died mid-run',
+                ).execution_options(synchronize_session=False)
+            )
+            continue
+        result = db.session.execute(
+            db.update(QueueJob).where(unchanged).values(
+                status='running',
+                attempts=QueueJob.attempts + 1,
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                heartbeat_at=now,
+                started_at=now,
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            try:
+                payload = json.loads(c.payload_json) if c.payload_json else {}
+            except (TypeError, ValueError):
+                payload = {}
+            claimed.append((c.id, c.kind, payload))
+    db.session.commit()
+    return claimed
+
+
+def heartbeat(job_ids, owner):
+    """Extend ``owner``'s leases on ``job_ids``. Returns the ids still held. Commits."""
+    from app import db
+    from app.models import QueueJob
+
+    if not job_ids:
+        return set()
+    now = datetime.utcnow()
+    db.session.execute(
+        db.update(QueueJob)
+        .where(QueueJob.id.in_(list(job_ids)), QueueJob.lease_owner == owner,
+               QueueJob.status == 'running')
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    held = {r[0] for r in db.session.execute(
+        db.select(QueueJob.id).where(QueueJob.id.in_(list(job_ids)),
+                                     QueueJob.lease_owner == owner)
+    ).all()}
+    db.session.commit()
+    return held
+
+
+def complete(job_id, owner, result=None):
+    """Mark ``job_id`` complete if ``owner`` still holds it. Commits."""
+    from app import db
+    from app.models import QueueJob
+
+    db.session.execute(
+        db.update(QueueJob)
+        .where(QueueJob.id == job_id, QueueJob.lease_owner == owner)
+        .values(status='complete', lease_owner=None, lease_expires_at=None,
+                completed_at=datetime.utcnow(), last_error=None,
+                result_json=json.dumps(result, default=str)[:20000] if result is not None else None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def fail(job_id, owner, error):
+    """
+    Record a failed attempt: requeue with backoff, or mark the job failed
+    once it's out of attempts. Returns the new status. Commits.
+    """
+    from app import db
+    from app.models import QueueJob
+
+    job = db.session.get(QueueJob, job_id, populate_existing=True)
+    if not job or job.lease_owner != owner:
+        db.session.rollback()
+        return None
+    now = datetime.utcnow()
+    job.last_error = str(error)[:500]
+    job.lease_owner = None
+    job.lease_expires_at = None
+    if (job.attempts or 0) >= (job.max_attempts or 1):
+        job.status = 'failed'
+        job.completed_at = now
+    else:
+        job.status = 'queued'
+        job.run_after = now + timedelta(seconds=_RETRY_BASE_SECONDS * 2 ** ((job.attempts or 1) - 1))
+    db.session.commit()
+    return job.status
+
+
+def recent_jobs(limit=50):
+    """Newest jobs first, as dicts — for the admin job list."""
+    from app.models import QueueJob
+
+    return [j.to_dict() for j in
+            QueueJob.query.order_by(QueueJob.id.desc()).limit(limit).all()]
+
+
+def purge_finished(older_than_days=_KEEP_FINISHED_DAYS):
+    """Delete complete / failed jobs older than ``older_than_days``. Commits."""
+    from app import db
+    from app.models import QueueJob
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    n = QueueJob.query.filter(
+        QueueJob.status.in_(['complete', 'failed']),
+        QueueJob.completed_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+class JobWorker:
+    """
+    Runs queued jobs on ``concurrency`` threads, each claiming one job at a
+    time, plus a heartbeat thread that renews every in-flight lease.
+    """
+
+    def __init__(self, app, concurrency=None, owner=None):
+        self.app = app
+        self.concurrency = max(1, concurrency or JOB_WORKER_CONCURRENCY)
+        self.owner = owner or PROCESS_OWNER
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return self
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._run_loop, daemon=True, name=f'job-worker-{i + 1}')
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat_loop, daemon=True, name='job-heartbeat')
+        t.start()
+        self._threads.append(t)
+        log.info("[JOBS] worker %s started (%d slots)", self.owner, self.concurrency)
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop claiming and wait up to ``timeout`` for running jobs. Jobs that
+        don't finish keep their lease until it expires, then get retried.
+        """
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def run_forever(self):
+        """Start and block until SIGTERM / SIGINT (the worker.py entry point)."""
+        def _shutdown(signum, frame):
+            log.info("[JOBS] signal %s — finishing in-flight jobs", signum)
+            self._stop.set()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+        self.start()
+        while not self._stop.wait(1):
+            pass
+        self.stop(timeout=25)
+
+    # -- internals ---------------------------------------------------------
+
+    def _run_loop(self):
+        while not self._stop.is_set():
+            picked = []
+            with self.app.app_context():
+                try:
+                    picked = claim(self.owner, limit=1)
+                except Exception:
+                    log.exception("[JOBS] claim failed")
+                    _rollback()
+            if not picked:
+                self._stop.wait(JOB_POLL_SECONDS)
+                continue
+            self._run(*picked[0])
+
+    def _run(self, job_id, kind, payload):
+        with self._lock:
+            self._in_flight.add(job_id)
+        log.info("[JOBS] running #%s %s", job_id, kind)
+        try:
+            fn = _resolve(kind)
+            with self.app.app_context():
+                result = fn(self.app, **payload)
+            with self.app.app_context():
+                complete(job_id, self.owner, result)
+            log.info("[JOBS] #%s %s complete", job_id, kind)
+        except Exception as e:
+            log.exception("[JOBS] #%s %s failed", job_id, kind)
+            with self.app.app_context():
+                try:
+                    status = fail(job_id, self.owner, e)
+                    log.info("[JOBS] #%s %s → %s", job_id, kind, status)
+                except Exception:
+                    log.exception("[JOBS] recording failure of #%s failed", job_id)
+                    _rollback()
+        finally:
+            with self._lock:
+                self._in_flight.discard(job_id)
+
+    def _heartbeat_loop(self):
+        last_purge = None
+        while not self._stop.wait(max(1, JOB_LEASE_SECONDS // 4)):
+            with self._lock:
+                ids = set(self._in_flight)
+            with self.app.app_context():
+                try:
+                    lost = ids - heartbeat(ids, self.owner)
+                    for job_id in lost:
+                        log.warning("[JOBS] lease on #%s lost — another worker may retry it", job_id)
+                    now = datetime.utcnow()
+                    if last_purge is None or now - last_purge > timedelta(hours=6):
+                        last_purge = now
+                        purge_finished()
+                except Exception:
+                    log.exception("[JOBS] heartbeat failed")
+                    _rollback()
+
+
+def _rollback():
+    from app import db
+    try: db.session.rollback()
+    except Exception: pass
+
+
+def start_embedded_worker(app):
+    """Boot hook: run a JobWorker in this process unless disabled. Safe to call twice."""
+    if getattr(start_embedded_worker, '_worker', None) is not None:
+        return start_embedded_worker._worker
+    if os.environ.get('SKIP_SCHEDULER') or not JOB_WORKER_EMBEDDED:
+        return None
+    start_embedded_worker._worker = JobWorker(app).start()
+    return start_embedded_worker._worker
@@ -0,0 +1,248 @@
+"""
+PRISM — Service Leases
+Cross-process locks kept in the database, so they hold across gunicorn
+workers, the job worker and the Discord bot process — a module-level flag
+only holds inside the process that set it.
+
+Lease rows (``service_leases``):
+    ``acquire(name, owner, ttl)`` is a conditional UPDATE that only
+    succeeds while the lease is free, expired or already held by
+    ``owner``. Holders renew before the TTL runs out; a crashed holder's
+    lease simply expires. Works on every dialect, SQLite included.
+
+Leader election (``LeaderElection``):
+    One instance of a role — the APScheduler scheduler — across every
+    process that imports the app. On Postgres the leader holds a
+    session-level ``pg_try_advisory_lock`` on a dedicated connection,
+    which the server releases the moment that connection or process
+    dies. Other dialects fall back to a renewed lease row.
+
+Environment variables:
+    LEADER_CHECK_SECONDS — how often leadership is verified / retried (default 30)
+"""
+
+import os
+import json
+import uuid
+import zlib
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+LEADER_CHECK_SECONDS = int(os.environ.get('LEADER_CHECK_SECONDS', '30'))
+
+# Identifies this process in lease / queue owner columns
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+# ---------------------------------------------------------------------------
+# Lease rows
+# ---------------------------------------------------------------------------
+
+def acquire(name, owner, ttl, info=None):
+    """
+    Take or renew lease ``name`` for ``ttl`` seconds. Returns True when
+    ``owner`` holds it afterwards. Commits.
+    """
+    from app import db
+    from app.models import ServiceLease
+    from sqlalchemy.exc import IntegrityError
+
+    now = datetime.utcnow()
+    values = {
+        'owner': owner,
+        'expires_at': now + timedelta(seconds=ttl),
+        'acquired_at': db.case((ServiceLease.owner == owner, ServiceLease.acquired_at), else_=now),
+    }
+    if info is not None:
+        values['info_json'] = json.dumps(info, default=str)
+    try:
+        result = db.session.execute(
+            db.update(ServiceLease)
+            .where(ServiceLease.name == name,
+                   db.or_(ServiceLease.owner == owner,
+                          ServiceLease.owner.is_(None),
+                          ServiceLease.expires_at < now))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            db.session.commit()
+            return True
+        if db.session.get(ServiceLease, name) is not None:
+            db.session.rollback()
+            return False
+        db.session.add(ServiceLease(
+            name=name, owner=owner, acquired_at=now, expires_at=values['expires_at'],
+            info_json=values.get('info_json'),
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # Another process inserted the row first
+        db.session.rollback()
+        return False
+    except Exception:
+        log.exception("[LEASE] acquire %s failed", name)
+        db.session.rollback()
+        return False
+
+
+def release(name, owner):
+    """Give up lease ``name`` if ``owner`` holds it. Commits."""
+    from app import db
+    from app.models import ServiceLease
+
+    try:
+        db.session.execute(
+            db.update(ServiceLease)
+            .where(ServiceLease.name == name, ServiceLease.owner == owner)
+            .values(owner=None, expires_at=None, info_json=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception:
+        log.exception("[LEASE] release %s failed", name)
+        db.session.rollback()
+
+
+def holder(name):
+    """The live holder of lease ``name`` as a dict, or None when it's free or expired."""
+    from app import db
+    from app.models import ServiceLease
+
+    row = db.session.get(ServiceLease, name, populate_existing=True)
+    if not row or not row.owner or not row.expires_at or row.expires_at < datetime.utcnow():
+        return None
+    try:
+        info = json.loads(row.info_json) if row.info_json else {}
+    except (TypeError, ValueError):
+        info = {}
+    return {'owner': row.owner, 'info': info,
+            'acquired_at': row.acquired_at, 'expires_at': row.expires_at}
+
+
+# ---------------------------------------------------------------------------
+# Leader election
+# ---------------------------------------------------------------------------
+
+class LeaderElection:
+    """
+    Keeps trying to become the single holder of role ``name``;
+    ``on_change(is_leader)`` fires whenever this process gains or loses it.
+    """
+
+    def __init__(self, app, name, on_change=None, check_seconds=None):
+        self.app = app
+        self.name = name
+        self.on_change = on_change
+        self.check_seconds = check_seconds or LEADER_CHECK_SECONDS
+        self.is_leader = False
+        self.owner = f"{PROCESS_OWNER}:{uuid.uuid4().hex[:6]}"
+        self._conn = None
+        self._key = zlib.crc32(f'prism:{name}'.encode())
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True,
+                                            name=f'leader-{self.name}')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self.app.app_context():
+            self._resign()
+
+    def check(self):
+        """Verify or try to take leadership once. Returns ``is_leader``."""
+        from app import db
+
+        with self.app.app_context():
+            if db.engine.dialect.name == 'postgresql':
+                leader = self._check_advisory(db)
+            else:
+                leader = acquire(f'leader:{self.name}', self.owner,
+                                 ttl=self.check_seconds * 3)
+        self._set(leader)
+        return leader
+
+    # -- internals ---------------------------------------------------------
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:
+                log.exception("[LEADER] %s check failed", self.name)
+                self._set(False)
+            self._stop.wait(self.check_seconds)
+
+    def _check_advisory(self, db):
+        if self._conn is not None:
+            try:
+                self._conn.execute(db.text('SELECT 1'))
+                self._conn.commit()
+                return True
+            except Exception:
+                log.warning("[LEADER] %s: lock connection lost", self.name)
+                self._close_conn()
+
+        conn = db.engine.connect()
+        try:
+            got = conn.execute(db.text('SELECT pg_try_advisory_lock(:k)'), {'k': self._key}).scalar()
+            # Session-level lock: it outlives the transaction, so don't sit idle in one
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if got:
+            self._conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _close_conn(self):
+        """
+        Release the advisory lock and drop the lock connection. The
+        connection came from the engine's pool, where ``close()`` would
+        only check it back in with the session — and the lock — still
+        open, so unlock explicitly and ``invalidate()`` it to really end
+        the session.
+        """
+        from app import db
+
+        conn, self._conn = self._conn, None
+        try:
+            conn.execute(db.text('SELECT pg_advisory_unlock(:k)'), {'k': self._key})
+            conn.commit()
+        except Exception:
+            pass
+        try:
+            conn.invalidate()
+        except Exception:
+            pass
+
+    def _resign(self):
+        if self._conn is not None:
+            self._close_conn()
+        elif self.is_leader:
+            release(f'leader:{self.name}', self.owner)
+        self._set(False)
+
+    def _set(self, leader):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        log.info("[LEADER] %s: %s", self.name, 'acquired' if leader else 'lost')
+        if self.on_change:
+            try:
+                self.on_change(leader)
+            except Exception:
+                log.exception("[LEADER] %s on_change failed", self.name)
+
@@ -0,0 +1,281 @@
+"""
+PRISM — Product Lookup Pipeline
+Turns what a user pasted — a TikTok share URL or a raw product ID — into
+a saved product row. Shared by the search-bar lookup (/api/products/lookup)
+and the external API scan workers (services/scan_jobs).
+
+    query → product_id (+ region)      share URL via services/share_links
+          → DB row, if present and fresh enough
+          → otherwise EchoTik realtime detail → sync_to_db
+
+Failures raise ``LookupFailed`` with a user-facing message and the HTTP
+status the web route answers with.
+
+``lookup_many`` is the batch variant behind /api/lookup/batch: share links
+resolve in parallel, product IDs are deduplicated, fresh rows come from
+the DB, and the rest are fetched with batched detail calls (all EchoTik
+traffic goes through its shared rate limiter). Results are yielded as
+they finish and nothing is saved.
+
+Environment variables:
+    LOOKUP_BATCH_MAX     — queries accepted per batch (default 300)
+    LOOKUP_BATCH_WORKERS — share-link resolves / detail calls in flight (default 8)
+"""
+
+import os
+import re
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+log = logging.getLogger(__name__)
+
+LOOKUP_BATCH_MAX = int(os.environ.get('LOOKUP_BATCH_MAX', '300'))
+LOOKUP_BATCH_WORKERS = int(os.environ.get('LOOKUP_BATCH_WORKERS', '8'))
+
+_TIKTOK_URL_RE = re.compile(r'^(?:https?://)?(?:[\w-]+\.)?tiktok\.com/', re.IGNORECASE)
+_PRODUCT_ID_RE = re.compile(r'^\d{15,}$')
+
+
+class LookupFailed(Exception):
+    """A lookup that can't produce a product; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_query(query):
+    """
+    ``(raw_id, region, source)`` for a TikTok share URL or raw product ID,
+    where source is 'share_url' or 'product_id'. Raises ``LookupFailed``.
+    """
+    query = (query or '').strip()
+    if not query:
+        raise LookupFailed('Missing query', 400)
+
+    if _TIKTOK_URL_RE.match(query):
+        from app.services.share_links import resolve
+        try:
+            raw_id, region = resolve(query)
+        except Exception as e:
+            log.warning("[ProductLookup] resolve %r err: %s", query, e)
+            raw_id, region = None, 'US'
+        if not raw_id:
+            raise LookupFailed('Could not extract a product from that TikTok link. '
+                               'Make sure it is a TikTok Shop product link, not a regular video.')
+        return raw_id, region, 'share_url'
+
+    if _PRODUCT_ID_RE.match(query):
+        return query, 'US', 'product_id'
+
+    raise LookupFailed('Not a TikTok URL or product ID', 400)
+
+
+def product_summary(p):
+    """Public fields of a Product row — the payload external API clients get."""
+    return {
+        'product_id': p.product_id,
+        'product_name': p.product_name,
+        'seller_name': p.seller_name,
+        'category': p.category,
+        'price': p.price,
+        'original_price': p.original_price,
+        'commission_rate': p.commission_rate,
+        'shop_ads_commission': p.shop_ads_commission,
+        'sales': p.sales,
+        'sales_7d': p.sales_7d,
+        'sales_30d': p.sales_30d,
+        'gmv': p.gmv,
+        'influencer_count': p.influencer_count,
+        'video_count': p.video_count,
+        'live_count': p.live_count,
+        'opportunity_score': p.cached_score,
+        'image_url': p.cached_image_url or p.image_url,
+        'product_url': p.product_url or f"https://www.tiktok.com/shop/pdp/{p.product_id.replace('shop_', '')}",
+        'last_synced': p.last_echotik_sync.isoformat() if p.last_echotik_sync else None,
+    }
+
+
+def lookup_product(query, refresh_due=False):
+    """
+    Resolve ``query`` to a saved product. An existing row is returned as-is
+    (source 'database') unless ``refresh_due`` is set and its adaptive
+    refresh is due, in which case it's re-fetched first. If the re-fetch
+    comes back empty the existing row is still returned.
+
+    Returns ``{'source', 'product_id', 'product'}`` where product is a
+    ``product_summary`` dict (None if the sync didn't persist the row).
+    Call inside an app context. Raises ``LookupFailed``.
+    """
+    from app import db
+    from app.models import Product
+    from app.services.refresh_policy import is_due
+
+    raw_id, region, source = parse_query(query)
+    db_key = f"shop_{raw_id}"
+
+    existing = db.session.get(Product, db_key)
+    if existing and not (refresh_due and is_due(existing)):
+        return {'source': 'database', 'product_id': db_key, 'product': product_summary(existing)}
+
+    try:
+        from app.services.echotik import fetch_product_detail_realtime
+        product_data = fetch_product_detail_realtime(raw_id, region=region)
+    except Exception as e:
+        log.warning("[ProductLookup] realtime fetch %s err: %s", raw_id, e)
+        product_data = None
+
+    if not product_data:
+        if existing:
+            return {'source': 'database', 'product_id': db_key, 'product': product_summary(existing)}
+        raise LookupFailed('Product not found on TikTok Shop. It may be region-restricted '
+                           'or delisted.')
+
+    # Make sure product_id matches what we looked up (sync_to_db prefixes it)
+    product_data['product_id'] = raw_id
+    try:
+        from app.services.echotik import sync_to_db
+        sync_to_db([product_data])
+    except Exception as e:
+        log.warning("[ProductLookup] sync_to_db %s err: %s", raw_id, e)
+        try: db.session.rollback()
+        except Exception: pass
+
+    row = db.session.get(Product, db_key, populate_existing=True)
+    return {'source': source, 'product_id': db_key,
+            'product': product_summary(row) if row else None}
+
+
+# ---------------------------------------------------------------------------
+# Batch lookup
+# ---------------------------------------------------------------------------
+
+def _preview(p, query):
+    """Batch preview row from a Product or a normalized EchoTik dict."""
+    if not isinstance(p, dict):
+        p = product_summary(p)
+    return {
+        'product_id': str(p.get('product_id') or '').replace('shop_', ''),
+        'product_name': p.get('product_name') or 'Unknown',
+        'image_url': p.get('image_url'),
+        'seller_name': p.get('seller_name') or 'Unknown',
+        'price': p.get('price'),
+        'sales_7d': p.get('sales_7d'),
+        'video_count': p.get('video_count', p.get('video_count_alltime')),
+        'influencer_count': p.get('influencer_count'),
+        'commission_rate': p.get('commission_rate'),
+        'url': query,
+    }
+
+
+def _parse_in_app(app, query):
+    with app.app_context():
+        return parse_query(query)
+
+
+def lookup_many(queries, workers=None):
+    """
+    Look up many share URLs / product IDs without saving anything.
+
+    Yields one dict per distinct query as soon as it's answered, in
+    completion order: ``{'url', 'success': True, 'source', 'product'}``
+    (source 'database' or 'echotik', product a preview row) or
+    ``{'url', 'success': False, 'error'}``.
+
+    Share links resolve on a thread pool; each product ID is looked up
+    once however many queries point at it. Rows whose adaptive refresh
+    isn't due are answered from the DB; the rest are fetched
+    ``DETAIL_BATCH_SIZE`` per call, falling back to the stale row if
+    EchoTik comes back empty. Call inside an app context.
+    """
+    from flask import current_app
+    from app.models import Product
+    from app.services.refresh_policy import is_due
+    from app.services.echotik import fetch_product_details, DETAIL_BATCH_SIZE
+
+    app = current_app._get_current_object()
+    queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    waiting = {}      # raw_id -> queries awaiting it
+    answered = {}     # raw_id -> (source, product) | None when not found
+    pending = []      # resolved ids not yet checked against the DB
+    running = {}      # future -> ('resolve', query) | ('fetch', ids, stale rows)
+
+    def answer(raw_id, source, product):
+        answered[raw_id] = (source, product) if product is not None else None
+        return [_result(q, answered[raw_id]) for q in waiting.pop(raw_id, [])]
+
+    def resolved(query, raw_id):
+        if raw_id in answered:
+            return [_result(query, answered[raw_id])]
+        if raw_id not in waiting:
+            pending.append(raw_id)
+        waiting.setdefault(raw_id, []).append(query)
+        return []
+
+    def dispatch(pool, force):
+        """Answer what the DB can; submit detail fetches for the rest."""
+        out = []
+        while pending and (force or len(pending) >= DETAIL_BATCH_SIZE):
+            chunk = pending[:DETAIL_BATCH_SIZE]
+            del pending[:DETAIL_BATCH_SIZE]
+            rows = {p.product_id.replace('shop_', ''): p for p in
+                    Product.query.filter(Product.product_id.in_([f"shop_{i}" for i in chunk]))}
+            stale = {}
+            for raw_id in chunk:
+                row = rows.get(raw_id)
+                if row is not None and not is_due(row):
+                    out += answer(raw_id, 'database', row)
+                else:
+                    stale[raw_id] = row
+            if stale:
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, fetch_product_details, list(stale))] = ('fetch', stale)
+        return out
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or LOOKUP_BATCH_WORKERS),
+                            thread_name_prefix='lookup-batch') as pool:
+        for query in queries:
+            if _PRODUCT_ID_RE.match(query):
+                yield from resolved(query, query)
+            else:
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, _parse_in_app, app, query)] = ('resolve', query)
+        yield from dispatch(pool, force=not any(t[0] == 'resolve' for t in running.values()))
+
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                task = running.pop(fut)
+                if task[0] == 'resolve':
+                    try:
+                        raw_id = fut.result()[0]
+                    except LookupFailed as e:
+                        yield {'url': task[1], 'success': False, 'error': str(e)}
+                        continue
+                    except Exception as e:
+                        log.warning("[ProductLookup] resolve %r err: %s", task[1], e)
+                        yield {'url': task[1], 'success': False, 'error': 'Could not resolve link'}
+                        continue
+                    yield from resolved(task[1], raw_id)
+                else:
+                    stale = task[1]
+                    try:
+                        found = fut.result()
+                    except Exception as e:
+                        log.warning("[ProductLookup] batch detail %s err: %s", list(stale), e)
+                        found = {}
+                    for raw_id, row in stale.items():
+                        if raw_id in found:
+                            yield from answer(raw_id, 'echotik', found[raw_id])
+                        else:
+                            yield from answer(raw_id, 'database', row)
+            # Flush partial chunks once no resolve can add to them
+            yield from dispatch(pool, force=not any(t[0] == 'resolve' for t in running.values()))
+
+
+def _result(query, hit):
+    if hit is None:
+        return {'url': query, 'success': False, 'error': 'Not found'}
+    source, product = hit
+    return {'url': query, 'success': True, 'source': source, 'product': _preview(product, query)}
@@ -0,0 +1,207 @@
+"""
+PRISM — Stage Pipeline
+Small dependency-graph executor for scheduler stages.
+
+Stages declare the stages they must run after; everything whose
+dependencies have finished runs concurrently on a bounded pool, each in
+its own app context (so each gets its own SQLAlchemy session). EchoTik
+calls from every stage draw on the one global ``echotik.rate_limiter``,
+which is the shared rate budget — running stages side by side never
+raises the request rate, it only fills the gaps a sequential run leaves.
+
+Dependencies order stages, they don't gate them: a stage still runs if
+one of its dependencies failed, matching the old sequential sync where
+every step ran regardless.
+
+Per stage the executor records wall time, EchoTik API calls (counted by
+the rate limiter through ``current_meter``) and rows touched (DML
+rowcounts via a SQLAlchemy cursor hook), and reports the critical path —
+the dependency chain that determined the total run time.
+
+Environment variables:
+    PIPELINE_STAGE_WORKERS — stages run at once (default 3)
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+log = logging.getLogger(__name__)
+
+PIPELINE_STAGE_WORKERS = int(os.environ.get('PIPELINE_STAGE_WORKERS', '3'))
+
+
+class StageMeter:
+    """Thread-safe counters for one stage run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.api_calls = 0
+        self.rows = 0
+
+    def add(self, api_calls=0, rows=0):
+        with self._lock:
+            self.api_calls += api_calls
+            self.rows += rows
+
+
+# The meter of the stage running in this context, if any
+current_meter = contextvars.ContextVar('pipeline_stage_meter', default=None)
+
+
+def carry_meter(fn):
+    """
+    Wrap ``fn`` so calls made from worker threads (e.g. a ThreadPoolExecutor
+    inside a stage) are still counted against the submitting stage.
+    """
+    meter = current_meter.get()
+    if meter is None:
+        return fn
+
+    def _run(*args, **kwargs):
+        token = current_meter.set(meter)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            current_meter.reset(token)
+    return _run
+
+
+class Stage:
+    """A named unit of pipeline work: ``fn(app)`` run after ``after`` stages."""
+
+    def __init__(self, name, fn, after=()):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+
+
+# ---------------------------------------------------------------------------
+# Row counting
+# ---------------------------------------------------------------------------
+
+_hooked_engines = set()
+_hook_lock = threading.Lock()
+
+
+def _count_rows(conn, cursor, statement, parameters, context, executemany):
+    meter = current_meter.get()
+    if meter is None:
+        return
+    verb = statement.lstrip()[:6].upper()
+    if verb not in ('INSERT', 'UPDATE', 'DELETE'):
+        return
+    n = cursor.rowcount
+    if n is None or n < 0:
+        n = len(parameters) if executemany and isinstance(parameters, (list, tuple)) else 0
+    meter.add(rows=n)
+
+
+def _install_row_counter(engine):
+    from sqlalchemy import event
+
+    with _hook_lock:
+        if id(engine) in _hooked_engines:
+            return
+        event.listen(engine, 'after_cursor_execute', _count_rows)
+        _hooked_engines.add(id(engine))
+
+
+# ---------------------------------------------------------------------------
+# Executor
+# ---------------------------------------------------------------------------
+
+def _run_stage(app, stage, on_event):
+    meter = StageMeter()
+    current_meter.set(meter)  # runs inside its own copied context
+    record = {'status': 'running', 'started': time.monotonic()}
+    if on_event:
+        on_event(stage.name, 'running', {})
+    try:
+        with app.app_context():
+            record['result'] = stage.fn(app)
+        record['status'] = 'complete'
+    except Exception as e:
+        log.exception("[PIPELINE] stage %s failed", stage.name)
+        record['status'] = 'failed'
+        record['error'] = str(e)[:200]
+    record['finished'] = time.monotonic()
+    record['seconds'] = round(record['finished'] - record['started'], 1)
+    record['api_calls'] = meter.api_calls
+    record['rows'] = meter.rows
+    if on_event:
+        on_event(stage.name, record['status'], {
+            k: record[k] for k in ('seconds', 'api_calls', 'rows', 'error') if k in record
+        })
+    return record
+
+
+def critical_path(stages, records):
+    """
+    The chain of stages that bounded the run: start at the stage that
+    finished last and repeatedly step to the dependency that finished
+    last. Returns ``{'stages': [...], 'seconds': float}``.
+    """
+    by_name = {s.name: s for s in stages}
+    done = {n: r for n, r in records.items() if 'finished' in r}
+    if not done:
+        return {'stages': [], 'seconds': 0.0}
+    path = []
+    name = max(done, key=lambda n: done[n]['finished'])
+    while name:
+        path.append(name)
+        deps = [d for d in by_name[name].after if d in done]
+        name = max(deps, key=lambda n: done[n]['finished']) if deps else None
+    path.reverse()
+    return {'stages': path, 'seconds': round(sum(done[n]['seconds'] for n in path), 1)}
+
+
+def run_stages(app, stages, workers=None, on_event=None):
+    """
+    Run ``stages`` respecting their ``after`` dependencies, up to
+    ``workers`` at a time. ``on_event(name, status, metrics)`` is called
+    as stages start and finish.
+
+    Returns ``{'stages': {name: record}, 'wall_seconds', 'critical_path'}``
+    where each record has status, seconds, api_calls, rows and the stage
+    function's return value under ``result`` (or ``error``).
+    """
+    names = {s.name for s in stages}
+    for s in stages:
+        missing = [d for d in s.after if d not in names]
+        if missing:
+            raise ValueError(f"Stage {s.name} depends on unknown stage(s) {missing}")
+
+    try:
+        from app import db
+        with app.app_context():
+            _install_row_counter(db.engine)
+    except Exception:
+        log.debug("[PIPELINE] row counter not installed", exc_info=True)
+
+    t0 = time.monotonic()
+    records = {}
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers or PIPELINE_STAGE_WORKERS)) as pool:
+        while pending or running:
+            ready = [s for s in pending if all(d in records for d in s.after)]
+            for s in ready:
+                pending.remove(s)
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, _run_stage, app, s, on_event)] = s
+            if not running:
+                # Only reachable with a dependency cycle
+                raise ValueError(f"Stage dependency cycle among {[s.name for s in pending]}")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                records[running.pop(fut).name] = fut.result()
+
+    return {
+        'stages': records,
+        'wall_seconds': round(time.monotonic() - t0, 1),
+        'critical_path': critical_path(stages, records),
+    }
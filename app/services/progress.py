@@ -0,0 +1,353 @@
+"""
+PRISM — Progress Event Bus
+In-process pub/sub for live progress of background work — Brand Hunter
+scans, the daily sync pipeline and the EchoTik scraper.
+
+Publishers call ``publish(channel, **fields)`` — an in-memory append, no
+DB round trip on the caller's thread — and SSE endpoints stream the
+events to the browser. Each channel keeps a short history so a reconnecting
+``EventSource`` (``Last-Event-ID``) picks up where it left off.
+
+Channels:
+    brand_scan:<job_id>  — per-brand task updates and job status
+    daily_sync           — stage started / finished events
+    scraper              — scraper page / capture / sync events
+    trickle              — continuous-mode refresh ticks
+
+Every long-lived stream — these progress streams and the streamed
+/api/ai/chat replies — holds one of the gthread worker's WEB_THREADS
+threads, so they share one cap (``try_open_stream``) that leaves at least
+two threads for page and API requests. Progress clients fall back to
+polling when no slot is free; chat answers 429.
+
+The bus lives in the web process, but the daily sync, trickle and
+scraper jobs can run in worker.py or the bot. Every process forwards its
+events to the ``progress_events`` table (``start_forwarder``, from
+create_app) until the web process calls ``start_relay``: it then stops
+forwarding and instead polls the table, republishing other processes'
+events into its own bus. Ids from concurrent writers can commit out of
+order, so each poll re-reads a short window behind its cursor and skips
+ids it already relayed. It polls every PROGRESS_RELAY_SECONDS while a
+stream is open or events are arriving, backing off to
+PROGRESS_RELAY_IDLE_SECONDS otherwise; opening a stream wakes it.
+
+Environment variables:
+    WEB_THREADS              — gunicorn --threads of the web process (default 4)
+    SSE_MAX_STREAMS          — concurrent long-lived streams of any kind
+                               (default WEB_THREADS - 2)
+    PROGRESS_SSE_MAX_SECONDS — lifetime of one connection before the
+                               client reconnects (default 55)
+    PROGRESS_RELAY_SECONDS   — how often the web process polls for
+                               relayed events while busy (default 1)
+    PROGRESS_RELAY_IDLE_SECONDS — longest poll interval while idle (default 15)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', str(max(0, WEB_THREADS - 2))))
+PROGRESS_SSE_MAX_SECONDS = int(os.environ.get('PROGRESS_SSE_MAX_SECONDS', '55'))
+PROGRESS_RELAY_SECONDS = float(os.environ.get('PROGRESS_RELAY_SECONDS', '1'))
+PROGRESS_RELAY_IDLE_SECONDS = float(os.environ.get('PROGRESS_RELAY_IDLE_SECONDS', '15'))
+
+# Events kept per channel, and how long an idle channel lives
+_HISTORY = 200
+_CHANNEL_TTL = 3600
+
+
+class ProgressBus:
+    """Thread-safe channel -> ring buffer of ``(seq, event)`` with blocking waits."""
+
+    def __init__(self, history=_HISTORY):
+        self._history = history
+        self._cond = threading.Condition()
+        self._channels = {}     # channel -> deque[(seq, event)]
+        self._touched = {}      # channel -> monotonic time of last publish
+        self._seq = 0
+
+    def publish(self, channel, event):
+        """Append ``event`` (a JSON-serializable dict) to ``channel``. Returns its sequence id."""
+        now = time.monotonic()
+        with self._cond:
+            self._seq += 1
+            event = {'ts': time.time(), **event}
+            self._channels.setdefault(channel, deque(maxlen=self._history)).append((self._seq, event))
+            self._touched[channel] = now
+            self._expire(now)
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self, channel):
+        """Most recent event on ``channel``, or None."""
+        with self._cond:
+            buf = self._channels.get(channel)
+            return buf[-1][1] if buf else None
+
+    def wait(self, channel, after=0, timeout=15.0):
+        """
+        Block until ``channel`` has events newer than ``after`` or ``timeout``
+        passes. Returns the new ``(seq, event)`` pairs (possibly empty).
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                new = [(s, e) for s, e in self._channels.get(channel, ()) if s > after]
+                remaining = deadline - time.monotonic()
+                if new or remaining <= 0:
+                    return new
+                self._cond.wait(remaining)
+
+    def _expire(self, now):
+        """Drop channels idle for longer than ``_CHANNEL_TTL``. Caller holds the lock."""
+        stale = [c for c, t in self._touched.items() if now - t > _CHANNEL_TTL]
+        for c in stale:
+            self._channels.pop(c, None)
+            self._touched.pop(c, None)
+
+
+progress_bus = ProgressBus()
+
+# Shared by every long-lived stream in this process (progress SSE, AI chat)
+_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS) if SSE_MAX_STREAMS > 0 else None
+_open_streams = 0
+_open_lock = threading.Lock()
+
+
+def try_open_stream():
+    """Reserve a long-lived stream slot; False when all are taken. Pair with ``close_stream``."""
+    global _open_streams
+    if _streams is None or not _streams.acquire(blocking=False):
+        return False
+    with _open_lock:
+        _open_streams += 1
+    _relay_wake.set()
+    return True
+
+
+def close_stream():
+    global _open_streams
+    with _open_lock:
+        _open_streams -= 1
+    _streams.release()
+
+
+def publish(channel, **fields):
+    """Shorthand for ``progress_bus.publish(channel, fields)`` that never raises."""
+    try:
+        event = {**fields, 'ts': time.time()}
+        if _forwarder is not None:
+            _forwarder.put(channel, event)
+        return progress_bus.publish(channel, event)
+    except Exception:
+        log.debug("[PROGRESS] publish to %s failed", channel, exc_info=True)
+        return 0
+
+
+# ---------------------------------------------------------------------------
+# Cross-process relay
+# ---------------------------------------------------------------------------
+
+# Events are dropped (oldest first) if the DB is down this long
+_OUTBOX_MAX = 1000
+_RELAY_BATCH = 500
+# Ids re-read behind the relay cursor, for rows that committed after a higher id
+_RELAY_LOOKBEHIND = 100
+
+# Set when a stream opens, so an idle relay polls straight away
+_relay_wake = threading.Event()
+
+
+class _Forwarder:
+    """Batches this process's events into ``progress_events`` from a daemon thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._cond = threading.Condition()
+        self._outbox = deque(maxlen=_OUTBOX_MAX)
+        self._stop = False
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True, name='progress-forwarder').start()
+        return self
+
+    def put(self, channel, event):
+        with self._cond:
+            self._outbox.append((channel, event))
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._outbox.clear()
+            self._cond.notify()
+
+    def _loop(self):
+        from app import db
+        from app.models import ProgressEvent
+
+        while True:
+            with self._cond:
+                while not self._outbox and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                batch = list(self._outbox)
+                self._outbox.clear()
+            try:
+                with self.app.app_context():
+                    db.session.add_all([
+                        ProgressEvent(channel=channel, payload_json=json.dumps(event, default=str))
+                        for channel, event in batch
+                    ])
+                    db.session.commit()
+            except Exception:
+                log.debug("[PROGRESS] forwarding %d events failed", len(batch), exc_info=True)
+            # Coalesce bursts (scraper pages, scan tasks) into one write
+            time.sleep(0.2)
+
+
+_forwarder = None
+
+
+def start_forwarder(app):
+    """Forward this process's events to the web process. Called from create_app; a no-op once relaying."""
+    global _forwarder
+    if _forwarder is None and not _relaying:
+        _forwarder = _Forwarder(app).start()
+
+
+_relaying = False
+
+
+def start_relay(app):
+    """
+    Web-process boot hook: stop forwarding (this process's bus is the one
+    SSE reads) and republish events other processes forward. Safe to call twice.
+    """
+    global _forwarder, _relaying
+    if _relaying:
+        return
+    _relaying = True
+    if _forwarder is not None:
+        _forwarder.stop()
+        _forwarder = None
+    threading.Thread(target=_relay_loop, args=(app,), daemon=True, name='progress-relay').start()
+
+
+def _relay_start():
+    """
+    ``(cursor, seen)`` at the tail of the table — earlier events were
+    published before this process booted. Call inside an app context.
+    """
+    from app import db
+    from app.models import ProgressEvent
+
+    cursor = db.session.query(db.func.max(ProgressEvent.id)).scalar() or 0
+    seen = set(db.session.execute(
+        db.select(ProgressEvent.id).where(ProgressEvent.id > cursor - _RELAY_LOOKBEHIND)
+    ).scalars())
+    return cursor, seen
+
+
+def _relay_once(cursor, seen):
+    """
+    Republish rows past ``cursor - _RELAY_LOOKBEHIND`` whose ids aren't in
+    ``seen`` (updated in place). Returns ``(published, cursor)``. Call
+    inside an app context.
+    """
+    from app.models import ProgressEvent
+
+    rows = (ProgressEvent.query
+            .filter(ProgressEvent.id > cursor - _RELAY_LOOKBEHIND)
+            .order_by(ProgressEvent.id)
+            .limit(_RELAY_BATCH + _RELAY_LOOKBEHIND).all())
+    published = 0
+    for row in rows:
+        if row.id in seen:
+            continue
+        seen.add(row.id)
+        published += 1
+        cursor = max(cursor, row.id)
+        try:
+            progress_bus.publish(row.channel, json.loads(row.payload_json or '{}'))
+        except ValueError:
+            pass
+    floor = cursor - _RELAY_LOOKBEHIND
+    seen.difference_update([i for i in seen if i <= floor])
+    return published, cursor
+
+
+def _relay_loop(app):
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import ProgressEvent
+
+    cursor, seen = None, set()
+    interval = PROGRESS_RELAY_SECONDS
+    last_purge = 0.0
+    while True:
+        published = 0
+        try:
+            with app.app_context():
+                if cursor is None:
+                    cursor, seen = _relay_start()
+                published, cursor = _relay_once(cursor, seen)
+                if time.monotonic() - last_purge > 60:
+                    last_purge = time.monotonic()
+                    ProgressEvent.query.filter(
+                        ProgressEvent.created_at < datetime.utcnow() - timedelta(seconds=_CHANNEL_TTL)
+                    ).delete(synchronize_session=False)
+                db.session.commit()
+                if published >= _RELAY_BATCH:
+                    continue
+        except Exception:
+            log.debug("[PROGRESS] relay poll failed", exc_info=True)
+        if published or _open_streams:
+            interval = PROGRESS_RELAY_SECONDS
+        else:
+            interval = min(PROGRESS_RELAY_IDLE_SECONDS, interval * 2)
+        if _relay_wake.wait(interval):
+            _relay_wake.clear()
+            interval = PROGRESS_RELAY_SECONDS
+
+
+def sse_event(data, event_id=None, event=None, retry=None):
+    """Format one Server-Sent Events message."""
+    lines = []
+    if retry is not None:
+        lines.append(f"retry: {int(retry)}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_channel(channel, after=0, max_seconds=None, until=None):
+    """
+    Generator of SSE messages for ``channel``: buffered events newer than
+    ``after``, then live ones, with a comment heartbeat every 15s. Ends
+    after ``max_seconds`` or once ``until(event)`` is true.
+    """
+    deadline = time.monotonic() + (max_seconds or PROGRESS_SSE_MAX_SECONDS)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = progress_bus.wait(channel, after, timeout=min(15.0, remaining))
+        if not events:
+            yield ': keep-alive\n\n'
+            continue
+        for seq, ev in events:
+            after = seq
+            yield sse_event(ev, event_id=seq)
+            if until and until(ev):
+                return
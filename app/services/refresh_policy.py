@@ -0,0 +1,122 @@
+"""
+PRISM — Adaptive Refresh Policy
+Per-product ``next_refresh_at`` so volatile, in-demand, high-score
+products are re-synced often and flat, ignored ones rarely — instead of
+one fixed staleness cutoff for everything.
+
+    interval = tier_base(cached_score) × volatility × demand
+               clamped to [REFRESH_MIN_HOURS, REFRESH_MAX_HOURS]
+
+    tier_base   — 8h for score ≥ 80, 16h ≥ 60, 24h ≥ 40, else 36h
+    volatility  — from the sales_7d change between the last two syncs
+                  (prev_sales_7d → sales_7d): flat → ×1.5, doubling → ×0.2;
+                  no prior sales on record (first sync) → ×1
+    demand      — 1 / (1 + 0.3·ln(1+lookups) + 0.3·ln(1+recent views)
+                  + 0.5 if favorited)
+
+Every sync path calls ``reschedule`` for the rows it touched; refresh
+jobs (daily deep refresh, trickle, scraper cache, Discord bot cache)
+select work with ``due_filter()`` / ``is_due()``. Rows never scheduled
+(``next_refresh_at`` NULL) are always due.
+
+Environment variables:
+    REFRESH_MIN_HOURS — shortest interval (default 2)
+    REFRESH_MAX_HOURS — longest interval (default 72)
+"""
+
+import os
+import math
+import logging
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+REFRESH_MIN_HOURS = float(os.environ.get('REFRESH_MIN_HOURS', '2'))
+REFRESH_MAX_HOURS = float(os.environ.get('REFRESH_MAX_HOURS', '72'))
+
+# (min cached_score, base hours) — first match wins
+_SCORE_TIERS = ((80, 8.0), (60, 16.0), (40, 24.0), (0, 36.0))
+
+# Views older than this don't count as current demand
+_VIEW_WINDOW_DAYS = 14
+
+
+def _tier_hours(score):
+    score = score or 0
+    for floor, hours in _SCORE_TIERS:
+        if score >= floor:
+            return hours
+    return _SCORE_TIERS[-1][1]
+
+
+def _volatility_factor(sales_7d, prev_sales_7d):
+    if not prev_sales_7d:
+        return 1.0
+    rel = abs((sales_7d or 0) - prev_sales_7d) / max(prev_sales_7d, 10)
+    return 1.5 / (1.0 + 6.0 * rel)
+
+
+def _demand_factor(lookups, views, favorite):
+    return 1.0 / (1.0 + 0.3 * math.log1p(lookups or 0) + 0.3 * math.log1p(views or 0)
+                  + (0.5 if favorite else 0.0))
+
+
+def refresh_interval(score, sales_7d, prev_sales_7d, lookups, views, favorite):
+    """Hours until the product should be synced again."""
+    hours = (_tier_hours(score)
+             * _volatility_factor(sales_7d, prev_sales_7d)
+             * _demand_factor(lookups, views, favorite))
+    return min(REFRESH_MAX_HOURS, max(REFRESH_MIN_HOURS, hours))
+
+
+def reschedule(product_ids, now=None):
+    """
+    Recompute ``next_refresh_at`` for ``product_ids`` from their current
+    row state, with recent view counts in one grouped query. Does not commit.
+    Returns the number of rows scheduled.
+    """
+    from app import db
+    from app.models import Product, ProductView
+
+    ids = list({pid for pid in product_ids if pid})
+    if not ids:
+        return 0
+    now = now or datetime.utcnow()
+
+    updates = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = db.session.execute(
+            db.select(Product.product_id, Product.cached_score, Product.sales_7d,
+                      Product.prev_sales_7d, Product.lookup_count, Product.is_favorite)
+            .where(Product.product_id.in_(chunk))
+        ).all()
+        views = dict(db.session.execute(
+            db.select(ProductView.product_id, db.func.count(ProductView.id))
+            .where(ProductView.product_id.in_(chunk),
+                   ProductView.viewed_at >= now - timedelta(days=_VIEW_WINDOW_DAYS))
+            .group_by(ProductView.product_id)
+        ).all())
+        for r in rows:
+            hours = refresh_interval(r.cached_score, r.sales_7d, r.prev_sales_7d,
+                                     r.lookup_count, views.get(r.product_id, 0), r.is_favorite)
+            updates.append({'product_id': r.product_id,
+                            'next_refresh_at': now + timedelta(hours=hours)})
+    if updates:
+        db.session.execute(db.update(Product), updates)
+    return len(updates)
+
+
+def due_filter(now=None):
+    """SQL condition for products whose refresh is due."""
+    from app import db
+    from app.models import Product
+
+    now = now or datetime.utcnow()
+    return db.or_(Product.next_refresh_at <= now, Product.next_refresh_at.is_(None))
+
+
+def is_due(product, now=None):
+    """Python-side counterpart of ``due_filter`` for a loaded row."""
+    due_at = getattr(product, 'next_refresh_at', None)
+    return due_at is None or due_at <= (now or datetime.utcnow())
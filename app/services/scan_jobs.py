@@ -0,0 +1,324 @@
+"""
+PRISM — External API Scan Workers
+Processes ``ScanJob`` rows queued by /api/extern/scan and
+/api/extern/scan/batch: each job's query (share URL or product ID) goes
+through the lookup pipeline (services/lookup) and the outcome is written
+to ``result_json`` / ``completed_at`` for /api/extern/jobs/<id>.
+
+Claiming:
+    Workers pick the API key with the fewest jobs running (ties: oldest
+    waiting job), then that key's oldest queued job — so one client's
+    1,000-query batch can't starve everyone else. A key with
+    SCAN_JOB_PER_KEY jobs already running is skipped (a soft cap: it's
+    checked against a snapshot). The job row is locked with
+    ``FOR UPDATE SKIP LOCKED`` on Postgres and taken with a conditional
+    UPDATE, so any number of workers in any number of processes can claim
+    concurrently.
+
+A lookup that fails unexpectedly (EchoTik down, rate limited) is requeued
+with exponential backoff — ``next_attempt_at``, 30s doubling — and only
+due jobs are claimed. Jobs left 'running' by a worker that died are
+requeued after SCAN_JOB_STALL_SECONDS. Either way a job gets three attempts. Finished jobs are pushed to
+the key's webhook, if it registered one (services/webhooks).
+
+One claimer thread per process claims jobs while a worker is free and
+hands them to SCAN_JOB_CONCURRENCY worker threads. When nothing is queued
+it backs off from 2s to SCAN_JOB_IDLE_MAX_SECONDS between polls; jobs
+queued in this process wake it at once (``notify``).
+
+The pool runs embedded in the web process (with the job queue worker, see
+services/job_queue) or in worker.py.
+
+Environment variables:
+    SCAN_JOB_CONCURRENCY   — jobs processed at once per process (default 4)
+    SCAN_JOB_PER_KEY       — running jobs per API key across workers (default 2)
+    SCAN_JOB_STALL_SECONDS — age of a 'running' job that marks it orphaned (default 300)
+    SCAN_JOB_IDLE_MAX_SECONDS — longest idle poll interval (default 30)
+"""
+
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services.leases import PROCESS_OWNER
+
+log = logging.getLogger(__name__)
+
+SCAN_JOB_CONCURRENCY = int(os.environ.get('SCAN_JOB_CONCURRENCY', '4'))
+SCAN_JOB_PER_KEY = int(os.environ.get('SCAN_JOB_PER_KEY', '2'))
+SCAN_JOB_STALL_SECONDS = int(os.environ.get('SCAN_JOB_STALL_SECONDS', '300'))
+SCAN_JOB_IDLE_MAX_SECONDS = float(os.environ.get('SCAN_JOB_IDLE_MAX_SECONDS', '30'))
+
+SCAN_JOB_MAX_ATTEMPTS = 3
+# First idle poll interval for jobs queued by other processes; doubles up to SCAN_JOB_IDLE_MAX_SECONDS
+_POLL_SECONDS = 2.0
+_STALL_CHECK_SECONDS = 60
+_RETRY_BASE_SECONDS = 30
+
+
+def _key_filter(model, key_id):
+    return model.api_key_id.is_(None) if key_id is None else model.api_key_id == key_id
+
+
+# ---------------------------------------------------------------------------
+# Queue operations — call inside an app context
+# ---------------------------------------------------------------------------
+
+def claim(worker_id):
+    """Take the next due job fairly across API keys. Returns ``(job_id, query)`` or None. Commits."""
+    from app import db
+    from app.models import ScanJob
+
+    now = datetime.utcnow()
+    due = db.and_(ScanJob.status == 'queued',
+                  db.or_(ScanJob.next_attempt_at.is_(None), ScanJob.next_attempt_at <= now))
+    running = dict(db.session.execute(
+        db.select(ScanJob.api_key_id, db.func.count(ScanJob.id))
+        .where(ScanJob.status == 'running')
+        .group_by(ScanJob.api_key_id)
+    ).all())
+    waiting = db.session.execute(
+        db.select(ScanJob.api_key_id, db.func.min(ScanJob.created_at))
+        .where(due)
+        .group_by(ScanJob.api_key_id)
+    ).all()
+    order = sorted(waiting, key=lambda r: (running.get(r[0], 0), r[1] or datetime.min))
+
+    for key_id, _ in order:
+        if running.get(key_id, 0) >= SCAN_JOB_PER_KEY:
+            continue
+        job_id = db.session.execute(
+            db.select(ScanJob.id)
+            .where(due, _key_filter(ScanJob, key_id))
+            .order_by(ScanJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if not job_id:
+            continue
+        taken = db.session.execute(
+            db.update(ScanJob)
+            .where(ScanJob.id == job_id, ScanJob.status == 'queued')
+            .values(status='running', worker_id=worker_id, started_at=now, next_attempt_at=None,
+                    attempts=db.func.coalesce(ScanJob.attempts, 0) + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if taken:
+            query = db.session.execute(
+                db.select(ScanJob.input_query).where(ScanJob.id == job_id)
+            ).scalar()
+            db.session.commit()
+            return job_id, query
+    db.session.commit()
+    return None
+
+
+def finish(job_id, worker_id, status, result, retry_at=None):
+    """
+    Write the outcome if ``worker_id`` still owns the job, and queue its
+    webhook delivery (services/webhooks) when the job is final. A requeued
+    job ('queued') isn't claimed again before ``retry_at``. Commits.
+    """
+    from app import db
+    from app.models import ScanJob
+    from app.services import webhooks
+
+    final = status != 'queued'
+    now = datetime.utcnow()
+    owned = db.session.execute(
+        db.update(ScanJob)
+        .where(ScanJob.id == job_id, ScanJob.worker_id == worker_id, ScanJob.status == 'running')
+        .values(status=status, result_json=json.dumps(result, default=str),
+                completed_at=now if final else None,
+                worker_id=worker_id if final else None,
+                next_attempt_at=None if final else retry_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    queued = False
+    if owned and final:
+        key_id = db.session.execute(
+            db.select(ScanJob.api_key_id).where(ScanJob.id == job_id)
+        ).scalar()
+        queued = webhooks.queue_delivery(job_id, key_id, status, result, now)
+    db.session.commit()
+    if queued:
+        webhooks.notify()
+
+
+def requeue_stalled():
+    """Requeue orphaned 'running' jobs; fail those out of attempts. Returns (requeued, failed). Commits."""
+    from app import db
+    from app.models import ScanJob
+
+    cutoff = datetime.utcnow() - timedelta(seconds=SCAN_JOB_STALL_SECONDS)
+    stalled = db.and_(ScanJob.status == 'running', ScanJob.started_at < cutoff)
+    failed = db.session.execute(
+        db.update(ScanJob)
+        .where(stalled, db.func.coalesce(ScanJob.attempts, 0) >= SCAN_JOB_MAX_ATTEMPTS)
+        .values(status='error', completed_at=datetime.utcnow(),
+                result_json=json.dumps({'success': False, 'error': 'Scan timed out'}))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requeued = db.session.execute(
+        db.update(ScanJob)
+        .where(stalled)
+        .values(status='queued', worker_id=None, started_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if requeued or failed:
+        log.info("[ScanJobs] stalled jobs: %d requeued, %d failed", requeued, failed)
+    return requeued, failed
+
+
+def process(job_id, query, worker_id):
+    """Run one claimed job through the lookup pipeline and record the outcome."""
+    from app import db
+    from app.models import ScanJob
+    from app.services.lookup import lookup_product, LookupFailed
+
+    try:
+        result = lookup_product(query, refresh_due=True)
+        if result['product'] is None:
+            raise RuntimeError(f"{result['product_id']} fetched but not saved")
+        finish(job_id, worker_id, 'complete', {'success': True, **result})
+    except LookupFailed as e:
+        finish(job_id, worker_id, 'error', {'success': False, 'error': str(e)})
+    except Exception as e:
+        log.exception("[ScanJobs] job %s failed", job_id)
+        try: db.session.rollback()
+        except Exception: pass
+        attempts = db.session.execute(
+            db.select(ScanJob.attempts).where(ScanJob.id == job_id)
+        ).scalar() or 0
+        retry = attempts < SCAN_JOB_MAX_ATTEMPTS
+        retry_at = datetime.utcnow() + timedelta(seconds=_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+        finish(job_id, worker_id, 'queued' if retry else 'error',
+               {'success': False, 'error': 'Lookup failed — retrying' if retry else str(e)[:200]},
+               retry_at=retry_at if retry else None)
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+class ScanJobPool:
+    """One claimer thread handing claimed ScanJob rows to ``concurrency`` worker threads."""
+
+    def __init__(self, app, concurrency=None):
+        self.app = app
+        self.concurrency = max(1, concurrency or SCAN_JOB_CONCURRENCY)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._busy = 0
+        self._woken = False
+        self._workers = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='scan-job')
+        self._last_stall_check = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='scan-job-claimer')
+            self._thread.start()
+            log.info("[ScanJobs] pool started (%d workers)", self.concurrency)
+        return self
+
+    def notify(self):
+        """Wake the claimer — called after jobs are queued in this process."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        self._workers.shutdown(wait=timeout is None or timeout > 0)
+
+    def _loop(self):
+        idle = _POLL_SECONDS
+        while not self._stop.is_set():
+            with self._cond:
+                while self._busy >= self.concurrency and not self._stop.is_set():
+                    self._cond.wait()
+                self._woken = False
+            if self._stop.is_set():
+                return
+
+            picked = None
+            with self.app.app_context():
+                try:
+                    self._maybe_requeue_stalled()
+                    picked = claim(PROCESS_OWNER)
+                except Exception:
+                    log.exception("[ScanJobs] claim error")
+                    from app import db
+                    try: db.session.rollback()
+                    except Exception: pass
+            if picked:
+                idle = _POLL_SECONDS
+                with self._cond:
+                    self._busy += 1
+                self._workers.submit(self._run, *picked)
+                continue
+
+            with self._cond:
+                if not self._woken:
+                    self._cond.wait(idle)
+                woken = self._woken
+            idle = _POLL_SECONDS if woken else min(idle * 2, SCAN_JOB_IDLE_MAX_SECONDS)
+
+    def _run(self, job_id, query):
+        try:
+            with self.app.app_context():
+                try:
+                    process(job_id, query, PROCESS_OWNER)
+                except Exception:
+                    log.exception("[ScanJobs] job %s crashed", job_id)
+                    from app import db
+                    try: db.session.rollback()
+                    except Exception: pass
+        finally:
+            # A free worker may mean more queued work — claim again right away
+            with self._cond:
+                self._busy -= 1
+                self._woken = True
+                self._cond.notify_all()
+
+    def _maybe_requeue_stalled(self):
+        now = datetime.utcnow()
+        if self._last_stall_check and (now - self._last_stall_check).total_seconds() < _STALL_CHECK_SECONDS:
+            return
+        self._last_stall_check = now
+        requeue_stalled()
+
+
+_pool = None
+
+
+def notify():
+    """Wake this process's pool, if it runs one."""
+    if _pool is not None:
+        _pool.notify()
+
+
+def start_pool(app, concurrency=None):
+    """Start this process's scan worker pool and webhook dispatcher (once)."""
+    global _pool
+    if _pool is None:
+        from app.services.webhooks import start_dispatcher
+        _pool = ScanJobPool(app, concurrency).start()
+        start_dispatcher(app)
+    return _pool
+
+
+def start_embedded_pool(app):
+    """Boot hook: run the pool in the web process unless a worker.py process owns it."""
+    from app.services.job_queue import JOB_WORKER_EMBEDDED
+    if os.environ.get('SKIP_SCHEDULER') or not JOB_WORKER_EMBEDDED:
+        return None
+    return start_pool(app)
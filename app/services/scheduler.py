@@ -2,6 +2,13 @@
 PRISM — Background Scheduler
 Single daily sync at 8 PM EST — products, videos, brands.
 
+SCHEDULER_MODE=continuous moves the per-product deep refresh out of the
+nightly burst into a trickle job every few minutes (services/trickle);
+the daily sync then only runs the list, brand and cache stages.
+
+Scheduled runs are queued on the durable job queue (services/job_queue)
+and fire only from the process holding scheduler leadership.
+
 Credit budget (~86k/month of 100k):
     Product scan (incremental):  ~60,000/month
     Video sync (piggybacked):    ~15,000/month
@@ -11,11 +18,14 @@ Credit budget (~86k/month of 100k):
 
 import atexit
 import logging
+import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 log = logging.getLogger(__name__)
 
+SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'daily').strip().lower()
+
 
 # ---------------------------------------------------------------------------
 # Video sync helper — called per product during deep refresh
@@ -112,82 +122,150 @@ def _run_brand_sync(app):
 # Main daily sync — products (incremental) + videos + brands
 # ---------------------------------------------------------------------------
 
+def _stage_product_list(app):
+    """Stage: trending product list sync (uses existing run_echotik_sync)."""
+    from app.routes.auth import log_system_event
+    from app.routes.scan import run_echotik_sync
+    try:
+        result = run_echotik_sync(max_pages=25, page_size=10)
+    except Exception as e:
+        log_system_event('scheduler_product_sync_failed', {'error': str(e)[:200]})
+        raise
+    log.info(
+        "[SCHEDULER] Product list: %d fetched, %d filtered, %d new, %d updated",
+        result.get('fetched', 0), result.get('filtered', 0),
+        result.get('created', 0), result.get('updated', 0),
+    )
+    summary = {
+        'fetched': result.get('fetched', 0),
+        'filtered': result.get('filtered', 0),
+        'created': result.get('created', 0),
+        'updated': result.get('updated', 0),
+    }
+    log_system_event('scheduler_product_sync', summary)
+    return summary
+
+
+def _stage_deep_refresh(app):
+    """Stage: deep refresh stale products + video sync."""
+    from app.routes.auth import log_system_event
+    try:
+        _deep_refresh_with_videos(app)
+    except Exception as e:
+        log_system_event('scheduler_deep_refresh_failed', {'error': str(e)[:200]})
+        raise
+    log_system_event('scheduler_deep_refresh_complete', {})
+
+
+def _stage_brand_sync(app):
+    """Stage: top shops / brands sync."""
+    from app.routes.auth import log_system_event
+    try:
+        _run_brand_sync(app)
+    except Exception as e:
+        log_system_event('scheduler_brand_sync_failed', {'error': str(e)[:200]})
+        raise
+    log_system_event('scheduler_brand_sync_complete', {})
+
+
+def _stage_image_warmup(app):
+    """Stage: pre-sign + prefetch images for the first listing pages."""
+    from app.services.image_warmup import warm_listing_images
+    return warm_listing_images(app)
+
+
+def _stage_hot_pool(app):
+    """Stage: rank the Discord hot-products candidate pool (services/hot_products)."""
+    from app.services.hot_products import build_pool
+    with app.app_context():
+        return len(build_pool())
+
+
+def _stage_ai_context(app):
+    """Stage: precompute the AI chat context snapshot (services/ai_context)."""
+    from app.services.ai_context import build_snapshot
+    with app.app_context():
+        return build_snapshot()['version']
+
+
+def daily_sync_stages():
+    """
+    The daily sync as a dependency graph. Brand stages don't touch the
+    product tables' inputs, so they run alongside the product stages;
+    seller enrichment only needs the product list, so it overlaps the
+    deep refresh.
+
+    In continuous mode the trickle job owns per-product refreshes, so the
+    deep refresh stage is left out.
+    """
+    from app.services.pipeline import Stage
+    stages = [
+        Stage('product_list', _stage_product_list),
+        Stage('deep_refresh', _stage_deep_refresh, after=['product_list']),
+        Stage('seller_enrichment', _enrich_seller_names, after=['product_list']),
+        Stage('brand_sync', _stage_brand_sync),
+        Stage('brand_refresh', _refresh_brand_products),
+        Stage('score_cache', _warm_score_cache, after=['deep_refresh']),
+        Stage('image_warmup', _stage_image_warmup, after=['deep_refresh', 'score_cache']),
+        Stage('hot_pool', _stage_hot_pool, after=['deep_refresh', 'score_cache']),
+        Stage('ai_context', _stage_ai_context, after=['deep_refresh', 'seller_enrichment']),
+    ]
+    if SCHEDULER_MODE == 'continuous':
+        stages = [Stage(s.name, s.fn, after=['product_list' if d == 'deep_refresh' else d for d in s.after])
+                  for s in stages if s.name != 'deep_refresh']
+    return stages
+
+
 def daily_sync(app):
     """
     Single daily sync at 8 PM EST.
 
-    1. Fetch trending product list (250 products)
-    2. For new/stale products, fetch detail + videos (incremental — skip <24h)
-    3. Sync brands
+    Stages (see ``daily_sync_stages`` for the dependency graph):
+        product_list → deep_refresh → score_cache → image_warmup, hot_pool
+        product_list → seller_enrichment
+        deep_refresh, seller_enrichment → ai_context
+        brand_sync, brand_refresh (independent)
+    (no deep_refresh in continuous mode — the trickle job covers it)
+
+    Independent stages run concurrently (services/pipeline); all EchoTik
+    calls share the global rate limiter. Stage progress is published on
+    the ``daily_sync`` progress channel, and the completion event carries
+    per-stage [seconds, API calls, rows touched] plus the critical path.
     """
     from app.routes.auth import log_system_event
-    from datetime import datetime as _dt
+    from app.services.pipeline import run_stages
+    from app.services.progress import publish
+
+    def _on_stage(stage, status, metrics):
+        publish('daily_sync', stage=stage, status=status, **metrics)
+
     with app.app_context():
         log.info("[SCHEDULER] === Daily sync starting ===")
         log_system_event('scheduler_daily_sync_started', {})
-        started_at = _dt.utcnow()
-        stage_results = {}
-
-        # Step 1: Product list sync (uses existing run_echotik_sync)
-        try:
-            from app.routes.scan import run_echotik_sync
-            result = run_echotik_sync(max_pages=25, page_size=10)
-            log.info(
-                "[SCHEDULER] Product list: %d fetched, %d filtered, %d new, %d updated",
-                result.get('fetched', 0), result.get('filtered', 0),
-                result.get('created', 0), result.get('updated', 0),
-            )
-            stage_results['product_list'] = {
-                'fetched': result.get('fetched', 0),
-                'filtered': result.get('filtered', 0),
-                'created': result.get('created', 0),
-                'updated': result.get('updated', 0),
-            }
-            log_system_event('scheduler_product_sync', stage_results['product_list'])
-        except Exception as e:
-            log.exception("[SCHEDULER] Product list sync failed")
-            log_system_event('scheduler_product_sync_failed', {'error': str(e)[:200]})
-
-        # Step 2: Deep refresh stale products + video sync
-        try:
-            _deep_refresh_with_videos(app)
-            log_system_event('scheduler_deep_refresh_complete', {})
-        except Exception as e:
-            log.exception("[SCHEDULER] Deep refresh failed")
-            log_system_event('scheduler_deep_refresh_failed', {'error': str(e)[:200]})
+        publish('daily_sync', stage='daily_sync', status='running')
 
-        # Step 3: Brand sync
-        try:
-            _run_brand_sync(app)
-            log_system_event('scheduler_brand_sync_complete', {})
-        except Exception as e:
-            log.exception("[SCHEDULER] Brand sync failed")
-            log_system_event('scheduler_brand_sync_failed', {'error': str(e)[:200]})
-
-        # Step 4: Refresh Brand Hunter product stats
-        try:
-            _refresh_brand_products(app)
-        except Exception:
-            log.exception("[SCHEDULER] Brand product refresh failed")
+        run = run_stages(app, daily_sync_stages(), on_event=_on_stage)
 
-        # Step 5: Enrich missing seller names (100 products per run)
-        try:
-            _enrich_seller_names(app)
-        except Exception:
-            log.exception("[SCHEDULER] Seller enrichment failed")
+        stages = run['stages']
+        for name, r in stages.items():
+            log.info("[SCHEDULER] stage %-18s %-8s %6.1fs  api=%d rows=%d",
+                     name, r['status'], r['seconds'], r['api_calls'], r['rows'])
+        path = run['critical_path']
+        log.info("[SCHEDULER] === Daily sync complete in %.1fs — critical path %s (%.1fs) ===",
+                 run['wall_seconds'], ' → '.join(path['stages']), path['seconds'])
 
-        # Step 6: Warm Opportunity Score cache for all active products
-        try:
-            _warm_score_cache(app)
-        except Exception:
-            log.exception("[SCHEDULER] Score cache warm failed")
-
-        duration = (_dt.utcnow() - started_at).total_seconds()
-        log.info("[SCHEDULER] === Daily sync complete ===")
+        # Compact — activity log details are capped at 500 chars
+        product_list = stages.get('product_list', {}).get('result')
         log_system_event('scheduler_daily_sync_complete', {
-            'duration_sec': round(duration, 1),
-            **stage_results,
+            'duration_sec': run['wall_seconds'],
+            'critical_path': path,
+            'stages': {n: [r['seconds'], r['api_calls'], r['rows']] + ([] if r['status'] == 'complete' else ['failed'])
+                       for n, r in stages.items()},
+            **({'product_list': product_list} if product_list else {}),
         })
+        publish('daily_sync', stage='daily_sync', status='complete',
+                seconds=run['wall_seconds'], critical_path=path)
+        return run
 
 
 def _warm_score_cache(app):
@@ -220,12 +298,11 @@ def _warm_score_cache(app):
 
 
 def _deep_refresh_with_videos(app):
-    """Re-fetch detail + videos for stale products (>24h since last sync)."""
+    """Re-fetch detail + videos for products whose adaptive refresh is due."""
     from app import db
     from app.models import Product
-    from app.services.echotik import fetch_product_detail, sync_to_db, EchoTikError
+    from app.services.refresh_policy import due_filter
 
-    cutoff = datetime.utcnow() - timedelta(hours=24)
     stale = (
         Product.query
         .filter(
@@ -233,12 +310,9 @@ def _deep_refresh_with_videos(app):
                 Product.product_status == 'active',
                 Product.product_status.is_(None),
             ),
-            db.or_(
-                Product.last_echotik_sync < cutoff,
-                Product.last_echotik_sync.is_(None),
-            ),
+            due_filter(),
         )
-        .order_by(Product.last_echotik_sync.asc().nullsfirst())
+        .order_by(Product.next_refresh_at.asc().nullsfirst())
         .limit(200)
         .all()
     )
@@ -248,23 +322,41 @@ def _deep_refresh_with_videos(app):
         return
 
     log.info("[SCHEDULER] Deep refresh: %d stale products", len(stale))
+    refreshed, videos_synced = refresh_products(stale)
+    log.info(
+        "[SCHEDULER] Deep refresh: %d products refreshed, %d videos synced",
+        refreshed, videos_synced,
+    )
+
+
+def refresh_products(products, pause=True):
+    """
+    Re-fetch detail + videos for ``products`` (Product rows) and sync them
+    in batches of 50. Shared by the daily deep refresh and the trickle
+    scheduler. Returns ``(refreshed, videos_synced)``.
+    """
+    from app import db
+    from app.services.echotik import fetch_product_detail, sync_to_db, EchoTikError
+
     refreshed = 0
     videos_synced = 0
     batch = []
 
-    for product in stale:
+    for product in products:
         raw_id = product.product_id.replace('shop_', '')
         try:
             detail = fetch_product_detail(raw_id)
             if detail:
                 batch.append(detail)
                 refreshed += 1
-            time.sleep(0.3)
+            if pause:
+                time.sleep(0.3)
 
             # Sync videos for this product too
             v = _sync_videos_for_product(product, db)
             videos_synced += v
-            time.sleep(0.2)
+            if pause:
+                time.sleep(0.2)
 
         except EchoTikError as exc:
             log.debug("[SCHEDULER] Refresh skip %s: %s", raw_id, exc)
@@ -290,17 +382,13 @@ def _deep_refresh_with_videos(app):
     except Exception:
         db.session.rollback()
 
-    log.info(
-        "[SCHEDULER] Deep refresh: %d products refreshed, %d videos synced",
-        refreshed, videos_synced,
-    )
+    return refreshed, videos_synced
 
 
 def _refresh_brand_products(app):
     """Refresh stats for Brand Hunter products (BrandProduct table)."""
-    from app import db
-    from app.models import BrandProduct, ScannedBrand
-    from app.services.echotik import fetch_brand_products
+    from app.models import ScannedBrand
+    from app.services.brand_hunter import refresh_brand_products
 
     brands = ScannedBrand.query.filter(
         ScannedBrand.scan_status == 'complete',
@@ -312,56 +400,12 @@ def _refresh_brand_products(app):
         return
 
     log.info("[SCHEDULER] Refreshing %d scanned brands", len(brands))
-    total_updated = 0
-
-    for brand in brands:
-        try:
-            # Fetch first 2 pages (20 products) for a quick stats refresh
-            fresh_products = []
-            for page in range(1, 3):
-                products = fetch_brand_products(brand.brand_id, page=page, page_size=10)
-                if products:
-                    fresh_products.extend(products)
-                time.sleep(0.3)
-
-            if not fresh_products:
-                continue
-
-            # Build a lookup of fresh data by product_id
-            fresh_map = {}
-            for p in fresh_products:
-                pid = p.get('product_id', '')
-                if pid:
-                    fresh_map[pid] = p
-
-            # Update existing BrandProduct records that match
-            existing = BrandProduct.query.filter_by(brand_id=brand.id).limit(100).all()
-            for bp in existing:
-                raw_pid = bp.product_id.replace('shop_', '')
-                fresh = fresh_map.get(raw_pid) or fresh_map.get(bp.product_id)
-                if fresh:
-                    bp.sales_7d = fresh.get('sales_7d', 0) or bp.sales_7d or 0
-                    bp.sales_30d = fresh.get('sales_30d', 0) or fresh.get('sales', 0) or bp.sales_30d
-                    bp.revenue_30d = fresh.get('gmv_30d', 0) or fresh.get('gmv', 0) or bp.revenue_30d
-                    bp.total_videos = fresh.get('video_count_alltime', 0) or fresh.get('video_count', 0) or bp.total_videos
-                    bp.influencer_count = fresh.get('influencer_count', 0) or bp.influencer_count
-                    bp.price = fresh.get('price', 0) or bp.price
-                    bp.commission_rate = fresh.get('commission_rate', 0) or bp.commission_rate
-                    total_updated += 1
-
-            # Update brand aggregate stats
-            all_bp = BrandProduct.query.filter_by(brand_id=brand.id).all()
-            brand.sales_30d = sum(bp.sales_30d or 0 for bp in all_bp)
-            brand.revenue_30d = sum(bp.revenue_30d or 0 for bp in all_bp)
-            brand.last_scanned = datetime.utcnow()
-            db.session.commit()
-
-        except Exception as e:
-            log.warning("[SCHEDULER] Brand refresh error for %s: %s", brand.brand_name, e)
-            db.session.rollback()
-            continue
-
-    log.info("[SCHEDULER] Brand products refreshed: %d products updated across %d brands", total_updated, len(brands))
+    stats = refresh_brand_products(brands)
+    log.info(
+        "[SCHEDULER] Brand products refreshed: %d products updated across %d/%d brands (%d fetched)",
+        stats['rows_updated'], stats['brands_changed'], stats['brands'], stats['fetched'],
+    )
+    return stats
 
 
 def _enrich_seller_names(app):
@@ -412,8 +456,32 @@ def _enrich_seller_names(app):
 # Scheduler init — SINGLE daily job at 8 PM EST
 # ---------------------------------------------------------------------------
 
+def enqueue_scheduled(app, kind, max_attempts=1):
+    """
+    APScheduler callback: queue ``kind`` on the durable job queue instead of
+    running it in the scheduler thread. Deduped, so a run still queued or
+    in progress isn't doubled.
+    """
+    from app import db
+    from app.services.job_queue import enqueue
+    with app.app_context():
+        try:
+            job_id, created = enqueue(kind, dedupe_key=kind, max_attempts=max_attempts)
+            log.info("[SCHEDULER] %s → job #%s%s", kind, job_id, '' if created else ' (already queued)')
+        except Exception:
+            log.exception("[SCHEDULER] enqueue %s failed", kind)
+            try: db.session.rollback()
+            except Exception: pass
+
+
 def init_scheduler(app):
-    """Start APScheduler with a single daily job. Safe to call multiple times."""
+    """
+    Start APScheduler with a single daily job. Safe to call multiple times.
+
+    Every process that imports the app calls this, so the scheduler starts
+    paused and only resumes while this process holds scheduler leadership
+    (services/leases) — one instance fires, whatever the worker count.
+    """
     if getattr(init_scheduler, '_started', False):
         return
     init_scheduler._started = True
@@ -437,13 +505,41 @@ def init_scheduler(app):
     # Single daily sync — 8 PM EST = 1:00 AM UTC (next day)
     # APScheduler handles DST automatically when using timezone-aware triggers
     scheduler.add_job(
-        func=daily_sync,
-        args=[app],
+        func=enqueue_scheduled,
+        args=[app, 'daily_sync', 2],
         trigger=CronTrigger(hour=1, minute=0, timezone='UTC'),
         id='daily_sync',
         name='Daily EchoTik Sync (8 PM EST)',
     )
 
-    scheduler.start()
-    atexit.register(lambda: scheduler.shutdown(wait=False))
+    if SCHEDULER_MODE == 'continuous':
+        from apscheduler.triggers.interval import IntervalTrigger
+        from app.services.trickle import TRICKLE_INTERVAL_MINUTES, hourly_allowance
+        scheduler.add_job(
+            func=enqueue_scheduled,
+            args=[app, 'trickle_refresh'],
+            trigger=IntervalTrigger(minutes=TRICKLE_INTERVAL_MINUTES),
+            id='trickle_refresh',
+            name=f'Trickle product refresh (every {TRICKLE_INTERVAL_MINUTES} min)',
+        )
+        log.info("[SCHEDULER] Continuous mode — trickle refresh every %d min, %.0f credits/hour",
+                 TRICKLE_INTERVAL_MINUTES, hourly_allowance())
+
+    from app.services.leases import LeaderElection
+
+    def _on_leadership(leader):
+        if leader:
+            scheduler.resume()
+            log.info("[SCHEDULER] Leader — jobs will fire from this process")
+        else:
+            scheduler.pause()
+
+    scheduler.start(paused=True)
+    leader = LeaderElection(app, 'scheduler', on_change=_on_leadership).start()
+    init_scheduler.leader = leader
+
+    def _shutdown():
+        scheduler.shutdown(wait=False)
+        leader.stop()
+    atexit.register(_shutdown)
     log.info("[SCHEDULER] Started — daily sync at 8 PM EST (1:00 AM UTC)")
@@ -0,0 +1,226 @@
+"""
+PRISM — Share Link Resolver
+The one place a pasted TikTok link or ID becomes a product ID. Used by the
+product lookups (routes/products, services/lookup) and the Discord bot.
+
+    full product URL / raw ID  → regex, no network
+    short link (tiktok.com/t/…, vm./vt.tiktok.com/…)
+        → share_links cache row, if any
+        → GET, following redirects: product ID in the final URL, else one
+          combined regex scan over the first SHARE_LINK_SCAN_BYTES of the
+          streamed page
+        → EchoTik realtime extract_product_id as a last resort
+
+Short links never change target, so resolved links are cached for good.
+Links whose page loaded but carries no product (plain videos) are cached
+as negative for SHARE_LINK_NEGATIVE_HOURS; timeouts and errors aren't
+cached at all.
+
+Environment variables:
+    SHARE_LINK_TIMEOUT        — seconds for the redirect chase (default 10)
+    SHARE_LINK_SCAN_BYTES     — page bytes scanned for a product ID (default 262144)
+    SHARE_LINK_NEGATIVE_HOURS — how long 'no product' is remembered (default 6)
+"""
+
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+
+import requests
+
+log = logging.getLogger(__name__)
+
+SHARE_LINK_TIMEOUT = float(os.environ.get('SHARE_LINK_TIMEOUT', '10'))
+SHARE_LINK_SCAN_BYTES = int(os.environ.get('SHARE_LINK_SCAN_BYTES', '262144'))
+SHARE_LINK_NEGATIVE_HOURS = float(os.environ.get('SHARE_LINK_NEGATIVE_HOURS', '6'))
+
+_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) '
+        'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 '
+        'Mobile/15E148 Safari/604.1'
+    ),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+_SHARE_LINK_RE = re.compile(r'(?:vm\.tiktok\.com|vt\.tiktok\.com|tiktok\.com/t/)', re.IGNORECASE)
+_RAW_ID_RE = re.compile(r'^\d{15,25}$')
+
+
+def _combined(patterns):
+    """
+    One alternation of ``patterns`` (each with exactly one capturing
+    group), in priority order — group N+1 belongs to pattern N.
+    """
+    return re.compile('|'.join(f'(?:{p})' for p in patterns))
+
+
+# Product ID inside a resolved / pasted URL. The bare-segment fallback
+# skips /video/<id> — a video ID is not a product ID.
+_URL_RE = _combined([
+    r'shop/pdp/(?:[^/?#]+/)?(\d{10,25})',
+    r'(?:view|shop)/product/(\d{10,25})',
+    r'product/(\d{10,25})',
+    r'product_?[iI]d=(\d{10,25})',
+    r'(?<!/video)/(\d{15,25})(?:[/?#]|$)',
+])
+
+# Product ID in a product or video page's markup / embedded JSON blobs
+_HTML_RE = _combined([
+    r'"product_?[iI]d"\s*:\s*"(\d{15,25})"',
+    r'"productIds?"\s*:\s*\["(\d{15,25})"',
+    r'shop\.tiktok\.com/view/product/(\d{15,25})',
+    r'shop/pdp/(\d{15,25})',
+    r'"/product/(\d{15,25})',
+    r'data-product-id="(\d{15,25})"',
+])
+
+
+def _scan(regex, text):
+    """Single pass over ``text``; the highest-priority pattern that matched wins."""
+    best = None
+    for m in regex.finditer(text):
+        rank = m.lastindex
+        if best is None or rank < best[0]:
+            best = (rank, m.group(rank))
+            if rank == 1:
+                break
+    return best[1] if best else None
+
+
+def is_share_link(url):
+    """True for short share links that need redirect resolution."""
+    return bool(url and _SHARE_LINK_RE.search(url))
+
+
+def extract_product_id(text):
+    """
+    Product ID from a raw ID or text containing a full product URL — no
+    network. Short share links carry no ID; use ``resolve`` for those.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    if _RAW_ID_RE.match(text):
+        return text
+    return _scan(_URL_RE, text)
+
+
+def normalize(url):
+    """Cache key for a short link: scheme and host lowercased, query and fragment dropped."""
+    url = (url or '').strip()
+    if not re.match(r'^https?://', url, re.IGNORECASE):
+        url = 'https://' + url
+    m = re.match(r'^https?://([^/?#]+)([^?#]*)', url, re.IGNORECASE)
+    if not m:
+        return url
+    host = m.group(1).lower()
+    if host == 'tiktok.com':
+        host = 'www.tiktok.com'
+    return f"https://{host}{m.group(2).rstrip('/')}"
+
+
+# ---------------------------------------------------------------------------
+# Resolution
+# ---------------------------------------------------------------------------
+
+def _chase(url):
+    """
+    Follow ``url``'s redirects and look for a product ID.
+    Returns ``(product_id | None, final_url, source)``; ``source`` is None
+    when the page couldn't be fetched (so the miss isn't cacheable).
+    """
+    try:
+        resp = requests.get(url, headers=_HEADERS, allow_redirects=True,
+                            timeout=SHARE_LINK_TIMEOUT, stream=True)
+    except requests.RequestException as e:
+        log.info("[ShareLinks] fetch %s failed: %s", url, e)
+        return None, None, None
+    try:
+        final_url = resp.url
+        pid = extract_product_id(final_url)
+        if pid:
+            return pid, final_url, 'redirect'
+        if resp.status_code >= 400:
+            return None, final_url, None
+        buf = bytearray()
+        for chunk in resp.iter_content(16384):
+            buf += chunk
+            if len(buf) >= SHARE_LINK_SCAN_BYTES:
+                break
+        html = buf[:SHARE_LINK_SCAN_BYTES].decode('utf-8', 'ignore')
+        return _scan(_HTML_RE, html), final_url, 'html'
+    except requests.RequestException as e:
+        log.info("[ShareLinks] read %s failed: %s", url, e)
+        return None, final_url, None
+    finally:
+        resp.close()
+
+
+def _cached(key):
+    from app import db
+    from app.models import ShareLink
+
+    row = db.session.get(ShareLink, key)
+    if row is None or (row.expires_at and row.expires_at <= datetime.utcnow()):
+        return None
+    return row.product_id, row.region or 'US'
+
+
+def _store(key, product_id, region, resolved_url, source):
+    from app import db
+    from app.models import ShareLink
+
+    expires = None if product_id else datetime.utcnow() + timedelta(hours=SHARE_LINK_NEGATIVE_HOURS)
+    try:
+        db.session.merge(ShareLink(
+            url=key, product_id=product_id, region=region,
+            resolved_url=(resolved_url or '')[:1000] or None, source=source,
+            created_at=datetime.utcnow(), expires_at=expires,
+        ))
+        db.session.commit()
+    except Exception as e:
+        log.warning("[ShareLinks] cache write %s failed: %s", key, e)
+        try: db.session.rollback()
+        except Exception: pass
+
+
+def resolve(query):
+    """
+    ``(product_id, region)`` for a raw ID, product URL or short share
+    link; ``(None, 'US')`` when there's no product behind it. Short links
+    go through the ``share_links`` cache. Call inside an app context.
+    """
+    query = (query or '').strip()
+    if not is_share_link(query):
+        return extract_product_id(query), 'US'
+
+    key = normalize(query)
+    try:
+        hit = _cached(key)
+    except Exception as e:
+        log.warning("[ShareLinks] cache read %s failed: %s", key, e)
+        hit = None
+    if hit is not None:
+        return hit
+
+    pid, final_url, source = _chase(key)
+    region = 'US'
+    if not pid:
+        from app.services.echotik import extract_product_id_from_share_url
+        try:
+            result = extract_product_id_from_share_url(key)
+        except Exception as e:
+            log.warning("[ShareLinks] EchoTik extract %s failed: %s", key, e)
+            result = None
+        if result and result.get('product_id'):
+            pid = str(result['product_id']).replace('shop_', '')
+            region = result.get('region') or 'US'
+            source = 'echotik'
+
+    if pid or source:
+        _store(key, pid, region, final_url, source)
+    log.info("[ShareLinks] %s -> %s (%s)", key, pid, source or 'unresolved')
+    return pid, region
@@ -0,0 +1,253 @@
+"""
+PRISM — Trickle Scheduler
+Continuous refresh mode: instead of one 1:00 UTC deep-refresh burst,
+refresh a small, prioritised batch of products every few minutes so
+freshness is roughly uniform through the day and EchoTik load is smooth.
+
+Budget:
+    The monthly EchoTik credit budget (share reserved for product
+    refreshes) is turned into a per-hour allowance. Each tick accrues its
+    slice of that allowance, spends it on product refreshes, and is
+    charged the API calls it actually made (metered through the
+    pipeline's ``StageMeter``), so image signing / category enrichment
+    overhead is paid back on later ticks. Unspent credit carries over for
+    at most one hour — downtime never turns into a burst. The balance and
+    last accrual time live in the ``trickle_ledger`` system_config row,
+    changed by conditional UPDATEs, so every process draws on one budget
+    and a restart neither resets nor re-grants it.
+
+Priority:
+    Products whose ``next_refresh_at`` is due (services/refresh_policy)
+    are candidates. Each is
+    scored by staleness weighted by demand — lookup_count, recent user
+    views (product_views), favorite flag and cached Opportunity Score —
+    and the highest scores go first.
+
+Enabled with SCHEDULER_MODE=continuous (see services/scheduler), which
+also drops the deep refresh stage from daily_sync.
+
+Environment variables:
+    ECHOTIK_MONTHLY_CREDITS  — monthly credit budget (default 100000)
+    TRICKLE_BUDGET_SHARE     — share of it for product refreshes (default 0.6)
+    TRICKLE_INTERVAL_MINUTES — minutes between ticks (default 5)
+    TRICKLE_MAX_BATCH        — hard cap on products per tick (default 25)
+"""
+
+import os
+import json
+import math
+import logging
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+ECHOTIK_MONTHLY_CREDITS = int(os.environ.get('ECHOTIK_MONTHLY_CREDITS', '100000'))
+TRICKLE_BUDGET_SHARE = float(os.environ.get('TRICKLE_BUDGET_SHARE', '0.6'))
+TRICKLE_INTERVAL_MINUTES = int(os.environ.get('TRICKLE_INTERVAL_MINUTES', '5'))
+TRICKLE_MAX_BATCH = int(os.environ.get('TRICKLE_MAX_BATCH', '25'))
+
+# Detail + videos — the planning estimate; actual spend is metered
+CREDITS_PER_PRODUCT = 2
+
+# Candidate pools and the window for "recent" user views
+_POOL_SIZE = 500
+_VIEW_WINDOW_DAYS = 14
+
+# Demand weights — multipliers on staleness
+_W_LOOKUP = 0.5      # per ln(1 + lookup_count)
+_W_VIEWS = 0.5       # per ln(1 + recent views)
+_W_FAVORITE = 1.0
+_W_SCORE = 1.0       # per cached_score / 100
+
+_LEDGER_KEY = 'trickle_ledger'
+# Conditional UPDATEs lost to another process before giving up
+_LEDGER_RETRIES = 5
+
+
+def hourly_allowance():
+    """Credits per hour available to the trickle refresh."""
+    return ECHOTIK_MONTHLY_CREDITS * TRICKLE_BUDGET_SHARE / (30 * 24)
+
+
+class CreditLedger:
+    """
+    Accrues the per-tick allowance and charges actual spend, in one
+    system_config row shared by every process. Call inside an app context.
+    """
+
+    def __init__(self, per_hour=None, key=_LEDGER_KEY):
+        self.per_hour = hourly_allowance() if per_hour is None else per_hour
+        self.key = key
+
+    @property
+    def balance(self):
+        return self._read()[1]
+
+    def accrue(self, now=None):
+        """Add credit for the time since the last accrual (capped at one hour). Commits."""
+        now = now or datetime.utcnow()
+
+        def add(balance, last):
+            if last is None:
+                elapsed_h = TRICKLE_INTERVAL_MINUTES / 60
+            else:
+                elapsed_h = max(0.0, (now - last).total_seconds() / 3600)
+            return min(self.per_hour, balance + elapsed_h * self.per_hour), max(now, last or now)
+
+        return self._update(add)
+
+    def charge(self, credits):
+        """Take metered spend off the balance. Commits."""
+        return self._update(lambda balance, last: (balance - credits, last))
+
+    # -- internals ---------------------------------------------------------
+
+    def _read(self):
+        """``(raw value, balance, last accrual)`` of the ledger row."""
+        from app import db
+        from app.models import SystemConfig
+
+        raw = db.session.execute(
+            db.select(SystemConfig.value).where(SystemConfig.key == self.key)
+        ).scalar()
+        try:
+            state = json.loads(raw) if raw else {}
+        except ValueError:
+            state = {}
+        last = state.get('last')
+        return raw, float(state.get('balance') or 0.0), datetime.fromisoformat(last) if last else None
+
+    def _update(self, fn):
+        """
+        Apply ``fn(balance, last) → (balance, last)`` with a conditional
+        UPDATE on the value it read, re-reading when another process got
+        there first. Returns the new balance. Commits.
+        """
+        from app import db
+        from app.models import SystemConfig
+        from sqlalchemy.exc import IntegrityError
+
+        for _ in range(_LEDGER_RETRIES):
+            raw, balance, last = self._read()
+            balance, last = fn(balance, last)
+            value = json.dumps({'balance': round(balance, 4),
+                                'last': last.isoformat() if last else None})
+            try:
+                if raw is None:
+                    db.session.add(SystemConfig(key=self.key, value=value,
+                                                description='Trickle refresh credit balance'))
+                    db.session.commit()
+                    return balance
+                result = db.session.execute(
+                    db.update(SystemConfig)
+                    .where(SystemConfig.key == self.key, SystemConfig.value == raw)
+                    .values(value=value, updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+                if result.rowcount:
+                    return balance
+            except IntegrityError:
+                # Another process created the row first
+                db.session.rollback()
+        raise RuntimeError(f"Credit ledger '{self.key}' kept changing under this update")
+
+
+ledger = CreditLedger()
+
+
+def priority(product, views, now):
+    """Staleness (hours) × demand multiplier. Never-synced counts as 7 days stale."""
+    if product.last_echotik_sync:
+        stale_h = max(0.0, (now - product.last_echotik_sync).total_seconds() / 3600)
+    else:
+        stale_h = 7 * 24
+    demand = (
+        1.0
+        + _W_LOOKUP * math.log1p(product.lookup_count or 0)
+        + _W_VIEWS * math.log1p(views)
+        + (_W_FAVORITE if product.is_favorite else 0.0)
+        + _W_SCORE * (product.cached_score or 0) / 100
+    )
+    return stale_h * demand
+
+
+def pick_batch(limit, now=None):
+    """
+    The ``limit`` highest-priority due products. Candidates are the
+    longest-overdue, most-looked-up and favorited due products (bounded
+    pools, so one query each), with recent view counts in one grouped query.
+    """
+    from app import db
+    from app.models import Product, ProductView
+    from app.services.refresh_policy import due_filter
+
+    now = now or datetime.utcnow()
+    if limit <= 0:
+        return []
+    base = Product.query.filter(
+        db.or_(Product.product_status == 'active', Product.product_status.is_(None)),
+        due_filter(now),
+    )
+    pools = (
+        base.order_by(Product.next_refresh_at.asc().nullsfirst()).limit(_POOL_SIZE),
+        base.filter(Product.lookup_count > 0)
+            .order_by(Product.lookup_count.desc()).limit(_POOL_SIZE // 5),
+        base.filter(Product.is_favorite == True).limit(_POOL_SIZE // 5),  # noqa: E712
+    )
+    candidates = {}
+    for q in pools:
+        for p in q.all():
+            candidates[p.product_id] = p
+    if not candidates:
+        return []
+
+    views = dict(
+        db.session.query(ProductView.product_id, db.func.count(ProductView.id))
+        .filter(ProductView.product_id.in_(list(candidates)),
+                ProductView.viewed_at >= now - timedelta(days=_VIEW_WINDOW_DAYS))
+        .group_by(ProductView.product_id)
+        .all()
+    )
+    ranked = sorted(candidates.values(),
+                    key=lambda p: priority(p, views.get(p.product_id, 0), now),
+                    reverse=True)
+    return ranked[:limit]
+
+
+def trickle_refresh(app):
+    """
+    One tick: accrue credit, refresh as many top-priority products as the
+    balance covers, charge the metered API calls. Returns tick stats.
+    """
+    from app.services.pipeline import StageMeter, current_meter
+    from app.services.progress import publish
+    from app.services.scheduler import refresh_products
+
+    with app.app_context():
+        balance = ledger.accrue()
+    batch_size = min(TRICKLE_MAX_BATCH, int(balance // CREDITS_PER_PRODUCT))
+    stats = {'balance': round(balance, 1), 'picked': 0, 'refreshed': 0,
+             'videos': 0, 'api_calls': 0}
+    if batch_size <= 0:
+        return stats
+
+    meter = StageMeter()
+    token = current_meter.set(meter)
+    try:
+        with app.app_context():
+            products = pick_batch(batch_size)
+            stats['picked'] = len(products)
+            if products:
+                # The rate limiter paces calls; no fixed sleeps needed here
+                stats['refreshed'], stats['videos'] = refresh_products(products, pause=False)
+    finally:
+        current_meter.reset(token)
+        with app.app_context():
+            ledger.charge(meter.api_calls)
+
+    stats['api_calls'] = meter.api_calls
+    log.info("[TRICKLE] balance %.1f → refreshed %d/%d products (%d videos), %d API calls",
+             balance, stats['refreshed'], stats['picked'], stats['videos'], meter.api_calls)
+    publish('trickle', status='complete', **stats)
+    return stats
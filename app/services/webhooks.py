@@ -0,0 +1,377 @@
+"""
+PRISM — Scan Job Webhooks
+Pushes finished external API scans to the client instead of making it
+poll /api/extern/jobs/<id>.
+
+An API key registers a callback URL (PUT /api/extern/webhook) and gets a
+signing secret. When a ScanJob finishes, ``queue_delivery`` adds a
+``webhook_deliveries`` row in the same transaction; the dispatcher POSTs
+it as JSON with
+
+    X-Prism-Event:      scan.completed
+    X-Prism-Delivery:   <delivery id>
+    X-Prism-Signature:  t=<unix ts>,v1=<hex HMAC-SHA256(secret, "<ts>.<body>")>
+
+Any 2xx is delivered. Anything else — timeouts, connection errors, non-2xx
+— is retried with exponential backoff (30s doubling, capped at an hour)
+up to WEBHOOK_MAX_ATTEMPTS, after which the delivery is marked failed.
+Every row doubles as the delivery log (GET /api/extern/webhook/deliveries).
+
+Callback URLs must be publicly reachable: registration rejects literal
+private addresses and local names, and every POST re-resolves the host and
+refuses to send if any address is private, loopback, link-local, reserved
+or multicast. Redirects are never followed.
+
+Claiming moves ``next_attempt_at`` forward with a conditional UPDATE, so
+a dispatcher that dies mid-POST just leaves the delivery to be retried.
+
+The dispatcher polls every 2s while deliveries are flowing. After an empty
+poll it sleeps until the next pending retry is due, backing off to at most
+WEBHOOK_IDLE_SECONDS when nothing is pending. ``notify()``, called when a
+finished job queues a delivery, wakes it at once.
+
+Environment variables:
+    WEBHOOK_CONCURRENCY   — POSTs in flight per dispatcher (default 4)
+    WEBHOOK_TIMEOUT       — seconds per POST (default 10)
+    WEBHOOK_MAX_ATTEMPTS  — attempts before giving up (default 8)
+    WEBHOOK_IDLE_SECONDS  — longest dispatcher sleep while idle (default 60)
+"""
+
+import os
+import hmac
+import json
+import time
+import socket
+import hashlib
+import logging
+import ipaddress
+import threading
+from urllib.parse import urlparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+log = logging.getLogger(__name__)
+
+WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', '4'))
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', '10'))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+WEBHOOK_IDLE_SECONDS = float(os.environ.get('WEBHOOK_IDLE_SECONDS', '60'))
+
+_BACKOFF_BASE = 30
+_BACKOFF_MAX = 3600
+_POLL_SECONDS = 2.0
+_KEEP_DAYS = 30
+_USER_AGENT = 'PRISM-Webhooks/1.0'
+
+
+def validate_url(url):
+    """Error message for an unacceptable callback URL, or None if it's fine."""
+    try:
+        parsed = urlparse(url or '')
+    except ValueError:
+        return 'Invalid URL'
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return 'Webhook URL must be an http(s) URL'
+    host = parsed.hostname.lower()
+    if host == 'localhost' or host.endswith('.local') or host.endswith('.internal'):
+        return 'Webhook URL must be publicly reachable'
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    if not _is_public(ip):
+        return 'Webhook URL must be publicly reachable'
+    return None
+
+
+def _is_public(ip):
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+def check_destination(url):
+    """
+    ``validate_url`` plus a DNS lookup: error message if the host resolves
+    to any non-public address, else None. Run right before each POST.
+    """
+    error = validate_url(url)
+    if error:
+        return error
+    parsed = urlparse(url)
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    try:
+        addresses = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        return f"DNS lookup failed: {e}"
+    for *_, sockaddr in addresses:
+        if not _is_public(ipaddress.ip_address(sockaddr[0].split('%', 1)[0])):
+            return 'Webhook URL resolves to a non-public address'
+    return None
+
+
+def sign(secret, body, ts=None):
+    """``X-Prism-Signature`` header value for ``body`` (bytes)."""
+    ts = int(ts if ts is not None else time.time())
+    mac = hmac.new(secret.encode(), f"{ts}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={ts},v1={mac}"
+
+
+# ---------------------------------------------------------------------------
+# Queue — call inside an app context
+# ---------------------------------------------------------------------------
+
+def queue_delivery(job_id, key_id, status, result, completed_at=None):
+    """
+    Add a pending delivery for a finished job if its key has a webhook.
+    Joins the caller's transaction (no commit). Returns True if queued.
+    """
+    from app import db
+    from app.models import ApiKey, WebhookDelivery
+
+    if key_id is None:
+        return False
+    url = db.session.execute(db.select(ApiKey.webhook_url).where(ApiKey.id == key_id)).scalar()
+    if not url:
+        return False
+    payload = {
+        'event': 'scan.completed',
+        'job_id': job_id,
+        'status': status,
+        'result': result,
+        'completed_at': (completed_at or datetime.utcnow()).isoformat(),
+    }
+    db.session.add(WebhookDelivery(
+        api_key_id=key_id, scan_job_id=job_id, url=url,
+        payload_json=json.dumps(payload, default=str), status='pending',
+        next_attempt_at=datetime.utcnow(),
+    ))
+    return True
+
+
+def _claim(limit):
+    """Lease up to ``limit`` due deliveries. Returns their ids. Commits."""
+    from app import db
+    from app.models import WebhookDelivery
+
+    now = datetime.utcnow()
+    due = db.session.execute(
+        db.select(WebhookDelivery.id, WebhookDelivery.next_attempt_at)
+        .where(WebhookDelivery.status == 'pending', WebhookDelivery.next_attempt_at <= now)
+        .order_by(WebhookDelivery.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    # Push the next attempt out past the POST timeout — that's the lease
+    lease_until = now + timedelta(seconds=WEBHOOK_TIMEOUT * 3 + 30)
+    claimed = []
+    for d in due:
+        taken = db.session.execute(
+            db.update(WebhookDelivery)
+            .where(WebhookDelivery.id == d.id, WebhookDelivery.status == 'pending',
+                   WebhookDelivery.next_attempt_at == d.next_attempt_at)
+            .values(next_attempt_at=lease_until,
+                    attempts=db.func.coalesce(WebhookDelivery.attempts, 0) + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if taken:
+            claimed.append(d.id)
+    db.session.commit()
+    return claimed
+
+
+def _post(delivery_id, url, body, secret):
+    """POST one delivery. Returns ``(http_status | None, error | None)``."""
+    error = check_destination(url)
+    if error:
+        return None, error
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': _USER_AGENT,
+        'X-Prism-Event': 'scan.completed',
+        'X-Prism-Delivery': str(delivery_id),
+    }
+    if secret:
+        headers['X-Prism-Signature'] = sign(secret, body)
+    try:
+        resp = requests.post(url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT,
+                             allow_redirects=False)
+        resp.close()
+    except requests.RequestException as e:
+        return None, f"{type(e).__name__}: {e}"[:500]
+    if 200 <= resp.status_code < 300:
+        return resp.status_code, None
+    return resp.status_code, f"HTTP {resp.status_code}"
+
+
+def _record(delivery_id, attempts, http_status, error):
+    from app import db
+    from app.models import WebhookDelivery
+
+    now = datetime.utcnow()
+    values = {'response_status': http_status, 'last_error': error}
+    if error is None:
+        values.update(status='delivered', delivered_at=now)
+    elif attempts >= WEBHOOK_MAX_ATTEMPTS:
+        values.update(status='failed')
+    else:
+        delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** (attempts - 1))
+        values.update(next_attempt_at=now + timedelta(seconds=delay))
+    db.session.execute(
+        db.update(WebhookDelivery).where(WebhookDelivery.id == delivery_id)
+        .values(**values).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def deliver_due(pool, limit=None):
+    """Claim due deliveries and POST them on ``pool``. Returns how many were attempted."""
+    from app import db
+    from app.models import ApiKey, WebhookDelivery
+
+    ids = _claim(limit or WEBHOOK_CONCURRENCY * 2)
+    if not ids:
+        return 0
+    rows = db.session.execute(
+        db.select(WebhookDelivery.id, WebhookDelivery.url, WebhookDelivery.payload_json,
+                  WebhookDelivery.attempts, ApiKey.webhook_secret)
+        .join(ApiKey, ApiKey.id == WebhookDelivery.api_key_id, isouter=True)
+        .where(WebhookDelivery.id.in_(ids))
+    ).all()
+    db.session.commit()
+
+    futures = {
+        pool.submit(_post, r.id, r.url, (r.payload_json or '{}').encode(), r.webhook_secret): r
+        for r in rows
+    }
+    for fut, r in futures.items():
+        http_status, error = fut.result()
+        _record(r.id, r.attempts or 1, http_status, error)
+        if error:
+            log.info("[Webhooks] delivery %s to %s failed (attempt %s): %s",
+                     r.id, r.url, r.attempts, error)
+    return len(rows)
+
+
+def next_due():
+    """``next_attempt_at`` of the earliest pending delivery, or None. Commits."""
+    from app import db
+    from app.models import WebhookDelivery
+
+    due = db.session.execute(
+        db.select(db.func.min(WebhookDelivery.next_attempt_at))
+        .where(WebhookDelivery.status == 'pending')
+    ).scalar()
+    db.session.commit()
+    return due
+
+
+def idle_wait(idle, due, now=None):
+    """
+    Seconds to sleep after an empty poll: the backoff ``idle``, cut short
+    when the pending delivery due at ``due`` comes up first.
+    """
+    if due is None:
+        return idle
+    until_due = (due - (now or datetime.utcnow())).total_seconds()
+    return max(_POLL_SECONDS, min(idle, until_due))
+
+
+def purge_old(older_than_days=_KEEP_DAYS):
+    """Delete finished deliveries older than ``older_than_days``. Commits."""
+    from app import db
+    from app.models import WebhookDelivery
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    n = WebhookDelivery.query.filter(
+        WebhookDelivery.status.in_(['delivered', 'failed']),
+        WebhookDelivery.created_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+class WebhookDispatcher:
+    """Background thread delivering due webhooks with up to WEBHOOK_CONCURRENCY POSTs at once."""
+
+    def __init__(self, app):
+        self.app = app
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._woken = False
+        self._pool = ThreadPoolExecutor(max_workers=max(1, WEBHOOK_CONCURRENCY),
+                                        thread_name_prefix='webhook-post')
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='webhook-dispatch')
+            self._thread.start()
+        return self
+
+    def notify(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def _loop(self):
+        last_purge = None
+        idle = _POLL_SECONDS
+        while not self._stop.is_set():
+            with self._cond:
+                self._woken = False
+            sent, due = 0, None
+            with self.app.app_context():
+                try:
+                    sent = deliver_due(self._pool)
+                    now = datetime.utcnow()
+                    if last_purge is None or now - last_purge > timedelta(hours=6):
+                        last_purge = now
+                        purge_old()
+                    if not sent:
+                        due = next_due()
+                except Exception:
+                    log.exception("[Webhooks] dispatch error")
+                    from app import db
+                    try: db.session.rollback()
+                    except Exception: pass
+            if sent:
+                idle = _POLL_SECONDS
+                continue
+            with self._cond:
+                if not self._woken:
+                    self._cond.wait(idle_wait(idle, due))
+                woken = self._woken
+            # Back off while nothing is queued; a notify() starts over
+            idle = _POLL_SECONDS if woken else min(WEBHOOK_IDLE_SECONDS, idle * 2)
+
+
+_dispatcher = None
+
+
+def notify():
+    """Wake this process's dispatcher, if it runs one."""
+    if _dispatcher is not None:
+        _dispatcher.notify()
+
+
+def start_dispatcher(app):
+    """Start this process's webhook dispatcher (once)."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = WebhookDispatcher(app).start()
+    return _dispatcher
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Brand Hunter persistence benchmark.
+
+Times saving one scanned brand of N products (default 2,000) two ways:
+
+    legacy — per-row BrandProduct adds, aggregates in Python, then
+             sync_to_db in 50-row chunks (savepoint + SELECT per row)
+    bulk   — replace_brand_products (executemany), recompute_brand_aggregates
+             (one grouped UPDATE) and bulk_upsert_products (one upsert)
+
+Only DB work is measured: sync_to_db's post-sync image signing and category
+enrichment (both EchoTik network calls) are switched off for the run.
+
+Usage:
+    DATABASE_URL=postgresql://... python bench_brand_persist.py [N]
+    python bench_brand_persist.py            # throwaway SQLite file
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('SKIP_SCHEDULER', '1')
+
+from app import app, db, Product, ScannedBrand, BrandProduct  # noqa: E402
+import app.services.echotik as echotik  # noqa: E402
+from app.services.brand_hunter import (  # noqa: E402
+    brand_product_row, replace_brand_products, recompute_brand_aggregates,
+)
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+SHOP_ID = 'bench_shop'
+
+
+def fake_products(n):
+    rnd = random.Random(42)
+    out = []
+    for i in range(n):
+        sales = rnd.randint(0, 50000)
+        out.append((i // 10 + 1, {
+            'product_id': f'9{i:018d}',
+            'product_name': f'Bench product {i}',
+            'image_url': f'https://p16-shop.tiktokcdn-us.com/bench/{i}.jpg',
+            'price': round(rnd.uniform(5, 80), 2),
+            'commission_rate': rnd.choice([0, 0.05, 0.1, 0.15, 0.2]),
+            'sales': sales,
+            'sales_7d': sales // 20,
+            'sales_30d': sales // 5,
+            'gmv_30d': sales * 3.5,
+            'video_count_alltime': rnd.randint(0, 900),
+            'influencer_count': rnd.randint(0, 200),
+            'category': 'Beauty',
+        }))
+    return out
+
+
+def reset(brand):
+    BrandProduct.query.filter_by(brand_id=brand.id).delete()
+    Product.query.filter(Product.seller_id == SHOP_ID).delete()
+    db.session.commit()
+
+
+def run_legacy(brand, pages):
+    rows = [brand_product_row(brand.id, p, page) for page, p in pages]
+    bps = [BrandProduct(**row) for row in rows]
+    BrandProduct.query.filter_by(brand_id=brand.id).delete()
+    for bp in bps:
+        db.session.add(bp)
+    brand.total_products = len(bps)
+    brand.sales_30d = sum(bp.sales_30d or 0 for bp in bps)
+    brand.revenue_30d = sum(bp.revenue_30d or 0 for bp in bps)
+    brand.units_sold_30d = sum(bp.total_sales or 0 for bp in bps)
+    comms = [bp.commission_rate for bp in bps if bp.commission_rate and bp.commission_rate > 0]
+    brand.avg_commission = sum(comms) / len(comms) if comms else 0
+    brand.top_product_name = max(bps, key=lambda bp: bp.total_sales or 0).title
+    brand.is_hidden_gem = any(bp.is_hidden_gem for bp in bps)
+    db.session.commit()
+    raw = [_sync_dict(r) for r in rows]
+    for i in range(0, len(raw), 50):
+        echotik.sync_to_db(raw[i:i + 50])
+
+
+def run_bulk(brand, pages):
+    rows = [brand_product_row(brand.id, p, page) for page, p in pages]
+    replace_brand_products(brand.id, rows)
+    recompute_brand_aggregates([brand.id])
+    db.session.commit()
+    echotik.bulk_upsert_products([_sync_dict(r) for r in rows])
+
+
+def _sync_dict(r):
+    return {
+        'product_id': r['product_id'], 'product_name': r['title'],
+        'image_url': r['image_url'], 'price': r['price'],
+        'commission_rate': r['commission_rate'], 'sales': r['total_sales'],
+        'sales_7d': r['sales_7d'], 'sales_30d': r['sales_30d'],
+        'video_count_alltime': r['total_videos'], 'video_count': r['total_videos'],
+        'influencer_count': r['influencer_count'], 'category': r['category'],
+        'seller_name': 'Bench Brand', 'seller_id': SHOP_ID,
+    }
+
+
+def main():
+    echotik._sign_product_images = lambda _db: None
+    echotik._enrich_missing_categories = lambda _db: None
+    pages = fake_products(N)
+
+    with app.app_context():
+        brand = ScannedBrand.query.filter_by(brand_id=SHOP_ID).first()
+        if not brand:
+            brand = ScannedBrand(brand_id=SHOP_ID, brand_name='Bench Brand')
+            db.session.add(brand)
+            db.session.commit()
+
+        results = {}
+        for label, fn in (('legacy', run_legacy), ('bulk', run_bulk)):
+            for phase in ('cold', 'warm'):  # warm = products already exist (update path)
+                if phase == 'cold':
+                    reset(brand)
+                t0 = time.perf_counter()
+                fn(brand, pages)
+                results[(label, phase)] = time.perf_counter() - t0
+                db.session.expire_all()
+                brand = db.session.get(ScannedBrand, brand.id)
+                results[(label, 'agg')] = (brand.total_products, brand.sales_30d,
+                                          round(brand.avg_commission or 0, 6),
+                                          brand.top_product_name, bool(brand.is_hidden_gem))
+
+        print(f"Brand Hunter persistence — {N} products on {db.engine.dialect.name}")
+        for phase in ('cold', 'warm'):
+            legacy, bulk = results[('legacy', phase)], results[('bulk', phase)]
+            print(f"  {phase:<5} legacy {legacy:8.2f}s   bulk {bulk:6.2f}s   "
+                  f"speedup x{legacy / max(bulk, 1e-6):.1f}")
+        same = results[('legacy', 'agg')] == results[('bulk', 'agg')]
+        print(f"  aggregates match: {same}  {results[('bulk', 'agg')]}")
+        reset(brand)
+
+
+if __name__ == '__main__':
+    main()
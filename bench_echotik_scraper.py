@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+EchoTik scraper benchmark.
+
+Serves a local stub of the EchoTik listing pages — each page pulls a
+stylesheet, a web font, a video and STUB_IMAGES product images (every
+asset delayed by STUB_ASSET_MS), then fetches its product list from a
+JSON XHR — and scrapes it RUNS times two ways:
+
+    legacy — fresh Chromium per run, every resource loaded, each page
+             waits for networkidle (the old scraper, minus its 2-5s
+             random sleeps per page)
+    pooled — scrape_products: pooled browser, ECHOTIK_SCRAPER_CONTEXTS
+             contexts sharing the pages, heavy resources blocked, each
+             page waits for its product XHR
+
+Reports pages/min per run; the first pooled run includes the browser
+launch, later ones reuse it. Nothing is written to the database.
+
+Usage:
+    python bench_echotik_scraper.py [PAGES] [RUNS]
+    STUB_IMAGES=60 STUB_ASSET_MS=150 python bench_echotik_scraper.py 10 3
+    ECHOTIK_SCRAPER_CONTEXTS=1 python bench_echotik_scraper.py   # sequential
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('SKIP_SCHEDULER', '1')
+os.environ.setdefault('ECHOTIK_SCRAPER_PAGE_DELAY', '0')
+
+from app.services import echotik_scraper  # noqa: E402
+
+PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+STUB_IMAGES = int(os.environ.get('STUB_IMAGES', '40'))
+STUB_ASSET_MS = int(os.environ.get('STUB_ASSET_MS', '80'))
+STUB_API_MS = int(os.environ.get('STUB_API_MS', '150'))
+PRODUCTS_PER_PAGE = 20
+
+_ASSET_TYPES = {
+    'css': ('text/css', b'body{font-family:stub}' + b' ' * 20_000),
+    'woff2': ('font/woff2', b'\0' * 40_000),
+    'jpg': ('image/jpeg', b'\xff\xd8' + b'\0' * 30_000),
+    'mp4': ('video/mp4', b'\0' * 200_000),
+}
+
+
+def _listing_html(page):
+    images = ''.join(f'<img src="/assets/p{page}_{i}.jpg" width="80">' for i in range(STUB_IMAGES))
+    return f"""<!doctype html><html><head>
+<link rel="stylesheet" href="/assets/app.css?p={page}">
+<style>@font-face{{font-family:stub;src:url(/assets/font.woff2?p={page})}}</style>
+</head><body><h1>Trending — page {page}</h1>
+<div id="grid">{images}</div><video src="/assets/clip.mp4?p={page}" autoplay muted></video>
+<script>
+fetch('/api/v3/echotik/product/list?page={page}')
+  .then(r => r.json())
+  .then(d => {{ document.getElementById('grid').insertAdjacentHTML('beforeend',
+       d.data.list.map(p => '<p>' + p.product_name + '</p>').join('')); }});
+</script></body></html>""".encode()
+
+
+def _products(page):
+    return [{
+        'product_id': f'17{page:04d}{i:06d}',
+        'product_name': f'Stub product {page}-{i}',
+        'total_sale_7d_cnt': 1000 - i,
+        'spu_avg_price': 19.99,
+    } for i in range(PRODUCTS_PER_PAGE)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        if url.path == '/products/trending':
+            self._send(200, 'text/html; charset=utf-8', _listing_html(page))
+        elif url.path == '/api/v3/echotik/product/list':
+            time.sleep(STUB_API_MS / 1000)
+            body = json.dumps({'code': 0, 'data': {'list': _products(page)}}).encode()
+            self._send(200, 'application/json', body)
+        elif url.path.startswith('/assets/'):
+            time.sleep(STUB_ASSET_MS / 1000)
+            content_type, body = _ASSET_TYPES.get(url.path.rsplit('.', 1)[-1], ('application/octet-stream', b''))
+            self._send(200, content_type, body)
+        else:
+            self._send(404, 'text/plain', b'not found')
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_legacy(products_url, cookies, pages):
+    """The pre-pool scraper's loading strategy, without its random sleeps."""
+    from playwright.async_api import async_playwright
+
+    captured = []
+
+    async def on_response(response):
+        if echotik_scraper._matches_product_xhr(response.url) \
+                and 'application/json' in response.headers.get('content-type', ''):
+            captured.extend(echotik_scraper._extract_products_from_response(await response.json()))
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=echotik_scraper._LAUNCH_ARGS)
+        try:
+            context = await browser.new_context(viewport={'width': 1920, 'height': 1080})
+            await context.add_cookies(cookies)
+            page = await context.new_page()
+            page.on('response', on_response)
+            await page.goto(products_url, wait_until='networkidle', timeout=45_000)
+            for page_num in range(2, pages + 1):
+                await page.goto(f"{products_url}?page={page_num}", wait_until='networkidle', timeout=30_000)
+        finally:
+            await browser.close()
+    return len(captured)
+
+
+def main():
+    server = start_stub()
+    host, port = server.server_address
+    products_url = f'http://{host}:{port}/products/trending'
+    cookies = [{'name': 'session', 'value': 'bench', 'domain': host, 'path': '/'}]
+
+    print(f"EchoTik scraper — {PAGES} pages x {RUNS} runs, {STUB_IMAGES} images/page, "
+          f"{STUB_ASSET_MS}ms per asset, {STUB_API_MS}ms product XHR")
+    results = {'legacy': [], 'pooled': []}
+    try:
+        for run in range(1, RUNS + 1):
+            t0 = time.perf_counter()
+            captured = asyncio.run(run_legacy(products_url, cookies, PAGES))
+            elapsed = time.perf_counter() - t0
+            results['legacy'].append(PAGES * 60 / elapsed)
+            print(f"  legacy run {run}: {elapsed:6.2f}s  {results['legacy'][-1]:7.1f} pages/min  "
+                  f"{captured} products")
+
+        for run in range(1, RUNS + 1):
+            t0 = time.perf_counter()
+            out = asyncio.run(echotik_scraper.scrape_products(PAGES, products_url=products_url, cookies=cookies))
+            elapsed = time.perf_counter() - t0
+            loaded = out['stats']['pages_loaded']
+            results['pooled'].append(loaded * 60 / elapsed)
+            note = f"{out['stats']['contexts']} contexts, " + ('launch' if out['stats']['browser_launched'] else 'warm')
+            print(f"  pooled run {run}: {elapsed:6.2f}s  {results['pooled'][-1]:7.1f} pages/min  "
+                  f"{len(out['products'])} products ({note})")
+    finally:
+        echotik_scraper.shutdown_browser_pool()
+        server.shutdown()
+
+    legacy = sum(results['legacy']) / len(results['legacy'])
+    pooled = sum(results['pooled']) / len(results['pooled'])
+    print(f"  mean: legacy {legacy:.1f} pages/min, pooled {pooled:.1f} pages/min "
+          f"(x{pooled / max(legacy, 1e-6):.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,14 +8,16 @@ Brand Hunter Discord Bot
 import os
 import re
 import sys
-import json
 import logging
+import functools
 import discord
 from discord.ext import commands, tasks
 from discord import Embed
 from datetime import datetime, time, timezone
-import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import aiohttp
 
 # Force unbuffered output for Render
 sys.stdout.reconfigure(line_buffering=True)
@@ -25,7 +27,11 @@ log = logging.getLogger('BrandHunterBot')
 
 # Database setup - Import from main application to ensure model consistency
 # Database setup - Import from main application to ensure model consistency
-from app import app, db, Product, User, ApiKey, Subscription
+from app import app, db, Product, User, ApiKey
+from app.services.refresh_policy import is_due, reschedule
+from app.services.share_links import is_share_link, extract_product_id, resolve as resolve_share_link
+from app.services import entitlements, hot_products, ai_context
+from app.services.ai_cache import response_cache, context_key
 
 # Discord Config
 DISCORD_BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN', '')
@@ -119,14 +125,12 @@ async def remove_vantage_pro_role(discord_id: str):
     discord_id_int = int(discord_id)
 
     # Check if user is admin — admins keep role permanently
-    with app.app_context():
-        user = User.query.filter_by(discord_id=str(discord_id)).first()
-        if user and user.is_admin:
-            log.info(f"[Role] Skipping role removal for admin {discord_id}")
-            return False
-        if discord_id_int in DISCORD_ADMIN_IDS:
-            log.info(f"[Role] Skipping role removal for env admin {discord_id}")
-            return False
+    if discord_id_int in DISCORD_ADMIN_IDS:
+        log.info(f"[Role] Skipping role removal for env admin {discord_id}")
+        return False
+    if await run_blocking(_is_db_admin, discord_id):
+        log.info(f"[Role] Skipping role removal for admin {discord_id}")
+        return False
 
     removed = False
     for guild in bot.guilds:
@@ -146,6 +150,12 @@ async def remove_vantage_pro_role(discord_id: str):
     return removed
 
 
+def _is_db_admin(discord_id):
+    with app.app_context():
+        user = User.query.filter_by(discord_id=str(discord_id)).first()
+        return bool(user and user.is_admin)
+
+
 def has_vantage_pro_role(member):
     """Check if a guild member has the Vantage Pro role."""
     if not member or not hasattr(member, 'roles'):
@@ -173,7 +183,7 @@ async def check_subscriber_gate(message):
         return True
 
     # DB check as fallback (role might not be assigned yet)
-    has_sub, _user = check_user_subscription(str(member.id))
+    has_sub, _user = await run_blocking(check_user_subscription, str(member.id))
     if has_sub:
         return True
 
@@ -191,8 +201,7 @@ active_ai_channels = {}
 # Hot Product Criteria - Free Shipping Deals
 MIN_SALES_7D = 50  # Lower threshold since we're filtering by free shipping
 MAX_VIDEO_COUNT = 30  # Low competition
-MAX_DAILY_POSTS = 15  # Top 15 daily
-DAYS_BEFORE_REPEAT = 3  # Don't show same product for 3 days
+MAX_DAILY_POSTS = 15  # Top 15 daily (repeat window: HOT_REPEAT_DAYS, services/hot_products)
 
 # Discord Config
 
@@ -205,120 +214,107 @@ intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)  # Disable default help
 log.info("====== CODE VERSION: 2026-02-15-v3 (with creator lists + thread join) ======")
 
-def is_share_link(url):
-    """Return True if the URL is a short share link that needs redirect resolution."""
-    return bool(re.search(r'(vm\.tiktok\.com|vt\.tiktok\.com|tiktok\.com/t/)', url, re.IGNORECASE))
 
+# ---------------------------------------------------------------------------
+# Async I/O — keep blocking work off the event loop
+# ---------------------------------------------------------------------------
+# Synchronous helpers (SQLAlchemy queries, EchoTik/requests calls) run on a
+# bounded thread pool through run_blocking(); HTTP the bot makes itself goes
+# through one pooled aiohttp session. Each channel handles at most
+# BOT_CHANNEL_CONCURRENCY lookups / AI replies at once, so a burst in one
+# channel can't take every worker. LoopLagMonitor measures how late the loop
+# wakes up — `!looplag` shows it.
 
-def extract_product_id(text):
-    """Extract TikTok product ID from a fully-resolved URL or raw text.
-    Does NOT handle short share links — use resolve_tiktok_share_link() first."""
-    patterns = [
-        r'shop/pdp/(\d+)',
-        r'view/product/(\d+)',
-        r'product/(\d+)',
-        r'product_id=(\d+)',
-        r'productId=(\d+)',
-        r'/(\d{15,25})(?:[/?]|$)',  # bare ID in path segment
-    ]
+BOT_DB_THREADS = int(os.environ.get('BOT_DB_THREADS', '4'))
+BOT_HTTP_CONNECTIONS = int(os.environ.get('BOT_HTTP_CONNECTIONS', '20'))
+BOT_CHANNEL_CONCURRENCY = int(os.environ.get('BOT_CHANNEL_CONCURRENCY', '2'))
+BOT_LOOP_LAG_WARN_MS = float(os.environ.get('BOT_LOOP_LAG_WARN_MS', '250'))
 
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return match.group(1)
+_db_pool = ThreadPoolExecutor(max_workers=max(1, BOT_DB_THREADS), thread_name_prefix='bot-db')
 
-    # Plain numeric product ID pasted directly
-    if re.match(r'^\d{15,25}$', text.strip()):
-        return text.strip()
 
-    return None
+async def run_blocking(fn, *args, **kwargs):
+    """Run a synchronous DB / HTTP helper on the bot's bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_pool, functools.partial(fn, *args, **kwargs))
 
 
-def resolve_tiktok_share_link(url):
-    """Follow a TikTok short share link to its final destination, then extract the product ID.
+_http_session = None
 
-    Handles:
-      - tiktok.com/t/XXXXXXX   (newer share format)
-      - vm.tiktok.com/XXXXXXX  (legacy short link)
-      - vt.tiktok.com/XXXXXXX  (regional variant)
 
-    Returns (product_id, region) or (None, 'US').
-    """
-    print(f"[Bot] Resolving share link: {url}")
-
-    # Normalise: bare tiktok.com/t/XXX links sometimes arrive without scheme
-    if not url.startswith('http'):
-        url = 'https://' + url
-
-    headers = {
-        'User-Agent': (
-            'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) '
-            'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 '
-            'Mobile/15E148 Safari/604.1'
-        ),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
+def http_session():
+    """The bot's shared aiohttp session (created lazily, inside the running loop)."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=BOT_HTTP_CONNECTIONS, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=65),
+        )
+    return _http_session
+
+
+_channel_slots = {}
+
+
+def channel_slot(channel_id):
+    """Semaphore bounding concurrent lookups / AI replies in one channel."""
+    sem = _channel_slots.get(channel_id)
+    if sem is None:
+        sem = _channel_slots[channel_id] = asyncio.Semaphore(max(1, BOT_CHANNEL_CONCURRENCY))
+    return sem
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag — how much later than asked a short sleep wakes up."""
+
+    def __init__(self, interval=0.5, window=600):
+        self.interval = interval
+        self.samples = deque(maxlen=window)   # last `window` lags in ms (~5 min)
+        self.max_ms = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - t0 - self.interval) * 1000)
+            self.samples.append(lag_ms)
+            self.max_ms = max(self.max_ms, lag_ms)
+            if lag_ms >= BOT_LOOP_LAG_WARN_MS:
+                log.warning(f"[Loop] event loop lagged {lag_ms:.0f} ms")
+            if loop.time() - last_report >= 300:
+                last_report = loop.time()
+                log.info(f"[Loop] lag {self.stats()}")
+
+    def stats(self):
+        s = sorted(self.samples)
+        if not s:
+            return {'samples': 0}
+        pct = lambda q: round(s[min(len(s) - 1, int(q * len(s)))], 1)
+        return {
+            'samples': len(s),
+            'p50_ms': pct(0.50),
+            'p99_ms': pct(0.99),
+            'max_ms': round(s[-1], 1),
+            'max_since_start_ms': round(self.max_ms, 1),
+            'db_pool_queued': _db_pool._work_queue.qsize(),
+        }
 
-    try:
-        # GET with full redirect following — TikTok blocks/truncates HEAD redirects
-        res = requests.get(url, allow_redirects=True, headers=headers, timeout=15)
-        final_url = res.url
-        print(f"[Bot] Resolved to: {final_url}")
-
-        pid = extract_product_id(final_url)
-        if pid:
-            print(f"[Bot] Product ID from resolved URL: {pid}")
-            return pid, 'US'
-
-        html = res.text
-
-        # Patterns found in TikTok's embedded JSON / Shop page / video page markup.
-        # tiktok.com/t/ links often land on a video page that has a tagged shop product
-        # embedded in __UNIVERSAL_DATA_FOR_REHYDRATION__ or window.__NEXT_DATA__ JSON blobs.
-        html_patterns = [
-            # Shop product pages
-            r'"productId"\s*:\s*"(\d{15,25})"',
-            r'"product_id"\s*:\s*"(\d{15,25})"',
-            r'shop\.tiktok\.com/view/product/(\d{15,25})',
-            r'shop/pdp/(\d{15,25})',
-            r'"/product/(\d{15,25})',
-            r'data-product-id="(\d{15,25})"',
-            # Video pages with tagged products (SIGI_STATE / NEXT_DATA blobs)
-            r'"itemId"\s*:\s*"(\d{15,25})"',
-            r'"productIds?\s*":\s*\["(\d{15,25})"',
-            r'"shoppingInfo".*?"productId"\s*:\s*"(\d{15,25})"',
-            r'tiktokcdn\.com.*?/product/(\d{15,25})',
-        ]
 
-        for pattern in html_patterns:
-            match = re.search(pattern, html, re.DOTALL)
-            if match:
-                pid = match.group(1)
-                print(f"[Bot] Product ID from page HTML ({pattern[:40]}): {pid}")
-                return pid, 'US'
-
-        # Also check any shop.tiktok.com URLs embedded in the page
-        shop_urls = re.findall(r'shop\.tiktok\.com[^\s"\'<>]+', html)
-        for shop_url in shop_urls:
-            pid = extract_product_id(shop_url)
-            if pid:
-                print(f"[Bot] Product ID from embedded shop URL: {pid}")
-                return pid, 'US'
-
-        # Conservative numeric fallback — 17-20 digit IDs in first 8 KB
-        for pid in re.findall(r'\b(\d{17,20})\b', final_url + html[:8000]):
-            print(f"[Bot] Numeric fallback product ID: {pid}")
-            return pid, 'US'
-
-        print(f"[Bot] Could not extract product ID from {final_url} (likely a plain video with no tagged product)")
-
-    except requests.exceptions.Timeout:
-        print(f"[Bot] Timeout resolving {url}")
-    except Exception as e:
-        print(f"[Bot] Resolution error: {e}")
+loop_lag = LoopLagMonitor()
 
-    return None, 'US'
+
+def resolve_tiktok_share_link(url):
+    """Resolve a TikTok short share link through the shared, DB-cached resolver
+    (services/share_links). Returns (product_id, region) or (None, 'US')."""
+    with app.app_context():
+        return resolve_share_link(url)
 
 
 def get_product_from_db(product_id):
@@ -358,7 +354,9 @@ def check_user_subscription(discord_id):
       1. DISCORD_ADMIN_IDS env var — hard-coded server admins, no DB needed
       2. User.is_admin flag in PRISM DB
       3. Active Subscription row
-    Returns (has_access: bool, user_or_None)
+    (2) and (3) come from the entitlement cache (services/entitlements).
+    Returns (has_access: bool, entitlement_or_None) — the entitlement has
+    .user_id and .is_admin, and is None when no PRISM account is linked.
     """
     try:
         # Fast env-var admin bypass — no DB hit needed
@@ -367,13 +365,8 @@ def check_user_subscription(discord_id):
             return True, None
 
         with app.app_context():
-            user = User.query.filter_by(discord_id=str(discord_id)).first()
-            if not user:
-                return False, None
-            if user.is_admin:
-                return True, user
-            sub = Subscription.query.filter_by(user_id=user.id, status='active').first()
-            return (sub is not None), user
+            ent = entitlements.lookup(discord_id)
+        return ent.has_access, (ent if ent.user_id else None)
 
     except Exception as e:
         log.error(f"[Sub] check_user_subscription error for {discord_id}: {e}")
@@ -443,7 +436,7 @@ def save_product_to_db(product_data):
             'cached_image_url': p.cached_image_url
         }
 
-CACHE_TTL_SECONDS = 86400  # 24 hours — fresh data threshold
+CACHE_TTL_SECONDS = 86400  # 24 hours — fallback for rows never scheduled by refresh_policy
 
 
 def _product_to_dict(p, source='cache'):
@@ -476,6 +469,8 @@ def _product_to_dict(p, source='cache'):
 
 def _update_product_from_detail(p, detail):
     """Apply EchoTik detail data onto a Product ORM object."""
+    p.prev_sales_7d = p.sales_7d or 0
+    p.prev_sales_30d = p.sales_30d or 0
     p.product_name = detail.get('product_name') or p.product_name
     p.seller_name = detail.get('seller_name') or p.seller_name
     p.image_url = detail.get('image_url') or p.image_url
@@ -508,7 +503,7 @@ def get_product_data(product_id):
     """Cache-first product lookup with automatic staleness refresh.
 
     Returns (product_dict, source) where source is one of:
-      'cache'     — fresh data from DB (< 24h old)
+      'cache'     — fresh data from DB (next_refresh_at not reached)
       'refreshed' — stale DB row updated via EchoTik API
       'new'       — product not in DB, fetched from API and saved
       'not_found' — no data anywhere
@@ -529,7 +524,12 @@ def get_product_data(product_id):
 
             seller_ok = db_product.seller_name and db_product.seller_name not in ('Unknown', 'Unknown Seller', '')
 
-            if (db_product.sales_7d or 0) > 0 and age_seconds < CACHE_TTL_SECONDS and seller_ok:
+            if db_product.next_refresh_at:
+                fresh = not is_due(db_product)
+            else:
+                fresh = age_seconds < CACHE_TTL_SECONDS
+
+            if (db_product.sales_7d or 0) > 0 and fresh and seller_ok:
                 # Fresh cache hit with complete data
                 print(f"[Bot] Product {product_id} CACHE HIT (age {int(age_seconds)}s)")
                 db.session.commit()
@@ -543,6 +543,8 @@ def get_product_data(product_id):
                 if detail:
                     _update_product_from_detail(db_product, detail)
                     db_product.scan_type = db_product.scan_type or 'bot_lookup_echotik'
+                    db.session.flush()
+                    reschedule([db_product.product_id])
                     db.session.commit()
                     print(f"[Bot] Product {product_id} REFRESHED from API")
                     return _product_to_dict(db_product, source='refreshed'), 'refreshed'
@@ -575,6 +577,8 @@ def get_product_data(product_id):
             p.lookup_count = 1
             _update_product_from_detail(p, detail)
             db.session.add(p)
+            db.session.flush()
+            reschedule([p.product_id])
             db.session.commit()
 
             print(f"[Bot] Product {product_id} SAVED as new (source: EchoTik)")
@@ -720,6 +724,10 @@ async def on_ready():
     print(f'   Hot products channels: {HOT_PRODUCTS_CHANNELS}')
     print(f'   Subscriber-gated channels: {SUBSCRIBER_GATED_CHANNELS}')
 
+    loop_lag.start()
+    if not poll_entitlement_changes.is_running():
+        poll_entitlement_changes.start()
+
     # Check Vantage Pro role exists in each guild
     for guild in bot.guilds:
         role = await get_vantage_pro_role(guild)
@@ -756,23 +764,58 @@ async def on_ready():
                 log.error(f"Could not fetch thread {thread_id}: {e}")
     log.info(f"Joined {joined}/{len(INSPO_THREAD_IDS)} inspo-chat threads")
 
-async def _post_hot_products_to_channel(channel, products):
-    """Post hot products to a single channel."""
-    await channel.send(
-        f"# 🔥 Vantage Daily Top {len(products)} — {datetime.now(timezone.utc).strftime('%B %d, %Y')}\n"
+def _hot_products_header(count):
+    return (
+        f"# 🔥 Vantage Daily Top {count} — {datetime.now(timezone.utc).strftime('%B %d, %Y')}\n"
         f"**Ranked by Opportunity Score** — sales velocity, commission, creator saturation\n"
         f"**Full data →** vantagehq.shop/app/products\n"
         f"──────────────────────────────"
     )
+
+
+def _build_hot_product_embeds(products):
+    """Embeds for the daily post — built once, sent to every channel."""
+    embeds = []
     for i, p in enumerate(products, 1):
         try:
             embed = create_product_embed(p, title_prefix=f"#{i} ")
             score = p.get('opportunity_score', 0)
             embed.set_footer(text=f"📦 Vantage • Score: {score} | ID: {p.get('product_id', '')}")
+            embeds.append(embed)
+        except Exception as e:
+            log.error(f"[Hot Products] embed for #{i} failed: {e}")
+    return embeds
+
+
+async def _post_hot_products_to_channel(channel, embeds):
+    """
+    Post the prebuilt embeds to one channel, in order. No sleeps between
+    messages: discord.py waits out the channel's rate-limit bucket itself.
+    """
+    await channel.send(_hot_products_header(len(embeds)))
+    for i, embed in enumerate(embeds, 1):
+        try:
             await channel.send(embed=embed)
-            await asyncio.sleep(1)
+        except discord.HTTPException as e:
+            log.error(f"[Hot Products] #{i} to {channel.id} failed: {e}")
+
+
+def _poll_entitlements():
+    with app.app_context():
+        try:
+            return entitlements.poll_changes()
         except Exception as e:
-            print(f"❌ Error sending product #{i}: {e}")
+            db.session.rollback()
+            log.warning(f"[Sub] entitlement poll failed: {e}")
+            return 0
+
+
+@tasks.loop(seconds=entitlements.ENTITLEMENT_POLL_SECONDS)
+async def poll_entitlement_changes():
+    """Drop cached entitlements the website changed (PayPal webhook, credits, cancels)."""
+    dropped = await run_blocking(_poll_entitlements)
+    if dropped:
+        log.info(f"[Sub] {dropped} entitlement change(s) picked up")
 
 
 @tasks.loop(time=time(hour=17, minute=0))  # 12:00 PM EST = 17:00 UTC
@@ -780,7 +823,7 @@ async def daily_hot_products():
     """Post daily hot products to all configured channels."""
     print(f"🔥 Daily hot products at {datetime.now(timezone.utc).isoformat()}")
 
-    products = get_hot_products()
+    products = await run_blocking(get_hot_products)
     if not products:
         print("[Hot Products] No products found matching criteria today")
         return
@@ -796,13 +839,18 @@ async def daily_hot_products():
         print("[Hot Products] No hot-product channels configured")
         return
 
-    print(f"[Hot Products] Posting {len(products)} products to {len(channels)} channel(s)")
-    for channel in channels:
-        try:
-            await _post_hot_products_to_channel(channel, products)
+    embeds = await run_blocking(_build_hot_product_embeds, products)
+    print(f"[Hot Products] Posting {len(embeds)} products to {len(channels)} channel(s)")
+    # Channels have separate rate-limit buckets, so they're posted concurrently
+    results = await asyncio.gather(
+        *(_post_hot_products_to_channel(channel, embeds) for channel in channels),
+        return_exceptions=True,
+    )
+    for channel, result in zip(channels, results):
+        if isinstance(result, Exception):
+            print(f"   ❌ Failed to post to {channel.id}: {result}")
+        else:
             print(f"   ✅ Posted to #{channel.name} ({channel.guild.name})")
-        except Exception as e:
-            print(f"   ❌ Failed to post to {channel.id}: {e}")
 
     print(f"   Finished hot products loop.")
 
@@ -838,14 +886,13 @@ async def on_message(message):
             return
 
         # Show typing while the AI thinks
-        async with message.channel.typing():
+        async with channel_slot(message.channel.id), message.channel.typing():
             try:
-                res = requests.post(
+                async with http_session().post(
                     f"{PRISM_BASE_URL}/api/ai/chat",
                     json={"message": user_msg},
-                    timeout=65,
-                )
-                data = res.json()
+                ) as res:
+                    data = await res.json(content_type=None)
                 if data.get('success') and data.get('response'):
                     reply = data['response']
                     # Discord max message length is 2000 chars
@@ -902,57 +949,66 @@ async def on_message(message):
         has_tiktok_link = any(re.search(pattern, content, re.IGNORECASE) for pattern in tiktok_patterns)
 
         if has_tiktok_link or re.search(r'\d{15,25}', content):
-            # React to show we're processing
-            await message.add_reaction('🔍')
-
-            # Try to resolve share links first
-            url_pattern = r'https?://[^\s]+'
-            urls = re.findall(url_pattern, content)
-
-            product_id = None
-            region = 'US'
-
-            # Check if any URL is a short share link that needs redirect resolution
-            for url in urls:
-                if is_share_link(url):
-                    resolved_pid, reg = resolve_tiktok_share_link(url)
-                    if resolved_pid:
-                        product_id = resolved_pid
-                        region = reg
-                        print(f"[Bot] Got product ID from share link resolution: {product_id}")
-                        break
-
-            # If no product ID from link resolution, try extracting from the raw message
-            if not product_id:
-                product_id = extract_product_id(content)
-
-            if not product_id:
-                await message.add_reaction('❌')
-                await message.reply("❌ Could not find a valid TikTok product ID. This might be a regular video link without a tagged product.", mention_author=False)
-                return
-
-            # Fetch product (cache-first, then EchoTik API)
-            product, source = get_product_data(product_id)
-
-            if not product:
-                await message.add_reaction('❌')
-                await message.reply(f"❌ Product not found via EchoTik API (ID: {product_id})", mention_author=False)
-                return
-
-            # Create and send embed with source indicator
-            embed = create_product_embed(product)
-            source_label = "Live data" if source in ('new', 'refreshed') else "Cached data"
-            embed.set_footer(text=f"📦 Vantage • {source_label} | ID: {product_id}")
-            await message.reply(embed=embed, mention_author=False)
-
-            # Update reaction
-            await message.remove_reaction('🔍', bot.user)
-            await message.add_reaction('✅')
+            async with channel_slot(message.channel.id):
+                if not await _reply_product_lookup(message, content):
+                    return
     
     # Process other commands
     await bot.process_commands(message)
 
 
+async def _reply_product_lookup(message, content):
+    """Resolve a product from a lookup-channel message and reply with its embed.
+    Returns False if nothing could be looked up."""
+    # React to show we're processing
+    await message.add_reaction('🔍')
+
+    # Try to resolve share links first
+    url_pattern = r'https?://[^\s]+'
+    urls = re.findall(url_pattern, content)
+
+    product_id = None
+    region = 'US'
+
+    # Check if any URL is a short share link that needs redirect resolution
+    for url in urls:
+        if is_share_link(url):
+            resolved_pid, reg = await run_blocking(resolve_tiktok_share_link, url)
+            if resolved_pid:
+                product_id = resolved_pid
+                region = reg
+                print(f"[Bot] Got product ID from share link resolution: {product_id}")
+                break
+
+    # If no product ID from link resolution, try extracting from the raw message
+    if not product_id:
+        product_id = extract_product_id(content)
+
+    if not product_id:
+        await message.add_reaction('❌')
+        await message.reply("❌ Could not find a valid TikTok product ID. This might be a regular video link without a tagged product.", mention_author=False)
+        return False
+
+    # Fetch product (cache-first, then EchoTik API)
+    product, source = await run_blocking(get_product_data, product_id)
+
+    if not product:
+        await message.add_reaction('❌')
+        await message.reply(f"❌ Product not found via EchoTik API (ID: {product_id})", mention_author=False)
+        return False
+
+    # Create and send embed with source indicator
+    embed = await run_blocking(create_product_embed, product)
+    source_label = "Live data" if source in ('new', 'refreshed') else "Cached data"
+    embed.set_footer(text=f"📦 Vantage • {source_label} | ID: {product_id}")
+    await message.reply(embed=embed, mention_author=False)
+
+    # Update reaction
+    await message.remove_reaction('🔍', bot.user)
+    await message.add_reaction('✅')
+    return True
+
+
 # =============================================================================
 # VANTAGE AI CHAT (Discord Integration)
 # =============================================================================
@@ -1079,16 +1135,24 @@ async def handle_ai_chat(message):
     if not user_msg or len(user_msg) < 2:
         return
     
-    await _generate_ai_response(message.channel, message.author, user_msg, reply_to=message)
+    async with channel_slot(message.channel.id):
+        await _generate_ai_response(message.channel, message.author, user_msg, reply_to=message)
+
+
+AI_FRESH_FLAG = '--fresh'
 
 
 async def _generate_ai_response(channel, user, user_msg, reply_to=None):
-    """Generate and send an AI response in a channel."""
+    """Generate and send an AI response in a channel (`--fresh` skips the answer cache)."""
+    fresh = AI_FRESH_FLAG in user_msg.lower()
+    if fresh:
+        user_msg = re.sub(re.escape(AI_FRESH_FLAG), '', user_msg, flags=re.IGNORECASE).strip() or user_msg
+
     # Show thinking
     thinking_msg = await channel.send("🧠 Thinking...")
     
     try:
-        product_context = _build_discord_product_context(user_msg)
+        product_context = await run_blocking(_build_discord_product_context, user_msg)
         
         system_prompt = f"""You are 'PRISM AI', the expert intelligence engine of the PRISM platform — a TikTok Shop product research tool.
 
@@ -1102,7 +1166,7 @@ YOUR CAPABILITIES:
 - Provide market insights and recommendations
 
 CURRENT DATABASE SNAPSHOT:
-{json.dumps(product_context, default=str)}
+{product_context}
 
 RESPONSE RULES:
 1. Be concise and data-driven. Discord messages should be scannable.
@@ -1121,8 +1185,18 @@ RESPONSE RULES:
     - Key stats (ad spend, videos, sales, commission)
     Example format: **Product Name** by Seller Name — $X ad spend, Y videos, Z% commission\n[View on TikTok](link)"""
         
-        loop = asyncio.get_event_loop()
-        ai_response = await loop.run_in_executor(None, lambda: _call_grok_discord(system_prompt, user_msg))
+        # Near-identical questions against the same snapshot reuse the answer (services/ai_cache)
+        scope = context_key(product_context)
+        cached = None
+        if fresh:
+            response_cache.bypass()
+        else:
+            cached = response_cache.get(scope, user_msg)
+        if cached:
+            ai_response = cached[0]
+        else:
+            ai_response = await _call_grok_discord(system_prompt, user_msg)
+            response_cache.put(scope, user_msg, ai_response, {'provider': 'grok'})
         
         # Delete thinking message
         try:
@@ -1143,7 +1217,10 @@ RESPONSE RULES:
             name="PRISM AI",
             icon_url="https://cdn-icons-png.flaticon.com/512/4712/4712109.png"
         )
-        embed.set_footer(text=f"Asked by {user.display_name} • Powered by Grok 4.1", icon_url=user.display_avatar.url if user.display_avatar else None)
+        footer = f"Asked by {user.display_name} • Powered by Grok 4.1"
+        if cached:
+            footer += f" • cached (add {AI_FRESH_FLAG} for a new answer)"
+        embed.set_footer(text=footer, icon_url=user.display_avatar.url if user.display_avatar else None)
         
         if reply_to:
             await reply_to.reply(embed=embed, mention_author=False)
@@ -1159,10 +1236,10 @@ RESPONSE RULES:
         await channel.send(f"❌ PRISM AI Error: {str(e)[:200]}")
 
 
-def _call_grok_discord(system_prompt, user_message):
-    """Call Grok 4.1 API (synchronous, called from executor)."""
+async def _call_grok_discord(system_prompt, user_message):
+    """Call Grok 4.1 API through the bot's shared aiohttp session."""
     try:
-        resp = requests.post(
+        async with http_session().post(
             "https://api.x.ai/v1/chat/completions",
             headers={
                 "Content-Type": "application/json",
@@ -1177,13 +1254,11 @@ def _call_grok_discord(system_prompt, user_message):
                     {"role": "user", "content": user_message}
                 ]
             },
-            timeout=60
-        )
-        
-        if resp.status_code == 200:
-            return resp.json()['choices'][0]['message']['content']
-        else:
-            log.error(f"Grok API error {resp.status_code}: {resp.text[:200]}")
+            timeout=aiohttp.ClientTimeout(total=60),
+        ) as resp:
+            if resp.status == 200:
+                return (await resp.json(content_type=None))['choices'][0]['message']['content']
+            log.error(f"Grok API error {resp.status}: {(await resp.text())[:200]}")
             return None
     except Exception as e:
         log.error(f"Grok API exception: {e}")
@@ -1191,104 +1266,9 @@ def _call_grok_discord(system_prompt, user_message):
 
 
 def _build_discord_product_context(user_message):
-    """Build product context for AI — same segments as website bot."""
-    from sqlalchemy import desc
-    
-    msg_lower = user_message.lower()
-    
-    def _psummary(p):
-        efficiency = round(p.ad_spend / max(p.video_count or 1, 1), 1) if p.ad_spend else 0
-        pid = p.product_id or ''
-        return {
-            "name": (p.product_name or "Unknown")[:80],
-            "seller": p.seller_name or "Unknown",
-            "tiktok_link": p.product_url or f"https://shop.tiktok.com/view/product/{pid}?region=US&locale=en-US" if pid else "",
-            "price": round(p.price or 0, 2),
-            "ad_spend_7d": round(p.ad_spend or 0, 2),
-            "videos": p.video_count_alltime or p.video_count or 0,
-            "sales_7d": p.sales_7d or 0,
-            "gmv_30d": round(p.gmv_30d or 0, 2),
-            "commission_pct": round((p.commission_rate or 0) * 100, 1),
-            "influencers": p.influencer_count or 0,
-            "efficiency": efficiency,
-        }
-    
+    """Product context JSON for AI — the precomputed snapshot's bot profile (services/ai_context)."""
     with app.app_context():
-        context = {}
-
-        # Filter out placeholder/broken products (must have real video data)
-        MIN_VIDEOS = 5
-        video_count_field = db.func.coalesce(Product.video_count_alltime, Product.video_count)
-
-        # Summary stats
-        total = Product.query.filter(
-            Product.product_status == 'active',
-            video_count_field >= MIN_VIDEOS,
-        ).count()
-        context["database_summary"] = {"total_active_products": total}
-
-        # Top by ad spend (always)
-        top_ad = Product.query.filter(
-            Product.ad_spend > 0,
-            video_count_field >= MIN_VIDEOS,
-            Product.product_status == 'active',
-        ).order_by(desc(Product.ad_spend)).limit(12).all()
-        context["top_by_ad_spend"] = [_psummary(p) for p in top_ad]
-
-        # Gems — strong sales + low saturation (but must have real data)
-        gems = Product.query.filter(
-            Product.sales_7d > 50,
-            video_count_field >= MIN_VIDEOS,
-            video_count_field < 50,
-            Product.product_status == 'active',
-        ).order_by(desc(Product.sales_7d)).limit(12).all()
-        context["gems"] = [_psummary(p) for p in gems]
-
-        # Top sales
-        top_sales = Product.query.filter(
-            Product.sales_7d > 0,
-            video_count_field >= MIN_VIDEOS,
-            Product.product_status == 'active',
-        ).order_by(desc(Product.sales_7d)).limit(8).all()
-        context["top_sellers"] = [_psummary(p) for p in top_sales]
-
-        # Commission (if relevant)
-        if any(w in msg_lower for w in ['commission', 'affiliate', 'earn', 'profit', 'margin']):
-            high_comm = Product.query.filter(
-                Product.commission_rate > 0.10, Product.sales_7d > 10,
-                video_count_field >= MIN_VIDEOS,
-                Product.product_status == 'active',
-            ).order_by(desc(Product.commission_rate)).limit(8).all()
-            context["best_commissions"] = [_psummary(p) for p in high_comm]
-
-        # New products (if relevant)
-        if any(w in msg_lower for w in ['new', 'recent', 'latest', 'trending', 'fresh']):
-            newest = Product.query.filter(
-                Product.product_status == 'active',
-                video_count_field >= MIN_VIDEOS,
-            ).order_by(desc(Product.first_seen)).limit(8).all()
-            context["newest"] = [_psummary(p) for p in newest]
-        
-        # Niche opportunities (if relevant)
-        if any(w in msg_lower for w in ['pick', 'niche', 'opportunity', 'untapped', 'hidden']):
-            niche = Product.query.filter(
-                Product.gmv_30d >= 50000, Product.gmv_30d <= 200000,
-                Product.influencer_count <= 50,
-                video_count_field >= MIN_VIDEOS,
-                Product.product_status == 'active',
-            ).order_by(desc(Product.gmv_30d)).limit(8).all()
-            context["niche_opportunities"] = [_psummary(p) for p in niche]
-
-        # Budget (if relevant)
-        if any(w in msg_lower for w in ['cheap', 'budget', 'affordable', 'low price', 'under']):
-            cheap = Product.query.filter(
-                Product.price > 0, Product.sales_7d > 5,
-                video_count_field >= MIN_VIDEOS,
-                Product.product_status == 'active',
-            ).order_by(Product.price.asc()).limit(8).all()
-            context["budget_friendly"] = [_psummary(p) for p in cheap]
-    
-    return context
+        return ai_context.render('bot', user_message)
 
 @bot.command(name='lookup')
 async def lookup_command(ctx, *, query: str = None):
@@ -1298,7 +1278,7 @@ async def lookup_command(ctx, *, query: str = None):
         return
 
     # Subscription / role check
-    has_sub, _user = check_user_subscription(str(ctx.author.id))
+    has_sub, _user = await run_blocking(check_user_subscription, str(ctx.author.id))
     is_admin = _user.is_admin if _user else (int(ctx.author.id) in DISCORD_ADMIN_IDS)
     member = ctx.author if hasattr(ctx.author, 'roles') else None
     has_role = has_vantage_pro_role(member) if member else False
@@ -1320,7 +1300,7 @@ async def lookup_command(ctx, *, query: str = None):
     # Try to resolve if it's a short share link
     region = 'US'
     if is_share_link(query):
-        extracted_id, reg = resolve_tiktok_share_link(query)
+        extracted_id, reg = await run_blocking(resolve_tiktok_share_link, query)
         if extracted_id:
             query = extracted_id
             region = reg
@@ -1332,7 +1312,8 @@ async def lookup_command(ctx, *, query: str = None):
         await status_msg.edit(content="❌ Could not extract product ID from your input.")
         return
 
-    product, source = get_product_data(product_id)
+    async with channel_slot(ctx.channel.id):
+        product, source = await run_blocking(get_product_data, product_id)
 
     if not product:
         await ctx.message.add_reaction('❌')
@@ -1340,7 +1321,7 @@ async def lookup_command(ctx, *, query: str = None):
         return
 
     await status_msg.delete()
-    embed = create_product_embed(product)
+    embed = await run_blocking(create_product_embed, product)
     source_label = "Live data" if source in ('new', 'refreshed') else "Cached data"
     admin_prefix = "👑 Admin • " if is_admin else ""
     embed.set_footer(text=f"📦 {admin_prefix}Vantage • {source_label} | ID: {product_id}")
@@ -1368,6 +1349,44 @@ def can_manage_blacklist(ctx):
             return True
     return False
 
+def _blacklist_add(brand_name, reason):
+    """Add a brand unless it's already listed (case-insensitive). Returns True if added."""
+    from app import BlacklistedBrand
+    with app.app_context():
+        if BlacklistedBrand.query.filter(BlacklistedBrand.seller_name.ilike(brand_name)).first():
+            return False
+        db.session.add(BlacklistedBrand(seller_name=brand_name, reason=reason))
+        db.session.commit()
+        return True
+
+
+def _blacklist_reset():
+    from app import BlacklistedBrand
+    with app.app_context():
+        num_rows = BlacklistedBrand.query.delete()
+        db.session.commit()
+        return num_rows
+
+
+def _blacklist_remove(brand_name):
+    """Returns False when the brand isn't on the blacklist."""
+    from app import BlacklistedBrand
+    with app.app_context():
+        existing = BlacklistedBrand.query.filter(BlacklistedBrand.seller_name.ilike(brand_name)).first()
+        if not existing:
+            return False
+        db.session.delete(existing)
+        db.session.commit()
+        return True
+
+
+def _blacklist_lines():
+    """One formatted line per blacklisted brand."""
+    from app import BlacklistedBrand
+    with app.app_context():
+        return [f"**{b.seller_name}** - {b.reason or 'No reason'} (Added: {b.added_at.strftime('%Y-%m-%d')})"
+                for b in BlacklistedBrand.query.all()]
+
 @bot.group(name='blacklist', invoke_without_command=True)
 async def blacklist_group(ctx):
     """Blacklist management: !blacklist <add|remove|list|scan>"""
@@ -1389,16 +1408,9 @@ async def blacklist_add(ctx, *, input_text: str = None):
         brand_name = input_text.strip()
         reason = "No reason provided"
     
-    from app import BlacklistedBrand
-    with app.app_context():
-        existing = BlacklistedBrand.query.filter(BlacklistedBrand.seller_name.ilike(brand_name)).first()
-        if existing:
-            await ctx.reply(f"⚠️ Brand `{brand_name}` is already on the blacklist.", mention_author=False)
-            return
-        
-        new_entry = BlacklistedBrand(seller_name=brand_name, reason=reason)
-        db.session.add(new_entry)
-        db.session.commit()
+    if not await run_blocking(_blacklist_add, brand_name, reason):
+        await ctx.reply(f"⚠️ Brand `{brand_name}` is already on the blacklist.", mention_author=False)
+        return
     
     await ctx.reply(f"✅ Added `{brand_name}` to the blacklist.", mention_author=False)
 
@@ -1407,210 +1419,152 @@ async def blacklist_add(ctx, *, input_text: str = None):
 @commands.has_permissions(administrator=True)
 async def blacklist_reset(ctx):
     """Admin only: Totally clear the brand blacklist"""
-    from app import BlacklistedBrand
-    with app.app_context():
-        num_rows = BlacklistedBrand.query.delete()
-        db.session.commit()
+    num_rows = await run_blocking(_blacklist_reset)
     await ctx.reply(f"🧹 Blacklist cleared! Removed **{num_rows}** entries.", mention_author=False)
 
 @blacklist_group.command(name='remove')
 async def blacklist_remove(ctx, *, brand_name: str):
     """Remove a brand from the blacklist: !blacklist remove Brand Name"""
-    from app import BlacklistedBrand
     brand_name = brand_name.strip().replace('"', '').replace("'", "")
-    with app.app_context():
-        existing = BlacklistedBrand.query.filter(BlacklistedBrand.seller_name.ilike(brand_name)).first()
-        if not existing:
-            await ctx.reply(f"⚠️ Brand `{brand_name}` not found on the blacklist.", mention_author=False)
-            return
-        
-        db.session.delete(existing)
-        db.session.commit()
+    if not await run_blocking(_blacklist_remove, brand_name):
+        await ctx.reply(f"⚠️ Brand `{brand_name}` not found on the blacklist.", mention_author=False)
+        return
     
     await ctx.reply(f"✅ Removed `{brand_name}` from the blacklist.", mention_author=False)
 
 @blacklist_group.command(name='list')
 async def blacklist_list(ctx):
     """List all blacklisted brands"""
-    from app import BlacklistedBrand
-    with app.app_context():
-        brands = BlacklistedBrand.query.all()
-        if not brands:
-            await ctx.reply("📭 The blacklist is currently empty.", mention_author=False)
-            return
-        
-        text = "**🚫 Blacklisted Brands/Sellers**\n"
-        for i, b in enumerate(brands, 1):
-            text += f"{i}. **{b.seller_name}** - {b.reason or 'No reason'} (Added: {b.added_at.strftime('%Y-%m-%d')})\n"
-            if len(text) > 1800:
-                await ctx.send(text)
-                text = ""
-        
-        if text:
+    lines = await run_blocking(_blacklist_lines)
+    if not lines:
+        await ctx.reply("📭 The blacklist is currently empty.", mention_author=False)
+        return
+    
+    text = "**🚫 Blacklisted Brands/Sellers**\n"
+    for i, line in enumerate(lines, 1):
+        text += f"{i}. {line}\n"
+        if len(text) > 1800:
             await ctx.send(text)
-
-def _calc_opportunity_score(p):
-    """Same Opportunity Score as the website (0-99). Inlined for bot use."""
-    import math
-    s7 = p.sales_7d or 0
-    s30 = p.sales_30d or 0
-    comm = p.commission_rate or 0
-    creators = p.influencer_count or 0
-    price = p.price or 0
-
-    # Demand (0-25)
-    demand = min(25, round(math.log10(max(s7, 1) + 1) * 8))
-    # Momentum (0-20)
-    if s30 > 0 and s7 > 0:
-        ratio = s7 / (s30 / 4.3)
-        momentum = min(20, round(ratio * 10))
-    else:
-        momentum = 5
-    # Commission (0-20)
-    c = comm * 100 if comm < 1 else comm
-    commission_score = min(20, round(c * 0.65))
-    # Saturation gap (0-20)
-    if s7 > 0 and creators > 0:
-        sat = s7 / creators
-        saturation = min(20, round(math.log10(max(sat, 1) + 1) * 8))
-    else:
-        saturation = 10
-    # Price fit (0-14)
-    if 10 <= price <= 60:
-        price_fit = 14
-    elif 5 <= price < 10 or 60 < price <= 100:
-        price_fit = 8
-    else:
-        price_fit = 3
-
-    return min(99, demand + momentum + commission_score + saturation + price_fit)
-
+            text = ""
+    
+    if text:
+        await ctx.send(text)
 
 def get_hot_products():
-    """Get top 10 daily products using Opportunity Score.
-
-    Uses last_shown_hot to prevent repeats for DAYS_BEFORE_REPEAT days.
-    Wider filters than before — relies on score to surface quality.
-    """
-    from datetime import timedelta
-
+    """Today's top MAX_DAILY_POSTS from the precomputed pool (services/hot_products); marks them shown."""
     with app.app_context():
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=DAYS_BEFORE_REPEAT)
-
-        # Original filters: opportunity zone videos + sales + commission (no ad spend)
-        video_count_field = db.func.coalesce(Product.video_count_alltime, Product.video_count)
-        products = Product.query.filter(
-            video_count_field >= 40,           # Min 40 all-time videos
-            video_count_field <= 120,          # Max 120 (opportunity zone)
-            Product.sales_7d >= 100,           # 100+ 7D sales
-            Product.commission_rate > 0,       # Must have commission
-            db.or_(Product.product_status == 'active', Product.product_status.is_(None)),
-            db.or_(
-                Product.last_shown_hot == None,
-                Product.last_shown_hot < cutoff_date
-            )
-        ).order_by(
-            Product.sales_7d.desc().nullslast()
-        ).limit(200).all()
-
-        print(f"[Hot Products] {len(products)} candidates after base filters")
-
-        # Score and sort
-        scored = []
-        for p in products:
-            p._score = _calc_opportunity_score(p)
-            scored.append(p)
-        scored.sort(key=lambda p: p._score, reverse=True)
-
-        # Deduplicate by name
-        seen_names = set()
-        unique = []
-        for p in scored:
-            name_key = (p.product_name or '').lower().strip()[:50]
-            if name_key and name_key not in seen_names:
-                seen_names.add(name_key)
-                unique.append(p)
-                if len(unique) >= MAX_DAILY_POSTS:
-                    break
-
-        # Convert to dicts
-        product_dicts = []
-        for p in unique:
-            video_count = p.video_count_alltime or p.video_count or 0
-            product_dicts.append({
-                'product_id': p.product_id,
-                'product_name': p.product_name,
-                'seller_name': p.seller_name,
-                'sales': p.sales,
-                'sales_7d': p.sales_7d,
-                'sales_30d': p.sales_30d,
-                'influencer_count': p.influencer_count,
-                'video_count': video_count,
-                'commission_rate': p.commission_rate,
-                'shop_ads_commission': p.shop_ads_commission,
-                'price': p.price,
-                'ad_spend': p.ad_spend,
-                'image_url': p.cached_image_url or p.image_url,
-                'cached_image_url': p.cached_image_url,
-                'has_free_shipping': p.has_free_shipping,
-                'product_url': p.product_url,
-                'live_count': p.live_count,
-                'stock': p.live_count,
-                'opportunity_score': p._score,
-            })
-            p.last_shown_hot = datetime.now(timezone.utc)
-
         try:
-            db.session.commit()
+            return hot_products.take(MAX_DAILY_POSTS)
         except Exception as e:
-            print(f"Error updating last_shown_hot: {e}")
             db.session.rollback()
+            log.error(f"[Hot Products] pool take failed: {e}")
+            return []
+
+
+def _rebuild_hot_pool():
+    with app.app_context():
+        return len(hot_products.build_pool())
 
-        return product_dicts
 
 @bot.command(name='hotproducts')
 @commands.has_permissions(administrator=True)
-async def force_hot_products(ctx):
-    """Admin command to force post hot products"""
+async def force_hot_products(ctx, action: str = None):
+    """Admin command to force post hot products (`!hotproducts rebuild` re-ranks the pool first)"""
+    if action == 'rebuild':
+        size = await run_blocking(_rebuild_hot_pool)
+        await ctx.reply(f"♻️ Hot products pool rebuilt ({size} candidates)", mention_author=False)
     await ctx.reply("🔥 Posting hot products now...", mention_author=False)
     await daily_hot_products()
 
 
-@bot.command(name='syncroles')
-@commands.has_permissions(administrator=True)
-async def sync_roles_command(ctx):
-    """Admin: Sync Vantage Pro role for all active subscribers + admins."""
-    await ctx.reply("🔄 Syncing Vantage Pro roles...", mention_author=False)
+ROLE_SYNC_CONCURRENCY = int(os.environ.get('ROLE_SYNC_CONCURRENCY', '5'))
 
-    synced = 0
-    errors = 0
 
+def _entitled_discord_ids():
     with app.app_context():
-        # Get all active subscribers
-        active_subs = Subscription.query.filter_by(status='active').all()
-        user_ids = {s.user_id for s in active_subs}
+        ids = entitlements.entitled_discord_ids()
+    return ids | {str(i) for i in DISCORD_ADMIN_IDS}
 
-        # Also include all admin users
-        admin_users = User.query.filter_by(is_admin=True).all()
-        for u in admin_users:
-            user_ids.add(u.id)
 
-        # Get discord_ids for all these users
-        users = User.query.filter(User.id.in_(user_ids), User.discord_id.isnot(None)).all()
+async def _sync_member_role(guild, role, discord_id, add, sem):
+    """Add/remove the role for one member if needed. Returns the outcome."""
+    async with sem:
+        try:
+            member = guild.get_member(int(discord_id)) or await guild.fetch_member(int(discord_id))
+            if member.bot:
+                return 'unchanged'
+            has_role = role in member.roles
+            if add and not has_role:
+                await member.add_roles(role, reason='Vantage Pro role sync')
+                return 'added'
+            if not add and has_role and not member.guild_permissions.administrator:
+                await member.remove_roles(role, reason='Vantage Pro role sync — no active subscription')
+                return 'removed'
+            return 'unchanged'
+        except discord.NotFound:
+            return 'not_in_guild'
+        except discord.HTTPException as e:
+            log.error(f"[SyncRoles] {discord_id} in {guild.name}: {e}")
+            return 'errors'
 
-    status_msg = await ctx.send(f"Found {len(users)} users to sync...")
 
-    for user in users:
-        try:
-            result = await assign_vantage_pro_role(user.discord_id)
-            if result:
-                synced += 1
-        except Exception as e:
-            errors += 1
-            log.error(f"[SyncRoles] Error for {user.discord_username}: {e}")
-        await asyncio.sleep(0.5)  # Rate limit
+@bot.command(name='syncroles')
+@commands.has_permissions(administrator=True)
+async def sync_roles_command(ctx, mode: str = None):
+    """Admin: Sync Vantage Pro role for all active subscribers + admins.
+
+    Only the difference between the role's current members and entitled users
+    is touched, ROLE_SYNC_CONCURRENCY members at a time (discord.py waits out
+    429s itself). `!syncroles prune` also removes the role from members who
+    aren't entitled — that needs the members intent to see who holds it.
+    """
+    prune = (mode or '').lower() == 'prune'
+    await ctx.reply("🔄 Syncing Vantage Pro roles...", mention_author=False)
+
+    entitled = await run_blocking(_entitled_discord_ids)
+    sem = asyncio.Semaphore(max(1, ROLE_SYNC_CONCURRENCY))
+    tasks_ = []
+    for guild in bot.guilds:
+        role = await get_vantage_pro_role(guild)
+        if not role:
+            continue
+        if bot.intents.members:
+            # Member cache is complete — diff against the role's holders
+            holders = {str(m.id) for m in role.members}
+            to_add = entitled - holders
+            to_remove = holders - entitled if prune else set()
+        else:
+            # No member list — check each entitled user, write only where missing
+            to_add, to_remove = entitled, set()
+        tasks_ += [_sync_member_role(guild, role, d, True, sem) for d in to_add]
+        tasks_ += [_sync_member_role(guild, role, d, False, sem) for d in to_remove]
 
-    await status_msg.edit(content=f"✅ Role sync complete: **{synced}** assigned, **{errors}** errors, **{len(users)}** total users checked.")
+    status_msg = await ctx.send(f"Found {len(entitled)} entitled users — {len(tasks_)} member checks to run...")
+    outcomes = await asyncio.gather(*tasks_)
+    counts = {k: outcomes.count(k) for k in ('added', 'removed', 'unchanged', 'not_in_guild', 'errors')}
+
+    note = "" if not prune or bot.intents.members else "\n⚠️ Prune skipped — the bot doesn't have the members intent."
+    await status_msg.edit(content=(
+        f"✅ Role sync complete: **{counts['added']}** assigned, **{counts['removed']}** removed, "
+        f"{counts['unchanged']} already correct, {counts['not_in_guild']} not in server, "
+        f"**{counts['errors']}** errors, **{len(entitled)}** entitled users.{note}"
+    ))
+
+
+@bot.command(name='looplag')
+@commands.has_permissions(administrator=True)
+async def loop_lag_command(ctx):
+    """Admin: event-loop lag over the last ~5 minutes."""
+    stats = loop_lag.stats()
+    if not stats.get('samples'):
+        await ctx.reply("No loop lag samples yet.", mention_author=False)
+        return
+    await ctx.reply(
+        f"⏱️ Event loop lag (last {stats['samples']} samples): "
+        f"p50 **{stats['p50_ms']} ms**, p99 **{stats['p99_ms']} ms**, max **{stats['max_ms']} ms** "
+        f"(max since start {stats['max_since_start_ms']} ms) • DB pool queue: {stats['db_pool_queued']}",
+        mention_author=False,
+    )
 
 # =============================================================================
 # BRAND HUNTER COMMANDS
@@ -1693,7 +1647,7 @@ async def brand_command(ctx, *, args: str = None):
     if args_lower == 'list':
         # Show popular brands
         await ctx.message.add_reaction('🔍')
-        brands = get_popular_brands(15)
+        brands = await run_blocking(get_popular_brands, 15)
         
         if not brands:
             await ctx.reply("📭 No brands found in database.", mention_author=False)
@@ -1726,7 +1680,7 @@ async def search_brand(ctx, brand_name: str):
     """Search for products by brand name."""
     await ctx.message.add_reaction('🔍')
     
-    products = get_brand_products(brand_name, limit=5)
+    products = await run_blocking(get_brand_products, brand_name, limit=5)
     
     if not products:
         await ctx.reply(f"📭 No products found for **{brand_name}** with 40-120 videos.\n\nTry a different brand or check spelling.", mention_author=False)
@@ -1742,7 +1696,7 @@ async def search_brand(ctx, brand_name: str):
     # Send each product as embed
     for i, p in enumerate(products, 1):
         try:
-            embed = create_product_embed(p, title_prefix=f"#{i} ")
+            embed = await run_blocking(create_product_embed, p, title_prefix=f"#{i} ")
             await ctx.send(embed=embed)
             await asyncio.sleep(0.5)  # Rate limiting
         except Exception as e:
@@ -1786,6 +1740,40 @@ def parse_creator_name(text):
         return text.lower()
     return None
 
+def _creator_add(thread_id, creator, added_by):
+    """Add a creator to a thread's list. Returns False when it's already there."""
+    from app import CreatorList
+    with app.app_context():
+        if CreatorList.query.filter_by(thread_id=thread_id, creator_name=creator).first():
+            return False
+        db.session.add(CreatorList(thread_id=thread_id, creator_name=creator, added_by=added_by))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return True
+
+
+def _creator_remove(thread_id, creator):
+    """Returns False when the creator isn't on the thread's list."""
+    from app import CreatorList
+    with app.app_context():
+        existing = CreatorList.query.filter_by(thread_id=thread_id, creator_name=creator).first()
+        if not existing:
+            return False
+        db.session.delete(existing)
+        db.session.commit()
+        return True
+
+
+def _creator_entries(thread_id):
+    """``[(creator_name, added_at)]`` of a thread's list, oldest first."""
+    from app import CreatorList
+    with app.app_context():
+        return [(c.creator_name, c.added_at) for c in
+                CreatorList.query.filter_by(thread_id=thread_id).order_by(CreatorList.added_at).all()]
+
 @bot.command(name='add')
 async def creator_add(ctx, *, input_text: str = None):
     """Add a TikTok creator to this thread's list: !add @creatorname"""
@@ -1806,24 +1794,12 @@ async def creator_add(ctx, *, input_text: str = None):
         thread_id = str(ctx.channel.id)
         thread_name = INSPO_THREAD_IDS.get(ctx.channel.id, 'Unknown')
         
-        from app import CreatorList
-        with app.app_context():
-            existing = CreatorList.query.filter_by(thread_id=thread_id, creator_name=creator).first()
-            if existing:
-                await ctx.reply(f"⚠️ **@{creator}** is already on the **{thread_name}** list.", mention_author=False)
-                return
-            
-            new_entry = CreatorList(
-                thread_id=thread_id,
-                creator_name=creator,
-                added_by=str(ctx.author)
-            )
-            db.session.add(new_entry)
-            db.session.commit()
+        if not await run_blocking(_creator_add, thread_id, creator, str(ctx.author)):
+            await ctx.reply(f"⚠️ **@{creator}** is already on the **{thread_name}** list.", mention_author=False)
+            return
         
         await ctx.reply(f"✅ Added **@{creator}** to the **{thread_name}** list.", mention_author=False)
     except Exception as e:
-        db.session.rollback()
         error_str = str(e)
         if 'UniqueViolation' in type(e).__name__ or 'duplicate key' in error_str or 'unique constraint' in error_str.lower():
             await ctx.reply(f"⚠️ **@{creator}** is already on the **{thread_name}** list.", mention_author=False)
@@ -1851,15 +1827,9 @@ async def creator_remove(ctx, *, input_text: str = None):
         thread_id = str(ctx.channel.id)
         thread_name = INSPO_THREAD_IDS.get(ctx.channel.id, 'Unknown')
         
-        from app import CreatorList
-        with app.app_context():
-            existing = CreatorList.query.filter_by(thread_id=thread_id, creator_name=creator).first()
-            if not existing:
-                await ctx.reply(f"⚠️ **@{creator}** not found on the **{thread_name}** list.", mention_author=False)
-                return
-            
-            db.session.delete(existing)
-            db.session.commit()
+        if not await run_blocking(_creator_remove, thread_id, creator):
+            await ctx.reply(f"⚠️ **@{creator}** not found on the **{thread_name}** list.", mention_author=False)
+            return
         
         await ctx.reply(f"✅ Removed **@{creator}** from the **{thread_name}** list.", mention_author=False)
     except Exception as e:
@@ -1877,18 +1847,16 @@ async def creator_list(ctx):
         thread_id = str(ctx.channel.id)
         thread_name = INSPO_THREAD_IDS.get(ctx.channel.id, 'Unknown')
         
-        from app import CreatorList
-        with app.app_context():
-            creators = CreatorList.query.filter_by(thread_id=thread_id).order_by(CreatorList.added_at).all()
+        creators = await run_blocking(_creator_entries, thread_id)
         
         if not creators:
             await ctx.reply(f"📭 The **{thread_name}** list is empty.\nUse `!add @creatorname` to add creators.", mention_author=False)
             return
         
         text = f"**📋 {thread_name} - Creator List**\n"
-        for i, c in enumerate(creators, 1):
-            date_str = c.added_at.strftime('%Y-%m-%d') if c.added_at else 'N/A'
-            text += f"{i}. **@{c.creator_name}** (Added: {date_str})\n"
+        for i, (creator_name, added_at) in enumerate(creators, 1):
+            date_str = added_at.strftime('%Y-%m-%d') if added_at else 'N/A'
+            text += f"{i}. **@{creator_name}** (Added: {date_str})\n"
             if len(text) > 1800:
                 await ctx.send(text)
                 text = ""
@@ -4,7 +4,10 @@ Starts the Flask application via the app factory.
 Used by Gunicorn (Procfile / render.yaml) and local dev.
 """
 
-from app import app  # noqa: F401 — created by app factory in app/__init__.py
+from app import app, start_web_services  # created by app factory in app/__init__.py
+
+# Embedded job worker etc. — web process only (see start_web_services)
+start_web_services(app)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
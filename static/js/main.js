@@ -284,27 +284,67 @@ function sendChat() {
   messages.appendChild(loadDiv);
   messages.scrollTop = messages.scrollHeight;
 
+  var aiDiv = null;
+  var text = "";
+  function render(t) {
+    if (!aiDiv) {
+      loadDiv.remove();
+      aiDiv = document.createElement("div");
+      aiDiv.className = "chat-msg chat-msg--ai";
+      messages.appendChild(aiDiv);
+    }
+    aiDiv.innerHTML = formatChatText(t);
+    messages.scrollTop = messages.scrollHeight;
+  }
+
+  // Stream tokens over SSE (POST, so read the body rather than EventSource)
   fetch("/api/ai/chat", {
     method: "POST",
-    headers: {"Content-Type": "application/json"},
-    body: JSON.stringify({message: msg})
+    headers: {"Content-Type": "application/json", "Accept": "text/event-stream"},
+    body: JSON.stringify({message: msg, stream: true})
   })
-  .then(function(r) { return r.json(); })
-  .then(function(data) {
-    loadDiv.remove();
-    var aiDiv = document.createElement("div");
-    aiDiv.className = "chat-msg chat-msg--ai";
-    var text = data.response || data.error || "Sorry, I couldn't process that.";
-    // Basic markdown-like formatting
-    text = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
-    text = text.replace(/\n- /g, '<br>• ');
-    text = text.replace(/\n\d+\. /g, function(m) { return '<br>' + m.trim() + ' '; });
-    text = text.replace(/\n/g, '<br>');
-    aiDiv.innerHTML = text;
-    messages.appendChild(aiDiv);
-    messages.scrollTop = messages.scrollHeight;
+  .then(function(r) {
+    var type = r.headers.get("Content-Type") || "";
+    if (!r.body || type.indexOf("text/event-stream") === -1) {
+      return r.json().then(function(data) {
+        render(data.response || data.error || "Sorry, I couldn't process that.");
+      });
+    }
+    var reader = r.body.getReader();
+    var decoder = new TextDecoder();
+    var buf = "";
+    function pump() {
+      return reader.read().then(function(res) {
+        if (res.done) {
+          if (!text) render("Sorry, I couldn't process that.");
+          return;
+        }
+        buf += decoder.decode(res.value, {stream: true});
+        var parts = buf.split("\n\n");
+        buf = parts.pop();
+        parts.forEach(function(block) {
+          var event = "message", data = "";
+          block.split("\n").forEach(function(line) {
+            if (line.indexOf("event:") === 0) event = line.slice(6).trim();
+            else if (line.indexOf("data:") === 0) data += line.slice(5).trim();
+          });
+          if (!data) return;
+          var payload = JSON.parse(data);
+          if (event === "message" && payload.delta) {
+            text += payload.delta;
+            render(text);
+          } else if (event === "error") {
+            text += (text ? "\n\n" : "") + (payload.error || "Sorry, I couldn't process that.");
+            render(text);
+          }
+        });
+        return pump();
+      });
+    }
+    return pump();
   })
   .catch(function() {
+    if (aiDiv) return;
     loadDiv.remove();
     var errDiv = document.createElement("div");
     errDiv.className = "chat-msg chat-msg--ai";
@@ -313,6 +353,15 @@ function sendChat() {
   });
 }
 
+function formatChatText(text) {
+  // Basic markdown-like formatting
+  text = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
+  text = text.replace(/\n- /g, '<br>• ');
+  text = text.replace(/\n\d+\. /g, function(m) { return '<br>' + m.trim() + ' '; });
+  text = text.replace(/\n/g, '<br>');
+  return text;
+}
+
 /* --- Favorite Toggle ------------------------------------------------------ */
 function toggleFavorite(productId, btn) {
   fetch("/api/favorite/" + productId, { method: "POST" })
@@ -0,0 +1,30 @@
+"""
+Test setup: a throwaway SQLite database and no background threads.
+
+The environment must be set before ``app`` is first imported — importing
+it runs the app factory (and _auto_migrate) against DATABASE_URL.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['SKIP_SCHEDULER'] = '1'
+os.environ['JOB_WORKER_EMBEDDED'] = '0'
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+
+from app import app as flask_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """The app inside an app context, with every table emptied afterwards."""
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
@@ -0,0 +1,43 @@
+import pytest
+
+from app.services import ai_cache
+from app.services.ai_cache import ResponseCache, normalize
+
+pytestmark = pytest.mark.skipif(not ai_cache.FUZZY_AVAILABLE, reason='fuzzywuzzy not installed')
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(ttl=60, max_entries=10, similarity=90)
+
+
+def test_exact_match_ignores_filler_and_punctuation(cache):
+    cache.put('ctx', 'best gems today', 'answer')
+    assert normalize('Best gems for today?') == normalize('best gems today')
+    assert cache.get('ctx', 'Best gems for today?') == ('answer', {'match': 'exact'})
+
+
+def test_near_duplicate_question_is_a_fuzzy_hit(cache):
+    cache.put('ctx', 'what are the top selling beauty products this week', 'answer')
+    assert cache.get('ctx', 'top selling beauty product this week?') == ('answer', {'match': 'fuzzy'})
+
+
+def test_swapped_words_are_not_a_hit(cache):
+    # Same words in a different order — token ratios alone score this 100
+    cache.put('ctx', 'show me products with low competition and high sales', 'answer')
+    assert cache.get('ctx', 'show me products with high competition and low sales') is None
+
+
+def test_extra_words_are_not_a_hit(cache):
+    cache.put('ctx', 'cheap products', 'answer')
+    assert cache.get('ctx', 'cheap products for dogs') is None
+
+
+def test_different_numbers_are_not_a_hit(cache):
+    cache.put('ctx', 'gems under $10', 'answer')
+    assert cache.get('ctx', 'gems under $20') is None
+
+
+def test_entries_are_scoped_by_context(cache):
+    cache.put('ctx-a', 'best gems today', 'answer')
+    assert cache.get('ctx-b', 'best gems today') is None
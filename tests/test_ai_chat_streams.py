@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from app.routes import ai as ai_routes
+from app.services import ai_chat, progress
+from app.services.ai_cache import response_cache
+
+
+@pytest.fixture
+def chat(app, monkeypatch):
+    monkeypatch.setattr(ai_routes, 'get_anthropic_key', lambda: 'test-key')
+    monkeypatch.setattr(ai_routes.ai_context, 'render', lambda scope, message: 'no products')
+    monkeypatch.setattr(ai_chat, 'stream', lambda *a, **k: iter([
+        ('start', 'anthropic'), ('text', 'Hi'), ('done', {'provider': 'anthropic'}),
+    ]))
+    monkeypatch.setattr(progress, '_streams', threading.BoundedSemaphore(1))
+    response_cache.clear()
+    yield app.test_client()
+    response_cache.clear()
+
+
+def _ask(client, message):
+    return client.post('/api/ai/chat', json={'message': message, 'stream': True, 'no_cache': True})
+
+
+def test_stream_slot_is_released_when_the_response_closes(chat):
+    for _ in range(3):
+        resp = _ask(chat, 'best gems')
+        assert resp.status_code == 200
+        assert 'event: done' in resp.get_data(as_text=True)
+        resp.close()
+
+
+def test_streams_past_the_cap_get_429(chat):
+    held = _ask(chat, 'best gems')
+    assert held.status_code == 200
+    busy = _ask(chat, 'trending products')
+    assert busy.status_code == 429
+    assert busy.headers['Retry-After']
+    held.close()
+    assert _ask(chat, 'trending products').status_code == 200
+
+
+def test_chat_and_progress_streams_share_the_cap(chat):
+    assert progress.try_open_stream()                  # e.g. a brand scan progress stream
+    assert _ask(chat, 'best gems').status_code == 429
+    progress.close_stream()
+    assert _ask(chat, 'best gems').status_code == 200
+
+
+def test_default_cap_leaves_two_threads_free():
+    assert progress.SSE_MAX_STREAMS == max(0, progress.WEB_THREADS - 2)
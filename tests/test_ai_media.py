@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import AiAsset, Product
+from app.routes import ai as ai_routes
+from app.services import ai_media
+
+PID = '1729384756102938475'
+
+
+@pytest.fixture
+def product(app):
+    product = Product(product_id=PID, product_name='Glow serum', image_url='https://example.com/p.jpg')
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def gemini(app, monkeypatch):
+    """Fake Gemini: every call returns a new image; the list records the calls."""
+    calls = []
+
+    def generate(key, image_data, mime_type, prompt):
+        calls.append(prompt)
+        return f'image-{len(calls)}', 'image/png'
+
+    monkeypatch.setattr(ai_routes, 'GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_media, '_source_image', lambda product, cropped=None: ('src', 'image/jpeg'))
+    monkeypatch.setattr(ai_media, '_generate_lifestyle', generate)
+    return calls
+
+
+def test_image_reused_only_by_retries_of_the_same_request(app, product, gemini):
+    first = ai_media.run_image_job(app, PID, variant='a')
+    retry = ai_media.run_image_job(app, PID, variant='a')
+    second = ai_media.run_image_job(app, PID, variant='b')
+
+    assert len(gemini) == 2
+    assert retry['cached'] and retry['asset_key'] == first['asset_key']
+    assert not second['cached'] and second['asset_key'] != first['asset_key']
+
+
+def test_video_key_follows_the_image_bytes():
+    assert ai_media.video_key(PID, 'image-1', '5') == ai_media.video_key(PID, 'image-1', '5')
+    assert ai_media.video_key(PID, 'image-1', '5') != ai_media.video_key(PID, 'image-2', '5')
+
+
+def test_videos_expire_like_images(app):
+    old = datetime.utcnow() - timedelta(days=ai_media.AI_ASSET_TTL_DAYS + 1)
+    db.session.add(AiAsset(key='old', kind='video', task_id='t1', status='completed',
+                           url='https://example.com/v.mp4', created_at=old))
+    db.session.add(AiAsset(key='new', kind='video', task_id='t2', status='processing'))
+    db.session.commit()
+
+    assert ai_media.get_asset('old') is None
+    assert ai_media.get_asset('new') is not None
+
+
+def test_legacy_data_url_moves_onto_an_asset(app, product):
+    product.ai_image_url = 'data:image/webp;base64,AAAA'
+    db.session.commit()
+
+    key, data = ai_media.stored_image(product)
+
+    assert data == 'AAAA'
+    assert product.ai_image_url == ai_media.asset_url(key)
+    assert ai_media.asset_image(key)[1] == 'image/webp'
+    assert ai_media.stored_image(product) == (key, 'AAAA')
@@ -0,0 +1,91 @@
+import pytest
+
+from app import db
+from app.models import ApiKey, SystemConfig
+from app.services import api_keys
+
+
+@pytest.fixture
+def key(app, monkeypatch):
+    monkeypatch.setattr(api_keys, '_cache', {})
+    monkeypatch.setattr(api_keys, '_version', {'value': None, 'checked': None})
+    row = ApiKey(key='a' * 32, credits=3, is_active=True)
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(api_keys.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    buckets = api_keys.MemoryBuckets(rate=2, burst=3)
+    assert [buckets.take('k') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take('k') == pytest.approx(0.5)
+    clock.now += 0.5
+    assert buckets.take('k') == 0.0
+    assert buckets.take('other') == 0.0      # buckets are per key
+
+
+def test_idle_full_buckets_are_pruned(clock):
+    buckets = api_keys.MemoryBuckets(rate=1, burst=5)
+    for n in range(50):
+        buckets.take(f'idle-{n}')
+    clock.now += api_keys._PRUNE_SECONDS + 1
+    buckets.take('busy')
+    assert list(buckets._buckets) == ['busy']
+
+
+def test_rate_limited_requests_get_429(app, key, monkeypatch):
+    monkeypatch.setattr(api_keys, 'buckets', api_keys.MemoryBuckets(rate=0.001, burst=2))
+    client = app.test_client()
+    headers = {'X-API-KEY': key.key}
+    assert [client.get('/api/extern/jobs/missing', headers=headers).status_code for _ in range(2)] == [404, 404]
+    resp = client.get('/api/extern/jobs/missing', headers=headers)
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) > 0
+
+
+def test_unknown_key_is_rejected(key):
+    assert api_keys.authenticate('b' * 32) is None
+
+
+def test_revoked_key_stops_authenticating_in_other_processes(key, clock, monkeypatch):
+    assert api_keys.authenticate(key.key).id == key.id
+
+    # Another process deactivates it: the DB changes and the version is bumped,
+    # but this process's cache still holds the key
+    db.session.execute(db.update(ApiKey).where(ApiKey.id == key.id).values(is_active=False))
+    db.session.merge(SystemConfig(key=api_keys._VERSION_KEY, value='2'))
+    db.session.commit()
+    assert api_keys.authenticate(key.key) is not None    # version checked recently
+
+    clock.now += api_keys.API_KEY_VERSION_SECONDS + 0.1
+    assert api_keys.authenticate(key.key) is None
+
+
+def test_revoke_drops_the_key_here_and_bumps_the_version(key):
+    api_keys.authenticate(key.key)
+    key.is_active = False
+    api_keys.revoke(key.key)
+    db.session.commit()
+    assert api_keys.authenticate(key.key) is None
+    assert db.session.get(SystemConfig, api_keys._VERSION_KEY).value
+
+
+def test_spend_credits_never_overdraws(key):
+    assert api_keys.spend_credits(key.id, 2) == 1
+    assert api_keys.spend_credits(key.id, 2) is None
+    assert api_keys.credit_balance(key.id) == 1
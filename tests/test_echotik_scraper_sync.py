@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.services import echotik, echotik_scraper
+
+
+def _raw(pid):
+    return {'product_id': pid, 'product_name': f'Product {pid}', 'total_sale_7d_cnt': 10, 'spu_avg_price': 9.99}
+
+
+@pytest.fixture
+def synced(app, monkeypatch):
+    """Every list handed to sync_to_db, plus how often run_post_sync ran."""
+    calls = {'batches': [], 'post_sync': 0}
+
+    def sync_to_db(products, post_sync=True):
+        assert post_sync is False
+        calls['batches'].append([p['product_id'] for p in products])
+        return {'created': len(products), 'updated': 0, 'errors': 0}
+
+    def run_post_sync():
+        calls['post_sync'] += 1
+
+    monkeypatch.setattr(echotik, 'sync_to_db', sync_to_db)
+    monkeypatch.setattr(echotik, 'run_post_sync', run_post_sync)
+    monkeypatch.setattr(echotik_scraper, '_get_recently_synced_ids', lambda app: {'shop_1700000000000000003'})
+    return calls
+
+
+def test_products_are_deduplicated_across_batches(app, synced):
+    sync = echotik_scraper._StreamingSync(app)
+    assert sync.push([_raw('1700000000000000001'), _raw('1700000000000000002'),
+                      _raw('1700000000000000001')]) == 2
+    # Page 2 from another context repeats one product, once with the shop_ prefix
+    assert sync.push([_raw('shop_1700000000000000002'), _raw('1700000000000000004')]) == 1
+    result = sync.finish()
+
+    assert [len(b) for b in synced['batches']] == [2, 1]
+    assert result['created'] == 3 and result['duplicates'] == 2
+    assert synced['post_sync'] == 1
+
+
+def test_recently_synced_products_are_skipped(app, synced):
+    sync = echotik_scraper._StreamingSync(app)
+    assert sync.push([_raw('1700000000000000003')]) == 0
+    result = sync.finish()
+    assert result['skipped'] == 1 and synced['batches'] == []
+    assert synced['post_sync'] == 0                    # nothing written, no post-sync pass
+
+
+def test_queued_batches_sync_once_each(app, synced):
+    async def run():
+        batches = asyncio.Queue()
+        sync = echotik_scraper._StreamingSync(app)
+        consumer = asyncio.ensure_future(echotik_scraper._sync_batches(batches, sync))
+        batches.put_nowait([_raw('1700000000000000001'), _raw('1700000000000000002')])
+        batches.put_nowait([_raw('1700000000000000002'), _raw('1700000000000000005')])
+        batches.put_nowait(None)
+        await consumer
+        return sync.finish()
+
+    result = asyncio.run(run())
+    synced_ids = [pid for batch in synced['batches'] for pid in batch]
+    assert len(synced_ids) == len(set(synced_ids)) == 3
+    assert result['duplicates'] == 1 and synced['post_sync'] == 1
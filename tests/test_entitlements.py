@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import User
+from app.services import entitlements
+
+
+@pytest.fixture
+def users(app, monkeypatch):
+    monkeypatch.setattr(entitlements, '_cursor', None)
+    dropped = []
+    monkeypatch.setattr(entitlements, 'invalidate', lambda *ids: dropped.extend(ids))
+    rows = [User(discord_id=f'd{n}') for n in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows, dropped
+
+
+def _bump(*users, at):
+    for u in users:
+        u.entitlement_changed_at = at
+    db.session.commit()
+
+
+def test_each_change_is_picked_up_once(users):
+    rows, dropped = users
+    start = datetime.utcnow()
+    _bump(rows[0], at=start)
+    assert entitlements.poll_changes() == 0            # first poll only sets the cursor
+
+    _bump(rows[1], at=start + timedelta(seconds=1))
+    assert entitlements.poll_changes() == 1
+    assert dropped == ['d1']
+    assert entitlements.poll_changes() == 0            # the last-seen row isn't re-matched
+    assert dropped == ['d1']
+
+
+def test_changes_in_the_same_instant_are_all_seen(users):
+    rows, dropped = users
+    start = datetime.utcnow()
+    _bump(rows[0], at=start)
+    entitlements.poll_changes()
+
+    _bump(rows[1], rows[2], at=start)                  # same timestamp as the cursor
+    assert entitlements.poll_changes() == 2
+    assert sorted(dropped) == ['d1', 'd2']
+    assert entitlements.poll_changes() == 0
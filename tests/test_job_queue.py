@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import QueueJob
+from app.services import job_queue
+
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    monkeypatch.setitem(job_queue.HANDLERS, 'test_job', 'builtins:dict')
+    return app
+
+
+def _job(job_id):
+    return db.session.get(QueueJob, job_id, populate_existing=True)
+
+
+def test_claim_leases_each_job_to_one_worker(queue):
+    low, _ = job_queue.enqueue('test_job', {'n': 1})
+    high, _ = job_queue.enqueue('test_job', {'n': 2}, priority=5)
+
+    first = job_queue.claim('worker-a', limit=1)
+    assert first == [(high, 'test_job', {'n': 2})]      # highest priority first
+    assert job_queue.claim('worker-b', limit=5) == [(low, 'test_job', {'n': 1})]
+    assert job_queue.claim('worker-c', limit=5) == []
+    assert _job(high).lease_owner == 'worker-a' and _job(high).attempts == 1
+
+
+def test_future_jobs_are_not_claimed_early(queue):
+    job_queue.enqueue('test_job', run_after=datetime.utcnow() + timedelta(minutes=5))
+    assert job_queue.claim('worker-a') == []
+
+
+def test_dedupe_key_returns_the_live_job(queue):
+    job_id, created = job_queue.enqueue('test_job', dedupe_key='sync')
+    assert created
+    assert job_queue.enqueue('test_job', dedupe_key='sync') == (job_id, False)
+    job_queue.claim('worker-a')
+    job_queue.complete(job_id, 'worker-a', {'ok': True})
+    assert job_queue.enqueue('test_job', dedupe_key='sync')[1] is True
+
+
+def test_failed_attempt_is_retried_with_backoff_then_fails(queue):
+    job_id, _ = job_queue.enqueue('test_job', max_attempts=2)
+    job_queue.claim('worker-a')
+    assert job_queue.fail(job_id, 'worker-a', 'boom') == 'queued'
+    job = _job(job_id)
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=30)
+    assert job_queue.claim('worker-a') == []             # backing off
+
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    assert [c[0] for c in job_queue.claim('worker-b')] == [job_id]
+    assert job_queue.fail(job_id, 'worker-b', 'boom again') == 'failed'
+    assert (_job(job_id).status, _job(job_id).last_error) == ('failed', 'boom again')
+
+
+def test_only_the_lease_owner_can_finish_a_job(queue):
+    job_id, _ = job_queue.enqueue('test_job')
+    job_queue.claim('worker-a')
+    assert job_queue.fail(job_id, 'worker-b', 'not mine') is None
+    job_queue.complete(job_id, 'worker-b', {'ok': True})
+    assert _job(job_id).status == 'running'
+    job_queue.complete(job_id, 'worker-a', {'ok': True})
+    assert _job(job_id).status == 'complete'
+
+
+def test_expired_lease_is_reclaimed_until_out_of_attempts(queue):
+    job_id, _ = job_queue.enqueue('test_job', max_attempts=2)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+
+    job_queue.claim('dead-worker')
+    _job(job_id).lease_expires_at = expired
+    db.session.commit()
+    assert [c[0] for c in job_queue.claim('worker-b')] == [job_id]
+    assert _job(job_id).attempts == 2
+
+    _job(job_id).lease_expires_at = expired
+    db.session.commit()
+    assert job_queue.claim('worker-c') == []
+    assert _job(job_id).status == 'failed'
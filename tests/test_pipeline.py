@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from app.services.pipeline import Stage, critical_path, run_stages
+
+
+def _stage(name, log, after=(), seconds=0.0, error=None):
+    def fn(app):
+        log.append(('start', name))
+        time.sleep(seconds)
+        log.append(('end', name))
+        if error:
+            raise RuntimeError(error)
+        return name.upper()
+    return Stage(name, fn, after)
+
+
+def test_stages_start_only_after_their_dependencies_finish(app):
+    log = []
+    stages = [
+        _stage('fetch', log, seconds=0.05),
+        _stage('enrich', log, after=['fetch'], seconds=0.02),
+        _stage('score', log, after=['fetch', 'enrich']),
+        _stage('images', log, seconds=0.01),
+    ]
+
+    out = run_stages(app, stages, workers=3)
+
+    for name, deps in (('enrich', ['fetch']), ('score', ['fetch', 'enrich'])):
+        for dep in deps:
+            assert log.index(('end', dep)) < log.index(('start', name))
+    assert {n: r['result'] for n, r in out['stages'].items()} == {
+        'fetch': 'FETCH', 'enrich': 'ENRICH', 'score': 'SCORE', 'images': 'IMAGES'}
+
+
+def test_independent_stages_run_concurrently(app):
+    both = threading.Barrier(2, timeout=2)
+    stages = [Stage(name, lambda app: both.wait()) for name in ('a', 'b')]
+
+    out = run_stages(app, stages, workers=2)
+
+    assert all(r['status'] == 'complete' for r in out['stages'].values())
+
+
+def test_failed_stage_is_recorded_and_dependents_still_run(app):
+    log, events = [], []
+    stages = [
+        _stage('sync', log, error='EchoTik down'),
+        _stage('report', log, after=['sync']),
+    ]
+
+    out = run_stages(app, stages, on_event=lambda name, status, metrics: events.append((name, status)))
+
+    assert out['stages']['sync']['status'] == 'failed'
+    assert out['stages']['sync']['error'] == 'EchoTik down'
+    assert out['stages']['report']['status'] == 'complete'
+    assert log.index(('end', 'sync')) < log.index(('start', 'report'))
+    assert events == [('sync', 'running'), ('sync', 'failed'),
+                      ('report', 'running'), ('report', 'complete')]
+
+
+def test_unknown_dependency_and_cycle_are_rejected(app):
+    with pytest.raises(ValueError, match='unknown'):
+        run_stages(app, [Stage('a', lambda app: None, after=['missing'])])
+    with pytest.raises(ValueError, match='cycle'):
+        run_stages(app, [Stage('a', lambda app: None, after=['b']),
+                         Stage('b', lambda app: None, after=['a'])])
+
+
+def test_critical_path_follows_the_last_finishing_dependency():
+    stages = [Stage('fetch', None), Stage('images', None),
+              Stage('enrich', None, after=['fetch']),
+              Stage('score', None, after=['enrich', 'images'])]
+    records = {
+        'fetch': {'finished': 10, 'seconds': 10},
+        'images': {'finished': 4, 'seconds': 4},
+        'enrich': {'finished': 15, 'seconds': 5},
+        'score': {'finished': 17, 'seconds': 2},
+    }
+
+    assert critical_path(stages, records) == {'stages': ['fetch', 'enrich', 'score'], 'seconds': 17}
+    assert critical_path(stages, {}) == {'stages': [], 'seconds': 0.0}
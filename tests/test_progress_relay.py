@@ -0,0 +1,49 @@
+import json
+
+from app import db
+from app.models import ProgressEvent
+from app.services import progress
+
+CHANNEL = 'test_relay'
+
+
+def _add(event_id, step):
+    db.session.add(ProgressEvent(id=event_id, channel=CHANNEL, payload_json=json.dumps({'step': step})))
+    db.session.commit()
+
+
+def _relayed(after):
+    return [event['step'] for _, event in progress.progress_bus.wait(CHANNEL, after=after, timeout=0)]
+
+
+def test_relay_starts_at_the_tail(app):
+    _add(1, 'before boot')
+    cursor, seen = progress._relay_start()
+
+    assert progress._relay_once(cursor, seen) == (0, 1)
+
+
+def test_late_committed_lower_id_is_still_relayed_once(app):
+    _add(1, 'before boot')
+    cursor, seen = progress._relay_start()
+    mark = progress.progress_bus.publish('other', {})
+
+    _add(3, 'fast writer')
+    published, cursor = progress._relay_once(cursor, seen)
+    assert (published, cursor) == (1, 3)
+
+    _add(2, 'slow writer')                               # committed after id 3
+    assert progress._relay_once(cursor, seen) == (1, 3)
+    assert progress._relay_once(cursor, seen) == (0, 3)
+    assert _relayed(mark) == ['fast writer', 'slow writer']
+
+
+def test_opening_a_stream_wakes_the_relay(app, monkeypatch):
+    monkeypatch.setattr(progress, '_streams', progress.threading.BoundedSemaphore(1))
+    progress._relay_wake.clear()
+    open_before = progress._open_streams
+
+    assert progress.try_open_stream()
+    assert progress._relay_wake.is_set() and progress._open_streams == open_before + 1
+    progress.close_stream()
+    assert progress._open_streams == open_before
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models import Product, ProductView
+from app.services import refresh_policy
+from app.services.refresh_policy import due_filter, is_due, refresh_interval, reschedule
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.mark.parametrize('score,hours', [(95, 8.0), (60, 16.0), (45, 24.0), (10, 36.0), (None, 36.0)])
+def test_interval_follows_the_score_tier(score, hours):
+    assert refresh_interval(score, 100, None, 0, 0, False) == hours
+
+
+def test_volatile_and_in_demand_products_refresh_sooner():
+    flat = refresh_interval(60, 100, 100, 0, 0, False)
+    moving = refresh_interval(60, 150, 100, 0, 0, False)
+    wanted = refresh_interval(60, 100, 100, 50, 20, True)
+
+    assert flat == 16.0 * 1.5
+    assert moving < flat and wanted < flat
+
+
+def test_interval_is_clamped(monkeypatch):
+    assert refresh_interval(95, 1000, 100, 500, 500, True) == refresh_policy.REFRESH_MIN_HOURS
+    monkeypatch.setattr(refresh_policy, 'REFRESH_MAX_HOURS', 20.0)
+    assert refresh_interval(10, 100, 100, 0, 0, False) == 20.0
+
+
+def test_is_due():
+    assert is_due(SimpleNamespace(next_refresh_at=None), NOW)
+    assert is_due(SimpleNamespace(next_refresh_at=NOW), NOW)
+    assert not is_due(SimpleNamespace(next_refresh_at=NOW + timedelta(minutes=1)), NOW)
+
+
+def test_reschedule_sets_next_refresh_and_due_filter_agrees(app):
+    db.session.add_all([
+        Product(product_id='hot', cached_score=85, sales_7d=300, prev_sales_7d=100, lookup_count=20),
+        Product(product_id='cold', cached_score=20, sales_7d=50, prev_sales_7d=50),
+    ])
+    db.session.add_all([ProductView(user_id=1, product_id='hot', viewed_at=NOW - timedelta(days=1))
+                        for _ in range(5)])
+    db.session.commit()
+    assert Product.query.filter(due_filter(NOW)).count() == 2          # never scheduled → due
+
+    assert reschedule(['hot', 'cold', 'hot', None], now=NOW) == 2
+    db.session.commit()
+
+    hot, cold = db.session.get(Product, 'hot'), db.session.get(Product, 'cold')
+    assert hot.next_refresh_at == NOW + timedelta(hours=refresh_policy.REFRESH_MIN_HOURS)
+    assert cold.next_refresh_at == NOW + timedelta(hours=36 * 1.5)
+    assert Product.query.filter(due_filter(NOW)).count() == 0
+    due_later = NOW + timedelta(hours=3)
+    assert [p.product_id for p in Product.query.filter(due_filter(due_later))] == ['hot']
+    assert is_due(hot, due_later) and not is_due(cold, due_later)
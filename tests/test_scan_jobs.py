@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ScanJob
+from app.services import lookup, scan_jobs
+
+
+@pytest.fixture
+def jobs(app, monkeypatch):
+    monkeypatch.setattr(scan_jobs, 'SCAN_JOB_PER_KEY', 2)
+    return app
+
+
+def _add(job_id, key_id=None, created=None, **fields):
+    db.session.add(ScanJob(id=job_id, status='queued', input_query=f'q-{job_id}', api_key_id=key_id,
+                           created_at=created or datetime.utcnow(), **fields))
+    db.session.commit()
+
+
+def _job(job_id):
+    return db.session.get(ScanJob, job_id, populate_existing=True)
+
+
+def test_claim_is_fair_across_api_keys(jobs):
+    start = datetime.utcnow() - timedelta(minutes=10)
+    for n in range(3):
+        _add(f'big-{n}', key_id=1, created=start + timedelta(seconds=n))
+    _add('small-0', key_id=2, created=start + timedelta(minutes=5))
+
+    assert scan_jobs.claim('w')[0] == 'big-0'
+    assert scan_jobs.claim('w')[0] == 'small-0'      # key 2 has nothing running yet
+    assert scan_jobs.claim('w')[0] == 'big-1'
+    assert scan_jobs.claim('w') is None              # key 1 is at SCAN_JOB_PER_KEY
+
+
+def test_failed_lookup_is_retried_with_backoff_then_errors(jobs, monkeypatch):
+    def outage(query, refresh_due=True):
+        raise RuntimeError('EchoTik 503')
+
+    monkeypatch.setattr(lookup, 'lookup_product', outage)
+    _add('job')
+
+    job_id, query = scan_jobs.claim('w')
+    scan_jobs.process(job_id, query, 'w')
+    job = _job('job')
+    assert job.status == 'queued' and job.attempts == 1
+    assert job.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+    assert scan_jobs.claim('w') is None              # not due yet
+
+    for attempt in (2, 3):
+        _job('job').next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        job_id, query = scan_jobs.claim('w')
+        scan_jobs.process(job_id, query, 'w')
+
+    job = _job('job')
+    assert (job.status, job.attempts, job.next_attempt_at) == ('error', 3, None)
+    assert json.loads(job.result_json)['error'] == 'EchoTik 503'
+
+
+def test_lookup_failure_is_final(jobs, monkeypatch):
+    def not_found(query, refresh_due=True):
+        raise lookup.LookupFailed('No product behind that link')
+
+    monkeypatch.setattr(lookup, 'lookup_product', not_found)
+    _add('job')
+    scan_jobs.process(*scan_jobs.claim('w'), 'w')
+    assert (_job('job').status, _job('job').attempts) == ('error', 1)
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ShareLink
+from app.services import echotik, share_links
+
+PID = '1729384756102938475'
+
+
+class _Response:
+    def __init__(self, url, status_code=200, html=''):
+        self.url = url
+        self.status_code = status_code
+        self._html = html.encode()
+
+    def iter_content(self, size):
+        for i in range(0, len(self._html), size):
+            yield self._html[i:i + size]
+
+    def close(self):
+        pass
+
+
+class _Fetches(list):
+    """Fake network: ``responses[url]`` answers a GET; the list records every fetched URL."""
+
+    def __init__(self):
+        super().__init__()
+        self.responses = {}
+
+    def get(self, url, **kwargs):
+        self.append(url)
+        return self.responses[url]
+
+
+@pytest.fixture
+def fetches(app, monkeypatch):
+    fake = _Fetches()
+    monkeypatch.setattr(share_links.requests, 'get', fake.get)
+    monkeypatch.setattr(echotik, 'extract_product_id_from_share_url', lambda url: None)
+    return fake
+
+
+@pytest.mark.parametrize('text', [
+    PID,
+    f'https://shop.tiktok.com/view/product/{PID}?region=US',
+    f'https://www.tiktok.com/shop/pdp/some-lamp/{PID}',
+    f'check this out https://www.tiktok.com/product/{PID} so good',
+])
+def test_product_id_from_ids_and_full_urls(text):
+    assert share_links.extract_product_id(text) == PID
+
+
+def test_video_id_is_not_a_product_id():
+    assert share_links.extract_product_id('https://www.tiktok.com/@shop/video/7301234567890123456') is None
+
+
+def test_normalize_drops_query_and_lowercases_host():
+    assert share_links.normalize('VM.TikTok.com/ZMabc123/?_r=1#x') == 'https://vm.tiktok.com/ZMabc123'
+    assert share_links.normalize('https://tiktok.com/t/ZTabc/') == 'https://www.tiktok.com/t/ZTabc'
+
+
+def test_full_urls_resolve_without_network(fetches):
+    assert share_links.resolve(f'https://shop.tiktok.com/view/product/{PID}') == (PID, 'US')
+    assert fetches == []
+
+
+def test_short_link_resolved_from_redirect_and_cached(fetches):
+    link = 'https://vm.tiktok.com/ZMabc123'
+    fetches.responses[link] = _Response(f'https://shop.tiktok.com/view/product/{PID}?u=1')
+
+    assert share_links.resolve(link + '/?_r=1') == (PID, 'US')
+    assert share_links.resolve(link) == (PID, 'US')
+    assert fetches == [link]                            # second lookup came from share_links
+    row = db.session.get(ShareLink, link)
+    assert (row.source, row.expires_at) == ('redirect', None)
+
+
+def test_short_link_resolved_from_page_markup(fetches):
+    link = 'https://vt.tiktok.com/ZSxyz'
+    fetches.responses[link] = _Response(
+        'https://www.tiktok.com/@shop/video/7301234567890123456',
+        html=f'<script>{{"itemId":"7301234567890123456","product_id":"{PID}"}}</script>',
+    )
+    assert share_links.resolve(link) == (PID, 'US')
+    assert db.session.get(ShareLink, link).source == 'html'
+
+
+def test_link_without_a_product_is_negatively_cached(fetches):
+    link = 'https://vm.tiktok.com/ZMplainvideo'
+    fetches.responses[link] = _Response('https://www.tiktok.com/@someone/video/7301234567890123456',
+                                        html='<html>just a video</html>')
+    assert share_links.resolve(link) == (None, 'US')
+    assert share_links.resolve(link) == (None, 'US')
+    assert fetches == [link]
+
+    row = db.session.get(ShareLink, link)
+    row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    share_links.resolve(link)
+    assert fetches == [link, link]                      # expired miss is retried
+
+
+def test_fetch_errors_are_not_cached(fetches):
+    link = 'https://vm.tiktok.com/ZMdown'
+    fetches.responses[link] = _Response(link, status_code=503)
+    assert share_links.resolve(link) == (None, 'US')
+    assert db.session.get(ShareLink, link) is None
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from app.services import trickle
+from app.services.trickle import CreditLedger
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+
+def test_balance_survives_a_new_ledger(app):
+    CreditLedger(per_hour=60).accrue(T0)                 # first tick: one interval's worth
+    first = trickle.TRICKLE_INTERVAL_MINUTES
+
+    restarted = CreditLedger(per_hour=60)
+    assert restarted.balance == first
+    assert restarted.accrue(T0 + timedelta(minutes=10)) == first + 10
+
+
+def test_accrual_is_capped_and_charges_are_shared(app):
+    a, b = CreditLedger(per_hour=60), CreditLedger(per_hour=60)
+    a.accrue(T0)
+    assert b.accrue(T0 + timedelta(hours=5)) == 60       # downtime never turns into a burst
+
+    a.charge(25)
+    b.charge(10)
+    assert a.balance == b.balance == 25
+
+
+def test_stale_read_retries_instead_of_overwriting(app, monkeypatch):
+    ledger = CreditLedger(per_hour=60)
+    ledger.accrue(T0)
+    real_read = ledger._read
+    reads = []
+
+    def racing_read():
+        state = real_read()
+        if not reads:
+            CreditLedger(per_hour=60).charge(3)          # another process commits in between
+        reads.append(state)
+        return state
+
+    monkeypatch.setattr(ledger, '_read', racing_read)
+    ledger.charge(2)
+
+    assert len(reads) == 2
+    assert real_read()[1] == trickle.TRICKLE_INTERVAL_MINUTES - 5
@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import json
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ApiKey, WebhookDelivery
+from app.services import webhooks
+
+
+def _resolves_to(monkeypatch, *addresses):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (a, port)) for a in addresses]
+    monkeypatch.setattr(webhooks.socket, 'getaddrinfo', getaddrinfo)
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('url', [
+    'https://hooks.example.com/prism',
+    'http://93.184.216.34:8080/cb',
+])
+def test_validate_url_accepts_public_urls(url):
+    assert webhooks.validate_url(url) is None
+
+
+@pytest.mark.parametrize('url', [
+    'ftp://example.com/cb',
+    'example.com/cb',
+    'http://localhost/cb',
+    'http://printer.local/cb',
+    'http://metadata.google.internal/cb',
+    'http://127.0.0.1/cb',
+    'http://10.0.0.5/cb',
+    'http://169.254.169.254/latest/meta-data',
+    'http://[::1]/cb',
+    'http://[::ffff:127.0.0.1]/cb',
+    'http://224.0.0.1/cb',
+    'http://0.0.0.0/cb',
+])
+def test_validate_url_rejects_non_public_urls(url):
+    assert webhooks.validate_url(url) is not None
+
+
+def test_sign_is_hmac_of_timestamp_and_body():
+    body = b'{"job_id": "abc"}'
+    header = webhooks.sign('s3cret', body, ts=1700000000)
+    expected = hmac.new(b's3cret', b'1700000000.' + body, hashlib.sha256).hexdigest()
+    assert header == f't=1700000000,v1={expected}'
+
+
+def test_check_destination_rejects_host_resolving_to_private_address(monkeypatch):
+    _resolves_to(monkeypatch, '93.184.216.34', '10.1.2.3')
+    assert webhooks.check_destination('https://rebind.example.com/cb') is not None
+    _resolves_to(monkeypatch, '93.184.216.34')
+    assert webhooks.check_destination('https://rebind.example.com/cb') is None
+
+
+def test_post_refuses_private_destination_without_sending(monkeypatch):
+    _resolves_to(monkeypatch, '127.0.0.1')
+    sent = []
+    monkeypatch.setattr(webhooks.requests, 'post', lambda *a, **k: sent.append(k) or _Response(200))
+    status, error = webhooks._post(1, 'https://evil.example.com/cb', b'{}', 'secret')
+    assert status is None and 'non-public' in error
+    assert sent == []
+
+
+def test_post_signs_and_never_follows_redirects(monkeypatch):
+    _resolves_to(monkeypatch, '93.184.216.34')
+    sent = []
+    monkeypatch.setattr(webhooks.requests, 'post', lambda url, **k: sent.append(k) or _Response(302))
+    status, error = webhooks._post(7, 'https://hooks.example.com/cb', b'{}', 'secret')
+    assert (status, error) == (302, 'HTTP 302')
+    assert sent[0]['allow_redirects'] is False
+    assert sent[0]['headers']['X-Prism-Delivery'] == '7'
+    assert sent[0]['headers']['X-Prism-Signature'].startswith('t=')
+
+
+def test_failed_delivery_is_retried_then_delivered(app, monkeypatch):
+    _resolves_to(monkeypatch, '93.184.216.34')
+    key = ApiKey(key='k' * 32, webhook_url='https://hooks.example.com/cb', webhook_secret='secret')
+    db.session.add(key)
+    db.session.commit()
+    assert webhooks.queue_delivery('job-1', key.id, 'complete', {'ok': True})
+    db.session.commit()
+
+    class _Pool:
+        def submit(self, fn, *args):
+            class _Done:
+                def result(self_inner):
+                    return fn(*args)
+            return _Done()
+
+    codes = iter([500, 204])
+    bodies = []
+    monkeypatch.setattr(webhooks.requests, 'post',
+                        lambda url, data, **k: bodies.append(json.loads(data)) or _Response(next(codes)))
+
+    assert webhooks.deliver_due(_Pool()) == 1
+    delivery = WebhookDelivery.query.one()
+    assert (delivery.status, delivery.attempts, delivery.response_status) == ('pending', 1, 500)
+    assert webhooks.deliver_due(_Pool()) == 0        # backing off
+
+    delivery.next_attempt_at = delivery.created_at
+    db.session.commit()
+    assert webhooks.deliver_due(_Pool()) == 1
+    db.session.expire_all()
+    delivery = WebhookDelivery.query.one()
+    assert (delivery.status, delivery.attempts, delivery.response_status) == ('delivered', 2, 204)
+    assert bodies[0]['job_id'] == 'job-1' and bodies[0]['event'] == 'scan.completed'
+
+
+def test_idle_wait_backs_off_but_wakes_for_the_next_retry():
+    now = datetime(2026, 1, 1, 12, 0)
+
+    assert webhooks.idle_wait(60, None, now) == 60
+    assert webhooks.idle_wait(60, now + timedelta(seconds=25), now) == 25
+    assert webhooks.idle_wait(60, now - timedelta(seconds=5), now) == webhooks._POLL_SECONDS
+
+
+def test_next_due_is_the_earliest_pending_delivery(app):
+    now = datetime(2026, 1, 1, 12, 0)
+    for status, minutes in (('pending', 5), ('pending', 2), ('failed', 1)):
+        db.session.add(WebhookDelivery(url='https://example.com/hook', payload_json='{}',
+                                       status=status, next_attempt_at=now + timedelta(minutes=minutes)))
+    db.session.commit()
+
+    assert webhooks.next_due() == now + timedelta(minutes=2)
@@ -0,0 +1,37 @@
+"""
+PRISM — Job Worker Entry Point
+Runs durable queue jobs (app/services/job_queue), external API scan
+jobs (app/services/scan_jobs) and the Kling video poller
+(app/services/ai_media) in their own process, so a web deploy or restart
+never kills a sync mid-run.
+
+Run alongside the web service with JOB_WORKER_EMBEDDED=0 set on the web
+side — the Procfile's web line does this (otherwise the web process keeps
+its embedded worker too — harmless, both just claim from the same queue):
+
+    python worker.py
+
+The scheduler also starts here; leader election keeps it to one firing
+instance across all processes.
+"""
+
+import os
+
+# This process is the worker — don't start a second, embedded one
+os.environ['JOB_WORKER_EMBEDDED'] = '0'
+
+from app import app  # noqa: E402 — created by app factory in app/__init__.py
+from app.services.job_queue import JobWorker  # noqa: E402
+from app.services.scan_jobs import start_pool  # noqa: E402
+from app.services.ai_media import start_poller  # noqa: E402
+from app.services.echotik_scraper import shutdown_browser_pool  # noqa: E402
+
+if __name__ == '__main__':
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    scan_pool = start_pool(app)
+    kling_poller = start_poller(app)
+    JobWorker(app).run_forever()
+    scan_pool.stop(timeout=10)
+    kling_poller.stop(timeout=10)
+    shutdown_browser_pool()